@@ -3,16 +3,27 @@
 - Uses google-adk Runner expectations: exposes `root_agent` (BaseAgent).
 - Delegates to legacy logic in `src.agents.agent_root` and sub-agents while
   mapping ADK session state via EventActions.state_delta.
+- kb_root runs the delegated subagent inside the same invocation (the Runner only follows
+  transfer_to_agent for LLM agents); the transfer event carries agent_root's delegation_payload
+  in custom_metadata, and every final event carries the agent's response dict as
+  custom_metadata["response"] for callers that need more than the text (server/adk_web.py).
+- Streaming turns relay progress as partial events in both job modes: inline runs report each pipeline
+  stage, queue mode polls the job's status (describe_job, every api.poll_interval_seconds) while the turn
+  budget lasts and answers with the candidate facts when the job finishes in time.
 - Default model config remains external; tools keep using Gemini 2.5 Flash via
   existing prompts/config loader.
 """
 
 from __future__ import annotations
 
-from typing import AsyncGenerator
+import asyncio
+import time
+from contextlib import contextmanager
+from typing import Any, AsyncGenerator, Dict, Iterator
 
 from google.adk.agents.base_agent import BaseAgent
 from google.adk.agents.callback_context import CallbackContext
+from google.adk.agents.run_config import StreamingMode
 from google.adk.events import Event, EventActions
 from google.adk.apps.app import App
 from opentelemetry import trace
@@ -21,9 +32,13 @@ from google.genai import types as genai_types
 from kb_adk.otel import setup_tracing_if_enabled
 
 from src.agents.agent_root import run_agent_root
-from src.agents.subagent_document_processor import run_subagent_document_processor
+from src.agents.subagent_document_processor import dispatch_subagent_document_processor, run_subagent_document_processor
 from src.agents.subagent_domain_lifecycle import run_subagent_domain_lifecycle
 from kb_adk.run_config import from_env as run_config_from_env
+from src.jobs.ingest import describe_job, job_message
+from src.utils.config_loader import load_api_config, load_deadline_config, load_jobs_config
+from src.utils.deadline import DeadlineExceeded, deadline, timeout_response
+from src.utils.scheduler import scheduling
 
 
 def _content_from_text(text: str) -> genai_types.Content:
@@ -54,20 +69,150 @@ def _apply_run_config(callback_context: CallbackContext):
     return None
 
 
+def _progress_text(update: Dict[str, Any]) -> str:
+    stage = update.get("stage")
+    if stage == "content_fetched":
+        label = update.get("title") or update.get("url")
+        return f"Fetched {label} ({update.get('content_chars', 0)} characters); checking your domains..."
+    if stage == "domain_scored":
+        verdict = "relevant" if update.get("relevant") else "not relevant"
+        return f"{update.get('domain_name')}: {verdict} for {update.get('url')} (score {update.get('score')})"
+    if stage == "facts_ready":
+        lines = [f"{update.get('domain_name')}: {len(update.get('facts', []))} candidate facts from {update.get('url')}"]
+        lines += [f"- [{f['fact_id']}] {f['content']}" for f in update.get("facts", [])]
+        return "\n".join(lines)
+    if stage == "job_status":
+        return update.get("message", "")
+    return ""
+
+
+def _turn_budget(ctx) -> float:
+    """Seconds left of the turn deadline, measured from the invocation's first event so root and subagent share one budget."""
+    metadata = getattr(getattr(ctx, "run_config", None), "custom_metadata", None) or {}
+    seconds = float(metadata.get("turn_deadline_seconds") or load_deadline_config()["turn_seconds"])
+    started = next((e.timestamp for e in ctx.session.events if e.invocation_id == ctx.invocation_id), time.time())
+    return seconds - (time.time() - started)
+
+
+@contextmanager
+def _turn_scope(ctx) -> Iterator[None]:
+    # Per-user fair queuing in the scheduler and the turn deadline for the Gemini/storage/HTTP calls this turn makes.
+    with scheduling(user_id=(ctx.session.state or {}).get("user_id")), deadline(_turn_budget(ctx)):
+        yield
+
+
+def _delegation_payload(ctx, agent_name: str) -> Dict[str, Any]:
+    """The payload kb_root attached to its transfer to `agent_name` in this invocation; {} when the agent was entered directly."""
+    for event in reversed(ctx.session.events):
+        if event.invocation_id == ctx.invocation_id and event.actions.transfer_to_agent == agent_name:
+            return dict((event.custom_metadata or {}).get("delegation_payload") or {})
+    return {}
+
+
+def _final_event(ctx, author: str, response: Dict[str, Any], state_delta: Dict[str, Any]) -> Event:
+    text = response.get("response_message") or response.get("message_to_user") or response.get("reasoning") or ""
+    return Event(
+        invocation_id=ctx.invocation_id,
+        author=author,
+        branch=ctx.branch,
+        content=_content_from_text(text),
+        actions=EventActions(state_delta=state_delta, end_of_agent=True),
+        custom_metadata={"response": response},
+    )
+
+
+async def _follow_job(ctx, job_id: str, user_id: str) -> AsyncGenerator[Dict[str, Any], None]:
+    """Poll a queued job until it finishes or the turn budget is spent, yielding the described job on each change."""
+    interval = float(load_api_config()["poll_interval_seconds"])
+    seen = None
+    while (job := await asyncio.to_thread(describe_job, job_id, user_id)) is not None:
+        if (job["status"], job["attempts"]) != seen:
+            seen = (job["status"], job["attempts"])
+            yield job
+        if job["status"] in {"done", "failed"} or _turn_budget(ctx) <= interval:
+            return
+        await asyncio.sleep(interval)
+
+
+def _is_streaming(ctx) -> bool:
+    run_config = getattr(ctx, "run_config", None)
+    return run_config is not None and run_config.streaming_mode not in (None, StreamingMode.NONE)
+
+
 class KbDocumentAgent(BaseAgent):
     name: str = "subagent_document_processor"
     description: str = "Processes documents/URLs, extracts facts, saves selections."
 
     async def _run_async_impl(self, ctx) -> AsyncGenerator[Event, None]:
         payload = {
-            "session_id": ctx.session.id,
             "raw_text": ctx.user_content.parts[0].text if ctx.user_content and ctx.user_content.parts else "",
+            **_delegation_payload(ctx, self.name),
+            "session_id": ctx.session.id,
         }
-        response = run_subagent_document_processor(payload, session_id=ctx.session.id, session_state=dict(ctx.session.state))
+        if not _is_streaming(ctx) or load_jobs_config()["mode"] == "queue":
+            # Queue mode returns the job id at once; the result is surfaced by kb_root on a later turn.
+            try:
+                with _turn_scope(ctx):
+                    response = dispatch_subagent_document_processor(payload, session_id=ctx.session.id, session_state=dict(ctx.session.state))
+            except DeadlineExceeded as exc:
+                response = timeout_response(exc.stage, session_id=ctx.session.id)
+            if _is_streaming(ctx) and response.get("status") == "queued":
+                # Streaming clients watch the job instead; a job that finishes within the turn is answered here.
+                job = None
+                async for job in _follow_job(ctx, response["job_id"], ctx.session.state.get("user_id")):
+                    update = {"stage": "job_status", "job_id": job["job_id"], "status": job["status"], "attempts": job["attempts"], "message": job_message(job)}
+                    yield Event(
+                        invocation_id=ctx.invocation_id,
+                        author=self.name,
+                        branch=ctx.branch,
+                        partial=True,
+                        content=_content_from_text(_progress_text(update)),
+                        custom_metadata={"progress": update},
+                    )
+                if job is not None and job["status"] in {"done", "failed"}:
+                    state_delta = {**(response.get("state_delta") or {}), "pending_job_id": None}
+                    response = {
+                        "reasoning": f"Background job {job['job_id']} finished within the turn ({job['status']}).",
+                        "status": "SUCCESS",
+                        "message_to_user": job_message(job),
+                        "job_id": job["job_id"],
+                        "job_status": job["status"],
+                        "candidate_facts": (job["result"] or {}).get("candidate_facts", []),
+                        "session_id": ctx.session.id,
+                        "state_delta": state_delta,
+                    }
+        else:
+            # The pipeline is blocking (HTTP + LLM calls): run it in a worker thread and relay its progress
+            # callbacks as partial events; partial events are not persisted by the session services.
+            loop = asyncio.get_running_loop()
+            updates: asyncio.Queue = asyncio.Queue()
+            with _turn_scope(ctx):
+                # The task copies the context here, so the worker thread inherits the scheduler scope.
+                task = asyncio.ensure_future(
+                    asyncio.to_thread(
+                        run_subagent_document_processor,
+                        payload,
+                        session_id=ctx.session.id,
+                        session_state=dict(ctx.session.state),
+                        on_progress=lambda update: loop.call_soon_threadsafe(updates.put_nowait, update),
+                    )
+                )
+            task.add_done_callback(lambda _: updates.put_nowait(None))
+            while (update := await updates.get()) is not None:
+                yield Event(
+                    invocation_id=ctx.invocation_id,
+                    author=self.name,
+                    branch=ctx.branch,
+                    partial=True,
+                    content=_content_from_text(_progress_text(update)),
+                    custom_metadata={"progress": update},
+                )
+            try:
+                response = task.result()
+            except DeadlineExceeded as exc:
+                response = timeout_response(exc.stage, session_id=ctx.session.id)
         state_delta = response.pop("state_delta", {}) or {}
-        text = response.get("message_to_user") or response.get("response_message") or response.get("reasoning") or ""
-        actions = EventActions(state_delta=state_delta, end_of_agent=True)
-        yield Event(invocation_id=ctx.invocation_id, author=self.name, branch=ctx.branch, content=_content_from_text(text), actions=actions)
+        yield _final_event(ctx, self.name, response, state_delta)
 
 
 class KbDomainAgent(BaseAgent):
@@ -76,16 +221,19 @@ class KbDomainAgent(BaseAgent):
 
     async def _run_async_impl(self, ctx) -> AsyncGenerator[Event, None]:
         payload = {
-            "session_id": ctx.session.id,
             "operation_type": ctx.session.state.get("intent"),
             "user_input": ctx.user_content.parts[0].text if ctx.user_content and ctx.user_content.parts else "",
+            **_delegation_payload(ctx, self.name),
+            "session_id": ctx.session.id,
             "confirmation_status": ctx.session.state.get("confirmation_status", False),
         }
-        response = run_subagent_domain_lifecycle(payload, session_id=ctx.session.id, session_state=dict(ctx.session.state))
+        try:
+            with _turn_scope(ctx):
+                response = run_subagent_domain_lifecycle(payload, session_id=ctx.session.id, session_state=dict(ctx.session.state))
+        except DeadlineExceeded as exc:
+            response = timeout_response(exc.stage, session_id=ctx.session.id)
         state_delta = response.pop("state_delta", {}) or {}
-        text = response.get("message_to_user") or response.get("response_message") or response.get("reasoning") or ""
-        actions = EventActions(state_delta=state_delta, end_of_agent=True)
-        yield Event(invocation_id=ctx.invocation_id, author=self.name, branch=ctx.branch, content=_content_from_text(text), actions=actions)
+        yield _final_event(ctx, self.name, response, state_delta)
 
 
 class KbRootAgent(BaseAgent):
@@ -106,19 +254,30 @@ class KbRootAgent(BaseAgent):
             user_message = "".join(part.text or "" for part in ctx.user_content.parts if hasattr(part, "text"))
 
         session_state = dict(ctx.session.state or {})
-        response = run_agent_root(user_message, session_state=session_state, session_id=ctx.session.id)
+        try:
+            with _turn_scope(ctx):
+                response = run_agent_root(user_message, session_state=session_state, session_id=ctx.session.id)
+        except DeadlineExceeded as exc:
+            response = timeout_response(exc.stage, message_field="response_message", session_id=ctx.session.id)
 
         state_delta = response.pop("state_delta", {}) or {}
 
         if response.get("status") == "DELEGATE":
-            target = response.get("delegation_target")
-            actions = EventActions(state_delta=state_delta, transfer_to_agent=target)
-            yield Event(invocation_id=ctx.invocation_id, author=self.name, branch=ctx.branch, actions=actions)
+            target = self.find_sub_agent(response.get("delegation_target"))
+            actions = EventActions(state_delta=state_delta, transfer_to_agent=target.name)
+            yield Event(
+                invocation_id=ctx.invocation_id,
+                author=self.name,
+                branch=ctx.branch,
+                actions=actions,
+                custom_metadata={"delegation_payload": response.get("delegation_payload") or {}},
+            )
+            # The Runner appended the transfer (and its state_delta) before resuming us, so the subagent sees both.
+            async for event in target.run_async(ctx):
+                yield event
             return
 
-        text = response.get("response_message") or response.get("message_to_user") or response.get("reasoning") or ""
-        actions = EventActions(state_delta=state_delta, end_of_agent=True)
-        yield Event(invocation_id=ctx.invocation_id, author=self.name, branch=ctx.branch, content=_content_from_text(text), actions=actions)
+        yield _final_event(ctx, self.name, response, state_delta)
 
 
 root_agent = KbRootAgent()
@@ -9,7 +9,6 @@ from __future__ import annotations
 
 import os
 from opentelemetry import trace
-from opentelemetry.exporter.cloud_trace import CloudTraceSpanExporter
 from opentelemetry.sdk.resources import Resource
 from opentelemetry.sdk.trace import TracerProvider
 from opentelemetry.sdk.trace.export import BatchSpanProcessor
@@ -27,6 +26,9 @@ def setup_tracing_if_enabled() -> None:
         # Already configured (ADK or previous call)
         return
 
+    # Only needed when tracing is enabled, so the exporter package stays optional.
+    from opentelemetry.exporter.cloud_trace import CloudTraceSpanExporter
+
     resource = Resource.create({"service.name": "kb_adk", "service.version": "0.0.1"})
     provider = TracerProvider(resource=resource)
     exporter = CloudTraceSpanExporter(project_id=project)
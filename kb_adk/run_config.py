@@ -3,6 +3,10 @@
 Profiles:
 - dev: mocks by default (RUN_REAL_AI=0, RUN_REAL_MEMORY=0), max_llm_calls=100.
 - prod: real services (RUN_REAL_AI=1, RUN_REAL_MEMORY=1), tracing enabled via custom_metadata flag.
+- ADK_STREAMING_MODE (none|sse|bidi, default none) sets streaming_mode; with sse/bidi the document agent emits
+  partial progress events (content fetched, each domain scored, facts per domain) before its final event.
+- custom_metadata["turn_deadline_seconds"] (deadlines.turn_seconds, TURN_DEADLINE_SECONDS) is the time budget of one
+  turn; kb_adk.agent propagates it to every tool call (src/utils/deadline.py).
 """
 
 from __future__ import annotations
@@ -11,6 +15,18 @@ import os
 from google.adk.runners import RunConfig
 from google.adk.agents.run_config import StreamingMode
 
+from src.utils.config_loader import load_deadline_config
+
+
+STREAMING_MODES = {"none": StreamingMode.NONE, "sse": StreamingMode.SSE, "bidi": StreamingMode.BIDI}
+
+
+def streaming_mode_from_env() -> StreamingMode:
+    value = os.getenv("ADK_STREAMING_MODE", "none").lower()
+    if value not in STREAMING_MODES:
+        raise ValueError(f"Unsupported ADK_STREAMING_MODE: {value}")
+    return STREAMING_MODES[value]
+
 
 def from_env(profile: str | None = None) -> RunConfig:
     profile = (profile or os.getenv("ADK_RUN_PROFILE", "dev")).lower()
@@ -19,13 +35,14 @@ def from_env(profile: str | None = None) -> RunConfig:
     enable_trace = os.getenv("ENABLE_GCP_LOGGING", "0") == "1"
 
     common = dict(
-        streaming_mode=StreamingMode.NONE,
+        streaming_mode=streaming_mode_from_env(),
         max_llm_calls=200 if profile == "prod" else 100,
         custom_metadata={
             "profile": profile,
             "run_real_ai": run_real_ai,
             "run_real_memory": run_real_mem,
             "trace": enable_trace,
+            "turn_deadline_seconds": load_deadline_config()["turn_seconds"],
         },
     )
 
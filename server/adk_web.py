@@ -1,78 +1,395 @@
 from __future__ import annotations
 
 """
-FastAPI harness exposing agent_root and subagents for HTTP access.
-Use ./adk web to run; designed primarily for local/mock flows.
+Async HTTP API over the same agents the ADK runner drives (agent_root plus its delegated subagents):
+- Agent turns, bulk URL submission, job status and fact save; the blocking agent/tool calls run on a thread pool bounded by `api.max_concurrency`.
+- Turns go through the ADK Runner with kb_adk's root agent, the same agents and event model `./adk web` uses, so each turn records its user message and agent events in the session.
+- Turns and saves of one session are serialised across workers: an asyncio lock within the process, then the session's lease row in the shared SQLite store (session.lease_seconds). Identical in-flight requests (same turn request_id, same user+URL, same job, same save) are coalesced onto one execution within a process.
+- Turns run in the scheduler's interactive class and bulk URL discovery in its bulk class (src/utils/scheduler.py), so bulk requests cannot crowd out chat.
+- Admission control sheds work with status OVERLOADED (src/utils/admission.py): a shed turn answers 429 with Retry-After, a shed URL is a {"type": "rejected"} item.
+- Every turn runs under a deadline (src/utils/deadline.py) counted from its arrival, queueing included: the request's deadline_seconds (at most deadlines.max_turn_seconds) or deadlines.turn_seconds. A turn that runs out answers status TIMEOUT, or the partial candidates when document discovery got that far.
+- Bulk URL results and turn progress stream as NDJSON (`Accept: application/x-ndjson`) or SSE (`Accept: text/event-stream`); otherwise the response is one JSON document.
 
 Public API:
-- /agent-root (POST): runs agent_root.
-- /subagent-domain-lifecycle (POST): runs domain lifecycle subagent.
-- /subagent-document-processor (POST): runs doc processor subagent.
-- /docs/status (GET): lists endpoints.
+- POST /v1/turns {message, session_id?, request_id?, deadline_seconds?}: one agent turn; streams {"type": "progress"} updates (inline pipeline stages, or the queued job's status changes) then {"type": "result"}.
+- POST /v1/documents {session_id, urls, wait?}: discovery for up to api.max_urls_per_request URLs, at most api.url_concurrency at a time; queue mode returns job ids (and, with wait, each job's result as it finishes), inline mode runs discovery here.
+- GET /v1/jobs/{job_id}?session_id=...: background job status and candidate facts.
+- POST /v1/facts {session_id, selected_fact_ids, facts_payload?}: save candidate facts by id.
+- GET /v1/stats: in-flight/coalesced counters, job queue depth by status, scheduler slots per class, admission counters (admitted, rejections by reason, in-flight documents, tokens in the last minute) document prefetch hits/misses and document contexts (active, created, deleted, failed, uses). GET /, /docs/status: endpoint list.
 
-Usage: `./adk web` starts uvicorn server. Honors environment flags for AI/memory/domains/logging. Not a full ADK web UI; meant for local API testing. See README and docs/project_overview.md.
+Usage: `./adk api [uvicorn args]` (e.g. `--workers 4`). Sessions, jobs and candidates live in the shared SQLite files, so uvicorn workers on one host serve the same sessions and the session lease keeps their turns on one session in order; coalescing is per process. Sessions must be authenticated (a turn with the user's name) before documents, jobs or facts are used. `./adk web` remains the ADK dev UI.
 """
 
-from typing import Optional
+import asyncio
+import contextlib
+import contextvars
+import functools
+import json
+import time
+import uuid
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Hashable, List, Optional
 
-from fastapi import FastAPI, HTTPException
-from pydantic import BaseModel
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+from google.adk.agents.run_config import RunConfig, StreamingMode
+from google.adk.runners import Runner
+from google.genai import types as genai_types
+from pydantic import BaseModel, Field
 
-from src.agents.agent_root import run_agent_root
+from kb_adk.agent import root_agent
 from src.agents.subagent_document_processor import run_subagent_document_processor
-from src.agents.subagent_domain_lifecycle import run_subagent_domain_lifecycle
+from src.jobs.ingest import describe_job, run_document_discovery, submit_document_discovery
+from src.jobs.queue import get_job_queue
+from src.session.prefetch import get_prefetcher
+from src.session.session_manager import (
+    APP_NAME,
+    acquire_session_lease,
+    ensure_session,
+    get_session_service,
+    get_state,
+    release_session_lease,
+    update_state,
+)
+from src.tools.document_context import get_context_cache
+from src.utils.admission import Overloaded, get_admission_controller
+from src.utils.config_loader import load_api_config, load_deadline_config, load_jobs_config, load_session_config
+from src.utils.deadline import DeadlineExceeded, deadline, remaining, timeout_response
+from src.utils.logger import get_logger
+from src.utils.scheduler import get_scheduler, scheduling
 
-app = FastAPI(title="ADK Mock Harness", version="0.1.0")
+app = FastAPI(title="KB Domains Agent API", version="1.0.0")
+logger = get_logger("api")
+NDJSON = "application/x-ndjson"
+SSE = "text/event-stream"
+FINISHED = {"done", "failed"}
 
 
-class AgentRootRequest(BaseModel):
-    user_message: str
+class TurnRequest(BaseModel):
+    message: str
     session_id: Optional[str] = None
+    request_id: Optional[str] = None
+    deadline_seconds: Optional[float] = Field(default=None, gt=0)
 
 
-class DomainLifecycleRequest(BaseModel):
-    operation_type: str
-    user_input: str
-    confirmation_status: bool = False
-    domain_id: Optional[str] = None
-    session_id: Optional[str] = None
+class DocumentsRequest(BaseModel):
+    session_id: str
+    urls: List[str] = Field(min_length=1)
+    wait: bool = False
 
 
-class DocumentProcessorRequest(BaseModel):
-    raw_text: Optional[str] = None
-    selected_fact_ids: Optional[list[str]] = None
-    facts_payload: Optional[list[dict]] = None
-    session_id: Optional[str] = None
+class SaveFactsRequest(BaseModel):
+    session_id: str
+    selected_fact_ids: List[str] = Field(min_length=1)
+    facts_payload: Optional[List[Dict[str, Any]]] = None
 
 
-@app.get("/")
-def read_root():
+class Coalescer:
+    """Runs one execution per key at a time; concurrent callers with the same key share its result."""
+
+    def __init__(self) -> None:
+        self._inflight: Dict[Hashable, asyncio.Future] = {}
+        self.coalesced = 0
+
+    async def run(self, key: Hashable, factory: Callable[[], Awaitable[Any]]) -> Any:
+        future = self._inflight.get(key)
+        if future is not None:
+            self.coalesced += 1
+            return await asyncio.shield(future)
+        future = asyncio.ensure_future(factory())
+        self._inflight[key] = future
+        future.add_done_callback(lambda _: self._inflight.pop(key, None))
+        return await asyncio.shield(future)
+
+    def __len__(self) -> int:
+        return len(self._inflight)
+
+
+_executor: Optional[ThreadPoolExecutor] = None
+_coalescer = Coalescer()
+_session_locks: "weakref.WeakValueDictionary[str, asyncio.Lock]" = weakref.WeakValueDictionary()
+
+
+async def _call(fn: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=int(load_api_config()["max_concurrency"]), thread_name_prefix="api")
+    # Carry the caller's context (scheduler priority class/user) into the pool thread.
+    ctx = contextvars.copy_context()
+    return await asyncio.get_running_loop().run_in_executor(_executor, lambda: ctx.run(fn, *args, **kwargs))
+
+
+def _session_lock(session_id: str) -> asyncio.Lock:
+    lock = _session_locks.get(session_id)
+    if lock is None:
+        lock = _session_locks[session_id] = asyncio.Lock()
+    return lock
+
+
+@contextlib.asynccontextmanager
+async def _session_turn(session_id: str) -> AsyncIterator[None]:
+    """Exclusive use of a session: the local lock queues this process's requests, the lease row excludes other workers."""
+    async with _session_lock(session_id):
+        owner = uuid.uuid4().hex
+        poll = float(load_session_config()["lease_poll_seconds"])
+        while not await _call(acquire_session_lease, session_id, owner):
+            left = remaining()
+            if left is not None and left <= poll:
+                raise DeadlineExceeded("session_lease")
+            await asyncio.sleep(poll)
+        try:
+            yield
+        finally:
+            await _call(release_session_lease, session_id, owner)
+
+
+def _apply_delta(session_id: str, delta: Dict[str, Any]) -> None:
+    if delta:
+        update_state(session_id, updates=delta, clear_keys=[k for k, v in delta.items() if v is None])
+
+
+def _run_turn(message: str, session_id: Optional[str], on_progress: Optional[Callable[[Dict[str, Any]], None]]) -> Dict[str, Any]:
+    """One turn through the ADK Runner (kb_root, then the subagent it delegates to), recording its events in the session."""
+    session_id, session = ensure_session(session_id)
+    left = remaining()
+    # The agents measure the turn deadline from the invocation start; pass on what queueing left of it.
+    metadata = {"turn_deadline_seconds": max(left, 0.001)} if left is not None else None
+    run_config = RunConfig(streaming_mode=StreamingMode.SSE if on_progress else StreamingMode.NONE, custom_metadata=metadata)
+    runner = Runner(app_name=APP_NAME, agent=root_agent, session_service=get_session_service())
+    new_message = genai_types.Content(role="user", parts=[genai_types.Part(text=message)])
+
+    async def run() -> Optional[Any]:
+        final = None
+        async for event in runner.run_async(user_id=session.user_id, session_id=session_id, new_message=new_message, run_config=run_config):
+            progress = (event.custom_metadata or {}).get("progress")
+            if event.partial and progress is not None and on_progress is not None:
+                on_progress(progress)
+            elif not event.partial and "response" in (event.custom_metadata or {}):
+                final = event
+        return final
+
+    # The agents make blocking calls from their coroutines, so the Runner gets its own loop on this pool thread.
+    final = asyncio.run(run())
+    agent = final.author if final else root_agent.name
+    response = dict((final.custom_metadata or {}).get("response") or {}) if final else {}
+    message_out = response.get("response_message") or response.get("message_to_user") or response.get("reasoning") or ""
+    return {"type": "result", "session_id": session_id, "agent": agent, "status": response.get("status"), "message": message_out, "response": response}
+
+
+def _save_facts(req: SaveFactsRequest) -> Dict[str, Any]:
+    state = get_state(req.session_id)
+    payload = {"session_id": req.session_id, "selected_fact_ids": req.selected_fact_ids, "facts_payload": req.facts_payload}
+    response = run_subagent_document_processor(payload, session_id=req.session_id, session_state=state)
+    _apply_delta(req.session_id, response.pop("state_delta", {}) or {})
+    return response
+
+
+def _submit(session_id: str, user_id: str, url: str) -> str:
+    job_id, rejection = get_admission_controller().admit_job(user_id, functools.partial(submit_document_discovery, session_id, user_id, url, url))
+    if rejection is not None:
+        raise Overloaded(rejection)
+    return job_id
+
+
+async def _user_id(session_id: str) -> str:
+    user_id = (await _call(get_state, session_id)).get("user_id")
+    if not user_id:
+        raise HTTPException(status_code=403, detail="Session is not authenticated; send a turn with your name first.")
+    return user_id
+
+
+def _stream_format(request: Request) -> Optional[str]:
+    accept = request.headers.get("accept", "")
+    if SSE in accept:
+        return SSE
+    if NDJSON in accept:
+        return NDJSON
+    return None
+
+
+async def _respond(fmt: Optional[str], items: AsyncIterator[Dict[str, Any]], collect: Callable[[List[Dict[str, Any]]], Dict[str, Any]]):
+    if fmt is None:
+        body = collect([item async for item in items])
+        if body.get("status") == "OVERLOADED":
+            # Shed turns map to 429 so HTTP clients and proxies back off.
+            return JSONResponse(body, status_code=429, headers={"Retry-After": str(max(1, round(body["response"]["retry_after_seconds"])))})
+        return JSONResponse(body)
+
+    async def body() -> AsyncIterator[str]:
+        async for item in items:
+            data = json.dumps(item, default=str)
+            yield f"event: {item.get('type', 'message')}\ndata: {data}\n\n" if fmt == SSE else data + "\n"
+
+    return StreamingResponse(body(), media_type=fmt, headers={"Cache-Control": "no-cache"})
+
+
+async def _turn_items(req: TurnRequest, stream: bool) -> AsyncIterator[Dict[str, Any]]:
+    loop = asyncio.get_running_loop()
+    updates: asyncio.Queue = asyncio.Queue()
+    on_progress = (lambda update: loop.call_soon_threadsafe(updates.put_nowait, {"type": "progress", **update})) if stream else None
+
+    cfg = load_deadline_config()
+    budget = min(req.deadline_seconds or cfg["turn_seconds"], cfg["max_turn_seconds"])
+
+    async def execute() -> Dict[str, Any]:
+        # Opened before the session lock and the pool queue, so waiting spends the turn's budget too.
+        with deadline(budget):
+            if req.session_id is None:
+                return await _call(_run_turn, req.message, None, on_progress)
+            try:
+                async with _session_turn(req.session_id):
+                    return await _call(_run_turn, req.message, req.session_id, on_progress)
+            except DeadlineExceeded as exc:
+                logger.error("TURN_DEADLINE_EXCEEDED", stage=exc.stage, session_id=req.session_id)
+                response = timeout_response(exc.stage, message_field="response_message", session_id=req.session_id)
+                return {"type": "result", "session_id": req.session_id, "agent": root_agent.name, "status": response["status"], "message": response["response_message"], "response": response}
+
+    # Retries of one turn (same session_id + request_id) share the first execution instead of replaying it.
+    key = ("turn", req.session_id, req.request_id) if req.session_id and req.request_id else None
+    task = asyncio.ensure_future(_coalescer.run(key, execute) if key else execute())
+    task.add_done_callback(lambda _: updates.put_nowait(None))
+    while (update := await updates.get()) is not None:
+        yield update
+    yield task.result()
+
+
+async def _document_items(req: DocumentsRequest, user_id: str) -> AsyncIterator[Dict[str, Any]]:
+    cfg = load_api_config()
+    urls = list(dict.fromkeys(u.strip() for u in req.urls if u.strip()))
+    results: asyncio.Queue = asyncio.Queue()
+    queue_mode = load_jobs_config()["mode"] == "queue"
+    concurrency = int(cfg["url_concurrency"])
+    if not queue_mode:
+        # More parallel runs than the user may have in flight would only be shed by admission control.
+        concurrency = min(concurrency, int(get_admission_controller().cfg["max_inflight_documents_per_user"]))
+    gate = asyncio.Semaphore(concurrency)
+
+    async def process(url: str) -> None:
+        async with gate:
+            try:
+                if queue_mode:
+                    job_id = await _coalescer.run(("submit", user_id, url), lambda: _call(_submit, req.session_id, user_id, url))
+                    await results.put({"type": "queued", "url": url, "job_id": job_id})
+                else:
+                    payload = {"session_id": req.session_id, "user_id": user_id, "raw_text": url, "url": url}
+                    with scheduling("bulk", user_id=user_id):
+                        response = await _coalescer.run(("discover", user_id, url), lambda: _call(run_document_discovery, payload))
+                    await results.put({"type": "result", "url": url, "status": response.get("status"), "response": response})
+                    return
+            except Overloaded as exc:
+                await results.put({"type": "rejected", "url": url, "status": "OVERLOADED", **exc.rejection.model_dump()})
+                return
+            except Exception as exc:  # noqa: BLE001
+                logger.error("API_URL_FAILED", url=url, error=str(exc), session_id=req.session_id)
+                await results.put({"type": "error", "url": url, "error": str(exc)})
+                return
+        if req.wait:
+            await results.put(await _wait_for_job(url, job_id, user_id, float(cfg["wait_timeout_seconds"]), float(cfg["poll_interval_seconds"])))
+
+    tasks = [asyncio.ensure_future(process(url)) for url in urls]
+    done = asyncio.ensure_future(asyncio.gather(*tasks))
+    done.add_done_callback(lambda _: results.put_nowait(None))
+    while (item := await results.get()) is not None:
+        yield item
+
+
+async def _job_status(job_id: str, user_id: str) -> Optional[Dict[str, Any]]:
+    return await _coalescer.run(("job", job_id, user_id), lambda: _call(describe_job, job_id, user_id))
+
+
+async def _wait_for_job(url: str, job_id: str, user_id: str, timeout: float, interval: float) -> Dict[str, Any]:
+    deadline = time.monotonic() + timeout
+    while True:
+        job = await _job_status(job_id, user_id)
+        if job is None or job["status"] in FINISHED or time.monotonic() >= deadline:
+            break
+        await asyncio.sleep(interval)
+    status = job["status"] if job else "unknown"
+    result = (job or {}).get("result") or {}
     return {
-        "message": "Mock ADK harness ready.",
-        "endpoints": ["/agent-root", "/subagent-domain-lifecycle", "/subagent-document-processor"],
+        "type": "result" if status in FINISHED else "pending",
+        "url": url,
+        "job_id": job_id,
+        "status": status,
+        "candidate_facts": result.get("candidate_facts", []),
+        "error": (job or {}).get("error"),
     }
 
 
-@app.post("/agent-root")
-def agent_root(req: AgentRootRequest):
-    raise HTTPException(status_code=410, detail="Legacy API deprecated; use ADK web UI (/dev-ui/) with kb_adk agent.")
+@app.post("/v1/turns")
+async def post_turn(req: TurnRequest, request: Request):
+    fmt = _stream_format(request)
+    return await _respond(fmt, _turn_items(req, stream=fmt is not None), lambda items: items[-1])
+
 
+@app.post("/v1/documents")
+async def post_documents(req: DocumentsRequest, request: Request):
+    if len(req.urls) > int(load_api_config()["max_urls_per_request"]):
+        raise HTTPException(status_code=413, detail=f"At most {load_api_config()['max_urls_per_request']} URLs per request.")
+    user_id = await _user_id(req.session_id)
+    fmt = _stream_format(request)
 
-@app.post("/subagent-domain-lifecycle")
-def subagent_domain_lifecycle(req: DomainLifecycleRequest):
-    raise HTTPException(status_code=410, detail="Legacy API deprecated; use ADK web UI.")
+    def collect(items: List[Dict[str, Any]]) -> Dict[str, Any]:
+        # Without streaming, keep one entry per URL: the final result when waiting, else the submission.
+        by_url: Dict[str, Dict[str, Any]] = {}
+        for item in items:
+            by_url[item["url"]] = item
+        return {"session_id": req.session_id, "results": list(by_url.values())}
 
+    return await _respond(fmt, _document_items(req, user_id), collect)
 
-@app.post("/subagent-document-processor")
-def subagent_document_processor(req: DocumentProcessorRequest):
-    raise HTTPException(status_code=410, detail="Legacy API deprecated; use ADK web UI.")
+
+@app.get("/v1/jobs/{job_id}")
+async def get_job(job_id: str, session_id: str):
+    job = await _job_status(job_id, await _user_id(session_id))
+    if job is None:
+        raise HTTPException(status_code=404, detail="Unknown job.")
+    return {**job, "candidate_facts": (job["result"] or {}).get("candidate_facts", [])}
+
+
+@app.post("/v1/facts")
+async def post_facts(req: SaveFactsRequest):
+    await _user_id(req.session_id)
+
+    async def execute() -> Dict[str, Any]:
+        async with _session_turn(req.session_id):
+            return await _call(_save_facts, req)
+
+    # A retried save of the same selection joins the in-flight one instead of saving twice.
+    key = ("save", req.session_id, tuple(sorted(req.selected_fact_ids)))
+    return await _coalescer.run(key, execute)
+
+
+@app.get("/v1/stats")
+async def stats():
+    return {
+        "inflight": len(_coalescer),
+        "coalesced": _coalescer.coalesced,
+        "jobs": await _call(lambda: get_job_queue().stats()),
+        "scheduler": get_scheduler().stats(),
+        "admission": get_admission_controller().stats(),
+        "prefetch": get_prefetcher().stats(),
+        "document_contexts": get_context_cache().stats(),
+    }
+
+
+@app.get("/")
+def read_root():
+    return {
+        "message": "KB Domains Agent API ready.",
+        "endpoints": ["/v1/turns", "/v1/documents", "/v1/jobs/{job_id}", "/v1/facts", "/v1/stats"],
+    }
 
 
 @app.get("/docs/status")
 def docs_status():
     return {
-        "message": "Mock ADK harness endpoints",
-        "agent_root": "/agent-root",
-        "subagent_domain_lifecycle": "/subagent-domain-lifecycle",
-        "subagent_document_processor": "/subagent-document-processor",
+        "message": "KB Domains Agent API endpoints",
+        "turns": "POST /v1/turns",
+        "documents": "POST /v1/documents",
+        "jobs": "GET /v1/jobs/{job_id}?session_id=...",
+        "facts": "POST /v1/facts",
+        "stats": "GET /v1/stats",
+        "streaming": f"Accept: {NDJSON} or {SSE}",
     }
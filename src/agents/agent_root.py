@@ -2,7 +2,10 @@ from __future__ import annotations
 
 """
 Agent Root:
-- Authenticates user, routes intents (URL/doc processing, domain lifecycle, toggle/snapshots/export).
+- Authenticates user, routes intents (URL/doc processing, domain lifecycle, toggle/snapshots/export, "what do I know about X" search).
+- Surfaces background document jobs (state pending_job_id): "status"/"results" reports progress or the candidate facts; a finished job is shown on the next unrecognised message and mentioned otherwise.
+- Sheds turns with status OVERLOADED (retry_after_seconds) when admission control rejects them (src/utils/admission.py).
+- On URLs it starts the document processor's page fetches (every URL in the message) and active-domain read in the background (prefetch_discovery) before delegating, so they overlap with the hand-off.
 - Emits HANDOFF logs on delegation.
 
 Public API:
@@ -14,19 +17,28 @@ Usage: Uses tool_auth_user and domain tools (Firestore-backed). Delegates to sub
 import re
 from typing import Any, Dict, Optional
 
+from src.agents.subagent_document_processor import extract_urls, prefetch_discovery
+from src.jobs.ingest import describe_job, job_message
+from src.utils.admission import get_admission_controller, overloaded_response
 from src.tools.auth import tool_auth_user
+from src.tools.memory import tool_search_facts
 from src.tools.ai_analysis import tool_extract_user_name
 from src.tools.domains import (
+    tool_bulk_toggle_domain_status,
     tool_export_detailed_domain_snapshot,
     tool_fetch_user_knowledge_domains,
     tool_generate_domain_snapshot,
-    tool_toggle_domain_status,
 )
 from src.utils.config_loader import load_model_config, load_prompts
 from src.utils.logger import get_logger
 from src.utils.telemetry import trace_span
 
 URL_REGEX = re.compile(r"https?://\S+", re.IGNORECASE)
+KNOWLEDGE_QUERY_REGEX = re.compile(r"what do i know(?:\s+(?:about|on|regarding))?\s*(?P<topic>.*)", re.IGNORECASE)
+DISABLE_REGEX = re.compile(r"\b(disable|deactivate|turn off)\b", re.IGNORECASE)
+ENABLE_REGEX = re.compile(r"\b(enable|activate|turn on)\b", re.IGNORECASE)
+ALL_DOMAINS_REGEX = re.compile(r"\ball\b", re.IGNORECASE)
+JOB_STATUS_REGEX = re.compile(r"\b(status|results?|progress)\b", re.IGNORECASE)
 logger = get_logger("agent_root")
 
 
@@ -41,6 +53,30 @@ def _detect_name(message: str) -> Optional[str]:
     return None
 
 
+def _toggle_target(message: str) -> Optional[str]:
+    """active/inactive when the verb says so; None flips each selected domain."""
+    if DISABLE_REGEX.search(message):
+        return "inactive"
+    if ENABLE_REGEX.search(message):
+        return "active"
+    return None
+
+
+def _select_domains(message: str, domains: list[dict[str, Any]]) -> list[dict[str, Any]]:
+    """Domains named in the message (by name or id), or every domain for "all"."""
+    if ALL_DOMAINS_REGEX.search(message):
+        return list(domains)
+    return [d for d in domains if _mentions(message, d.get("name", "")) or _mentions(message, d.get("domain_id", ""))]
+
+
+def _mentions(message: str, term: str) -> bool:
+    # Whole words only: "AI" must not match "said", nor an id "ml" match "html".
+    if not term.strip():
+        return False
+    pattern = re.escape(term.strip()).replace(r"\ ", r"\s+")
+    return re.search(rf"(?<!\w){pattern}(?!\w)", message, re.IGNORECASE) is not None
+
+
 def _format_domains(domains: list[dict[str, Any]]) -> str:
     active = [d for d in domains if d.get("status", "").lower() == "active"]
     inactive = [d for d in domains if d.get("status", "").lower() == "inactive"]
@@ -57,7 +93,9 @@ def _classify_intent(message: str) -> str:
         return "DOMAIN_LIFECYCLE"
     if any(k in lowered for k in ["enable", "disable", "activate", "turn off"]):
         return "TOGGLE"
-    if any(k in lowered for k in ["snapshot", "summary", "what do i know"]):
+    if KNOWLEDGE_QUERY_REGEX.search(message):
+        return "KNOWLEDGE_QUERY"
+    if any(k in lowered for k in ["snapshot", "summary"]):
         return "SNAPSHOT"
     if any(k in lowered for k in ["export", "download", "detailed report"]):
         return "EXPORT"
@@ -82,8 +120,11 @@ def run_agent_root(
     original_state = dict(state)
     session_user_id = state.get("user_id")
     name_attempts = state.get("name_attempts", 0)
+    ready_note = ""
 
     def finalize(resp: Dict[str, Any]) -> Dict[str, Any]:
+        if ready_note and resp.get("response_message"):
+            resp["response_message"] += ready_note
         delta: Dict[str, Any] = {}
         for key in set(original_state.keys()).union(state.keys()):
             old = original_state.get(key)
@@ -97,6 +138,11 @@ def run_agent_root(
         resp.setdefault("session_id", session_id)
         return resp
 
+    # Admission: shed the turn with OVERLOADED when the user's or the global LLM budget is spent.
+    rejection = get_admission_controller().admit_turn(session_user_id)
+    if rejection is not None:
+        return finalize(overloaded_response(rejection, message_field="response_message"))
+
     # Phase 1: authentication/state check
     if not session_user_id:
         # Initial prompt if no input yet
@@ -145,7 +191,7 @@ def run_agent_root(
         user_id = auth_result["data"]["user_id"]
         state.update({"user_id": user_id, "user_name": name, "name_attempts": attempts})
         domains_result = tool_fetch_user_knowledge_domains(
-            {"user_id": user_id, "status_filter": "ALL", "view_mode": "DETAILED"}
+            {"user_id": user_id, "status_filter": "ALL", "view_mode": "BRIEF"}
         )
         domain_summary = _format_domains(domains_result.get("data", []))
         return finalize({
@@ -158,21 +204,46 @@ def run_agent_root(
 
     # Phase 2: intent classification & routing
     intent = _classify_intent(user_message)
+    pending_job_id = state.get("pending_job_id")
+    job = describe_job(pending_job_id, session_user_id) if pending_job_id else None
+    if pending_job_id and job is None:
+        state.pop("pending_job_id", None)
+    if job is not None:
+        finished = job["status"] in {"done", "failed"}
+        if JOB_STATUS_REGEX.search(user_message) or (finished and intent == "UNKNOWN"):
+            if finished:
+                state.pop("pending_job_id", None)
+            return finalize({
+                "reasoning": f"Reported background job {job['job_id']} ({job['status']}).",
+                "status": "SUCCESS",
+                "response_message": job_message(job),
+                "job_id": job["job_id"],
+                "job_status": job["status"],
+                "candidate_facts": (job["result"] or {}).get("candidate_facts", []),
+            })
+        if finished:
+            ready_note = f"\n\n(Your document results are ready, job {job['job_id']}: say 'results' to see them.)"
+
     if intent == "URL":
-        url_match = URL_REGEX.search(user_message)
-        target_url = url_match.group(0) if url_match else ""
+        urls = extract_urls(user_message)
+        target_url = urls[0] if urls else ""
         state.update({"intent": "DOC_PROCESS", "url": target_url})
+        prefetched = prefetch_discovery(session_id, session_user_id, urls)
         logger.info(
             "HANDOFF",
             source="agent_root",
             target="subagent_document_processor",
             reason="URL detected",
             url=target_url,
+            urls=len(urls),
+            prefetched=prefetched,
             session_id=session_id,
             trace_id=None,
         )
         return finalize({
-            "reasoning": f"Detected URL; delegating to document processor for {target_url}.",
+            "reasoning": f"Detected URL; delegating to document processor for {target_url}."
+            if len(urls) <= 1
+            else f"Detected {len(urls)} URLs; delegating to document processor.",
             "status": "DELEGATE",
             "delegation_target": "subagent_document_processor",
             "delegation_payload": {
@@ -203,25 +274,83 @@ def run_agent_root(
             },
         })
     if intent == "TOGGLE":
-        toggle_result = tool_toggle_domain_status({"user_id": session_user_id, "domain_id": "dom_ai"})
+        listed = tool_fetch_user_knowledge_domains({"user_id": session_user_id, "status_filter": "ALL", "view_mode": "BRIEF"})
+        selected = _select_domains(user_message, listed.get("data") or [])
+        if not selected:
+            names = ", ".join(d.get("name", d.get("domain_id", "")) for d in listed.get("data") or []) or "none yet"
+            return finalize({
+                "reasoning": "Toggle intent without a recognizable domain; asking which one.",
+                "status": "SUCCESS",
+                "response_message": f"Which domain should I change? Your domains: {names} (or say 'all').",
+            })
+        toggle_result = tool_bulk_toggle_domain_status({
+            "user_id": session_user_id,
+            "domain_ids": [d["domain_id"] for d in selected],
+            "target_status": _toggle_target(user_message),
+        })
+        if toggle_result.get("status") != "success":
+            return finalize({
+                "reasoning": f"Bulk toggle failed: {toggle_result.get('error')}",
+                "status": "SUCCESS",
+                "response_message": "I could not change those domains right now. Please retry.",
+            })
+        names = {d["domain_id"]: d.get("name", d["domain_id"]) for d in selected}
+        changes = ", ".join(
+            f"{names[r['domain_id']]}: {r['previous_status']} → {r['new_status']}" for r in toggle_result["data"]["results"]
+        )
+        return finalize({
+            "reasoning": f"Toggle intent detected; updated {len(selected)} domain(s) in one transaction.",
+            "status": "SUCCESS",
+            "response_message": f"Updated domain status — {changes}",
+        })
+    if intent == "KNOWLEDGE_QUERY":
+        topic = KNOWLEDGE_QUERY_REGEX.search(user_message).group("topic").strip(" ?.!")
+        if not topic:
+            return finalize({
+                "reasoning": "Knowledge query without a topic; asking for one.",
+                "status": "SUCCESS",
+                "response_message": "What topic should I look up? Try: what do I know about <topic>",
+            })
+        search = tool_search_facts({"user_id": session_user_id, "query": topic})
+        hits = (search.get("data") or {}).get("hits", [])
+        if not hits:
+            message = f"I couldn't find saved facts about {topic}." if search.get("status") != "error" else "Search is unavailable right now."
+            return finalize({
+                "reasoning": f"Knowledge query returned no hits: {search.get('error') or search.get('status')}",
+                "status": "SUCCESS",
+                "response_message": message,
+            })
+        lines = "\n".join(f"- {hit['fact_text']}" + (f" ({hit['source_url']})" if hit.get("source_url") else "") for hit in hits)
         return finalize({
-            "reasoning": "Toggle intent detected; executed mock toggle.",
+            "reasoning": "Knowledge query detected; ranked saved facts with hybrid search.",
             "status": "SUCCESS",
-            "response_message": f"Toggled domain status: {toggle_result['data']}",
+            "response_message": f"Here is what you know about {topic}:\n{lines}",
         })
     if intent == "SNAPSHOT":
         snapshot = tool_generate_domain_snapshot({"user_id": session_user_id, "domain_id": "dom_ai"})
+        if "data" not in snapshot:
+            return finalize({
+                "reasoning": f"Snapshot tool failed: {snapshot.get('error')}",
+                "status": "SUCCESS",
+                "response_message": "I could not build a snapshot for that domain right now.",
+            })
         return finalize({
-            "reasoning": "Snapshot intent detected; generated mock snapshot.",
+            "reasoning": "Snapshot intent detected; returned rolling snapshot.",
             "status": "SUCCESS",
             "response_message": snapshot["data"]["super_summary"],
         })
     if intent == "EXPORT":
         export = tool_export_detailed_domain_snapshot({"user_id": session_user_id, "domain_id": "dom_ai"})
+        if "data" not in export:
+            return finalize({
+                "reasoning": f"Export tool failed: {export.get('error')}",
+                "status": "SUCCESS",
+                "response_message": "I could not export that domain right now. Please retry later.",
+            })
         return finalize({
-            "reasoning": "Export intent detected; generated mock export link.",
+            "reasoning": "Export intent detected; returned export link.",
             "status": "SUCCESS",
-            "response_message": f"Download: {export['data']['download_url']}",
+            "response_message": f"Download: {export['data']['download_url']} ({export['data']['file_size_bytes']} bytes)",
         })
 
     return finalize({
@@ -237,6 +366,7 @@ def run_agent_root(
             - or disable domain
             - or snapshot
             - or summary
+            - or what do I know about <topic>
             - or export
             - or provide valid url""",
     })
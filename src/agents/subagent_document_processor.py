@@ -6,34 +6,66 @@ Subagent: Document Processor
 - Logs hand-offs and key steps; spans instrumented via trace_span.
 
 Public API:
-- run_subagent_document_processor(payload): discovery mode (URL→facts) or save mode (selected_fact_ids).
+- run_subagent_document_processor(payload, session_id=None, session_state=None, on_progress=None): discovery mode (URLs→facts) or save mode (selected_fact_ids).
+  A long document is uploaded once as a context (src/tools/document_context.py: Gemini cached content, or a local stand-in) that all per-domain relevance/extraction calls reference, and deleted when discovery finishes.
+  Domains are checked most likely first (keyword hits and embedding similarity from the domain's precomputed profile, src/tools/domain_profile.py), and prompts use the profile's stored prompt fragment.
+  Every URL in the message (state url first, deduplicated, at most `discovery.max_urls_per_message`) is fetched concurrently; each domain scores all fetched documents in one batched relevance call and extracts from the relevant ones concurrently. With more than one URL the response adds "sources": [{url, title, status success|error|no_relevance|skipped, error_detail, candidate_facts}], so one failed link does not hide the others.
+  on_progress(update) is called as discovery advances: {"stage": "content_fetched", url, category, title, content_chars}, {"stage": "domain_scored", url, domain_id, domain_name, score, relevant} and {"stage": "facts_ready", url, domain_id, domain_name, facts}; the return value is unchanged.
+- extract_urls(text, first=None) -> URLs in message order without trailing punctuation or duplicates.
+- dispatch_subagent_document_processor(payload, session_id=None, session_state=None): chat-turn entry; with jobs.mode queue, discovery is enqueued (status "queued", job_id, state pending_job_id) and run by src/jobs/worker.py; save mode and inline mode run here.
+- prefetch_discovery(session_id, user_id, urls) -> bool: start the page fetches and the active-domain read in the background (src/session/prefetch.py) for an upcoming inline discovery; agent_root calls it when it detects a URL. Discovery waits on that handle, or starts both reads itself, so the two I/O waits overlap instead of running back to back.
+- Both shed discovery with status "OVERLOADED" (error_detail = reason, retry_after_seconds) when admission control (src/utils/admission.py) refuses the document run or the job.
+- Under a turn deadline (src/utils/deadline.py) discovery stops at the next step once the budget is spent: with candidates from the domains processed so far it returns them (status "review_required", partial True, domains_skipped), otherwise status "TIMEOUT".
 
-Usage: Requires user_id and raw_text or selected facts. Content tools are real networked; relevance/facts may hit Gemini when RUN_REAL_AI=1. Saves facts via tool_save_fact_to_memory (mock or Firestore when RUN_REAL_MEMORY=1). See docs/subagent_document_processor.json. Emits logs for classification, domain filtering, fact extraction errors, and save batches.
+Usage: Requires user_id and raw_text or selected facts. Discovery keeps the candidates server-side per session (src/session/candidate_store.py, session.candidate_ttl_seconds), so save mode only needs selected_fact_ids; a client-sent facts_payload is still accepted and takes precedence. Content tools are real networked; relevance/facts may hit Gemini when RUN_REAL_AI=1. Saves facts via tool_save_fact_to_memory (mock or Firestore when RUN_REAL_MEMORY=1). See docs/subagent_document_processor.json. Emits logs for classification, domain filtering, fact extraction errors, and save batches.
 """
 
+import contextvars
+import functools
 import re
 import uuid
-from typing import Any, Dict, List, Optional
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack
+from typing import Any, Callable, Dict, List, Optional, Tuple
 
+from src.session.candidate_store import get_candidate_store
+from src.session.prefetch import Prefetch, get_prefetcher
+from src.utils.admission import get_admission_controller, overloaded_response
+from src.utils.deadline import DeadlineExceeded, check as check_deadline, timeout_response
 from src.utils.logger import get_logger
 from src.utils.telemetry import trace_span
-from src.tools.ai_analysis import tool_define_topic_relevance, tool_extract_facts_from_text
+from src.tools.ai_analysis import tool_define_topic_relevance, tool_extract_facts_from_text, tool_score_documents_relevance
+from src.tools.document_context import get_context_cache
+from src.tools.domain_profile import match_strength, profile_for
+from src.tools.fact_index import embed_text
 from src.tools.content import (
     tool_process_ordinary_page,
     tool_process_pdf_link,
     tool_process_youtube_link,
 )
 from src.tools.domains import tool_fetch_user_knowledge_domains
-from src.tools.memory import tool_save_fact_to_memory
-from src.utils.config_loader import load_model_config, load_prompts, load_relevance_threshold
+from src.tools.memory import tool_check_duplicate_facts, tool_save_fact_to_memory
+from src.jobs.ingest import submit_document_discovery
+from src.utils.config_loader import (
+    load_discovery_config,
+    load_jobs_config,
+    load_model_config,
+    load_prefetch_config,
+    load_prompts,
+    load_relevance_threshold,
+    load_search_config,
+)
 
 URL_REGEX = re.compile(r"https?://\S+", re.IGNORECASE)
+RANK_SAMPLE_CHARS = 4000
+URL_TRAILING = ".,;:!?)]}>'\""
 logger = get_logger("subagent_document_processor")
 
 
-def _first_url(text: str) -> Optional[str]:
-    match = URL_REGEX.search(text)
-    return match.group(0) if match else None
+def extract_urls(text: str, first: Optional[str] = None) -> List[str]:
+    """URLs in message order, without trailing punctuation and duplicates; `first` (e.g. state url) leads."""
+    found = [match.rstrip(URL_TRAILING) for match in URL_REGEX.findall(text)]
+    return list(dict.fromkeys(url for url in [first, *found] if url))
 
 
 def _classify_url(url: str) -> str:
@@ -45,7 +77,8 @@ def _classify_url(url: str) -> str:
     return "ORDINARY"
 
 
-def _fetch_content(url: str, category: str) -> str:
+def _fetch_content(url: str, category: str) -> Tuple[str, str]:
+    """Returns (content, title); content is empty on failure."""
     if category == "PDF":
         response = tool_process_pdf_link({"url": url})
     elif category == "YOUTUBE":
@@ -53,17 +86,131 @@ def _fetch_content(url: str, category: str) -> str:
     else:
         response = tool_process_ordinary_page({"url": url})
     if response.get("status") != "success":
-        return ""
-    return response.get("content", "")
+        return "", ""
+    return response.get("content", ""), response.get("page_title") or response.get("video_title") or ""
+
+
+def _fetch_active_domains(user_id: str) -> Dict[str, Any]:
+    return tool_fetch_user_knowledge_domains({"user_id": user_id, "status_filter": "ACTIVE", "view_mode": "DETAILED"})
+
+
+def _fetch_url(url: str) -> Tuple[str, str]:
+    return _fetch_content(url, _classify_url(url))
+
+
+def _start_fetches(session_id: str | None, user_id: str, urls: List[str]) -> Prefetch:
+    return get_prefetcher().start(session_id, user_id, urls, _fetch_url, lambda: _fetch_active_domains(user_id))
+
+
+def _map_concurrently(fn: Callable[[Any], Any], items: List[Any]) -> List[Any]:
+    """fn over items, at most discovery.max_concurrency at a time for this call, results in order; a single item runs inline."""
+    if len(items) <= 1:
+        return [fn(item) for item in items]
+    # A pool per call bounds one message's fan-out; the process-wide Gemini/storage limits are the scheduler's.
+    workers = min(len(items), int(load_discovery_config()["max_concurrency"]))
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="discovery") as pool:
+        # One context copy per item keeps the turn's scheduler scope and deadline in every worker.
+        futures = [pool.submit(contextvars.copy_context().run, fn, item) for item in items]
+        return [future.result() for future in futures]
+
+
+def prefetch_discovery(session_id: str | None, user_id: str | None, urls: List[str]) -> bool:
+    """Speculatively start discovery's reads; only inline discovery runs in this process and can pick them up."""
+    if not session_id or not user_id or not urls or not load_prefetch_config()["enabled"] or load_jobs_config()["mode"] != "inline":
+        return False
+    _start_fetches(session_id, user_id, urls[: int(load_discovery_config()["max_urls_per_message"])])
+    return True
+
+
+def _notify(on_progress: Optional[Callable[[Dict[str, Any]], None]], update: Dict[str, Any], session_id: str | None) -> None:
+    if on_progress is None:
+        return
+    try:
+        on_progress(update)
+    except Exception as exc:  # noqa: BLE001
+        logger.error("PROGRESS_CALLBACK_FAILED", stage=update.get("stage"), error=str(exc), session_id=session_id)
+
+
+def _timed_out(
+    exc: DeadlineExceeded,
+    state: Dict[str, Any],
+    original_state: Dict[str, Any],
+    session_id: str | None,
+    session_state: Optional[Dict[str, Any]],
+) -> Dict[str, Any]:
+    logger.error("DEADLINE_EXCEEDED", stage=exc.stage, url=state.get("url"), session_id=session_id)
+    state.pop("url", None)
+    state.pop("url_type", None)
+    return _finalize(timeout_response(exc.stage, session_id=session_id), state, original_state, session_id, session_state, True)
 
 
 def _generate_fact_id(domain_id: str, index: int) -> str:
-    return f"{domain_id}_{index}_{uuid.uuid4().hex[:4]}"
+    # Candidates of every URL in a session share one id space (save-by-id); a full uuid keeps them from colliding.
+    return f"{domain_id}_{index}_{uuid.uuid4().hex}"
+
+
+def dispatch_subagent_document_processor(
+    payload: Dict[str, Any], session_id: str | None = None, session_state: Optional[Dict[str, Any]] = None
+) -> Dict[str, Any]:
+    state = dict(session_state or {})
+    session_id = session_id or payload.get("session_id")
+    urls = extract_urls(payload.get("raw_text") or "", state.get("url"))
+    target_url = urls[0] if urls else None
+    if load_jobs_config()["mode"] != "queue" or payload.get("selected_fact_ids") or not state.get("user_id") or not target_url:
+        return run_subagent_document_processor(payload, session_id=session_id, session_state=session_state)
+    original_state = dict(state)
+    job_id, rejection = get_admission_controller().admit_job(
+        state["user_id"], functools.partial(submit_document_discovery, session_id, state["user_id"], payload.get("raw_text") or "", target_url)
+    )
+    if rejection is not None:
+        state.pop("url", None)
+        return _finalize(overloaded_response(rejection), state, original_state, session_id, session_state, True)
+    state.pop("url", None)
+    state["pending_job_id"] = job_id
+    label = target_url if len(urls) == 1 else f"{len(urls)} links"
+    return _finalize(
+        {
+            "reasoning": f"Discovery for {label} queued as {job_id}.",
+            "status": "queued",
+            "job_id": job_id,
+            "message_to_user": f"I'm processing {label} in the background (job {job_id}). Ask for 'results' in a moment to review the facts.",
+            "session_id": session_id,
+        },
+        state,
+        original_state,
+        session_id,
+        session_state,
+        True,
+    )
 
 
 @trace_span(span_name="subagent_document_processor_turn", component="subagent_document_processor")
 def run_subagent_document_processor(
-    payload: Dict[str, Any], session_id: str | None = None, session_state: Optional[Dict[str, Any]] = None
+    payload: Dict[str, Any],
+    session_id: str | None = None,
+    session_state: Optional[Dict[str, Any]] = None,
+    on_progress: Optional[Callable[[Dict[str, Any]], None]] = None,
+) -> Dict[str, Any]:
+    user_id = (session_state or {}).get("user_id")
+    if payload.get("selected_fact_ids") or not user_id:
+        return _process_document(payload, session_id, session_state, on_progress)
+    # Discovery is the expensive path (fetch + one LLM call per domain): admit it or shed it at once.
+    ticket, rejection = get_admission_controller().admit_document(user_id)
+    if rejection is not None:
+        get_prefetcher().discard(session_id or payload.get("session_id"))
+        response = overloaded_response(rejection, session_id=session_id or payload.get("session_id"))
+        if session_state.get("url"):
+            response["state_delta"] = {"url": None}
+        return response
+    with ticket:
+        return _process_document(payload, session_id, session_state, on_progress)
+
+
+def _process_document(
+    payload: Dict[str, Any],
+    session_id: str | None,
+    session_state: Optional[Dict[str, Any]],
+    on_progress: Optional[Callable[[Dict[str, Any]], None]],
 ) -> Dict[str, Any]:
     _ = load_prompts().get("subagent_document_processor")
     _ = load_model_config("subagent_document_processor")
@@ -84,33 +231,71 @@ def run_subagent_document_processor(
         return _finalize({"reasoning": "Missing user_id.", "status": "error", "error_detail": "user_id_required", "session_id": session_id}, state, original_state, session_id, session_state, using_adk_state)
 
     # Save mode
-    if selected_fact_ids and facts_payload:
-        saved = 0
-        for fact in facts_payload:
-            if fact.get("fact_id") in selected_fact_ids:
-                tool_save_fact_to_memory(
-                    {
-                        "fact_text": fact["content"],
-                        "source_url": fact["source_url"],
-                        "user_id": user_id,
-                        "domain_id": fact["domain_id"],
-                    }
-                )
-                saved += 1
+    if selected_fact_ids:
+        if facts_payload:
+            chosen = [fact for fact in facts_payload if fact.get("fact_id") in selected_fact_ids]
+            stored = False
+        elif session_id:
+            chosen = get_candidate_store().get(session_id, user_id, selected_fact_ids)
+            stored = True
+        else:
+            chosen, stored = [], False
+        if not chosen:
+            logger.error("CANDIDATES_UNAVAILABLE", selected=len(selected_fact_ids), session_id=session_id)
+            return _finalize(
+                {
+                    "reasoning": "Selected facts are no longer available; run discovery again.",
+                    "status": "error",
+                    "error_detail": "candidates_expired",
+                    "session_id": session_id,
+                },
+                state,
+                original_state,
+                session_id,
+                session_state,
+                using_adk_state,
+            )
+        saved_ids: List[str] = []
+        failed_ids: List[str] = []
+        for fact in chosen:
+            result = tool_save_fact_to_memory(
+                {
+                    "fact_text": fact["content"],
+                    "source_url": fact["source_url"],
+                    "user_id": user_id,
+                    "domain_id": fact["domain_id"],
+                }
+            )
+            if result.get("status") == "success":
+                saved_ids.append(fact["fact_id"])
+            else:
+                failed_ids.append(fact["fact_id"])
+                logger.error("FACT_SAVE_FAILED", fact_id=fact["fact_id"], domain_id=fact["domain_id"], error=result.get("error"), session_id=session_id)
+        if stored and saved_ids:
+            # Failed candidates stay in the store so the user can retry them by id.
+            get_candidate_store().discard(session_id, saved_ids)
         logger.info(
             "FACT_SAVE_BATCH",
             selected=len(selected_fact_ids),
-            attempted=len(facts_payload),
-            saved=saved,
+            attempted=len(chosen),
+            saved=len(saved_ids),
+            failed=len(failed_ids),
+            source="store" if stored else "payload",
             session_id=session_id,
         )
+        outcome: Dict[str, Any] = {
+            "reasoning": f"Saved {len(saved_ids)} facts.",
+            "status": "success",
+            "saved_count": len(saved_ids),
+            "session_id": session_id,
+        }
+        if failed_ids:
+            outcome["reasoning"] = f"Saved {len(saved_ids)} of {len(chosen)} facts; failed: {', '.join(failed_ids)}."
+            outcome["failed_fact_ids"] = failed_ids
+            if not saved_ids:
+                outcome.update(status="error", error_detail="save_failed")
         return _finalize(
-            {
-                "reasoning": f"Saved {saved} facts.",
-                "status": "success",
-                "saved_count": saved,
-                "session_id": session_id,
-            },
+            outcome,
             state,
             original_state,
             session_id,
@@ -119,8 +304,8 @@ def run_subagent_document_processor(
         )
 
     # Discovery mode
-    target_url = state.get("url") or _first_url(raw_text or "")
-    if not target_url:
+    urls = extract_urls(raw_text or "", state.get("url"))
+    if not urls:
         return _finalize(
             {
                 "reasoning": "No URL found in text.",
@@ -135,58 +320,222 @@ def run_subagent_document_processor(
             using_adk_state,
         )
 
-    category = _classify_url(target_url)
-    state["url_type"] = category
-    logger.info("DOC_CLASSIFIED", url=target_url, category=category, session_id=session_id)
-    content_text = _fetch_content(target_url, category)
-    if not content_text:
-        logger.error("CONTENT_FETCH_FAILED", url=target_url, category=category, session_id=session_id)
+    cap = int(load_discovery_config()["max_urls_per_message"])
+    urls, over_cap = urls[:cap], urls[cap:]
+    state["url_type"] = _classify_url(urls[0])
+    for url in urls:
+        logger.info("DOC_CLASSIFIED", url=url, category=_classify_url(url), session_id=session_id)
+    prefetched: Optional[Prefetch] = None
+    if load_prefetch_config()["enabled"]:
+        # Use the reads agent_root started, else start them now; either way pages and domains load concurrently.
+        prefetched = get_prefetcher().take(session_id, user_id) if session_id else None
+        if prefetched is not None:
+            get_prefetcher().fill(prefetched, urls, _fetch_url)
+        else:
+            prefetched = _start_fetches(None, user_id, urls)
+    try:
+        check_deadline("content fetch")
+        fetched = [prefetched.content(url) for url in urls] if prefetched else _map_concurrently(_fetch_url, urls)
+        # A fetch cut short by the budget is a timeout, not missing content.
+        check_deadline("content fetch")
+    except DeadlineExceeded as exc:
+        return _timed_out(exc, state, original_state, session_id, session_state)
+
+    sources: Dict[str, Dict[str, Any]] = {}
+    documents: List[Tuple[str, str]] = []
+    for url, (content_text, title) in zip(urls, fetched):
+        sources[url] = {"url": url, "title": title, "status": "success", "error_detail": None, "candidate_facts": []}
+        if not content_text:
+            logger.error("CONTENT_FETCH_FAILED", url=url, category=_classify_url(url), session_id=session_id)
+            sources[url].update({"status": "error", "error_detail": "content_unavailable"})
+            continue
+        documents.append((url, content_text))
+        _notify(
+            on_progress,
+            {"stage": "content_fetched", "url": url, "category": _classify_url(url), "title": title, "content_chars": len(content_text)},
+            session_id,
+        )
+    for url in over_cap:
+        sources[url] = {"url": url, "title": "", "status": "skipped", "error_detail": "url_limit", "candidate_facts": []}
+
+    def done(resp: Dict[str, Any]) -> Dict[str, Any]:
         state.pop("url", None)
         state.pop("url_type", None)
-        return _finalize(
+        if len(sources) > 1:
+            resp["sources"] = list(sources.values())
+        return _finalize(resp, state, original_state, session_id, session_state, using_adk_state)
+
+    if not documents:
+        if prefetched:
+            prefetched.cancel()
+        return done(
             {
                 "reasoning": "Content fetch failed.",
                 "status": "error",
                 "error_detail": "content_unavailable",
                 "session_id": session_id,
-            },
-            state,
-            original_state,
-            session_id,
-            session_state,
-            using_adk_state,
+            }
         )
 
-    domains_result = tool_fetch_user_knowledge_domains(
-        {"user_id": user_id, "status_filter": "ACTIVE", "view_mode": "DETAILED"}
-    )
+    try:
+        domains_result = prefetched.domains() if prefetched else _fetch_active_domains(user_id)
+    except DeadlineExceeded as exc:
+        return _timed_out(exc, state, original_state, session_id, session_state)
     if domains_result.get("status") == "empty" or not domains_result.get("data"):
         logger.info("NO_ACTIVE_DOMAINS", user_id=user_id, session_id=session_id)
-        state.pop("url", None)
-        state.pop("url_type", None)
-        return _finalize(
-            {"reasoning": "No active domains found.", "status": "no_relevance", "session_id": session_id},
-            state,
-            original_state,
-            session_id,
-            session_state,
-            using_adk_state,
-        )
+        return done({"reasoning": "No active domains found.", "status": "no_relevance", "session_id": session_id})
     logger.info("DOMAINS_RETRIEVED", count=len(domains_result.get("data", [])), user_id=user_id, session_id=session_id)
 
     candidate_facts: List[Dict[str, Any]] = []
-    for domain in domains_result["data"]:
-        relevance = tool_define_topic_relevance(
+    domains = _rank_domains(domains_result["data"], documents)
+    skipped: List[str] = []
+    # A document with a context is scored alone against it, so it serves a relevance and an extraction call per domain.
+    calls_per_document = len(domains) * 2
+    with ExitStack() as stack:
+        # Long documents are uploaded once as a context for all domains; contexts are deleted on exit.
+        contexts = {url: stack.enter_context(get_context_cache().document(text, calls_per_document)) for url, text in documents}
+        for index, domain in enumerate(domains):
+            try:
+                candidate_facts.extend(_facts_for_domain(domain, documents, threshold, on_progress, session_id, contexts))
+            except DeadlineExceeded as exc:
+                skipped = [d.get("name") or d.get("domain_id") for d in domains[index:]]
+                logger.error("DEADLINE_EXCEEDED", stage=exc.stage, urls=len(documents), domains_done=index, domains_skipped=len(skipped), session_id=session_id)
+                break
+
+    if skipped and not candidate_facts:
+        return done(timeout_response("domain scoring", session_id=session_id))
+
+    for fact in candidate_facts:
+        sources[fact["source_url"]]["candidate_facts"].append(fact)
+    for url, _ in documents:
+        if not sources[url]["candidate_facts"]:
+            sources[url]["status"] = "no_relevance"
+
+    if not candidate_facts:
+        logger.info("NO_RELEVANT_FACTS", urls=len(documents), session_id=session_id)
+        return done({"reasoning": "No relevant facts above threshold.", "status": "no_relevance", "session_id": session_id})
+
+    if not skipped:
+        _flag_duplicates(user_id, candidate_facts, session_id)
+    if session_id:
+        get_candidate_store().put(session_id, user_id, candidate_facts)
+    logger.info("FACTS_EXTRACTED", count=len(candidate_facts), urls=len(documents), partial=bool(skipped), session_id=session_id)
+    response: Dict[str, Any] = {
+        "reasoning": f"Extracted {len(candidate_facts)} candidate facts.",
+        "status": "review_required",
+        "candidate_facts": candidate_facts,
+        "session_id": session_id,
+    }
+    if len(sources) > 1:
+        failed = [url for url, source in sources.items() if source["status"] in {"error", "skipped"}]
+        response["reasoning"] = f"Extracted {len(candidate_facts)} candidate facts from {len(documents)} of {len(sources)} URLs."
+        if failed:
+            response["reasoning"] += f" Not processed: {', '.join(failed)}."
+    if skipped:
+        # Out of time: hand back what the processed domains produced instead of nothing.
+        response.update(
             {
-                "content_text": content_text,
-                "domain_name": domain["name"],
-                "domain_description": domain.get("domain_description", ""),
-                "domain_keywords": domain.get("domain_keywords", []),
+                "reasoning": f"Extracted {len(candidate_facts)} candidate facts before the turn deadline; not checked: {', '.join(skipped)}.",
+                "partial": True,
+                "domains_skipped": skipped,
             }
         )
-        if relevance.get("status") != "success" or relevance.get("relevance_score", 0) <= threshold:
+    return done(response)
+
+
+def _domain_fields(domain: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "domain_name": domain["name"],
+        "domain_description": domain.get("domain_description") or "",
+        "domain_keywords": domain.get("domain_keywords") or [],
+        "domain_prompt": profile_for(domain)["prompt_fragment"],
+    }
+
+
+def _rank_domains(domains: List[Dict[str, Any]], documents: List[Tuple[str, str]]) -> List[Dict[str, Any]]:
+    """Most likely domains first (keyword hits, then embedding similarity), so a deadline cuts the least likely; the LLM still decides relevance."""
+    if len(domains) <= 1:
+        return domains
+    cfg = load_search_config()
+    vectors = [embed_text(text[:RANK_SAMPLE_CHARS], int(cfg["embedding_dim"])) for _, text in documents]
+    floor = float(cfg["min_similarity"])
+
+    def strength(domain: Dict[str, Any]) -> Tuple[int, float]:
+        profile = profile_for(domain)
+        # Similarity under the search floor is hashing noise; ties keep the stored domain order.
+        return max(
+            (hits, similarity if similarity >= floor else 0.0)
+            for hits, similarity in (match_strength(profile, text, vector) for (_, text), vector in zip(documents, vectors))
+        )
+
+    return sorted(domains, key=strength, reverse=True)
+
+
+def _score_documents(fields: Dict[str, Any], documents: List[Tuple[str, str]], contexts: Dict[str, Optional[str]]) -> List[Dict[str, Any]]:
+    """
+    Relevance per document, in order. Documents uploaded as a context are scored alone against it; the others share
+    one batched call with their text cut to discovery.batch_document_chars. Documents the batch fails or leaves out
+    are scored one call each.
+    """
+    results: List[Optional[Dict[str, Any]]] = [None] * len(documents)
+    inline = [i for i, (url, _) in enumerate(documents) if not contexts.get(url)]
+    if len(inline) > 1:
+        limit = int(load_discovery_config()["batch_document_chars"])
+        batch = tool_score_documents_relevance(
+            {"documents": [{"document_id": str(i), "content_text": documents[i][1][:limit]} for i in inline], **fields}
+        )
+        if batch.get("status") == "success":
+            for score in batch["scores"]:
+                results[int(score["document_id"])] = {"status": "success", "relevance_score": score["relevance_score"], "reasoning": score["reasoning"]}
+            unscored = sum(1 for i in inline if results[i] is None)
+            if unscored:
+                logger.error("BATCH_RELEVANCE_INCOMPLETE", domain_name=fields["domain_name"], documents=len(inline), unscored=unscored)
+        else:
+            logger.error("BATCH_RELEVANCE_FAILED", domain_name=fields["domain_name"], error_detail=batch.get("error_detail"))
+    pending = [i for i, result in enumerate(results) if result is None]
+    singles = _map_concurrently(
+        lambda i: tool_define_topic_relevance({"content_text": documents[i][1], "context_id": contexts.get(documents[i][0]), **fields}), pending
+    )
+    for i, result in zip(pending, singles):
+        results[i] = result
+    return results
+
+
+def _facts_for_domain(
+    domain: Dict[str, Any],
+    documents: List[Tuple[str, str]],
+    threshold: float,
+    on_progress: Optional[Callable[[Dict[str, Any]], None]],
+    session_id: str | None,
+    contexts: Optional[Dict[str, Optional[str]]] = None,
+) -> List[Dict[str, Any]]:
+    """Score the documents for one domain, then extract facts from the relevant ones concurrently; raises DeadlineExceeded when the budget runs out around either step."""
+    check_deadline("domain scoring")
+    # The profile's prompt fragment was built when the domain was saved; nothing is rebuilt per document.
+    fields = _domain_fields(domain)
+    contexts = contexts or {}
+    relevances = _score_documents(fields, documents, contexts)
+    # A call that failed because the budget ran out leaves the domain unprocessed rather than irrelevant.
+    check_deadline("domain scoring")
+    relevant_docs: List[Tuple[str, str, Dict[str, Any]]] = []
+    for (url, content_text), relevance in zip(documents, relevances):
+        relevant = relevance.get("status") == "success" and relevance.get("relevance_score", 0) > threshold
+        _notify(
+            on_progress,
+            {
+                "stage": "domain_scored",
+                "url": url,
+                "domain_id": domain.get("domain_id"),
+                "domain_name": domain.get("name"),
+                "score": relevance.get("relevance_score"),
+                "relevant": relevant,
+            },
+            session_id,
+        )
+        if not relevant:
             logger.info(
                 "DOMAIN_DROPPED",
+                url=url,
                 domain_id=domain.get("domain_id"),
                 domain_name=domain.get("name"),
                 score=relevance.get("relevance_score"),
@@ -194,65 +543,73 @@ def run_subagent_document_processor(
                 session_id=session_id,
             )
             continue
+        relevant_docs.append((url, content_text, relevance))
 
-        facts_resp = tool_extract_facts_from_text(
-            {
-                "content_text": content_text,
-                "domain_name": domain["name"],
-                "domain_description": domain.get("domain_description", ""),
-                "domain_keywords": domain.get("domain_keywords", []),
-                "relevance_justification": relevance.get("reasoning", ""),
-            }
-        )
+    responses = _map_concurrently(
+        lambda doc: tool_extract_facts_from_text(
+            {"content_text": doc[1], "context_id": contexts.get(doc[0]), **fields, "relevance_justification": doc[2].get("reasoning", "")}
+        ),
+        relevant_docs,
+    )
+    check_deadline("fact extraction")
+    facts: List[Dict[str, Any]] = []
+    for (url, _, _), facts_resp in zip(relevant_docs, responses):
         if facts_resp.get("status") != "success":
             logger.error(
                 "FACT_EXTRACTION_FAILED",
+                url=url,
                 domain_id=domain.get("domain_id"),
                 domain_name=domain.get("name"),
                 error_detail=facts_resp.get("error_detail"),
                 session_id=session_id,
             )
             continue
-        for idx, fact in enumerate(facts_resp.get("facts", [])):
-            fact_id = _generate_fact_id(domain["domain_id"], idx)
-            candidate_facts.append(
-                {
-                    "domain_id": domain["domain_id"],
-                    "fact_id": fact_id,
-                    "content": fact["content"],
-                    "source_url": target_url,
-                }
-            )
-
-    if not candidate_facts:
-        logger.info("NO_RELEVANT_FACTS", url=target_url, session_id=session_id)
-        state.pop("url", None)
-        state.pop("url_type", None)
-        return _finalize(
-            {"reasoning": "No relevant facts above threshold.", "status": "no_relevance", "session_id": session_id},
-            state,
-            original_state,
+        domain_facts = [
+            {
+                "domain_id": domain["domain_id"],
+                "fact_id": _generate_fact_id(domain["domain_id"], idx),
+                "content": fact["content"],
+                "source_url": url,
+            }
+            for idx, fact in enumerate(facts_resp.get("facts", []))
+        ]
+        _notify(
+            on_progress,
+            {"stage": "facts_ready", "url": url, "domain_id": domain["domain_id"], "domain_name": domain.get("name"), "facts": [dict(f) for f in domain_facts]},
             session_id,
-            session_state,
-            using_adk_state,
         )
+        facts.extend(domain_facts)
+    return facts
 
-    logger.info("FACTS_EXTRACTED", count=len(candidate_facts), url=target_url, session_id=session_id)
-    state.pop("url", None)
-    state.pop("url_type", None)
-    return _finalize(
-        {
-        "reasoning": f"Extracted {len(candidate_facts)} candidate facts.",
-        "status": "review_required",
-        "candidate_facts": candidate_facts,
-        "session_id": session_id,
-        },
-        state,
-        original_state,
-        session_id,
-        session_state,
-        using_adk_state,
-    )
+
+def _flag_duplicates(user_id: str, candidate_facts: List[Dict[str, Any]], session_id: str | None) -> None:
+    """Annotate candidates that restate a stored fact or an earlier candidate (duplicate_of/similarity)."""
+    try:
+        check = tool_check_duplicate_facts(
+            {
+                "user_id": user_id,
+                "facts": [{"fact_id": f["fact_id"], "domain_id": f["domain_id"], "content": f["content"]} for f in candidate_facts],
+            }
+        )
+    except DeadlineExceeded:
+        # Flags are advisory; the candidates are still worth returning.
+        check = {"status": "error", "error": "deadline_exceeded"}
+    if check.get("status") != "success":
+        logger.error("DEDUP_CHECK_FAILED", error=check.get("error"), session_id=session_id)
+        return
+    flags = {flag["fact_id"]: flag for flag in check.get("data", []) if flag.get("duplicate_of")}
+    for fact in candidate_facts:
+        flag = flags.get(fact["fact_id"])
+        if flag:
+            fact.update(
+                {
+                    "duplicate_of": flag["duplicate_of"],
+                    "duplicate_kind": flag["duplicate_kind"],
+                    "similarity": flag["similarity"],
+                }
+            )
+    if flags:
+        logger.info("DUPLICATE_CANDIDATES_FLAGGED", count=len(flags), session_id=session_id)
 
 
 def _finalize(
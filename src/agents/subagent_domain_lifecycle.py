@@ -3,7 +3,8 @@ from __future__ import annotations
 """
 Subagent: Domain Lifecycle
 - Drafts domain via prettify tool.
-- Awaits confirmation; on confirm can persist to Firestore when RUN_REAL_DOMAINS=1, else mock save.
+- The draft is kept in session state ("domain_draft", keyed by domain_id and a hash of the input it came from): confirming saves exactly that draft without another LLM call, re-sending the same input reuses it, and an UPDATE on a pending draft refines it (only the edit instructions and the previous draft go to the LLM).
+- Awaits confirmation; on confirm can persist to the configured store (Firestore or SQLite) when RUN_REAL_DOMAINS=1, else mock save. The saved domain carries its precomputed profile (src/tools/domain_profile.py).
 
 Public API:
 - run_subagent_domain_lifecycle(payload): handles CREATE/UPDATE drafts, confirmation flow; returns status/domain_draft/message_to_user.
@@ -11,6 +12,7 @@ Public API:
 Usage: Invoked via agent_root or directly. Prettify uses AI (mock or Gemini). Real save requires RUN_REAL_DOMAINS=1 and GCP Firestore setup. See docs/subagent_domain_lifecycle.json for spec. Logs PRETTIFY_FAILED/DOMAIN_WRITE_FAILED on errors.
 """
 
+import hashlib
 import os
 import random
 import string
@@ -18,10 +20,12 @@ from typing import Any, Dict, Optional
 
 from google.cloud import firestore
 
+from src.storage.client import get_client
+from src.tools.domain_profile import build_domain_profile
 from src.utils.logger import get_logger
 from src.utils.telemetry import trace_span
 from src.tools.domains import tool_prettify_domain_description
-from src.utils.config_loader import ConfigLoader, load_model_config, load_prompts
+from src.utils.config_loader import load_model_config, load_prompts
 
 logger = get_logger("subagent_domain_lifecycle")
 
@@ -30,10 +34,14 @@ def _generate_id(length: int = 6) -> str:
     return "".join(random.choices(string.ascii_lowercase + string.digits, k=length))
 
 
+def _input_hash(text: str) -> str:
+    return hashlib.sha256(" ".join(text.lower().split()).encode("utf-8")).hexdigest()[:16]
+
+
 def _persist_domain(doc_id: str, user_id: str, draft: Dict[str, Any]) -> None:
-    settings = ConfigLoader.instance().settings
-    client = firestore.Client(database=settings.firestore_database or "(default)")
+    client = get_client()
     doc_ref = client.collection("domains").document(doc_id)
+    # Merge so an edit keeps the domain's version counter; the bump invalidates cached snapshots/exports.
     doc_ref.set(
         {
             "user_id": user_id,
@@ -41,7 +49,11 @@ def _persist_domain(doc_id: str, user_id: str, draft: Dict[str, Any]) -> None:
             "status": "active",
             "domain_description": draft["description"],
             "domain_keywords": draft["keywords"],
-        }
+            # Computed once per edit; discovery reads it instead of rebuilding prompts and matchers per document.
+            "profile": build_domain_profile(draft["name"], draft["description"], draft["keywords"]),
+            "version": firestore.Increment(1),
+        },
+        merge=True,
     )
 
 
@@ -82,44 +94,59 @@ def run_subagent_domain_lifecycle(
             using_adk_state,
         )
 
-    # First phase: ask LLM to prettify the raw intent into a structured draft.
-    # This is the draft-generation hop: user text -> LLM prettify -> candidate domain_draft.
-    prettified = tool_prettify_domain_description({"raw_input_text": user_input})
-    if prettified.get("status") != "SUCCESS":
-        logger.error(
-            "PRETTIFY_FAILED",
-            raw_input=user_input,
-            error_details=prettified.get("error_details") or prettified.get("error_detail"),
-            session_id=session_id,
-        )
-        return _finalize(
-            {
-                "reasoning": "Prettify tool failed.",
-                "status": "READ_ERROR",
-                "message_to_user": "Could not draft domain. Please retry.",
-                "session_id": session_id,
-            },
-            state,
-            original_state,
-            session_id,
-            session_state,
-            using_adk_state,
-        )
+    input_hash = _input_hash(user_input)
+    cached = state.get("domain_draft")
+    if cached and domain_id and cached.get("domain_id") != domain_id:
+        cached = None
+    if cached and (confirmation_status or cached.get("input_hash") == input_hash):
+        # The user approved (or re-sent) this exact draft: save it as shown instead of drafting again.
+        draft = {k: cached[k] for k in ("domain_id", "name", "description", "keywords")}
+        logger.info("DRAFT_REUSED", domain_id=draft["domain_id"], confirmed=confirmation_status, session_id=session_id)
+    else:
+        # First phase: ask LLM to prettify the raw intent into a structured draft.
+        # This is the draft-generation hop: user text -> LLM prettify -> candidate domain_draft.
+        prettify_payload: Dict[str, Any] = {"raw_input_text": user_input}
+        if cached and operation_type == "UPDATE":
+            prettify_payload["previous_draft"] = {k: cached[k] for k in ("name", "description", "keywords")}
+        prettified = tool_prettify_domain_description(prettify_payload)
+        if prettified.get("status") != "SUCCESS":
+            logger.error(
+                "PRETTIFY_FAILED",
+                raw_input=user_input,
+                refine="previous_draft" in prettify_payload,
+                error_details=prettified.get("error_details") or prettified.get("error_detail"),
+                session_id=session_id,
+            )
+            return _finalize(
+                {
+                    "reasoning": "Prettify tool failed.",
+                    "status": "READ_ERROR",
+                    "message_to_user": "Could not draft domain. Please retry.",
+                    "session_id": session_id,
+                },
+                state,
+                original_state,
+                session_id,
+                session_state,
+                using_adk_state,
+            )
 
-    # Build draft object; reused across both review and save paths.
-    draft = {
-        "domain_id": domain_id or _generate_id(),
-        "name": prettified["data"]["name"],
-        "description": prettified["data"]["description"],
-        "keywords": prettified["data"]["keywords"],
-    }
+        # Build draft object; reused across both review and save paths.
+        draft = {
+            "domain_id": domain_id or (cached or {}).get("domain_id") or _generate_id(),
+            "name": prettified["data"]["name"],
+            "description": prettified["data"]["description"],
+            "keywords": prettified["data"]["keywords"],
+        }
+        if "previous_draft" in prettify_payload:
+            logger.info("DRAFT_REFINED", domain_id=draft["domain_id"], session_id=session_id)
 
     # If user has not confirmed yet, surface the draft for review and stop.
     # Control waits for explicit user confirmation; no persistence occurs in this branch.
     # Confirmation is driven by the caller (agent_root or CLI) setting confirmation_status=True
     # after the user replies with “confirm” (or equivalent) to the presented draft.
     if not confirmation_status:
-        state.update({"domain_id": draft["domain_id"], "intent": "DOMAIN_LIFECYCLE"})
+        state.update({"domain_id": draft["domain_id"], "intent": "DOMAIN_LIFECYCLE", "domain_draft": {**draft, "input_hash": input_hash}})
         return _finalize(
             {
                 "reasoning": "Draft prepared; awaiting user confirmation.",
@@ -159,6 +186,7 @@ def run_subagent_domain_lifecycle(
     # Clear intent after confirmation
     state.pop("intent", None)
     state.pop("domain_id", None)
+    state.pop("domain_draft", None)
     return _finalize(
         {
         "reasoning": "User confirmed draft; saved." if run_real_save else "User confirmed draft; mock save performed.",
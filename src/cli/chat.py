@@ -8,7 +8,7 @@ CLI chat harness:
 Public API:
 - main(): REPL loop.
 
-Usage: `./adk chat`. Honors environment flags (RUN_REAL_AI/RUN_REAL_MEMORY/RUN_REAL_DOMAINS, logging). Stores session_id across turns via ADK InMemorySessionService. Experimental: minimal UX, intended for dev/demo. See README for flags and docs/project_overview.md for flow.
+Usage: `./adk chat`. Honors environment flags (RUN_REAL_AI/RUN_REAL_MEMORY/RUN_REAL_DOMAINS, logging). Stores session_id across turns via the configured ADK session service (persistent SQLite by default). Experimental: minimal UX, intended for dev/demo. See README for flags and docs/project_overview.md for flow.
 """
 
 import sys
@@ -0,0 +1 @@
+# Background jobs package. Contains queue (SQLite job table with leases), worker (process pool) and ingest (document discovery jobs).
@@ -0,0 +1,84 @@
+from __future__ import annotations
+
+"""
+Document discovery as a background job:
+- The chat turn enqueues discovery (URL fetch, relevance, extraction) and answers at once with the job id.
+- A worker runs run_subagent_document_processor for the job; candidates are stored server-side as in the inline flow, so save-by-id works once the job is done.
+
+Public API:
+- DOCUMENT_DISCOVERY: job kind.
+- submit_document_discovery(session_id, user_id, raw_text, url=None, max_pending=None, max_pending_per_user=None) -> job_id (when jobs.autostart_workers, starts the host's worker pool here unless another process already runs it); the caps go to JobQueue.enqueue, which raises QueueFull.
+- run_document_discovery(payload) -> processor response without state_delta (the worker handler); raises Overloaded when admission sheds the run, so the worker defers it without using an attempt.
+- describe_job(job_id, user_id) -> {"job_id", "status", "attempts", "result", "error"} or None for unknown/foreign jobs.
+- job_message(job) -> user-facing text for a described job (progress, failure, or its candidate facts).
+
+Usage: Used by kb_adk.agent.KbDocumentAgent when jobs.mode is queue (a streaming turn also polls describe_job and relays the job's progress), and by agent_root to surface results on a later turn.
+"""
+
+from typing import Any, Dict, Optional
+
+from src.jobs.queue import get_job_queue
+from src.utils.admission import Overloaded, Rejection
+from src.utils.config_loader import load_jobs_config
+from src.utils.logger import get_logger
+
+DOCUMENT_DISCOVERY = "document_discovery"
+logger = get_logger("jobs_ingest")
+
+
+def submit_document_discovery(
+    session_id: Optional[str],
+    user_id: str,
+    raw_text: str,
+    url: Optional[str] = None,
+    max_pending: Optional[int] = None,
+    max_pending_per_user: Optional[int] = None,
+) -> str:
+    payload = {"session_id": session_id, "user_id": user_id, "raw_text": raw_text, "url": url}
+    job_id = get_job_queue().enqueue(
+        DOCUMENT_DISCOVERY, payload, session_id=session_id, max_pending=max_pending, max_pending_per_user=max_pending_per_user
+    )
+    if load_jobs_config()["autostart_workers"]:
+        from src.jobs.worker import ensure_worker_pool
+
+        ensure_worker_pool()
+    logger.info("JOB_ENQUEUED", job_id=job_id, kind=DOCUMENT_DISCOVERY, url=url, session_id=session_id)
+    return job_id
+
+
+def run_document_discovery(payload: Dict[str, Any]) -> Dict[str, Any]:
+    from src.agents.subagent_document_processor import run_subagent_document_processor
+
+    state = {"user_id": payload["user_id"]}
+    if payload.get("url"):
+        state["url"] = payload["url"]
+    response = run_subagent_document_processor(
+        {"session_id": payload.get("session_id"), "raw_text": payload.get("raw_text") or ""},
+        session_id=payload.get("session_id"),
+        session_state=state,
+    )
+    response.pop("state_delta", None)
+    if response.get("status") == "OVERLOADED":
+        # Shed work is deferred by the worker (retry hint, no attempt used) instead of finishing as a result.
+        raise Overloaded(Rejection(reason=response["error_detail"], message=response["message_to_user"], retry_after_seconds=response["retry_after_seconds"]))
+    return response
+
+
+def describe_job(job_id: str, user_id: str) -> Optional[Dict[str, Any]]:
+    job = get_job_queue().get(job_id)
+    if job is None or job.payload.get("user_id") != user_id:
+        return None
+    return {"job_id": job.job_id, "status": job.status, "attempts": job.attempts, "result": job.result, "error": job.error}
+
+
+def job_message(job: Dict[str, Any]) -> str:
+    if job["status"] in {"queued", "running"}:
+        return f"Still processing your document (job {job['job_id']}, attempt {max(job['attempts'], 1)})."
+    if job["status"] == "failed":
+        return f"Processing failed for job {job['job_id']}: {job['error']}"
+    result = job["result"] or {}
+    facts = result.get("candidate_facts") or []
+    if not facts:
+        return f"Job {job['job_id']} finished: {result.get('reasoning', 'no facts found.')}"
+    lines = "\n".join(f"- [{f['fact_id']}] {f['content']}" for f in facts)
+    return f"Job {job['job_id']} found {len(facts)} candidate facts:\n{lines}"
@@ -0,0 +1,284 @@
+from __future__ import annotations
+
+"""
+Crash-safe local job queue on SQLite:
+- Jobs are rows; claiming one takes a time-bounded lease (`jobs.lease_seconds`) that the worker extends by heartbeating.
+- A job whose worker died (lease expired) is claimed again by the next worker; every claim counts as an attempt.
+- Failures retry with exponential backoff (`jobs.retry_backoff_seconds` * 2^(attempt-1)) until `jobs.max_attempts`, then the job is failed.
+- A shed run (admission said OVERLOADED) is deferred instead of failed: requeued after the retry hint without using up an attempt.
+- enqueue can cap queued+running jobs (overall and per payload user_id); the count and the insert share one BEGIN IMMEDIATE transaction, so racing producers, in any process on the host, cannot overshoot a cap.
+- complete/fail/defer/heartbeat only succeed for the current lease holder, so a worker that lost its lease cannot overwrite the new attempt.
+- One worker pool per host: the process running it holds the pool lease row (renewed like a job lease), so processes that autostart workers elect a single pool.
+
+Public API:
+- Job: job_id, kind, payload, status (queued|running|done|failed), attempts, max_attempts, result, error, session_id, created_at, updated_at.
+- QueueFull(scope): raised by enqueue when a cap is reached; scope is "global" or "user".
+- JobQueue(db_path=None, lease_seconds=None, max_attempts=None, retry_backoff_seconds=None): enqueue(kind, payload, session_id=None, max_attempts=None, max_pending=None, max_pending_per_user=None) -> job_id; claim(worker_id, kinds=None) -> Job|None; heartbeat(job_id, worker_id) -> bool; complete(job_id, worker_id, result) -> bool; fail(job_id, worker_id, error) -> resulting status; defer(job_id, worker_id, delay_seconds, reason) -> bool; get(job_id); pending_count(user_id=None) -> queued+running jobs (for one payload user_id); purge_finished(older_than_seconds) -> removed; stats(); claim_pool(owner) -> bool (take or renew the host's pool lease); release_pool(owner).
+- get_job_queue(): process-wide queue on jobs.sqlite_path.
+
+Usage: Producers enqueue and return the job id; src/jobs/worker.py runs the handlers. The file is shared by every process on the host (WAL); claims run under BEGIN IMMEDIATE so two workers never take the same job.
+"""
+
+import json
+import sqlite3
+import threading
+import time
+import uuid
+from pathlib import Path
+from typing import Any, Dict, Iterable, Optional
+
+from pydantic import BaseModel
+
+from src.utils.config_loader import load_jobs_config
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    job_id TEXT PRIMARY KEY,
+    kind TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    session_id TEXT,
+    status TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    max_attempts INTEGER NOT NULL,
+    available_at REAL NOT NULL,
+    lease_owner TEXT,
+    lease_expires REAL,
+    result TEXT,
+    error TEXT,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS worker_pool (
+    pool TEXT PRIMARY KEY,
+    owner TEXT NOT NULL,
+    expires_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_jobs_ready ON jobs(status, available_at);
+CREATE INDEX IF NOT EXISTS idx_jobs_lease ON jobs(status, lease_expires);
+"""
+STATUSES = ("queued", "running", "done", "failed")
+
+_queue: Optional["JobQueue"] = None
+_queue_lock = threading.Lock()
+
+
+class QueueFull(Exception):
+    def __init__(self, scope: str) -> None:
+        super().__init__(f"job queue full ({scope})")
+        self.scope = scope
+
+
+class Job(BaseModel):
+    job_id: str
+    kind: str
+    payload: Dict[str, Any]
+    status: str
+    attempts: int
+    max_attempts: int
+    result: Optional[Dict[str, Any]] = None
+    error: Optional[str] = None
+    session_id: Optional[str] = None
+    created_at: float
+    updated_at: float
+
+
+def _job(row: sqlite3.Row) -> Job:
+    return Job(
+        job_id=row["job_id"],
+        kind=row["kind"],
+        payload=json.loads(row["payload"]),
+        status=row["status"],
+        attempts=row["attempts"],
+        max_attempts=row["max_attempts"],
+        result=json.loads(row["result"]) if row["result"] else None,
+        error=row["error"],
+        session_id=row["session_id"],
+        created_at=row["created_at"],
+        updated_at=row["updated_at"],
+    )
+
+
+class JobQueue:
+    def __init__(
+        self,
+        db_path: Optional[str] = None,
+        lease_seconds: Optional[float] = None,
+        max_attempts: Optional[int] = None,
+        retry_backoff_seconds: Optional[float] = None,
+    ) -> None:
+        cfg = load_jobs_config()
+        self.path = db_path or cfg["sqlite_path"]
+        Path(self.path).parent.mkdir(parents=True, exist_ok=True)
+        self.lease_seconds = float(lease_seconds or cfg["lease_seconds"])
+        self.max_attempts = int(max_attempts or cfg["max_attempts"])
+        self.retry_backoff_seconds = float(cfg["retry_backoff_seconds"] if retry_backoff_seconds is None else retry_backoff_seconds)
+        self._local = threading.local()
+        self._conn().executescript(SCHEMA)
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA busy_timeout=30000")
+            self._local.conn = conn
+        return conn
+
+    def _transaction(self, fn: Any) -> Any:
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            result = fn(conn)
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return result
+
+    def enqueue(
+        self,
+        kind: str,
+        payload: Dict[str, Any],
+        session_id: Optional[str] = None,
+        max_attempts: Optional[int] = None,
+        max_pending: Optional[int] = None,
+        max_pending_per_user: Optional[int] = None,
+    ) -> str:
+        """Raises QueueFull instead of inserting when max_pending, or max_pending_per_user for payload["user_id"], is reached."""
+        job_id = f"job_{uuid.uuid4().hex}"
+
+        def insert(conn: sqlite3.Connection) -> str:
+            if max_pending is not None and self._pending(conn) >= max_pending:
+                raise QueueFull("global")
+            if max_pending_per_user is not None and self._pending(conn, payload.get("user_id")) >= max_pending_per_user:
+                raise QueueFull("user")
+            now = time.time()
+            conn.execute(
+                "INSERT INTO jobs (job_id, kind, payload, session_id, status, max_attempts, available_at, created_at, updated_at) "
+                "VALUES (?, ?, ?, ?, 'queued', ?, ?, ?, ?)",
+                [job_id, kind, json.dumps(payload), session_id, int(max_attempts or self.max_attempts), now, now, now],
+            )
+            return job_id
+
+        return self._transaction(insert)
+
+    def claim(self, worker_id: str, kinds: Optional[Iterable[str]] = None) -> Optional[Job]:
+        kind_list = list(kinds or [])
+        kind_clause = f" AND kind IN ({', '.join('?' for _ in kind_list)})" if kind_list else ""
+
+        def take(conn: sqlite3.Connection) -> Optional[Job]:
+            now = time.time()
+            # Expired leases mean the worker died mid-job; out of attempts, the job is poison and fails here.
+            conn.execute(
+                "UPDATE jobs SET status = 'failed', error = 'lease expired on final attempt', lease_owner = NULL, updated_at = ? "
+                "WHERE status = 'running' AND lease_expires < ? AND attempts >= max_attempts",
+                [now, now],
+            )
+            row = conn.execute(
+                "SELECT job_id FROM jobs WHERE ((status = 'queued' AND available_at <= ?) OR (status = 'running' AND lease_expires < ?))"
+                f"{kind_clause} ORDER BY available_at LIMIT 1",
+                [now, now, *kind_list],
+            ).fetchone()
+            if row is None:
+                return None
+            conn.execute(
+                "UPDATE jobs SET status = 'running', attempts = attempts + 1, lease_owner = ?, lease_expires = ?, updated_at = ? WHERE job_id = ?",
+                [worker_id, now + self.lease_seconds, now, row["job_id"]],
+            )
+            return _job(conn.execute("SELECT * FROM jobs WHERE job_id = ?", [row["job_id"]]).fetchone())
+
+        return self._transaction(take)
+
+    def heartbeat(self, job_id: str, worker_id: str) -> bool:
+        now = time.time()
+        cur = self._conn().execute(
+            "UPDATE jobs SET lease_expires = ?, updated_at = ? WHERE job_id = ? AND status = 'running' AND lease_owner = ?",
+            [now + self.lease_seconds, now, job_id, worker_id],
+        )
+        return cur.rowcount == 1
+
+    def complete(self, job_id: str, worker_id: str, result: Dict[str, Any]) -> bool:
+        cur = self._conn().execute(
+            "UPDATE jobs SET status = 'done', result = ?, error = NULL, lease_owner = NULL, lease_expires = NULL, updated_at = ? "
+            "WHERE job_id = ? AND status = 'running' AND lease_owner = ?",
+            [json.dumps(result, default=str), time.time(), job_id, worker_id],
+        )
+        return cur.rowcount == 1
+
+    def fail(self, job_id: str, worker_id: str, error: str) -> str:
+        """Record a failed attempt; returns 'queued' (retry scheduled), 'failed' (out of attempts) or '' (lease lost)."""
+
+        def record(conn: sqlite3.Connection) -> str:
+            row = conn.execute(
+                "SELECT attempts, max_attempts FROM jobs WHERE job_id = ? AND status = 'running' AND lease_owner = ?", [job_id, worker_id]
+            ).fetchone()
+            if row is None:
+                return ""
+            now = time.time()
+            status = "queued" if row["attempts"] < row["max_attempts"] else "failed"
+            delay = self.retry_backoff_seconds * (2 ** (row["attempts"] - 1))
+            conn.execute(
+                "UPDATE jobs SET status = ?, error = ?, available_at = ?, lease_owner = NULL, lease_expires = NULL, updated_at = ? WHERE job_id = ?",
+                [status, error, now + delay, now, job_id],
+            )
+            return status
+
+        return self._transaction(record)
+
+    def defer(self, job_id: str, worker_id: str, delay_seconds: float, reason: str) -> bool:
+        """Requeue a claimed job after delay_seconds; the claim is handed back, so it does not count as an attempt."""
+        now = time.time()
+        cur = self._conn().execute(
+            "UPDATE jobs SET status = 'queued', attempts = MAX(attempts - 1, 0), error = ?, available_at = ?, lease_owner = NULL, lease_expires = NULL, "
+            "updated_at = ? WHERE job_id = ? AND status = 'running' AND lease_owner = ?",
+            [reason, now + max(delay_seconds, 0.0), now, job_id, worker_id],
+        )
+        return cur.rowcount == 1
+
+    def get(self, job_id: str) -> Optional[Job]:
+        row = self._conn().execute("SELECT * FROM jobs WHERE job_id = ?", [job_id]).fetchone()
+        return _job(row) if row else None
+
+    @staticmethod
+    def _pending(conn: sqlite3.Connection, user_id: Optional[str] = None) -> int:
+        sql = "SELECT COUNT(*) FROM jobs WHERE status IN ('queued', 'running')"
+        if user_id is None:
+            return conn.execute(sql).fetchone()[0]
+        return conn.execute(sql + " AND json_extract(payload, '$.user_id') = ?", [user_id]).fetchone()[0]
+
+    def pending_count(self, user_id: Optional[str] = None) -> int:
+        return self._pending(self._conn(), user_id)
+
+    def purge_finished(self, older_than_seconds: float) -> int:
+        cur = self._conn().execute(
+            "DELETE FROM jobs WHERE status IN ('done', 'failed') AND updated_at < ?", [time.time() - older_than_seconds]
+        )
+        return cur.rowcount
+
+    def claim_pool(self, owner: str) -> bool:
+        """Take or renew the host's worker pool lease for owner; False while another owner holds an unexpired one."""
+        now = time.time()
+        cur = self._conn().execute(
+            "INSERT INTO worker_pool VALUES ('default', ?, ?) "
+            "ON CONFLICT (pool) DO UPDATE SET owner = excluded.owner, expires_at = excluded.expires_at "
+            "WHERE worker_pool.owner = excluded.owner OR worker_pool.expires_at <= ?",
+            [owner, now + self.lease_seconds, now],
+        )
+        return cur.rowcount == 1
+
+    def release_pool(self, owner: str) -> None:
+        self._conn().execute("DELETE FROM worker_pool WHERE owner = ?", [owner])
+
+    def stats(self) -> Dict[str, int]:
+        counts = dict(self._conn().execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall())
+        return {status: counts.get(status, 0) for status in STATUSES}
+
+
+def get_job_queue() -> JobQueue:
+    global _queue
+    with _queue_lock:
+        if _queue is None:
+            _queue = JobQueue()
+        return _queue
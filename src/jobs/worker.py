@@ -0,0 +1,192 @@
+from __future__ import annotations
+
+"""
+Job worker pool:
+- Each worker process claims jobs from the SQLite queue, heartbeats its lease from a side thread while the handler runs, and records the result or the failure (retried with backoff by the queue).
+- A killed worker just stops heartbeating; its job is reclaimed by another worker once the lease expires.
+- One pool per host: starting a pool takes the queue's pool lease (renewed by a side thread), so with autostart only the first enqueuing process (API worker, agent) spawns workers, and another takes over if that process dies.
+
+Public API:
+- JobWorker(queue=None, worker_id=None, handlers=None, poll_interval=None): run_once() -> bool (False when idle); run_forever(stop_event).
+- start_worker_pool(workers=None) -> (processes, stop_event): spawn jobs.workers worker processes.
+- ensure_worker_pool() -> bool: start the host's pool from this process unless another process holds the pool lease; True when this process runs it (used when jobs.autostart_workers is set).
+- main(): `python -m src.jobs.worker [--workers N]` / `./adk worker`; exits with 1 when another process already runs the host's pool, stops on SIGINT/SIGTERM.
+
+Usage: Handlers map job kind -> callable(payload) -> JSON-serialisable dict and run in the scheduler's bulk class; exceptions count as failed attempts, except Overloaded, which defers the job by its retry hint without using an attempt. Worker processes use the spawn start method so they never inherit the parent's threads, SQLite connections or gRPC channels.
+"""
+
+import argparse
+import multiprocessing
+import os
+import signal
+import socket
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from src.jobs.queue import JobQueue, get_job_queue
+from src.utils.admission import Overloaded
+from src.utils.config_loader import load_jobs_config
+from src.utils.logger import get_logger
+from src.utils.scheduler import scheduling
+
+Handler = Callable[[Dict[str, Any]], Dict[str, Any]]
+PURGE_INTERVAL_SECONDS = 600
+logger = get_logger("job_worker")
+_pool: Optional[Tuple[List[Any], Any]] = None
+_pool_lock = threading.Lock()
+_pool_owner = f"{socket.gethostname()}-{os.getpid()}"
+_next_pool_check = 0.0
+
+
+def default_handlers() -> Dict[str, Handler]:
+    from src.jobs.ingest import DOCUMENT_DISCOVERY, run_document_discovery
+
+    return {DOCUMENT_DISCOVERY: run_document_discovery}
+
+
+class JobWorker:
+    def __init__(
+        self,
+        queue: Optional[JobQueue] = None,
+        worker_id: Optional[str] = None,
+        handlers: Optional[Dict[str, Handler]] = None,
+        poll_interval: Optional[float] = None,
+    ) -> None:
+        cfg = load_jobs_config()
+        self.queue = queue or get_job_queue()
+        self.worker_id = worker_id or f"{socket.gethostname()}-{os.getpid()}-{threading.get_ident()}"
+        self.handlers = handlers if handlers is not None else default_handlers()
+        self.poll_interval = float(poll_interval or cfg["poll_interval_seconds"])
+        self.result_ttl_seconds = float(cfg["result_ttl_seconds"])
+        self._next_purge = 0.0
+
+    def _heartbeat(self, job_id: str, done: threading.Event) -> None:
+        while not done.wait(self.queue.lease_seconds / 3):
+            if not self.queue.heartbeat(job_id, self.worker_id):
+                logger.error("JOB_LEASE_LOST", job_id=job_id, worker_id=self.worker_id)
+                return
+
+    def run_once(self) -> bool:
+        job = self.queue.claim(self.worker_id, kinds=self.handlers.keys())
+        if job is None:
+            return False
+        logger.info("JOB_CLAIMED", job_id=job.job_id, kind=job.kind, attempt=job.attempts, worker_id=self.worker_id, session_id=job.session_id)
+        done = threading.Event()
+        beat = threading.Thread(target=self._heartbeat, args=(job.job_id, done), daemon=True)
+        beat.start()
+        started = time.monotonic()
+        try:
+            # Background work yields Gemini/storage capacity to interactive turns (src/utils/scheduler.py).
+            with scheduling("bulk", user_id=job.payload.get("user_id")):
+                result = self.handlers[job.kind](job.payload)
+        except Overloaded as exc:
+            # Shedding is not the job's fault: try again after the retry hint without spending an attempt.
+            deferred = self.queue.defer(job.job_id, self.worker_id, exc.rejection.retry_after_seconds, str(exc))
+            logger.info(
+                "JOB_DEFERRED",
+                job_id=job.job_id,
+                kind=job.kind,
+                reason=exc.rejection.reason,
+                retry_after_seconds=exc.rejection.retry_after_seconds,
+                deferred=deferred,
+                session_id=job.session_id,
+            )
+        except Exception as exc:  # noqa: BLE001
+            status = self.queue.fail(job.job_id, self.worker_id, f"{type(exc).__name__}: {exc}")
+            logger.error("JOB_FAILED", job_id=job.job_id, kind=job.kind, attempt=job.attempts, next_status=status, error=str(exc), session_id=job.session_id)
+        else:
+            stored = self.queue.complete(job.job_id, self.worker_id, result)
+            logger.info(
+                "JOB_DONE",
+                job_id=job.job_id,
+                kind=job.kind,
+                stored=stored,
+                elapsed_ms=int((time.monotonic() - started) * 1000),
+                session_id=job.session_id,
+            )
+        finally:
+            done.set()
+            beat.join()
+        return True
+
+    def run_forever(self, stop_event: Any) -> None:
+        while not stop_event.is_set():
+            if self.run_once():
+                continue
+            if time.monotonic() >= self._next_purge:
+                self._next_purge = time.monotonic() + PURGE_INTERVAL_SECONDS
+                self.queue.purge_finished(self.result_ttl_seconds)
+            stop_event.wait(self.poll_interval)
+
+
+def _worker_main(index: int, stop_event: Any) -> None:
+    # Ctrl-C goes to the whole process group; let the parent decide when workers stop.
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    JobWorker(worker_id=f"{socket.gethostname()}-{os.getpid()}-w{index}").run_forever(stop_event)
+
+
+def start_worker_pool(workers: Optional[int] = None) -> Tuple[List[Any], Any]:
+    ctx = multiprocessing.get_context("spawn")
+    stop_event = ctx.Event()
+    processes = []
+    for index in range(int(workers or load_jobs_config()["workers"])):
+        process = ctx.Process(target=_worker_main, args=(index, stop_event), name=f"job-worker-{index}", daemon=True)
+        process.start()
+        processes.append(process)
+    logger.info("JOB_POOL_STARTED", workers=len(processes), pids=[p.pid for p in processes])
+    return processes, stop_event
+
+
+def _hold_pool(queue: JobQueue, processes: List[Any], stop_event: Any) -> None:
+    """Renew the pool lease while the workers live; a pool that lost its lease to another process stops."""
+    while not stop_event.wait(queue.lease_seconds / 3) and any(p.is_alive() for p in processes):
+        if not queue.claim_pool(_pool_owner):
+            logger.error("JOB_POOL_LEASE_LOST", owner=_pool_owner)
+            stop_event.set()
+            return
+    queue.release_pool(_pool_owner)
+
+
+def ensure_worker_pool() -> bool:
+    global _pool, _next_pool_check
+    with _pool_lock:
+        if _pool is not None and any(p.is_alive() for p in _pool[0]):
+            return True
+        # Another process's pool is only re-checked once per lease renewal period, not on every enqueue.
+        if time.monotonic() < _next_pool_check:
+            return False
+        queue = get_job_queue()
+        if not queue.claim_pool(_pool_owner):
+            _next_pool_check = time.monotonic() + queue.lease_seconds / 3
+            return False
+        _pool = start_worker_pool()
+        threading.Thread(target=_hold_pool, args=(queue, *_pool), name="job-pool-lease", daemon=True).start()
+        return True
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Run background job workers.")
+    parser.add_argument("--workers", type=int, default=None, help="worker processes (default: jobs.workers)")
+    args = parser.parse_args(argv)
+    queue = get_job_queue()
+    if not queue.claim_pool(_pool_owner):
+        logger.error("JOB_POOL_ALREADY_RUNNING", owner=_pool_owner)
+        return 1
+    processes, stop_event = start_worker_pool(args.workers)
+    threading.Thread(target=_hold_pool, args=(queue, processes, stop_event), name="job-pool-lease", daemon=True).start()
+
+    def shutdown(signum: int, _frame: Any) -> None:
+        logger.info("JOB_POOL_STOPPING", signal=signum)
+        stop_event.set()
+
+    signal.signal(signal.SIGINT, shutdown)
+    signal.signal(signal.SIGTERM, shutdown)
+    for process in processes:
+        process.join()
+    queue.release_pool(_pool_owner)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -1,5 +1,5 @@
 """
-Session utilities wrapping ADK InMemorySessionService for this project.
+Session utilities wrapping an ADK session service (persistent SQLite by default, in-memory optional) for this project.
 
 Exposes a singleton session service and helpers to create/lookup sessions and
 read/write session.state fields.
@@ -0,0 +1,163 @@
+from __future__ import annotations
+
+"""
+Server-side store for candidate facts between the document processor's discovery and save turns:
+- Discovery adds the session's candidates here (several URLs may be discovered concurrently for one session, via jobs or the bulk API); save mode only needs `selected_fact_ids`.
+- Entries expire `session.candidate_ttl_seconds` after the session's latest discovery and are scoped by (session_id, user_id).
+- Only what save needs is kept per fact: domain_id, content, source_url.
+
+Public API:
+- CandidateStore: put(session_id, user_id, facts) -> stored count; get(session_id, user_id, fact_ids) -> facts in fact_ids order (expired/unknown ids omitted); discard(session_id, fact_ids).
+- InMemoryCandidateStore(ttl_seconds=None, max_sessions=None), SqliteCandidateStore(db_path=None, ttl_seconds=None).
+- get_candidate_store(): process-wide store following session.backend (the SQLite store shares session.sqlite_path).
+
+Usage: Used by src/agents/subagent_document_processor.py. The SQLite store is shared by every worker on the host, like sessions; the in-memory store is bounded by session.max_cached_sessions and evicts least recently discovered sessions first.
+"""
+
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from src.session.eviction import SessionBudget
+from src.utils.config_loader import load_session_config
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS candidate_facts (
+    session_id TEXT NOT NULL,
+    fact_id TEXT NOT NULL,
+    user_id TEXT NOT NULL,
+    domain_id TEXT NOT NULL,
+    content TEXT NOT NULL,
+    source_url TEXT NOT NULL,
+    expires_at REAL NOT NULL,
+    PRIMARY KEY (session_id, fact_id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_candidate_facts_expires_at ON candidate_facts(expires_at);
+"""
+
+_store: Optional["CandidateStore"] = None
+_store_lock = threading.Lock()
+
+
+def _record(fact: Dict[str, Any]) -> Tuple[str, str, str]:
+    return fact["domain_id"], fact["content"], fact["source_url"]
+
+
+def _fact(fact_id: str, record: Tuple[str, str, str]) -> Dict[str, Any]:
+    domain_id, content, source_url = record
+    return {"fact_id": fact_id, "domain_id": domain_id, "content": content, "source_url": source_url}
+
+
+class CandidateStore:
+    def put(self, session_id: str, user_id: str, facts: List[Dict[str, Any]]) -> int:
+        raise NotImplementedError
+
+    def get(self, session_id: str, user_id: str, fact_ids: Iterable[str]) -> List[Dict[str, Any]]:
+        raise NotImplementedError
+
+    def discard(self, session_id: str, fact_ids: Iterable[str]) -> None:
+        raise NotImplementedError
+
+
+class InMemoryCandidateStore(CandidateStore):
+    def __init__(self, ttl_seconds: Optional[float] = None, max_sessions: Optional[int] = None) -> None:
+        cfg = load_session_config()
+        self._budget = SessionBudget(
+            idle_ttl_seconds=float(ttl_seconds or cfg["candidate_ttl_seconds"]),
+            max_sessions=int(max_sessions or cfg["max_cached_sessions"]),
+        )
+        self._sessions: Dict[str, Tuple[str, Dict[str, Tuple[str, str, str]]]] = {}
+        self._lock = threading.Lock()
+
+    def _drop(self, session_ids: List[Any]) -> None:
+        for session_id in session_ids:
+            self._sessions.pop(session_id, None)
+
+    def put(self, session_id: str, user_id: str, facts: List[Dict[str, Any]]) -> int:
+        records = {f["fact_id"]: _record(f) for f in facts}
+        with self._lock:
+            owner, existing = self._sessions.get(session_id, (user_id, {}))
+            self._sessions[session_id] = (user_id, {**existing, **records} if owner == user_id else records)
+            # Deadline counts from discovery only; reads do not extend it.
+            self._budget.discard(session_id)
+            self._drop(self._budget.touch(session_id))
+        return len(records)
+
+    def get(self, session_id: str, user_id: str, fact_ids: Iterable[str]) -> List[Dict[str, Any]]:
+        with self._lock:
+            self._drop(self._budget.expire())
+            owner, records = self._sessions.get(session_id, (None, {}))
+            if owner != user_id:
+                return []
+            return [_fact(fid, records[fid]) for fid in fact_ids if fid in records]
+
+    def discard(self, session_id: str, fact_ids: Iterable[str]) -> None:
+        with self._lock:
+            _, records = self._sessions.get(session_id, (None, {}))
+            for fid in fact_ids:
+                records.pop(fid, None)
+
+
+class SqliteCandidateStore(CandidateStore):
+    def __init__(self, db_path: Optional[str] = None, ttl_seconds: Optional[float] = None) -> None:
+        cfg = load_session_config()
+        self.path = db_path or cfg["sqlite_path"]
+        Path(self.path).parent.mkdir(parents=True, exist_ok=True)
+        self.ttl_seconds = float(ttl_seconds or cfg["candidate_ttl_seconds"])
+        self._local = threading.local()
+        self._conn().executescript(SCHEMA)
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def put(self, session_id: str, user_id: str, facts: List[Dict[str, Any]]) -> int:
+        now = time.time()
+        rows = [[session_id, f["fact_id"], user_id, *_record(f), now + self.ttl_seconds] for f in facts]
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            # Purging here keeps the table bounded without a separate sweeper; the expires_at index makes it a range delete.
+            conn.execute("DELETE FROM candidate_facts WHERE expires_at <= ?", [now])
+            conn.execute("UPDATE candidate_facts SET expires_at = ? WHERE session_id = ? AND user_id = ?", [now + self.ttl_seconds, session_id, user_id])
+            conn.execute("DELETE FROM candidate_facts WHERE session_id = ? AND user_id != ?", [session_id, user_id])
+            conn.executemany("INSERT OR REPLACE INTO candidate_facts VALUES (?, ?, ?, ?, ?, ?, ?)", rows)
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return len({row[1] for row in rows})
+
+    def get(self, session_id: str, user_id: str, fact_ids: Iterable[str]) -> List[Dict[str, Any]]:
+        wanted = list(dict.fromkeys(fact_ids))
+        if not wanted:
+            return []
+        placeholders = ", ".join("?" for _ in wanted)
+        rows = self._conn().execute(
+            "SELECT fact_id, domain_id, content, source_url FROM candidate_facts "
+            f"WHERE session_id = ? AND user_id = ? AND expires_at > ? AND fact_id IN ({placeholders})",
+            [session_id, user_id, time.time(), *wanted],
+        ).fetchall()
+        found = {row[0]: row[1:] for row in rows}
+        return [_fact(fid, found[fid]) for fid in wanted if fid in found]
+
+    def discard(self, session_id: str, fact_ids: Iterable[str]) -> None:
+        self._conn().executemany(
+            "DELETE FROM candidate_facts WHERE session_id = ? AND fact_id = ?", [[session_id, fid] for fid in fact_ids]
+        )
+
+
+def get_candidate_store() -> CandidateStore:
+    global _store
+    with _store_lock:
+        if _store is None:
+            cfg = load_session_config()
+            _store = SqliteCandidateStore() if cfg["backend"] == "sqlite" else InMemoryCandidateStore()
+        return _store
@@ -0,0 +1,67 @@
+from __future__ import annotations
+
+"""
+Session event-history compaction:
+- Session state is already materialised (SQLite `session_state` rows / the in-memory state dict), so old events carry no information the next turn needs; KbRootAgent and the sub-agents only read `ctx.session.state`.
+- Once a session holds more than `session.compact_max_events` events or `session.compact_max_bytes` of event JSON, everything but the last `session.compact_keep_recent` events is folded into one marker event.
+- The marker records how many events/bytes were folded and their time range, and absorbs any earlier marker, so a session carries at most one.
+
+Public API:
+- CompactionPolicy(max_events=None, max_bytes=None, keep_recent=None): should_compact(event_count, event_bytes); fold_count(event_count) -> leading events to fold.
+- compaction_marker(folded_count, folded_bytes, start_timestamp, end_timestamp, previous=None) -> Event.
+- is_compaction_marker(event) -> bool.
+
+Usage: Applied by SqliteSessionService and BoundedInMemorySessionService after each append_event; a 0 threshold disables that trigger.
+"""
+
+from typing import Any, Dict, Optional
+
+from google.adk.events import Event
+
+from src.utils.config_loader import load_session_config
+
+COMPACTION_AUTHOR = "session_compaction"
+
+
+class CompactionPolicy:
+    def __init__(self, max_events: Optional[int] = None, max_bytes: Optional[int] = None, keep_recent: Optional[int] = None) -> None:
+        cfg = load_session_config()
+        self.max_events = int(cfg["compact_max_events"] if max_events is None else max_events)
+        self.max_bytes = int(cfg["compact_max_bytes"] if max_bytes is None else max_bytes)
+        self.keep_recent = int(cfg["compact_keep_recent"] if keep_recent is None else keep_recent)
+
+    def should_compact(self, event_count: int, event_bytes: int) -> bool:
+        # Leave room for the marker itself so a compacted session does not re-trigger on the next append.
+        if event_count <= self.keep_recent + 1:
+            return False
+        return bool((self.max_events and event_count > self.max_events) or (self.max_bytes and event_bytes > self.max_bytes))
+
+    def fold_count(self, event_count: int) -> int:
+        return max(0, event_count - self.keep_recent)
+
+
+def is_compaction_marker(event: Event) -> bool:
+    return event.author == COMPACTION_AUTHOR
+
+
+def compaction_marker(
+    folded_count: int,
+    folded_bytes: int,
+    start_timestamp: float,
+    end_timestamp: float,
+    previous: Optional[Event] = None,
+) -> Event:
+    """Build the marker for `folded_count` events; when the oldest folded event was a marker, its totals carry over."""
+    meta: Dict[str, Any] = {
+        "compacted_events": folded_count,
+        "compacted_bytes": folded_bytes,
+        "start_timestamp": start_timestamp,
+        "end_timestamp": end_timestamp,
+    }
+    if previous is not None and is_compaction_marker(previous):
+        prior = previous.custom_metadata or {}
+        # The old marker is one of the folded events; count what it stood for instead.
+        meta["compacted_events"] += int(prior.get("compacted_events", 0)) - 1
+        meta["compacted_bytes"] += int(prior.get("compacted_bytes", 0))
+        meta["start_timestamp"] = float(prior.get("start_timestamp", start_timestamp))
+    return Event(invocation_id="", author=COMPACTION_AUTHOR, custom_metadata=meta, timestamp=end_timestamp)
@@ -0,0 +1,122 @@
+from __future__ import annotations
+
+"""
+Session residency budget:
+- Idle TTL via a min-heap of deadlines with lazy invalidation: touching a session pushes a new deadline and older heap entries for it are skipped when popped; the heap is rebuilt when stale entries dominate.
+- max_sessions / max_bytes caps enforced in least-recently-used order.
+- Per-session size accounting (caller-supplied byte estimates) and eviction counters.
+
+Public API:
+- SessionBudget(idle_ttl_seconds, max_sessions, max_bytes, clock=time.monotonic): touch(key, size_bytes=None) -> evicted keys; resize(key, size_bytes) -> evicted keys; discard(key); expire() -> expired keys; size_of(key); stats().
+- json_size(value): byte estimate of a JSON-serialisable value.
+
+Usage: The budget only decides *what* to evict; the owning store drops the returned keys (see SqliteSessionService's hot cache and BoundedInMemorySessionService). Not thread-safe; callers hold their own lock. A ttl/cap of 0 or None disables that limit.
+"""
+
+import heapq
+import json
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, List, Optional, Tuple
+
+
+def json_size(value: Any) -> int:
+    return len(json.dumps(value, default=str, separators=(",", ":")))
+
+
+class SessionBudget:
+    def __init__(
+        self,
+        idle_ttl_seconds: Optional[float] = None,
+        max_sessions: Optional[int] = None,
+        max_bytes: Optional[int] = None,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.idle_ttl_seconds = idle_ttl_seconds or None
+        self.max_sessions = max_sessions or None
+        self.max_bytes = max_bytes or None
+        self._clock = clock
+        self._sizes: "OrderedDict[Hashable, int]" = OrderedDict()  # LRU order, oldest first
+        self._deadlines: Dict[Hashable, float] = {}
+        self._heap: List[Tuple[float, int, Hashable]] = []
+        self._seq = 0
+        self.total_bytes = 0
+        self.counters = {"evicted_ttl": 0, "evicted_sessions_cap": 0, "evicted_bytes_cap": 0, "evicted_bytes": 0}
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._sizes
+
+    def __len__(self) -> int:
+        return len(self._sizes)
+
+    def size_of(self, key: Hashable) -> int:
+        return self._sizes.get(key, 0)
+
+    def touch(self, key: Hashable, size_bytes: Optional[int] = None) -> List[Hashable]:
+        """Record an access (and optionally a new size); returns keys evicted by TTL or caps, never `key` itself."""
+        evicted = self.expire()
+        if size_bytes is None:
+            size_bytes = self._sizes.get(key, 0)
+        self.total_bytes += size_bytes - self._sizes.get(key, 0)
+        self._sizes[key] = size_bytes
+        self._sizes.move_to_end(key)
+        if self.idle_ttl_seconds:
+            deadline = self._clock() + self.idle_ttl_seconds
+            self._deadlines[key] = deadline
+            self._seq += 1
+            heapq.heappush(self._heap, (deadline, self._seq, key))
+            if len(self._heap) > 2 * len(self._deadlines) + 64:
+                self._heap = [(d, i, k) for i, (k, d) in enumerate(self._deadlines.items())]
+                heapq.heapify(self._heap)
+        return evicted + self._enforce_caps(protect=key)
+
+    def resize(self, key: Hashable, size_bytes: int) -> List[Hashable]:
+        if key not in self._sizes:
+            return self.touch(key, size_bytes)
+        self.total_bytes += size_bytes - self._sizes[key]
+        self._sizes[key] = size_bytes
+        return self._enforce_caps(protect=key)
+
+    def discard(self, key: Hashable) -> None:
+        size = self._sizes.pop(key, None)
+        if size is not None:
+            self.total_bytes -= size
+        self._deadlines.pop(key, None)
+
+    def expire(self) -> List[Hashable]:
+        """Pop every session whose idle deadline has passed. O(log n) per expired or superseded heap entry."""
+        if not self.idle_ttl_seconds:
+            return []
+        now = self._clock()
+        expired: List[Hashable] = []
+        while self._heap and self._heap[0][0] <= now:
+            deadline, _, key = heapq.heappop(self._heap)
+            if self._deadlines.get(key) != deadline:
+                continue  # superseded by a later touch, or already discarded
+            self.counters["evicted_bytes"] += self._sizes.get(key, 0)
+            self.discard(key)
+            self.counters["evicted_ttl"] += 1
+            expired.append(key)
+        return expired
+
+    def _enforce_caps(self, protect: Hashable) -> List[Hashable]:
+        evicted: List[Hashable] = []
+        while self._over_cap():
+            victim = next((k for k in self._sizes if k != protect), None)
+            if victim is None:
+                break
+            reason = "evicted_sessions_cap" if self.max_sessions and len(self._sizes) > self.max_sessions else "evicted_bytes_cap"
+            self.counters[reason] += 1
+            self.counters["evicted_bytes"] += self._sizes[victim]
+            self.discard(victim)
+            evicted.append(victim)
+        return evicted
+
+    def _over_cap(self) -> bool:
+        return bool(
+            (self.max_sessions and len(self._sizes) > self.max_sessions)
+            or (self.max_bytes and self.total_bytes > self.max_bytes)
+        )
+
+    def stats(self) -> Dict[str, int]:
+        return {**self.counters, "sessions": len(self._sizes), "bytes": self.total_bytes}
@@ -0,0 +1,173 @@
+from __future__ import annotations
+
+"""
+In-memory ADK session service with a residency budget:
+- Same behaviour as ADK's InMemorySessionService, but sessions idle past the TTL, or beyond the session-count/byte caps (least recently used first), are deleted.
+- Per-session size is tracked incrementally from state values and appended events (src/session/eviction.py).
+- Long event histories are folded into one marker event plus a recent tail (src/session/compaction.py).
+
+Public API:
+- BoundedInMemorySessionService(idle_ttl_seconds=None, max_sessions=None, max_bytes=None): drop-in InMemorySessionService.
+- BoundedInMemorySessionService.update_state_sync(app_name, user_id, session_id, updates=None, clear_keys=None): in-place state change with size accounting (same signature as SqliteSessionService).
+- BoundedInMemorySessionService.budget_info(): eviction counters, live sessions and bytes.
+- BoundedInMemorySessionService.session_size(app_name, user_id, session_id): tracked byte estimate.
+
+Usage: Selected by `session.backend: memory` (src/session/session_manager.py); limits come from the `session:` config section. Evicted sessions are gone (there is no backing store): a later turn with that id starts a fresh session.
+"""
+
+import threading
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from google.adk.events import Event
+from google.adk.sessions import Session
+from google.adk.sessions.base_session_service import GetSessionConfig
+from google.adk.sessions.in_memory_session_service import InMemorySessionService
+from google.adk.sessions.state import State
+
+from src.session.compaction import CompactionPolicy, compaction_marker
+from src.session.eviction import SessionBudget, json_size
+from src.utils.config_loader import load_session_config
+
+SessionKey = Tuple[str, str, str]
+
+
+class BoundedInMemorySessionService(InMemorySessionService):
+    def __init__(
+        self,
+        idle_ttl_seconds: Optional[float] = None,
+        max_sessions: Optional[int] = None,
+        max_bytes: Optional[int] = None,
+    ) -> None:
+        super().__init__()
+        cfg = load_session_config()
+        self._budget = SessionBudget(
+            idle_ttl_seconds=float(cfg["idle_ttl_seconds"] if idle_ttl_seconds is None else idle_ttl_seconds),
+            max_sessions=int(max_sessions or cfg["max_cached_sessions"]),
+            max_bytes=int(cfg["max_cached_bytes"] if max_bytes is None else max_bytes),
+        )
+        self._state_sizes: Dict[SessionKey, Dict[str, int]] = {}
+        self._event_bytes: Dict[SessionKey, int] = {}
+        self._compaction = CompactionPolicy()
+        self._budget_lock = threading.RLock()
+
+    # -- accounting -----------------------------------------------------------
+
+    def _size(self, key: SessionKey) -> int:
+        return sum(self._state_sizes.get(key, {}).values()) + self._event_bytes.get(key, 0)
+
+    def _drop(self, keys: List[SessionKey]) -> None:
+        for app_name, user_id, session_id in keys:
+            self.sessions.get(app_name, {}).get(user_id, {}).pop(session_id, None)
+            self._state_sizes.pop((app_name, user_id, session_id), None)
+            self._event_bytes.pop((app_name, user_id, session_id), None)
+
+    def _expire(self) -> None:
+        with self._budget_lock:
+            self._drop(self._budget.expire())
+
+    def _track_created(self, session: Session) -> None:
+        key = (session.app_name, session.user_id, session.id)
+        with self._budget_lock:
+            self._state_sizes[key] = {k: len(k) + json_size(v) for k, v in (session.state or {}).items()}
+            self._event_bytes[key] = 0
+            self._drop(self._budget.touch(key, self._size(key)))
+
+    def _track_access(self, session: Optional[Session]) -> None:
+        if session is None:
+            return
+        key = (session.app_name, session.user_id, session.id)
+        with self._budget_lock:
+            if key in self._budget:
+                self._drop(self._budget.touch(key))
+
+    def budget_info(self) -> Dict[str, int]:
+        with self._budget_lock:
+            return self._budget.stats()
+
+    def session_size(self, app_name: str, user_id: str, session_id: str) -> int:
+        with self._budget_lock:
+            return self._budget.size_of((app_name, user_id, session_id))
+
+    # -- InMemorySessionService overrides ---------------------------------------
+
+    def create_session_sync(self, *, app_name: str, user_id: str, state: Optional[Dict[str, Any]] = None, session_id: Optional[str] = None) -> Session:
+        self._expire()
+        session = super().create_session_sync(app_name=app_name, user_id=user_id, state=state, session_id=session_id)
+        self._track_created(session)
+        return session
+
+    async def create_session(self, *, app_name: str, user_id: str, state: Optional[Dict[str, Any]] = None, session_id: Optional[str] = None) -> Session:
+        self._expire()
+        session = await super().create_session(app_name=app_name, user_id=user_id, state=state, session_id=session_id)
+        self._track_created(session)
+        return session
+
+    def get_session_sync(self, *, app_name: str, user_id: str, session_id: str, config: Optional[GetSessionConfig] = None) -> Optional[Session]:
+        self._expire()
+        session = super().get_session_sync(app_name=app_name, user_id=user_id, session_id=session_id, config=config)
+        self._track_access(session)
+        return session
+
+    async def get_session(self, *, app_name: str, user_id: str, session_id: str, config: Optional[GetSessionConfig] = None) -> Optional[Session]:
+        self._expire()
+        session = await super().get_session(app_name=app_name, user_id=user_id, session_id=session_id, config=config)
+        self._track_access(session)
+        return session
+
+    def delete_session_sync(self, *, app_name: str, user_id: str, session_id: str) -> None:
+        super().delete_session_sync(app_name=app_name, user_id=user_id, session_id=session_id)
+        with self._budget_lock:
+            self._budget.discard((app_name, user_id, session_id))
+            self._drop([(app_name, user_id, session_id)])
+
+    async def delete_session(self, *, app_name: str, user_id: str, session_id: str) -> None:
+        self.delete_session_sync(app_name=app_name, user_id=user_id, session_id=session_id)
+
+    def update_state_sync(
+        self,
+        app_name: str,
+        user_id: str,
+        session_id: str,
+        updates: Optional[Dict[str, Any]] = None,
+        clear_keys: Optional[Iterable[str]] = None,
+    ) -> None:
+        key = (app_name, user_id, session_id)
+        stored = self.sessions.get(app_name, {}).get(user_id, {}).get(session_id)
+        if stored is None:
+            raise ValueError(f"Session {session_id} not found")
+        changes = {k: v for k, v in (updates or {}).items() if not k.startswith(State.TEMP_PREFIX)}
+        with self._budget_lock:
+            sizes = self._state_sizes.setdefault(key, {})
+            stored.state.update(changes)
+            sizes.update({k: len(k) + json_size(v) for k, v in changes.items()})
+            for k in clear_keys or []:
+                stored.state.pop(k, None)
+                sizes.pop(k, None)
+            self._drop(self._budget.touch(key, self._size(key)))
+
+    async def append_event(self, session: Session, event: Event) -> Event:
+        event = await super().append_event(session, event)
+        if event.partial:
+            return event
+        key = (session.app_name, session.user_id, session.id)
+        delta = {k: v for k, v in ((event.actions.state_delta if event.actions else None) or {}).items() if not k.startswith(State.TEMP_PREFIX)}
+        with self._budget_lock:
+            if key not in self._budget:
+                return event
+            self._state_sizes.setdefault(key, {}).update({k: len(k) + json_size(v) for k, v in delta.items()})
+            self._event_bytes[key] = self._event_bytes.get(key, 0) + len(event.model_dump_json(exclude_none=True))
+            self._compact(key)
+            self._drop(self._budget.resize(key, self._size(key)))
+        return event
+
+    def _compact(self, key: SessionKey) -> None:
+        app_name, user_id, session_id = key
+        stored = self.sessions.get(app_name, {}).get(user_id, {}).get(session_id)
+        if stored is None or not self._compaction.should_compact(len(stored.events), self._event_bytes.get(key, 0)):
+            return
+        folded = stored.events[: self._compaction.fold_count(len(stored.events))]
+        folded_bytes = sum(len(e.model_dump_json(exclude_none=True)) for e in folded)
+        marker = compaction_marker(len(folded), folded_bytes, folded[0].timestamp, folded[-1].timestamp, previous=folded[0])
+        # Only the stored copy is compacted; last_update_time is unchanged, so sessions handed out earlier stay appendable.
+        stored.events = [marker] + stored.events[len(folded) :]
+        self._event_bytes[key] += len(marker.model_dump_json(exclude_none=True)) - folded_bytes
@@ -0,0 +1,141 @@
+from __future__ import annotations
+
+"""
+Per-session speculative prefetch for document discovery:
+- When agent_root sees URLs it starts their content fetches and the active-domain read in the background, concurrently, before the ADK transfer to the document processor; the processor then waits on these in-flight results instead of making serial I/O calls.
+- Handles are keyed by session and matched on user_id; a handle is taken once (the processor fills in any URL it lacks), and unclaimed handles expire after `prefetch.ttl_seconds`.
+- Background calls run in a copy of the starting context, so they keep the turn's scheduler class/user and deadline.
+
+Public API:
+- Prefetch: urls, user_id; content(url) -> (content, title), domains() -> fetch-domains response; both wait at most until the turn deadline (DeadlineExceeded after it) and re-raise the call's own error.
+- Prefetcher(config=None): start(session_id, user_id, urls, fetch_content, fetch_domains) -> Prefetch (replaces the session's previous handle; session_id None runs the reads without registering a handle); fill(handle, urls, fetch_content) starts fetches for URLs the handle lacks; take(session_id, user_id) -> Prefetch | None; discard(session_id); stats().
+- get_prefetcher(): process-wide prefetcher from `prefetch:` config.
+
+Usage: src/agents/subagent_document_processor.py owns the fetch functions (prefetch_discovery(session_id, user_id, urls)) and only prefetches for inline discovery in this process; in jobs.mode queue the worker fetches. Prefetched content is per process and never persisted.
+"""
+
+import contextvars
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FutureTimeout
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from src.utils.config_loader import load_prefetch_config
+from src.utils.deadline import DeadlineExceeded, remaining
+from src.utils.logger import get_logger
+
+logger = get_logger("prefetch")
+_prefetcher: Optional["Prefetcher"] = None
+_prefetcher_lock = threading.Lock()
+
+
+class Prefetch:
+    def __init__(self, user_id: str, contents: Dict[str, Future], domains: Future) -> None:
+        self.user_id = user_id
+        self.started = time.monotonic()
+        self._contents = contents
+        self._domains = domains
+
+    @property
+    def urls(self) -> List[str]:
+        return list(self._contents)
+
+    def _wait(self, future: Future, stage: str) -> Any:
+        try:
+            return future.result(timeout=remaining())
+        except FutureTimeout:
+            raise DeadlineExceeded(stage) from None
+
+    def content(self, url: str) -> Tuple[str, str]:
+        return self._wait(self._contents[url], "content fetch")
+
+    def domains(self) -> Dict[str, Any]:
+        return self._wait(self._domains, "domain fetch")
+
+    def cancel(self) -> None:
+        # Calls already running finish in the background; queued ones never start.
+        for future in self._contents.values():
+            future.cancel()
+        self._domains.cancel()
+
+
+class Prefetcher:
+    def __init__(self, config: Optional[Dict[str, Any]] = None) -> None:
+        self.cfg = config or load_prefetch_config()
+        self._executor = ThreadPoolExecutor(max_workers=int(self.cfg["max_workers"]), thread_name_prefix="prefetch")
+        self._lock = threading.Lock()
+        self._handles: "OrderedDict[str, Prefetch]" = OrderedDict()
+        self.counts: Dict[str, int] = {"started": 0, "hits": 0, "misses": 0, "expired": 0}
+
+    def _submit(self, fn: Callable[..., Any], *args: Any) -> Future:
+        # One context copy per call: a Context cannot be entered by two threads at once.
+        ctx = contextvars.copy_context()
+        return self._executor.submit(ctx.run, fn, *args)
+
+    def _expire(self, now: float) -> None:
+        ttl = float(self.cfg["ttl_seconds"])
+        while self._handles:
+            session_id, handle = next(iter(self._handles.items()))
+            if now - handle.started < ttl and len(self._handles) <= int(self.cfg["max_sessions"]):
+                return
+            del self._handles[session_id]
+            handle.cancel()
+            self.counts["expired"] += 1
+
+    def start(
+        self,
+        session_id: Optional[str],
+        user_id: str,
+        urls: List[str],
+        fetch_content: Callable[[str], Tuple[str, str]],
+        fetch_domains: Callable[[], Dict[str, Any]],
+    ) -> Prefetch:
+        # The domain read goes first: every URL's scoring needs it.
+        domains = self._submit(fetch_domains)
+        handle = Prefetch(user_id, {url: self._submit(fetch_content, url) for url in dict.fromkeys(urls)}, domains)
+        if session_id is None:
+            return handle
+        with self._lock:
+            previous = self._handles.pop(session_id, None)
+            if previous is not None:
+                previous.cancel()
+            self._handles[session_id] = handle
+            self.counts["started"] += 1
+            self._expire(time.monotonic())
+        logger.info("PREFETCH_STARTED", urls=len(handle.urls), session_id=session_id)
+        return handle
+
+    def fill(self, handle: Prefetch, urls: List[str], fetch_content: Callable[[str], Tuple[str, str]]) -> None:
+        for url in urls:
+            if url not in handle._contents:
+                handle._contents[url] = self._submit(fetch_content, url)
+
+    def take(self, session_id: str, user_id: str) -> Optional[Prefetch]:
+        with self._lock:
+            self._expire(time.monotonic())
+            handle = self._handles.get(session_id)
+            if handle is None or handle.user_id != user_id:
+                self.counts["misses"] += 1
+                return None
+            del self._handles[session_id]
+            self.counts["hits"] += 1
+            return handle
+
+    def discard(self, session_id: str) -> None:
+        with self._lock:
+            handle = self._handles.pop(session_id, None)
+        if handle is not None:
+            handle.cancel()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"pending": len(self._handles), **self.counts}
+
+
+def get_prefetcher() -> Prefetcher:
+    global _prefetcher
+    with _prefetcher_lock:
+        if _prefetcher is None:
+            _prefetcher = Prefetcher()
+        return _prefetcher
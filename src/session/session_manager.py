@@ -1,14 +1,21 @@
 """
-Session management helpers built on ADK InMemorySessionService.
+Session management helpers built on an ADK session service.
 
 Main helpers:
-- ensure_session(session_id=None): returns (session_id, session), creating one when missing.
+- get_session_service(): SqliteSessionService (session.backend: sqlite, default) or BoundedInMemorySessionService (memory).
+- ensure_session(session_id=None): returns (session_id, session), creating one when missing; safe when several workers race to create the same id.
 - get_state(session_id): returns current session.state dict.
 - update_state(session_id, updates=None, clear_keys=None): merges/removes keys in session.state.
+- acquire_session_lease(session_id, owner) -> bool / release_session_lease(session_id, owner): serialise work on one
+  session across workers (SQLite lease row, expiring after session.lease_seconds); always granted with the memory
+  backend, whose sessions live in one process.
 
 Notes:
 - Uses a single app_name and a fixed service-level user bucket ("anonymous") since user_id
   is tracked inside session.state per business requirements. Session IDs are server-generated.
+- With the SQLite backend, sessions persist across restarts and are shared by all workers on the host;
+  update_state writes only the changed keys (see src/session/sqlite_session_service.py).
+- Both backends bound memory by idle TTL and session/byte caps (`session:` config, src/session/eviction.py).
 """
 
 from __future__ import annotations
@@ -17,17 +24,26 @@ import os
 import uuid
 from typing import Any, Dict, Iterable, Optional
 
-from google.adk.sessions.in_memory_session_service import InMemorySessionService
+from google.adk.errors.already_exists_error import AlreadyExistsError
+from google.adk.sessions.base_session_service import BaseSessionService
+
+from src.session.memory_session_service import BoundedInMemorySessionService
+from src.session.sqlite_session_service import SqliteSessionService
+from src.utils.config_loader import load_session_config
 
 APP_NAME = os.getenv("ADK_APP_NAME", "kb_domains_agent")
 _SERVICE_USER_ID = "anonymous"
-_session_service: Optional[InMemorySessionService] = None
+_session_service: Optional[BaseSessionService] = None
 
 
-def get_session_service() -> InMemorySessionService:
+def get_session_service() -> BaseSessionService:
     global _session_service
     if _session_service is None:
-        _session_service = InMemorySessionService()
+        cfg = load_session_config()
+        if cfg["backend"] == "sqlite":
+            _session_service = SqliteSessionService(cfg["sqlite_path"], int(cfg["max_cached_sessions"]))
+        else:
+            _session_service = BoundedInMemorySessionService()
     return _session_service
 
 
@@ -40,26 +56,21 @@ def ensure_session(session_id: Optional[str] = None) -> tuple[str, Any]:
     target_session_id = session_id or str(uuid.uuid4())
     session = service.get_session_sync(app_name=APP_NAME, user_id=_SERVICE_USER_ID, session_id=target_session_id)
     if session is None:
-        session = service.create_session_sync(
-            app_name=APP_NAME,
-            user_id=_SERVICE_USER_ID,
-            session_id=target_session_id,
-            state={},
-        )
+        try:
+            session = service.create_session_sync(
+                app_name=APP_NAME,
+                user_id=_SERVICE_USER_ID,
+                session_id=target_session_id,
+                state={},
+            )
+        except AlreadyExistsError:
+            # Another worker created it between our read and insert; use theirs.
+            session = service.get_session_sync(app_name=APP_NAME, user_id=_SERVICE_USER_ID, session_id=target_session_id)
+            if session is None:
+                raise
     return session.id, session
 
 
-def _get_storage_state(session_id: str) -> Dict[str, Any]:
-    service = get_session_service()
-    ensure_session(session_id)
-    storage = service.sessions.setdefault(APP_NAME, {}).setdefault(_SERVICE_USER_ID, {})
-    if session_id not in storage:
-        storage[session_id] = service.create_session_sync(
-            app_name=APP_NAME, user_id=_SERVICE_USER_ID, session_id=session_id, state={}
-        )
-    return storage[session_id].state
-
-
 def get_state(session_id: str) -> Dict[str, Any]:
     """
     Returns a shallow copy of session.state; always non-None.
@@ -75,9 +86,27 @@ def update_state(session_id: str, updates: Optional[Dict[str, Any]] = None, clea
     """
     Merge updates into session.state and/or remove listed keys.
     """
-    state = _get_storage_state(session_id)
-    if updates:
-        state.update({k: v for k, v in updates.items() if v is not None})
-    if clear_keys:
-        for key in clear_keys:
-            state.pop(key, None)
+    ensure_session(session_id)
+    get_session_service().update_state_sync(
+        APP_NAME,
+        _SERVICE_USER_ID,
+        session_id,
+        updates={k: v for k, v in (updates or {}).items() if v is not None},
+        clear_keys=clear_keys,
+    )
+
+
+def acquire_session_lease(session_id: str, owner: str) -> bool:
+    """
+    Take the cross-worker lease on a session for `owner`; False while another owner holds it.
+    """
+    service = get_session_service()
+    if not isinstance(service, SqliteSessionService):
+        return True
+    return service.acquire_lease(APP_NAME, _SERVICE_USER_ID, session_id, owner, float(load_session_config()["lease_seconds"]))
+
+
+def release_session_lease(session_id: str, owner: str) -> None:
+    service = get_session_service()
+    if isinstance(service, SqliteSessionService):
+        service.release_lease(APP_NAME, _SERVICE_USER_ID, session_id, owner)
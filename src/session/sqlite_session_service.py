@@ -0,0 +1,579 @@
+from __future__ import annotations
+
+"""
+Persistent ADK session service on SQLite with an in-process hot cache:
+- Sessions, per-key state rows and events live in one SQLite file (WAL), so sessions survive restarts and are shared by every worker on the host.
+- Writes are deltas: append_event upserts only the keys in the event's state_delta and inserts one event row; update_state_sync touches only the given keys.
+- `app:` and `user:` keys are shared like in ADK's InMemorySessionService: they live in app_state/user_state rows and are merged into every session of the app/user when it is read.
+- A per-process hot cache keeps recently used sessions; a hit costs one primary-key lookup of update_time, and a session changed by another worker is reloaded.
+- The cache is bounded by idle TTL, session count and bytes (src/session/eviction.py); stored sessions idle past the TTL are deleted by a periodic sweep.
+- Session leases serialise turns across workers: acquire_lease takes a per-session row that other workers cannot take until it is released or expires (a crashed holder does not block the session forever).
+- Long histories are compacted (src/session/compaction.py): past the event-count/byte threshold, old event rows are replaced by one marker row, so loads and cached copies stay small.
+
+Public API:
+- SqliteSessionService(db_path=None, max_cached_sessions=None, uri=None, idle_ttl_seconds=None, max_cached_bytes=None): BaseSessionService implementation (async API, run off the event loop with asyncio.to_thread, plus get_session_sync/create_session_sync). create raises AlreadyExistsError for a taken session id.
+- SqliteSessionService.update_state_sync(app_name, user_id, session_id, updates=None, clear_keys=None): delta state write outside an invocation.
+- SqliteSessionService.acquire_lease(app_name, user_id, session_id, owner, lease_seconds) -> bool / release_lease(app_name, user_id, session_id, owner): cross-worker per-session mutual exclusion.
+- SqliteSessionService.compact_session(app_name, user_id, session_id): fold old events now if over the threshold; returns events folded (append_event does this automatically).
+- SqliteSessionService.sweep_expired(): delete stored sessions idle longer than the TTL; runs every session.sweep_interval_seconds on create.
+- SqliteSessionService.cache_info(): hit/miss/reload/eviction counters, cached sessions and bytes.
+- SqliteSessionService.session_size(app_name, user_id, session_id): cached byte estimate (state values + events).
+
+Usage: Selected by `session.backend: sqlite` (src/session/session_manager.py) and registered for ADK CLIs as the `kbsession://` scheme in services.yaml (`./adk web` passes it by default; `kbsession:///abs/path.sqlite3` picks a file, a bare `kbsession://` uses session.sqlite_path). Eviction only drops cached copies (the next read reloads from SQLite); the TTL sweep is what deletes stored sessions. `temp:` keys are never persisted; shared `app:`/`user:` keys are not cached with the session, so a change made through another session is seen on the next read. append_event raises ValueError when the passed session is older than the stored one (another worker appended in between).
+"""
+
+import asyncio
+import copy
+import json
+import sqlite3
+import threading
+import time
+import uuid
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from urllib.parse import urlparse
+
+from google.adk.errors.already_exists_error import AlreadyExistsError
+from google.adk.events import Event
+from google.adk.sessions import Session
+from google.adk.sessions.base_session_service import BaseSessionService, GetSessionConfig, ListSessionsResponse
+from google.adk.sessions.state import State
+
+from src.session.compaction import CompactionPolicy, compaction_marker
+from src.session.eviction import SessionBudget
+from src.utils.config_loader import load_session_config
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS sessions (
+    app_name TEXT NOT NULL,
+    user_id TEXT NOT NULL,
+    session_id TEXT NOT NULL,
+    create_time REAL NOT NULL,
+    update_time REAL NOT NULL,
+    PRIMARY KEY (app_name, user_id, session_id)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS session_state (
+    app_name TEXT NOT NULL,
+    user_id TEXT NOT NULL,
+    session_id TEXT NOT NULL,
+    key TEXT NOT NULL,
+    value TEXT NOT NULL,
+    PRIMARY KEY (app_name, user_id, session_id, key)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS session_events (
+    app_name TEXT NOT NULL,
+    user_id TEXT NOT NULL,
+    session_id TEXT NOT NULL,
+    seq INTEGER NOT NULL,
+    timestamp REAL NOT NULL,
+    data TEXT NOT NULL,
+    PRIMARY KEY (app_name, user_id, session_id, seq)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS app_state (
+    app_name TEXT NOT NULL,
+    key TEXT NOT NULL,
+    value TEXT NOT NULL,
+    PRIMARY KEY (app_name, key)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS user_state (
+    app_name TEXT NOT NULL,
+    user_id TEXT NOT NULL,
+    key TEXT NOT NULL,
+    value TEXT NOT NULL,
+    PRIMARY KEY (app_name, user_id, key)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS session_leases (
+    app_name TEXT NOT NULL,
+    user_id TEXT NOT NULL,
+    session_id TEXT NOT NULL,
+    owner TEXT NOT NULL,
+    expires_at REAL NOT NULL,
+    PRIMARY KEY (app_name, user_id, session_id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_sessions_update_time ON sessions(update_time);
+"""
+KEY_WHERE = "app_name = ? AND user_id = ? AND session_id = ?"
+
+SessionKey = Tuple[str, str, str]
+
+
+def _path_from_uri(uri: Optional[str]) -> Optional[str]:
+    if not uri:
+        return None
+    parsed = urlparse(uri)
+    path = (parsed.netloc + parsed.path) if parsed.netloc else parsed.path
+    return path or None
+
+
+def _persisted(delta: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    return {k: v for k, v in (delta or {}).items() if not k.startswith(State.TEMP_PREFIX)}
+
+
+def _is_shared(key: str) -> bool:
+    return key.startswith(State.APP_PREFIX) or key.startswith(State.USER_PREFIX)
+
+
+def _session_only(delta: Dict[str, Any]) -> Dict[str, Any]:
+    return {k: v for k, v in delta.items() if not _is_shared(k)}
+
+
+def _upsert_state(conn: sqlite3.Connection, key: SessionKey, encoded: Dict[str, str]) -> None:
+    """Write JSON-encoded state values; app:/user: keys go to the shared tables without their prefix."""
+    app_name, user_id, _ = key
+    session_rows, app_rows, user_rows = [], [], []
+    for k, raw in encoded.items():
+        if k.startswith(State.APP_PREFIX):
+            app_rows.append([app_name, k.removeprefix(State.APP_PREFIX), raw])
+        elif k.startswith(State.USER_PREFIX):
+            user_rows.append([app_name, user_id, k.removeprefix(State.USER_PREFIX), raw])
+        else:
+            session_rows.append([*key, k, raw])
+    if session_rows:
+        conn.executemany(
+            "INSERT INTO session_state VALUES (?, ?, ?, ?, ?) "
+            "ON CONFLICT(app_name, user_id, session_id, key) DO UPDATE SET value = excluded.value",
+            session_rows,
+        )
+    if app_rows:
+        conn.executemany("INSERT INTO app_state VALUES (?, ?, ?) ON CONFLICT(app_name, key) DO UPDATE SET value = excluded.value", app_rows)
+    if user_rows:
+        conn.executemany(
+            "INSERT INTO user_state VALUES (?, ?, ?, ?) ON CONFLICT(app_name, user_id, key) DO UPDATE SET value = excluded.value",
+            user_rows,
+        )
+
+
+def _delete_state(conn: sqlite3.Connection, key: SessionKey, clear: List[str]) -> None:
+    app_name, user_id, _ = key
+    for k in clear:
+        if k.startswith(State.APP_PREFIX):
+            conn.execute("DELETE FROM app_state WHERE app_name = ? AND key = ?", [app_name, k.removeprefix(State.APP_PREFIX)])
+        elif k.startswith(State.USER_PREFIX):
+            conn.execute(
+                "DELETE FROM user_state WHERE app_name = ? AND user_id = ? AND key = ?", [app_name, user_id, k.removeprefix(State.USER_PREFIX)]
+            )
+        else:
+            conn.execute(f"DELETE FROM session_state WHERE {KEY_WHERE} AND key = ?", [*key, k])
+
+
+class _CacheEntry:
+    """Cached session plus the byte sizes it was built from, so deltas adjust the size without re-serialising."""
+
+    __slots__ = ("session", "state_sizes", "event_bytes")
+
+    def __init__(self, session: Session, state_sizes: Dict[str, int], event_bytes: int) -> None:
+        self.session = session
+        self.state_sizes = state_sizes
+        self.event_bytes = event_bytes
+
+    def size(self) -> int:
+        return sum(self.state_sizes.values()) + self.event_bytes
+
+
+class SqliteSessionService(BaseSessionService):
+    def __init__(
+        self,
+        db_path: Optional[str] = None,
+        max_cached_sessions: Optional[int] = None,
+        uri: Optional[str] = None,
+        idle_ttl_seconds: Optional[float] = None,
+        max_cached_bytes: Optional[int] = None,
+        **_: Any,
+    ) -> None:
+        cfg = load_session_config()
+        path = Path(db_path or _path_from_uri(uri) or cfg["sqlite_path"])
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self.path = str(path)
+        self.idle_ttl_seconds = float(cfg["idle_ttl_seconds"] if idle_ttl_seconds is None else idle_ttl_seconds)
+        self.sweep_interval_seconds = float(cfg["sweep_interval_seconds"])
+        self._budget = SessionBudget(
+            idle_ttl_seconds=self.idle_ttl_seconds,
+            max_sessions=int(max_cached_sessions or cfg["max_cached_sessions"]),
+            max_bytes=int(cfg["max_cached_bytes"] if max_cached_bytes is None else max_cached_bytes),
+        )
+        self._cache: Dict[SessionKey, _CacheEntry] = {}
+        self._cache_lock = threading.Lock()
+        self._compaction = CompactionPolicy()
+        self._stats = {"hits": 0, "misses": 0, "reloads": 0, "expired_deleted": 0, "compactions": 0, "events_compacted": 0}
+        self._next_sweep = 0.0
+        self._local = threading.local()
+        self._write_lock = threading.Lock()
+        self._conn().executescript(SCHEMA)
+
+    # -- connection helpers -------------------------------------------------
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None, cached_statements=128)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA busy_timeout=30000")
+            self._local.conn = conn
+        return conn
+
+    def _transaction(self, fn: Any) -> Any:
+        conn = self._conn()
+        with self._write_lock:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                result = fn(conn)
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+        return result
+
+    # -- cache --------------------------------------------------------------
+
+    def _cache_get(self, key: SessionKey) -> Optional[_CacheEntry]:
+        with self._cache_lock:
+            for victim in self._budget.expire():
+                self._cache.pop(victim, None)
+            entry = self._cache.get(key)
+            if entry is not None:
+                self._evict(self._budget.touch(key))
+            return entry
+
+    def _cache_put(self, key: SessionKey, entry: _CacheEntry) -> None:
+        with self._cache_lock:
+            self._cache[key] = entry
+            self._evict(self._budget.touch(key, entry.size()))
+
+    def _cache_resized(self, key: SessionKey, entry: _CacheEntry) -> None:
+        with self._cache_lock:
+            if self._cache.get(key) is entry:
+                self._evict(self._budget.resize(key, entry.size()))
+
+    def _evict(self, keys: List[SessionKey]) -> None:
+        for victim in keys:
+            self._cache.pop(victim, None)
+
+    def _cache_drop(self, key: SessionKey) -> None:
+        with self._cache_lock:
+            self._cache.pop(key, None)
+            self._budget.discard(key)
+
+    def _count(self, name: str, n: int = 1) -> None:
+        with self._cache_lock:
+            self._stats[name] += n
+
+    def cache_info(self) -> Dict[str, int]:
+        with self._cache_lock:
+            return {**self._stats, **self._budget.stats(), "size": len(self._cache)}
+
+    def session_size(self, app_name: str, user_id: str, session_id: str) -> int:
+        with self._cache_lock:
+            return self._budget.size_of((app_name, user_id, session_id))
+
+    # -- reads --------------------------------------------------------------
+
+    def _load(self, key: SessionKey, update_time: float) -> _CacheEntry:
+        conn = self._conn()
+        state: Dict[str, Any] = {}
+        state_sizes: Dict[str, int] = {}
+        for k, raw in conn.execute(f"SELECT key, value FROM session_state WHERE {KEY_WHERE}", key):
+            state[k] = json.loads(raw)
+            state_sizes[k] = len(k) + len(raw)
+        events, event_bytes = [], 0
+        for (raw,) in conn.execute(f"SELECT data FROM session_events WHERE {KEY_WHERE} ORDER BY seq", key):
+            events.append(Event.model_validate_json(raw))
+            event_bytes += len(raw)
+        app_name, user_id, session_id = key
+        session = Session(id=session_id, app_name=app_name, user_id=user_id, state=state, events=events, last_update_time=update_time)
+        return _CacheEntry(session, state_sizes, event_bytes)
+
+    def _current(self, key: SessionKey) -> Optional[Session]:
+        row = self._conn().execute(f"SELECT update_time FROM sessions WHERE {KEY_WHERE}", key).fetchone()
+        if row is None:
+            self._cache_drop(key)
+            return None
+        cached = self._cache_get(key)
+        if cached is not None and cached.session.last_update_time == row[0]:
+            self._count("hits")
+            return cached.session
+        self._count("reloads" if cached is not None else "misses")
+        entry = self._load(key, row[0])
+        self._cache_put(key, entry)
+        return entry.session
+
+    def get_session_sync(
+        self, *, app_name: str, user_id: str, session_id: str, config: Optional[GetSessionConfig] = None
+    ) -> Optional[Session]:
+        session = self._current((app_name, user_id, session_id))
+        if session is None:
+            return None
+        events = session.events
+        if config:
+            if config.num_recent_events is not None:
+                events = events[-config.num_recent_events :] if config.num_recent_events else []
+            if config.after_timestamp is not None:
+                events = [e for e in events if e.timestamp >= config.after_timestamp]
+        # Callers own the returned copy; the cached session is only changed through this service.
+        return Session(
+            id=session.id,
+            app_name=session.app_name,
+            user_id=session.user_id,
+            state={**copy.deepcopy(session.state), **self._shared_state(app_name, user_id)},
+            events=[e.model_copy(deep=True) for e in events],
+            last_update_time=session.last_update_time,
+        )
+
+    def _shared_state(self, app_name: str, user_id: str) -> Dict[str, Any]:
+        # Not cached: another session of the app/user may change these at any time.
+        rows = self._conn().execute(
+            "SELECT ? || key, value FROM app_state WHERE app_name = ? "
+            "UNION ALL SELECT ? || key, value FROM user_state WHERE app_name = ? AND user_id = ?",
+            [State.APP_PREFIX, app_name, State.USER_PREFIX, app_name, user_id],
+        )
+        return {k: json.loads(raw) for k, raw in rows}
+
+    async def get_session(
+        self, *, app_name: str, user_id: str, session_id: str, config: Optional[GetSessionConfig] = None
+    ) -> Optional[Session]:
+        return await asyncio.to_thread(self.get_session_sync, app_name=app_name, user_id=user_id, session_id=session_id, config=config)
+
+    async def list_sessions(self, *, app_name: str, user_id: Optional[str] = None) -> ListSessionsResponse:
+        sql = "SELECT user_id, session_id, update_time FROM sessions WHERE app_name = ?"
+        params: List[Any] = [app_name]
+        if user_id is not None:
+            sql += " AND user_id = ?"
+            params.append(user_id)
+        rows = await asyncio.to_thread(lambda: self._conn().execute(sql + " ORDER BY update_time", params).fetchall())
+        return ListSessionsResponse(
+            sessions=[Session(id=sid, app_name=app_name, user_id=uid, state={}, events=[], last_update_time=ts) for uid, sid, ts in rows]
+        )
+
+    # -- writes -------------------------------------------------------------
+
+    def create_session_sync(
+        self, *, app_name: str, user_id: str, state: Optional[Dict[str, Any]] = None, session_id: Optional[str] = None
+    ) -> Session:
+        key = (app_name, user_id, (session_id or "").strip() or str(uuid.uuid4()))
+        initial = _persisted(state)
+        encoded = {k: json.dumps(v) for k, v in initial.items()}
+        now = time.time()
+        if now >= self._next_sweep:
+            self._next_sweep = now + self.sweep_interval_seconds
+            self.sweep_expired()
+
+        def insert(conn: sqlite3.Connection) -> None:
+            if conn.execute(f"SELECT 1 FROM sessions WHERE {KEY_WHERE}", key).fetchone():
+                raise AlreadyExistsError(f"Session {key[2]} already exists")
+            conn.execute("INSERT INTO sessions VALUES (?, ?, ?, ?, ?)", [*key, now, now])
+            _upsert_state(conn, key, encoded)
+
+        self._transaction(insert)
+        own = _session_only(initial)
+        session = Session(id=key[2], app_name=app_name, user_id=user_id, state=own, events=[], last_update_time=now)
+        self._cache_put(key, _CacheEntry(session, {k: len(k) + len(encoded[k]) for k in own}, 0))
+        return self.get_session_sync(app_name=app_name, user_id=user_id, session_id=key[2])
+
+    async def create_session(
+        self, *, app_name: str, user_id: str, state: Optional[Dict[str, Any]] = None, session_id: Optional[str] = None
+    ) -> Session:
+        return await asyncio.to_thread(self.create_session_sync, app_name=app_name, user_id=user_id, state=state, session_id=session_id)
+
+    async def delete_session(self, *, app_name: str, user_id: str, session_id: str) -> None:
+        key = (app_name, user_id, session_id)
+
+        def delete(conn: sqlite3.Connection) -> None:
+            for table in ("session_events", "session_state", "session_leases", "sessions"):
+                conn.execute(f"DELETE FROM {table} WHERE {KEY_WHERE}", key)
+
+        await asyncio.to_thread(self._transaction, delete)
+        self._cache_drop(key)
+
+    def sweep_expired(self) -> int:
+        """Delete stored sessions whose last update is older than the idle TTL; returns how many were removed."""
+        if not self.idle_ttl_seconds:
+            return 0
+        cutoff = time.time() - self.idle_ttl_seconds
+
+        def sweep(conn: sqlite3.Connection) -> List[SessionKey]:
+            keys = [tuple(r) for r in conn.execute("SELECT app_name, user_id, session_id FROM sessions WHERE update_time < ?", [cutoff])]
+            for table in ("session_events", "session_state", "session_leases", "sessions"):
+                conn.executemany(f"DELETE FROM {table} WHERE {KEY_WHERE}", keys)
+            return keys
+
+        expired = self._transaction(sweep)
+        for key in expired:
+            self._cache_drop(key)
+        if expired:
+            self._count("expired_deleted", len(expired))
+        return len(expired)
+
+    # -- leases -------------------------------------------------------------
+
+    def acquire_lease(self, app_name: str, user_id: str, session_id: str, owner: str, lease_seconds: float) -> bool:
+        """Take (or extend) the session's lease for `owner`; False while another owner holds an unexpired one."""
+        now = time.time()
+
+        def take(conn: sqlite3.Connection) -> bool:
+            cursor = conn.execute(
+                "INSERT INTO session_leases VALUES (?, ?, ?, ?, ?) "
+                "ON CONFLICT (app_name, user_id, session_id) DO UPDATE SET owner = excluded.owner, expires_at = excluded.expires_at "
+                "WHERE session_leases.owner = excluded.owner OR session_leases.expires_at <= ?",
+                [app_name, user_id, session_id, owner, now + float(lease_seconds), now],
+            )
+            return cursor.rowcount == 1
+
+        return self._transaction(take)
+
+    def release_lease(self, app_name: str, user_id: str, session_id: str, owner: str) -> None:
+        self._transaction(lambda conn: conn.execute(f"DELETE FROM session_leases WHERE {KEY_WHERE} AND owner = ?", [app_name, user_id, session_id, owner]))
+
+    def compact_session(self, app_name: str, user_id: str, session_id: str) -> int:
+        return self._compact((app_name, user_id, session_id))[0]
+
+    def _compact(self, key: SessionKey, expected_time: Optional[float] = None) -> Tuple[int, Optional[float]]:
+        """Returns (events folded, new update_time); (0, None) when nothing was compacted or the session moved past expected_time."""
+        policy = self._compaction
+
+        def compact(conn: sqlite3.Connection) -> Optional[Tuple[float, float, int, int, Event, str]]:
+            row = conn.execute(f"SELECT update_time FROM sessions WHERE {KEY_WHERE}", key).fetchone()
+            if row is None or (expected_time is not None and row[0] != expected_time):
+                return None
+            rows = conn.execute(f"SELECT seq, timestamp, LENGTH(data) FROM session_events WHERE {KEY_WHERE} ORDER BY seq", key).fetchall()
+            if not policy.should_compact(len(rows), sum(r[2] for r in rows)):
+                return None
+            folded = rows[: policy.fold_count(len(rows))]
+            last_seq = folded[-1][0]
+            (oldest,) = conn.execute(f"SELECT data FROM session_events WHERE {KEY_WHERE} AND seq = ?", [*key, folded[0][0]]).fetchone()
+            folded_bytes = sum(r[2] for r in folded)
+            marker = compaction_marker(len(folded), folded_bytes, folded[0][1], folded[-1][1], previous=Event.model_validate_json(oldest))
+            raw_marker = marker.model_dump_json(exclude_none=True)
+            # The marker takes the last folded seq, so it still sorts before the kept tail.
+            conn.execute(f"DELETE FROM session_events WHERE {KEY_WHERE} AND seq <= ?", [*key, last_seq])
+            conn.execute("INSERT INTO session_events VALUES (?, ?, ?, ?, ?, ?)", [*key, last_seq, marker.timestamp, raw_marker])
+            now = max(time.time(), row[0] + 1e-6)
+            conn.execute(f"UPDATE sessions SET update_time = ? WHERE {KEY_WHERE}", [now, *key])
+            return row[0], now, len(folded), folded_bytes, marker, raw_marker
+
+        result = self._transaction(compact)
+        if result is None:
+            return 0, None
+        previous, now, folded_count, folded_bytes, marker, raw_marker = result
+        self._count("compactions")
+        self._count("events_compacted", folded_count)
+        entry = self._cache_get(key)
+        if entry is not None:
+            if entry.session.last_update_time != previous:
+                self._cache_drop(key)
+            else:
+                entry.session.events = [marker] + entry.session.events[folded_count:]
+                entry.event_bytes += len(raw_marker) - folded_bytes
+                entry.session.last_update_time = now
+                self._cache_resized(key, entry)
+        return folded_count, now
+
+    def _compaction_due(self, key: SessionKey) -> bool:
+        with self._cache_lock:
+            entry = self._cache.get(key)
+            return entry is not None and self._compaction.should_compact(len(entry.session.events), entry.event_bytes)
+
+    def _write_delta(
+        self,
+        key: SessionKey,
+        encoded: Dict[str, str],
+        clear_keys: Iterable[str] = (),
+        event: Optional[Tuple[float, str]] = None,
+        expected_time: Optional[float] = None,
+    ) -> Tuple[float, float]:
+        """Apply one delta (JSON-encoded values, optional (timestamp, event JSON)) atomically; returns (previous, new) update_time."""
+        clear = list(clear_keys)
+
+        def write(conn: sqlite3.Connection) -> Tuple[float, float]:
+            row = conn.execute(f"SELECT update_time FROM sessions WHERE {KEY_WHERE}", key).fetchone()
+            if row is None:
+                raise ValueError(f"Session {key[2]} not found")
+            previous = row[0]
+            if expected_time is not None and previous > expected_time:
+                raise ValueError(f"Session {key[2]} is stale: it was updated after it was loaded")
+            # Strictly increasing, so update_time doubles as the cache revision.
+            now = max(time.time(), previous + 1e-6)
+            _upsert_state(conn, key, encoded)
+            _delete_state(conn, key, clear)
+            if event is not None:
+                conn.execute(
+                    "INSERT INTO session_events VALUES (?, ?, ?, "
+                    f"(SELECT COALESCE(MAX(seq), 0) + 1 FROM session_events WHERE {KEY_WHERE}), ?, ?)",
+                    [*key, *key, *event],
+                )
+            conn.execute(f"UPDATE sessions SET update_time = ? WHERE {KEY_WHERE}", [now, *key])
+            return previous, now
+
+        return self._transaction(write)
+
+    def _patch_cache(
+        self,
+        key: SessionKey,
+        previous: float,
+        now: float,
+        updates: Dict[str, Any],
+        encoded: Dict[str, str],
+        clear_keys: Iterable[str],
+        event: Optional[Event] = None,
+        event_bytes: int = 0,
+    ) -> None:
+        """Apply a committed delta to the cached copy, or drop it if it was not the revision the delta was based on."""
+        entry = self._cache_get(key)
+        if entry is None:
+            return
+        cached = entry.session
+        if cached.last_update_time != previous:
+            self._cache_drop(key)
+            return
+        cached.state.update(copy.deepcopy(updates))
+        entry.state_sizes.update({k: len(k) + len(raw) for k, raw in encoded.items()})
+        for k in clear_keys:
+            cached.state.pop(k, None)
+            entry.state_sizes.pop(k, None)
+        if event is not None:
+            cached.events.append(event.model_copy(deep=True))
+            entry.event_bytes += event_bytes
+        cached.last_update_time = now
+        self._cache_resized(key, entry)
+
+    def update_state_sync(
+        self,
+        app_name: str,
+        user_id: str,
+        session_id: str,
+        updates: Optional[Dict[str, Any]] = None,
+        clear_keys: Optional[Iterable[str]] = None,
+    ) -> None:
+        key = (app_name, user_id, session_id)
+        changes = _persisted(updates)
+        clear = list(clear_keys or [])
+        if not changes and not clear:
+            return
+        encoded = {k: json.dumps(v) for k, v in changes.items()}
+        previous, now = self._write_delta(key, encoded, clear)
+        own = _session_only(changes)
+        self._patch_cache(key, previous, now, own, {k: encoded[k] for k in own}, [k for k in clear if not _is_shared(k)])
+
+    async def append_event(self, session: Session, event: Event) -> Event:
+        if event.partial:
+            return event
+        key = (session.app_name, session.user_id, session.id)
+        delta = _persisted(event.actions.state_delta if event.actions else None)
+        stored = event.model_copy(deep=True)
+        if stored.actions and stored.actions.state_delta:
+            stored.actions.state_delta = delta
+        encoded = {k: json.dumps(v) for k, v in delta.items()}
+        raw_event = stored.model_dump_json(exclude_none=True)
+        previous, now = await asyncio.to_thread(
+            self._write_delta, key, encoded, event=(stored.timestamp, raw_event), expected_time=session.last_update_time
+        )
+        # Only now mutate the caller's session (temp state, delta, events), so a rejected write leaves it untouched.
+        event = await super().append_event(session, event)
+        session.last_update_time = now
+        own = _session_only(delta)
+        self._patch_cache(key, previous, now, own, {k: encoded[k] for k in own}, (), stored, len(raw_event))
+        if self._compaction_due(key):
+            folded, compacted_at = await asyncio.to_thread(self._compact, key, now)
+            if folded:
+                # Compaction bumps update_time; keep the caller's session current so its next append is not rejected as stale.
+                session.last_update_time = compacted_at
+        return event
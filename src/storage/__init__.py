@@ -0,0 +1,2 @@
+# Package marker for storage backends.
+# Storage package marker. Contains client (backend selection) and sqlite_store (embedded document store).
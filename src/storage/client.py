@@ -0,0 +1,41 @@
+from __future__ import annotations
+
+"""
+Storage backend selection:
+- firestore (default): google.cloud.firestore Client for FIRESTORE_DATABASE.
+- sqlite: embedded SqliteClient (src/storage/sqlite_store.py) exposing the same document API, for single-node edge deployments and benchmarks.
+
+Public API:
+- get_client(): document client for the configured backend.
+- run_transaction(client, fn): run fn(transaction) as an atomic read-modify-write on either backend.
+
+Usage: Every persistence tool obtains its client here (auth, domains, memory, domain lifecycle, facts migration), so swapping `storage.backend` in config/config.yaml (or STORAGE_BACKEND) moves all tools at once. SQLite clients are shared per database file; Firestore clients are created per call as before.
+"""
+
+from typing import Any, Callable, TypeVar
+
+from google.cloud import firestore
+
+from src.storage.sqlite_store import SqliteClient
+from src.utils.config_loader import ConfigLoader, load_storage_config
+
+T = TypeVar("T")
+
+
+def get_client() -> Any:
+    cfg = load_storage_config()
+    if cfg["backend"] == "sqlite":
+        return SqliteClient.shared(cfg["sqlite_path"])
+    settings = ConfigLoader.instance().settings
+    return firestore.Client(database=settings.firestore_database or "(default)")
+
+
+def run_transaction(client: Any, fn: Callable[[Any], T]) -> T:
+    """
+    fn reads with `client.get_all(refs, transaction=transaction)` and queues writes on `transaction`.
+    Firestore re-runs fn on contention (so fn must be side-effect free); the SQLite store runs it once under its write lock.
+    """
+    runner = getattr(client, "run_transaction", None)
+    if runner is not None:
+        return runner(fn)
+    return firestore.transactional(fn)(client.transaction())
@@ -0,0 +1,572 @@
+from __future__ import annotations
+
+"""
+Embedded SQLite document store:
+- Implements the subset of the google.cloud.firestore Client API the tools use: collections and subcollections, document get/set/update/delete, get_all, where/select/order_by/start_after/limit/stream, count aggregation, batched writes and read-then-write transactions.
+- One `documents` table keyed by full document path with a JSON data column and expression indexes on the fields tools filter and order by.
+- WAL journal, one connection per thread, parameterised statements (prepared once and cached by sqlite3), writes serialised in IMMEDIATE transactions.
+
+Public API:
+- SqliteClient(path): document client; SqliteClient.shared(path) returns one client per database file.
+- SqliteClient.run_transaction(fn): call fn(transaction) holding the write lock; its queued writes commit atomically with its reads.
+- Write sentinels from google.cloud.firestore (SERVER_TIMESTAMP, DELETE_FIELD, Increment, ArrayUnion, ArrayRemove) are applied at write time.
+
+Usage: Selected with `storage.backend: sqlite` (see src/storage/client.py). Timestamps are stored as tagged UTC ISO-8601 strings so they compare and sort correctly and read back as datetimes. Missing documents raise google.api_core NotFound on update, as Firestore does. Reads and single-document writes accept Firestore's `timeout` argument (src/tools/firestore_query.py passes the turn's remaining budget) and ignore it: calls are local. Single-node only: there is no cross-host replication.
+"""
+
+import json
+import random
+import sqlite3
+import string
+import threading
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, ClassVar, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from google.api_core.exceptions import NotFound
+from google.cloud.firestore_v1 import transforms
+
+DOCUMENT_ID = "__name__"
+ASCENDING = "ASCENDING"
+DESCENDING = "DESCENDING"
+AUTO_ID_CHARS = string.ascii_letters + string.digits
+# Fields the tools filter or order on; each gets a (parent, field) expression index.
+INDEXED_FIELDS = [
+    "user_id",
+    "domain_id",
+    "username",
+    "status",
+    "created_at",
+    "text_hash",
+    "group_key",
+    "dirty",
+    "branch",
+]
+_TS_KEY = "__ts__"
+_OPS = {"==": "=", "!=": "!=", "<": "<", "<=": "<=", ">": ">", ">=": ">="}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS documents (
+    path TEXT PRIMARY KEY,
+    parent TEXT NOT NULL,
+    doc_id TEXT NOT NULL,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_documents_parent ON documents(parent);
+"""
+
+
+def _auto_id() -> str:
+    return "".join(random.SystemRandom().choice(AUTO_ID_CHARS) for _ in range(20))
+
+
+def _ts(value: datetime) -> str:
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    # Fixed width so string order equals time order.
+    return value.astimezone(timezone.utc).isoformat(timespec="microseconds")
+
+
+def _encode_default(value: Any) -> Any:
+    if isinstance(value, datetime):
+        return {_TS_KEY: _ts(value)}
+    raise TypeError(f"Unsupported value for SQLite store: {type(value).__name__}")
+
+
+def _decode_hook(obj: Dict[str, Any]) -> Any:
+    if len(obj) == 1 and _TS_KEY in obj:
+        return datetime.fromisoformat(obj[_TS_KEY])
+    return obj
+
+
+def _dumps(data: Dict[str, Any]) -> str:
+    return json.dumps(data, default=_encode_default, ensure_ascii=False, separators=(",", ":"))
+
+
+def _loads(raw: str) -> Dict[str, Any]:
+    return json.loads(raw, object_hook=_decode_hook)
+
+
+def _param(value: Any) -> Any:
+    if isinstance(value, datetime):
+        return _ts(value)
+    return value
+
+
+def _json_path(field: str) -> str:
+    parts = field.split(".")
+    if any(not p or '"' in p or "'" in p for p in parts):
+        raise ValueError(f"Unsupported field path: {field!r}")
+    return "$" + "".join(f'."{p}"' for p in parts)
+
+
+def _field_expr(field: str) -> str:
+    """SQL expression for a field value; tagged timestamps compare by their ISO string."""
+    if field == DOCUMENT_ID:
+        return "doc_id"
+    path = _json_path(field)
+    return f"coalesce(json_extract(data, '{path}.\"{_TS_KEY}\"'), json_extract(data, '{path}'))"
+
+
+def _get_path(data: Dict[str, Any], field: str) -> Tuple[bool, Any]:
+    node: Any = data
+    for part in field.split("."):
+        if not isinstance(node, dict) or part not in node:
+            return False, None
+        node = node[part]
+    return True, node
+
+
+def _set_path(data: Dict[str, Any], field: str, value: Any) -> None:
+    parts = field.split(".")
+    node = data
+    for part in parts[:-1]:
+        child = node.get(part)
+        if not isinstance(child, dict):
+            child = node[part] = {}
+        node = child
+    node[parts[-1]] = value
+
+
+def _delete_path(data: Dict[str, Any], field: str) -> None:
+    parts = field.split(".")
+    node: Any = data
+    for part in parts[:-1]:
+        node = node.get(part) if isinstance(node, dict) else None
+        if node is None:
+            return
+    if isinstance(node, dict):
+        node.pop(parts[-1], None)
+
+
+def _project(data: Dict[str, Any], fields: Optional[Sequence[str]]) -> Dict[str, Any]:
+    if fields is None:
+        return data
+    projected: Dict[str, Any] = {}
+    for field in fields:
+        found, value = _get_path(data, field)
+        if found:
+            _set_path(projected, field, value)
+    return projected
+
+
+def _apply_value(current: Dict[str, Any], field: str, value: Any, now: datetime) -> None:
+    if value is transforms.DELETE_FIELD:
+        _delete_path(current, field)
+    elif value is transforms.SERVER_TIMESTAMP:
+        _set_path(current, field, now)
+    elif isinstance(value, transforms.Increment):
+        _, existing = _get_path(current, field)
+        base = existing if isinstance(existing, (int, float)) and not isinstance(existing, bool) else 0
+        _set_path(current, field, base + value.value)
+    elif isinstance(value, transforms.ArrayUnion):
+        _, existing = _get_path(current, field)
+        items = list(existing) if isinstance(existing, list) else []
+        items.extend(v for v in value.values if v not in items)
+        _set_path(current, field, items)
+    elif isinstance(value, transforms.ArrayRemove):
+        _, existing = _get_path(current, field)
+        items = list(existing) if isinstance(existing, list) else []
+        _set_path(current, field, [v for v in items if v not in value.values])
+    elif isinstance(value, dict):
+        _set_path(current, field, _resolve_nested(value, now))
+    else:
+        _set_path(current, field, value)
+
+
+def _resolve_nested(value: Dict[str, Any], now: datetime) -> Dict[str, Any]:
+    resolved: Dict[str, Any] = {}
+    for key, item in value.items():
+        _apply_value(resolved, key, item, now)
+    return resolved
+
+
+def _merge(current: Dict[str, Any], updates: Dict[str, Any], now: datetime) -> None:
+    """set(..., merge=True): nested maps merge key by key instead of being replaced."""
+    for key, value in updates.items():
+        if isinstance(value, dict) and isinstance(current.get(key), dict):
+            _merge(current[key], value, now)
+        else:
+            _apply_value(current, key, value, now)
+
+
+class DocumentSnapshot:
+    def __init__(self, reference: "DocumentReference", data: Optional[Dict[str, Any]]) -> None:
+        self.reference = reference
+        self.id = reference.id
+        self.exists = data is not None
+        self._data = data
+
+    def to_dict(self) -> Optional[Dict[str, Any]]:
+        return None if self._data is None else dict(self._data)
+
+    def get(self, field: str) -> Any:
+        return _get_path(self._data or {}, field)[1]
+
+
+class AggregationResult:
+    def __init__(self, alias: str, value: int) -> None:
+        self.alias = alias
+        self.value = value
+
+
+class AggregationQuery:
+    def __init__(self, query: "Query", alias: str) -> None:
+        self._query = query
+        self._alias = alias
+
+    def get(self, timeout: Optional[float] = None) -> List[List[AggregationResult]]:
+        return [[AggregationResult(self._alias, self._query._count())]]
+
+
+class Query:
+    def __init__(
+        self,
+        client: "SqliteClient",
+        parent: str,
+        filters: Tuple[Tuple[str, Tuple[Any, ...]], ...] = (),
+        orders: Tuple[Tuple[str, str], ...] = (),
+        limit: Optional[int] = None,
+        cursor: Optional[Tuple[Any, ...]] = None,
+        projection: Optional[Tuple[str, ...]] = None,
+    ) -> None:
+        self._client = client
+        self._parent = parent
+        self._filters = filters
+        self._orders = orders
+        self._limit = limit
+        self._cursor = cursor
+        self._projection = projection
+
+    def _copy(self, **changes: Any) -> "Query":
+        state = {
+            "filters": self._filters,
+            "orders": self._orders,
+            "limit": self._limit,
+            "cursor": self._cursor,
+            "projection": self._projection,
+        }
+        state.update(changes)
+        return Query(self._client, self._parent, **state)
+
+    def where(self, field_path: str, op_string: str, value: Any) -> "Query":
+        expr = _field_expr(field_path)
+        if op_string in _OPS:
+            if value is None and op_string in ("==", "!="):
+                clause = f"{expr} IS {'NOT ' if op_string == '!=' else ''}NULL"
+                return self._copy(filters=self._filters + ((clause, ()),))
+            clause = f"{expr} {_OPS[op_string]} ?"
+            return self._copy(filters=self._filters + ((clause, (_param(value),)),))
+        if op_string in ("in", "not-in"):
+            values = tuple(_param(v) for v in value)
+            marks = ",".join("?" * len(values)) or "NULL"
+            clause = f"{expr} {'NOT IN' if op_string == 'not-in' else 'IN'} ({marks})"
+            return self._copy(filters=self._filters + ((clause, values),))
+        if op_string in ("array_contains", "array_contains_any"):
+            values = (value,) if op_string == "array_contains" else tuple(value)
+            marks = ",".join("?" * len(values)) or "NULL"
+            path = _json_path(field_path)
+            clause = f"EXISTS (SELECT 1 FROM json_each(documents.data, '{path}') WHERE json_each.value IN ({marks}))"
+            return self._copy(filters=self._filters + ((clause, tuple(_param(v) for v in values)),))
+        raise ValueError(f"Unsupported operator: {op_string}")
+
+    def select(self, field_paths: Sequence[str]) -> "Query":
+        return self._copy(projection=tuple(f for f in field_paths if f != DOCUMENT_ID))
+
+    def order_by(self, field_path: str, direction: str = ASCENDING) -> "Query":
+        return self._copy(orders=self._orders + ((field_path, direction),))
+
+    def limit(self, count: int) -> "Query":
+        return self._copy(limit=count)
+
+    def start_after(self, document_fields_or_snapshot: Any) -> "Query":
+        if isinstance(document_fields_or_snapshot, DocumentSnapshot):
+            snap = document_fields_or_snapshot
+            data = snap.to_dict() or {}
+            values = tuple(snap.id if f == DOCUMENT_ID else _get_path(data, f)[1] for f, _ in self._orders)
+            return self._copy(cursor=values + (snap.id,))
+        fields = document_fields_or_snapshot
+        return self._copy(cursor=tuple(fields.get(f) for f, _ in self._orders) + (None,))
+
+    def count(self, alias: Optional[str] = None) -> AggregationQuery:
+        return AggregationQuery(self, alias or "field_1")
+
+    def _where_sql(self) -> Tuple[str, List[Any]]:
+        clauses = ["parent = ?"]
+        params: List[Any] = [self._parent]
+        for clause, values in self._filters:
+            clauses.append(clause)
+            params.extend(values)
+        for field, _ in self._orders:
+            # Firestore omits documents that lack an order_by field.
+            if field != DOCUMENT_ID:
+                clauses.append(f"{_field_expr(field)} IS NOT NULL")
+        if self._cursor is not None:
+            cursor_sql, cursor_params = self._cursor_sql()
+            clauses.append(cursor_sql)
+            params.extend(cursor_params)
+        return " AND ".join(clauses), params
+
+    def _sort_keys(self) -> List[Tuple[str, str]]:
+        keys = [(_field_expr(f), d) for f, d in self._orders]
+        if not any(f == DOCUMENT_ID for f, _ in self._orders):
+            keys.append(("doc_id", self._orders[-1][1] if self._orders else ASCENDING))
+        return keys
+
+    def _cursor_sql(self) -> Tuple[str, List[Any]]:
+        keys = self._sort_keys()
+        values = list(self._cursor or ())[: len(keys)]
+        if values and values[-1] is None and len(values) == len(keys):
+            keys, values = keys[:-1], values[:-1]  # cursor from a field dict has no document id
+        if not keys:
+            return "1 = 1", []
+        options: List[str] = []
+        params: List[Any] = []
+        for i, (expr, direction) in enumerate(keys):
+            parts = [f"{keys[j][0]} = ?" for j in range(i)]
+            parts.append(f"{expr} {'<' if direction == DESCENDING else '>'} ?")
+            options.append("(" + " AND ".join(parts) + ")")
+            params.extend(_param(v) for v in values[:i])
+            params.append(_param(values[i]))
+        return "(" + " OR ".join(options) + ")", params
+
+    def _order_sql(self) -> str:
+        return ", ".join(f"{expr} {'DESC' if d == DESCENDING else 'ASC'}" for expr, d in self._sort_keys())
+
+    def stream(self, transaction: Any = None, timeout: Optional[float] = None) -> Iterator[DocumentSnapshot]:
+        where, params = self._where_sql()
+        sql = f"SELECT doc_id, data FROM documents WHERE {where} ORDER BY {self._order_sql()}"
+        if self._limit is not None:
+            sql += " LIMIT ?"
+            params.append(self._limit)
+        rows = self._client._read(sql, params)
+        for doc_id, raw in rows:
+            ref = DocumentReference(self._client, f"{self._parent}/{doc_id}")
+            yield DocumentSnapshot(ref, _project(_loads(raw), self._projection))
+
+    def get(self, transaction: Any = None, timeout: Optional[float] = None) -> List[DocumentSnapshot]:
+        return list(self.stream())
+
+    def _count(self) -> int:
+        where, params = self._where_sql()
+        sql = f"SELECT count(*) FROM documents WHERE {where}"
+        if self._limit is not None:
+            sql = f"SELECT count(*) FROM (SELECT 1 FROM documents WHERE {where} LIMIT ?)"
+            params.append(self._limit)
+        return int(self._client._read(sql, params)[0][0])
+
+
+class CollectionReference(Query):
+    def __init__(self, client: "SqliteClient", path: str) -> None:
+        super().__init__(client, path)
+        self.id = path.rsplit("/", 1)[-1]
+        self.path = path
+
+    def document(self, document_id: Optional[str] = None) -> "DocumentReference":
+        return DocumentReference(self._client, f"{self.path}/{document_id or _auto_id()}")
+
+    def add(self, document_data: Dict[str, Any], document_id: Optional[str] = None) -> Tuple[datetime, "DocumentReference"]:
+        ref = self.document(document_id)
+        ref.set(document_data)
+        return datetime.now(timezone.utc), ref
+
+    def list_documents(self) -> Iterator["DocumentReference"]:
+        for doc_id, _ in self._client._read("SELECT doc_id, '' FROM documents WHERE parent = ? ORDER BY doc_id", [self.path]):
+            yield self.document(doc_id)
+
+
+class DocumentReference:
+    def __init__(self, client: "SqliteClient", path: str) -> None:
+        self._client = client
+        self.path = path
+        self.id = path.rsplit("/", 1)[-1]
+
+    @property
+    def parent(self) -> CollectionReference:
+        return CollectionReference(self._client, self.path.rsplit("/", 1)[0])
+
+    def collection(self, collection_id: str) -> CollectionReference:
+        return CollectionReference(self._client, f"{self.path}/{collection_id}")
+
+    def get(self, field_paths: Optional[Sequence[str]] = None, transaction: Any = None, timeout: Optional[float] = None) -> DocumentSnapshot:
+        rows = self._client._read("SELECT data FROM documents WHERE path = ?", [self.path])
+        if not rows:
+            return DocumentSnapshot(self, None)
+        fields = None if field_paths is None else [f for f in field_paths if f != DOCUMENT_ID]
+        return DocumentSnapshot(self, _project(_loads(rows[0][0]), fields))
+
+    def set(self, document_data: Dict[str, Any], merge: bool = False, timeout: Optional[float] = None) -> None:
+        self._client._write([("set", self, document_data, merge)])
+
+    def create(self, document_data: Dict[str, Any]) -> None:
+        self._client._write([("create", self, document_data, False)])
+
+    def update(self, field_updates: Dict[str, Any], timeout: Optional[float] = None) -> None:
+        self._client._write([("update", self, field_updates, False)])
+
+    def delete(self) -> None:
+        self._client._write([("delete", self, None, False)])
+
+
+class WriteBatch:
+    def __init__(self, client: "SqliteClient") -> None:
+        self._client = client
+        self._ops: List[Tuple[str, DocumentReference, Any, bool]] = []
+
+    def set(self, reference: DocumentReference, document_data: Dict[str, Any], merge: bool = False) -> "WriteBatch":
+        self._ops.append(("set", reference, document_data, merge))
+        return self
+
+    def create(self, reference: DocumentReference, document_data: Dict[str, Any]) -> "WriteBatch":
+        self._ops.append(("create", reference, document_data, False))
+        return self
+
+    def update(self, reference: DocumentReference, field_updates: Dict[str, Any]) -> "WriteBatch":
+        self._ops.append(("update", reference, field_updates, False))
+        return self
+
+    def delete(self, reference: DocumentReference) -> "WriteBatch":
+        self._ops.append(("delete", reference, None, False))
+        return self
+
+    def commit(self) -> List[Any]:
+        """All writes apply atomically or not at all."""
+        ops, self._ops = self._ops, []
+        self._client._write(ops)
+        return []
+
+
+class Transaction(WriteBatch):
+    """Write queue handed to run_transaction callbacks; reads go through client.get_all(..., transaction=txn)."""
+
+    def commit(self) -> List[Any]:
+        raise RuntimeError("transactions commit when the run_transaction callback returns")
+
+
+class SqliteClient:
+    _shared: ClassVar[Dict[str, "SqliteClient"]] = {}
+    _shared_lock: ClassVar[threading.Lock] = threading.Lock()
+
+    def __init__(self, path: str | Path) -> None:
+        self.path = str(path)
+        Path(self.path).parent.mkdir(parents=True, exist_ok=True)
+        self._local = threading.local()
+        self._write_lock = threading.Lock()
+        conn = self._conn()
+        conn.executescript(SCHEMA)
+        for field in INDEXED_FIELDS:
+            conn.execute(f"CREATE INDEX IF NOT EXISTS idx_documents_{field} ON documents(parent, {_field_expr(field)})")
+
+    @classmethod
+    def shared(cls, path: str | Path) -> "SqliteClient":
+        key = str(Path(path).resolve())
+        with cls._shared_lock:
+            if key not in cls._shared:
+                cls._shared[key] = cls(key)
+            return cls._shared[key]
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            # isolation_level=None: explicit BEGIN/COMMIT below; statements are cached per connection.
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None, cached_statements=256)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA busy_timeout=30000")
+            self._local.conn = conn
+        return conn
+
+    def _read(self, sql: str, params: Sequence[Any]) -> List[Tuple[Any, ...]]:
+        return self._conn().execute(sql, list(params)).fetchall()
+
+    def _write(self, ops: List[Tuple[str, DocumentReference, Any, bool]]) -> None:
+        now = datetime.now(timezone.utc)
+        conn = self._conn()
+        with self._write_lock:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                for kind, ref, data, merge in ops:
+                    self._apply(conn, kind, ref, data, merge, now)
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+
+    def _apply(
+        self, conn: sqlite3.Connection, kind: str, ref: DocumentReference, data: Any, merge: bool, now: datetime
+    ) -> None:
+        if kind == "delete":
+            conn.execute("DELETE FROM documents WHERE path = ?", [ref.path])
+            return
+        row = conn.execute("SELECT data FROM documents WHERE path = ?", [ref.path]).fetchone()
+        if kind == "update" and row is None:
+            raise NotFound(f"No document to update: {ref.path}")
+        if kind == "create" and row is not None:
+            raise ValueError(f"Document already exists: {ref.path}")
+        if kind == "update":
+            current = _loads(row[0])
+            for field, value in data.items():
+                _apply_value(current, field, value, now)
+        elif merge and row is not None:
+            current = _loads(row[0])
+            _merge(current, data, now)
+        else:
+            current = _resolve_nested(data, now)
+        parent, doc_id = ref.path.rsplit("/", 1)
+        conn.execute(
+            "INSERT INTO documents(path, parent, doc_id, data) VALUES (?, ?, ?, ?) "
+            "ON CONFLICT(path) DO UPDATE SET data = excluded.data",
+            [ref.path, parent, doc_id, _dumps(current)],
+        )
+
+    def collection(self, collection_path: str) -> CollectionReference:
+        return CollectionReference(self, collection_path.strip("/"))
+
+    def document(self, document_path: str) -> DocumentReference:
+        return DocumentReference(self, document_path.strip("/"))
+
+    def batch(self) -> WriteBatch:
+        return WriteBatch(self)
+
+    def get_all(
+        self,
+        references: Sequence[DocumentReference],
+        field_paths: Optional[Sequence[str]] = None,
+        transaction: Any = None,
+        timeout: Optional[float] = None,
+    ) -> Iterator[DocumentSnapshot]:
+        refs = list(references)
+        if not refs:
+            return
+        marks = ",".join("?" * len(refs))
+        found = dict(self._read(f"SELECT path, data FROM documents WHERE path IN ({marks})", [r.path for r in refs]))
+        fields = None if field_paths is None else [f for f in field_paths if f != DOCUMENT_ID]
+        for ref in refs:
+            raw = found.get(ref.path)
+            yield DocumentSnapshot(ref, None if raw is None else _project(_loads(raw), fields))
+
+    def run_transaction(self, fn: Any) -> Any:
+        """
+        Serializable read-modify-write: BEGIN IMMEDIATE blocks other writers for the duration, so reads made
+        by fn on this thread cannot be invalidated before its writes land. Nothing is written if fn raises.
+        """
+        conn = self._conn()
+        with self._write_lock:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                transaction = Transaction(self)
+                result = fn(transaction)
+                now = datetime.now(timezone.utc)
+                for kind, ref, data, merge in transaction._ops:
+                    self._apply(conn, kind, ref, data, merge, now)
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+        return result
+
+    def close(self) -> None:
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
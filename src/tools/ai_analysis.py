@@ -7,11 +7,14 @@ AI analysis tools:
 
 Public API:
 - tool_define_topic_relevance(payload): returns score/reasoning or error.
+- tool_score_documents_relevance(payload): scores several documents against one domain in a single call; returns scores per document_id or error.
 - tool_extract_facts_from_text(payload): returns facts list or error; handles missing parts/finish_reason gracefully.
-- tool_prettify_domain_description(payload): returns structured name/description/keywords.
+- tool_prettify_domain_description(payload): returns structured name/description/keywords; with previous_draft it refines that draft, treating raw_input_text as edit instructions.
 - tool_extract_user_name(payload): extracts a user name from free-form input using Gemini or mock.
+- tool_merge_snapshot_summary(payload): folds one new fact into a domain's rolling super/extended summary.
+- tool_summarize_texts(payload): summarizes a batch of facts or lower-level summaries (tree-reduce snapshots).
 
-Usage: Requires GOOGLE_API_KEY when RUN_REAL_AI=1; otherwise mocked. Uses model configs from config/config.yaml. Set RUN_REAL_AI=0 to avoid API calls in tests. See docs/tool_* JSON specs. Generation may be limited by safety/max tokens; errors surface in error_detail.
+Usage: Requires GOOGLE_API_KEY when RUN_REAL_AI=1; otherwise mocked. Relevance and extraction requests accept domain_prompt, the domain's precomputed prompt fragment (src/tools/domain_profile.py), in place of the raw name/description/keywords lines, and context_id: a document context opened by discovery (src/tools/document_context.py), so the model reads the cached document instead of a re-uploaded content_text. Real calls take an "llm" slot from src/utils/scheduler.py, count their tokens toward admission limits (src/utils/admission.py) and, under a turn deadline, time out with the remaining budget (src/utils/deadline.py). Uses model configs from config/config.yaml. Set RUN_REAL_AI=0 to avoid API calls in tests. See docs/tool_* JSON specs. Generation may be limited by safety/max tokens; errors surface in error_detail.
 """
 
 import json
@@ -27,6 +30,13 @@ from src.utils.config_loader import (
     load_prompts,
     load_relevance_threshold,
 )
+from src.tools.document_context import get_context_cache
+from src.utils.admission import get_admission_controller
+from src.utils.deadline import timeout_kwargs
+from src.utils.scheduler import current_scope, slot
+
+
+CACHED_DOCUMENT_NOTE = "(the document in the cached context)"
 
 
 class RelevanceRequest(BaseModel):
@@ -34,6 +44,8 @@ class RelevanceRequest(BaseModel):
     domain_name: str
     domain_description: str
     domain_keywords: List[str]
+    domain_prompt: str | None = None
+    context_id: str | None = None
 
 
 class RelevanceResponse(BaseModel):
@@ -43,11 +55,38 @@ class RelevanceResponse(BaseModel):
     error_detail: str | None = None
 
 
+class RelevanceDocument(BaseModel):
+    document_id: str
+    content_text: str
+
+
+class BatchRelevanceRequest(BaseModel):
+    documents: List[RelevanceDocument]
+    domain_name: str
+    domain_description: str
+    domain_keywords: List[str]
+    domain_prompt: str | None = None
+
+
+class DocumentScore(BaseModel):
+    document_id: str
+    relevance_score: float
+    reasoning: str
+
+
+class BatchRelevanceResponse(BaseModel):
+    status: str
+    scores: List[DocumentScore]
+    error_detail: str | None = None
+
+
 class ExtractFactsRequest(BaseModel):
     content_text: str
     domain_name: str
     domain_description: str
     domain_keywords: List[str]
+    domain_prompt: str | None = None
+    context_id: str | None = None
     relevance_justification: str
 
 
@@ -64,22 +103,43 @@ class ExtractFactsResponse(BaseModel):
     error_detail: str | None = None
 
 
-class PrettifyRequest(BaseModel):
-    raw_input_text: str
-
-
 class PrettifyData(BaseModel):
     name: str
     description: str
     keywords: List[str]
 
 
+class PrettifyRequest(BaseModel):
+    raw_input_text: str
+    previous_draft: PrettifyData | None = None
+
+
 class PrettifyResponse(BaseModel):
     status: str
     data: PrettifyData
     error_details: str | None = None
 
 
+class SnapshotMergeRequest(BaseModel):
+    domain_name: str
+    previous_super_summary: str = ""
+    previous_extended_summary: str = ""
+    new_fact_text: str
+
+
+class SnapshotMergeResponse(BaseModel):
+    status: str
+    super_summary: str
+    extended_summary: str
+    error_detail: str | None = None
+
+
+class SummarizeTextsRequest(BaseModel):
+    domain_name: str
+    texts: List[str]
+    level: str = Field(default="facts")
+
+
 class NameExtractRequest(BaseModel):
     user_input: str
 
@@ -96,7 +156,15 @@ def _ensure(model_cls, payload):
     return payload if isinstance(payload, model_cls) else model_cls(**payload)
 
 
-def _configure_model(component_id: str) -> genai.GenerativeModel:
+def _domain_block(req: Any, labels: tuple = ("Domain name", "Domain description", "Domain keywords")) -> str:
+    # A stored profile fragment is already compacted at save time; raw fields are the fallback.
+    if req.domain_prompt:
+        return req.domain_prompt
+    name, description, keywords = labels
+    return f"{name}: {req.domain_name}\n{description}: {req.domain_description}\n{keywords}: {', '.join(req.domain_keywords)}"
+
+
+def _configure_model(component_id: str, cached_content: Any = None) -> genai.GenerativeModel:
     settings = ConfigLoader.instance().settings
     if not settings.google_api_key:
         raise EnvironmentError("GOOGLE_API_KEY is required for Gemini calls.")
@@ -109,9 +177,29 @@ def _configure_model(component_id: str) -> genai.GenerativeModel:
         "top_k": cfg.get("top_k", 40),
         "max_output_tokens": cfg.get("max_output_tokens", 1024),
     }
+    if cached_content is not None:
+        return genai.GenerativeModel.from_cached_content(cached_content=cached_content, generation_config=generation_config)
     return genai.GenerativeModel(model_id, generation_config=generation_config)
 
 
+def _document_model(req: Any) -> tuple[genai.GenerativeModel, str]:
+    """Model and prompt content for a document call: against its cached context when discovery opened one, else inline."""
+    cached = get_context_cache().cached_content(req.context_id) if req.context_id else None
+    model = _configure_model("subagent_document_processor", cached_content=cached)
+    return model, CACHED_DOCUMENT_NOTE if cached is not None else req.content_text
+
+
+def _generate(model: genai.GenerativeModel, prompt: str) -> Any:
+    # Gemini quota is shared by chat turns and background work; the scheduler orders calls by priority class.
+    with slot("llm"):
+        options = timeout_kwargs("llm")
+        resp = model.generate_content(prompt, request_options=options) if options else model.generate_content(prompt)
+    usage = getattr(resp, "usage_metadata", None)
+    tokens = int(getattr(usage, "total_token_count", 0) or 0) or len(prompt) // 4
+    get_admission_controller().record_tokens(current_scope()[1], tokens)
+    return resp
+
+
 def _safe_json_extract(text: str) -> Any:
     try:
         return json.loads(text)
@@ -150,20 +238,18 @@ def tool_define_topic_relevance(payload: RelevanceRequest | Dict[str, Any]) -> D
             error_detail=None,
         ).model_dump()
     try:
-        model = _configure_model("subagent_document_processor")
+        model, content = _document_model(req)
     except Exception as exc:  # noqa: BLE001
         return {"status": "error", "error_detail": f"LLM_AUTH_ERROR: {exc}"}
 
     prompt = f"""
 You are a relevance scorer. Given content and a domain (name, description, keywords), return JSON: {{"score": float 0-1, "reasoning": "brief"}}.
-Domain name: {req.domain_name}
-Domain description: {req.domain_description}
-Domain keywords: {', '.join(req.domain_keywords)}
+{_domain_block(req)}
 Content:
-{req.content_text}
+{content}
 """
     try:
-        resp = model.generate_content(prompt)
+        resp = _generate(model, prompt)
         parsed = _safe_json_extract(resp.text or "")
         score = float(parsed.get("score")) if parsed else 0.0
         reasoning = parsed.get("reasoning", "") if parsed else resp.text
@@ -177,6 +263,43 @@ Content:
         return {"status": "error", "error_detail": f"LLM_SERVICE_ERROR: {exc}"}
 
 
+def tool_score_documents_relevance(payload: BatchRelevanceRequest | Dict[str, Any]) -> Dict[str, Any]:
+    """One round trip per domain for a multi-URL message instead of one per (document, domain); documents the model leaves unscored are omitted from scores."""
+    req = _ensure(BatchRelevanceRequest, payload)
+    if os.getenv("RUN_REAL_AI") != "1":
+        score = max(0.9, load_relevance_threshold("subagent_document_processor"))
+        return BatchRelevanceResponse(
+            status="success",
+            scores=[DocumentScore(document_id=d.document_id, relevance_score=score, reasoning="Mock relevance (RUN_REAL_AI not set).") for d in req.documents],
+            error_detail=None,
+        ).model_dump()
+    try:
+        model = _configure_model("subagent_document_processor")
+    except Exception as exc:  # noqa: BLE001
+        return {"status": "error", "error_detail": f"LLM_AUTH_ERROR: {exc}"}
+
+    documents = "\n".join(f"<document id=\"{d.document_id}\">\n{d.content_text}\n</document>" for d in req.documents)
+    prompt = f"""
+You are a relevance scorer. Score each document against the domain (name, description, keywords).
+Return JSON: {{"scores": [{{"document_id": "id", "score": float 0-1, "reasoning": "brief"}}]}} with one entry per document.
+{_domain_block(req)}
+Documents:
+{documents}
+"""
+    try:
+        resp = _generate(model, prompt)
+        parsed = _safe_json_extract(resp.text or "")
+        by_id = {str(s.get("document_id")): s for s in (parsed or {}).get("scores", []) if isinstance(s, dict) and isinstance(s.get("score"), (int, float))}
+        scores = [
+            DocumentScore(document_id=d.document_id, relevance_score=float(by_id[d.document_id]["score"]), reasoning=by_id[d.document_id].get("reasoning", ""))
+            for d in req.documents
+            if d.document_id in by_id
+        ]
+        return BatchRelevanceResponse(status="success", scores=scores, error_detail=None).model_dump()
+    except Exception as exc:  # noqa: BLE001
+        return {"status": "error", "error_detail": f"LLM_SERVICE_ERROR: {exc}"}
+
+
 def tool_extract_facts_from_text(payload: ExtractFactsRequest | Dict[str, Any]) -> Dict[str, Any]:
     req = _ensure(ExtractFactsRequest, payload)
     if os.getenv("RUN_REAL_AI") != "1":
@@ -191,21 +314,19 @@ def tool_extract_facts_from_text(payload: ExtractFactsRequest | Dict[str, Any])
             error_detail=None,
         ).model_dump()
     try:
-        model = _configure_model("subagent_document_processor")
+        model, content = _document_model(req)
     except Exception as exc:  # noqa: BLE001
         return {"status": "error", "error_detail": f"LLM_AUTH_ERROR: {exc}"}
 
     prompt = f"""
 Extract atomic, verifiable facts relevant to the domain. Respond JSON: {{"facts":[{{"fact_id": "slug", "content": "fact", "justification": "why"}}]}}.
-Domain: {req.domain_name}
-Description: {req.domain_description}
-Keywords: {', '.join(req.domain_keywords)}
+{_domain_block(req, labels=("Domain", "Description", "Keywords"))}
 Relevance justification: {req.relevance_justification}
 Content:
-{req.content_text}
+{content}
 """
     try:
-        resp = model.generate_content(prompt)
+        resp = _generate(model, prompt)
         text, finish_reason = _extract_text_safely(resp)
         if not text:
             return {
@@ -227,37 +348,155 @@ Content:
 
 def tool_prettify_domain_description(payload: PrettifyRequest | Dict[str, Any]) -> Dict[str, Any]:
     req = _ensure(PrettifyRequest, payload)
+    previous = req.previous_draft
     if os.getenv("RUN_REAL_AI") != "1":
-        data = PrettifyData(
-            name="Mock Domain",
-            description=req.raw_input_text,
-            keywords=["mock"],
-        )
+        if previous is not None:
+            data = PrettifyData(name=previous.name, description=f"{previous.description} {req.raw_input_text}".strip(), keywords=previous.keywords)
+        else:
+            data = PrettifyData(
+                name="Mock Domain",
+                description=req.raw_input_text,
+                keywords=["mock"],
+            )
         return PrettifyResponse(status="SUCCESS", data=data, error_details=None).model_dump()
     try:
         model = _configure_model("subagent_domain_lifecycle")
     except Exception as exc:  # noqa: BLE001
         return {"status": "error", "error_details": f"LLM_AUTH_ERROR: {exc}"}
 
-    prompt = f"""
+    if previous is not None:
+        # Refine: only the edit instructions and the draft go out, not the whole conversation again.
+        prompt = f"""
+Revise this knowledge domain draft according to the edit instructions and return the full JSON:
+{{"name": "...", "description": "...", "keywords": ["..."]}}
+Current draft:
+{previous.model_dump_json()}
+Edit instructions:
+{req.raw_input_text}
+"""
+    else:
+        prompt = f"""
 Given a user's raw description of an interest area, produce JSON:
 {{"name": "...", "description": "...", "keywords": ["..."]}}
 Raw input:
 {req.raw_input_text}
 """
     try:
-        resp = model.generate_content(prompt)
+        resp = _generate(model, prompt)
         parsed = _safe_json_extract(resp.text or "")
+        fallback = previous or PrettifyData(name="Untitled Domain", description=req.raw_input_text, keywords=[])
         data = PrettifyData(
-            name=parsed.get("name", "Untitled Domain"),
-            description=parsed.get("description", req.raw_input_text),
-            keywords=parsed.get("keywords", []),
+            name=parsed.get("name", fallback.name),
+            description=parsed.get("description", fallback.description),
+            keywords=parsed.get("keywords", fallback.keywords),
         )
         return PrettifyResponse(status="SUCCESS", data=data, error_details=None).model_dump()
     except Exception as exc:  # noqa: BLE001
         return {"status": "error", "error_details": f"LLM_SERVICE_UNAVAILABLE: {exc}"}
 
 
+MOCK_SUPER_SUMMARY_WORDS = 20
+MOCK_EXTENDED_SUMMARY_CHARS = 2000
+
+
+def tool_merge_snapshot_summary(payload: SnapshotMergeRequest | Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Incremental merge step: previous summaries + one new fact -> updated summaries.
+    Prompt size is bounded by the summaries, not by the number of facts in the domain.
+    """
+    req = _ensure(SnapshotMergeRequest, payload)
+    if os.getenv("RUN_REAL_AI") != "1":
+        extended = f"{req.previous_extended_summary} {req.new_fact_text}".strip()
+        if len(extended) > MOCK_EXTENDED_SUMMARY_CHARS:
+            extended = extended[-MOCK_EXTENDED_SUMMARY_CHARS:]
+        super_summary = " ".join(req.new_fact_text.split()[:MOCK_SUPER_SUMMARY_WORDS])
+        return SnapshotMergeResponse(
+            status="success",
+            super_summary=super_summary,
+            extended_summary=extended,
+            error_detail=None,
+        ).model_dump()
+    try:
+        model = _configure_model("snapshot_generator")
+    except Exception as exc:  # noqa: BLE001
+        return {"status": "error", "error_detail": f"LLM_AUTH_ERROR: {exc}"}
+
+    prompt = f"""
+You maintain a rolling summary of a user's knowledge domain. Merge the new fact into the existing summaries.
+Respond JSON: {{"super_summary": "~20 words", "extended_summary": "one or two paragraphs"}}.
+Domain: {req.domain_name}
+Current super summary: {req.previous_super_summary or "(empty)"}
+Current extended summary: {req.previous_extended_summary or "(empty)"}
+New fact:
+{req.new_fact_text}
+"""
+    try:
+        resp = _generate(model, prompt)
+        text, finish_reason = _extract_text_safely(resp)
+        if not text:
+            return {"status": "error", "error_detail": f"LLM_GENERATION_FAILED: finish_reason={finish_reason}"}
+        parsed = _safe_json_extract(text)
+        if not parsed or not isinstance(parsed, dict):
+            return {"status": "error", "error_detail": "LLM_GENERATION_FAILED: unparseable summary"}
+        return SnapshotMergeResponse(
+            status="success",
+            super_summary=parsed.get("super_summary", req.previous_super_summary),
+            extended_summary=parsed.get("extended_summary", req.previous_extended_summary),
+            error_detail=None,
+        ).model_dump()
+    except Exception as exc:  # noqa: BLE001
+        return {"status": "error", "error_detail": f"LLM_SERVICE_ERROR: {exc}"}
+
+
+def tool_summarize_texts(payload: SummarizeTextsRequest | Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Map/reduce step for tree snapshots: `level="facts"` summarizes raw facts of one group,
+    `level="summaries"` summarizes lower-level summaries. Callers bound len(texts) per call.
+    """
+    req = _ensure(SummarizeTextsRequest, payload)
+    if os.getenv("RUN_REAL_AI") != "1":
+        extended = " ".join(t.strip() for t in req.texts if t.strip())
+        if len(extended) > MOCK_EXTENDED_SUMMARY_CHARS:
+            extended = extended[:MOCK_EXTENDED_SUMMARY_CHARS]
+        super_summary = " ".join(extended.split()[:MOCK_SUPER_SUMMARY_WORDS])
+        return SnapshotMergeResponse(
+            status="success",
+            super_summary=super_summary,
+            extended_summary=extended,
+            error_detail=None,
+        ).model_dump()
+    try:
+        model = _configure_model("snapshot_generator")
+    except Exception as exc:  # noqa: BLE001
+        return {"status": "error", "error_detail": f"LLM_AUTH_ERROR: {exc}"}
+
+    kind = "facts" if req.level == "facts" else "partial summaries of the same domain"
+    joined = "\n".join(f"- {t}" for t in req.texts)
+    prompt = f"""
+Summarize the following {kind} for a user's knowledge domain.
+Respond JSON: {{"super_summary": "~20 words", "extended_summary": "one or two paragraphs"}}.
+Domain: {req.domain_name}
+Items:
+{joined}
+"""
+    try:
+        resp = _generate(model, prompt)
+        text, finish_reason = _extract_text_safely(resp)
+        if not text:
+            return {"status": "error", "error_detail": f"LLM_GENERATION_FAILED: finish_reason={finish_reason}"}
+        parsed = _safe_json_extract(text)
+        if not parsed or not isinstance(parsed, dict):
+            return {"status": "error", "error_detail": "LLM_GENERATION_FAILED: unparseable summary"}
+        return SnapshotMergeResponse(
+            status="success",
+            super_summary=parsed.get("super_summary", ""),
+            extended_summary=parsed.get("extended_summary", ""),
+            error_detail=None,
+        ).model_dump()
+    except Exception as exc:  # noqa: BLE001
+        return {"status": "error", "error_detail": f"LLM_SERVICE_ERROR: {exc}"}
+
+
 def tool_extract_user_name(payload: NameExtractRequest | Dict[str, Any]) -> Dict[str, Any]:
     req = _ensure(NameExtractRequest, payload)
     prompts = load_prompts()
@@ -288,7 +527,7 @@ def tool_extract_user_name(payload: NameExtractRequest | Dict[str, Any]) -> Dict
 
     prompt = prompt_template.format(user_input=req.user_input)
     try:
-        resp = model.generate_content(prompt)
+        resp = _generate(model, prompt)
         text, finish_reason = _extract_text_safely(resp)
         if not text:
             return {
@@ -6,16 +6,18 @@ Auth tool (Firestore-backed): looks up user by username, creates if missing.
 Public API:
 - tool_auth_user(payload): validates username, queries Firestore `users`, creates if absent; returns status/data/error per spec.
 
-Usage: requires GOOGLE_APPLICATION_CREDENTIALS/GOOGLE_CLOUD_PROJECT and FIRESTORE_DATABASE. Obeys RUN_REAL modes implicitly (always real Firestore). Errors are returned in response; caller should handle AUTH failures gracefully. See docs/tool_auth_user.json for detailed schema.
+Usage: requires GOOGLE_APPLICATION_CREDENTIALS/GOOGLE_CLOUD_PROJECT and FIRESTORE_DATABASE. Obeys RUN_REAL modes implicitly (always real storage; Firestore or embedded SQLite per `storage.backend`). Errors are returned in response; caller should handle AUTH failures gracefully. See docs/tool_auth_user.json for detailed schema.
 """
 
 from typing import Any, Dict
 
-from google.cloud import firestore
 from google.cloud.firestore import Client
 from pydantic import BaseModel, Field
 
-from src.utils.config_loader import ConfigLoader
+from src.storage.client import get_client
+from src.tools.firestore_query import KEY_ONLY, stream_documents, track_reads
+from src.utils.deadline import timeout_kwargs
+from src.utils.scheduler import scheduled
 
 
 class AuthUserRequest(BaseModel):
@@ -38,10 +40,10 @@ def _ensure_request(payload: AuthUserRequest | Dict[str, Any]) -> AuthUserReques
 
 
 def _get_client() -> Client:
-    settings = ConfigLoader.instance().settings
-    return firestore.Client(database=settings.firestore_database or "(default)")
+    return get_client()
 
 
+@scheduled("storage")
 def tool_auth_user(payload: AuthUserRequest | Dict[str, Any]) -> Dict[str, Any]:
     """
     Real Firestore-backed auth: lookup by username, create if missing.
@@ -49,13 +51,9 @@ def tool_auth_user(payload: AuthUserRequest | Dict[str, Any]) -> Dict[str, Any]:
     req = _ensure_request(payload)
     client = _get_client()
     try:
-        query = (
-            client.collection("users")
-            .where("username", "==", req.username)
-            .limit(1)
-            .stream()
-        )
-        existing = next(query, None)
+        with track_reads("tool_auth_user"):
+            query = client.collection("users").where("username", "==", req.username).limit(1)
+            existing = next(stream_documents(query, fields=KEY_ONLY), None)
         if existing:
             return AuthUserResponse(
                 status="success",
@@ -67,7 +65,7 @@ def tool_auth_user(payload: AuthUserRequest | Dict[str, Any]) -> Dict[str, Any]:
 
     try:
         doc_ref = client.collection("users").document()
-        doc_ref.set({"username": req.username})
+        doc_ref.set({"username": req.username}, **timeout_kwargs("storage"))
         return AuthUserResponse(
             status="success",
             data=AuthUserData(user_id=doc_ref.id, is_new_user=True),
@@ -11,7 +11,7 @@ Public API:
 - tool_process_pdf_link(payload): download PDF, extract text.
 - tool_process_youtube_link(payload): fetch transcript text.
 
-Usage: networked; respects USER_AGENT; raises error statuses on HTTP/timeouts/empty content. No mock flag here—mock at caller/tests via monkeypatch. See docs/tool_process_* JSON specs. Beware site scraping policies and PDF size limits.
+Usage: networked; respects USER_AGENT; raises error statuses on HTTP/timeouts/empty content. Request timeouts come from the turn's remaining budget (src/utils/deadline.py, capped by deadlines.http_timeout_seconds); a PDF download stops between chunks once the budget is spent. No mock flag here—mock at caller/tests via monkeypatch. See docs/tool_process_* JSON specs. Beware site scraping policies and PDF size limits.
 """
 
 import re
@@ -25,7 +25,10 @@ from pydantic import BaseModel, Field, HttpUrl
 from pypdf import PdfReader
 from youtube_transcript_api import YouTubeTranscriptApi
 
+from src.utils.deadline import DeadlineExceeded, check, timeout_for
+
 USER_AGENT = "Mozilla/5.0 (compatible; ADKMock/1.0; +https://example.com)"
+DOWNLOAD_CHUNK_BYTES = 64 * 1024
 
 
 class UrlRequest(BaseModel):
@@ -62,11 +65,20 @@ def _ensure(model_cls, payload):
 
 
 def _http_get(url: str, stream: bool = False) -> requests.Response:
-    resp = requests.get(url, headers={"User-Agent": USER_AGENT}, timeout=10, stream=stream)
+    resp = requests.get(url, headers={"User-Agent": USER_AGENT}, timeout=timeout_for("http"), stream=stream)
     resp.raise_for_status()
     return resp
 
 
+def _read_body(resp: requests.Response) -> bytes:
+    # The request timeout bounds each socket read, not the whole body; check the budget between chunks.
+    chunks = []
+    for chunk in resp.iter_content(chunk_size=DOWNLOAD_CHUNK_BYTES):
+        check("pdf download")
+        chunks.append(chunk)
+    return b"".join(chunks)
+
+
 def _clean_html(html: str) -> tuple[str, str]:
     soup = BeautifulSoup(html, "html.parser")
     for tag in soup(["script", "style"]):
@@ -80,7 +92,7 @@ def tool_process_ordinary_page(payload: UrlRequest | Dict[str, Any]) -> Dict[str
     req = _ensure(UrlRequest, payload)
     try:
         resp = _http_get(str(req.url))
-    except requests.exceptions.Timeout:
+    except (requests.exceptions.Timeout, DeadlineExceeded):
         return OrdinaryPageResponse(status="error", content="", page_title="", error_detail="TIMEOUT").model_dump()
     except requests.HTTPError as exc:
         code = exc.response.status_code if exc.response else "UNKNOWN"
@@ -98,7 +110,7 @@ def tool_process_pdf_link(payload: UrlRequest | Dict[str, Any]) -> Dict[str, Any
     req = _ensure(UrlRequest, payload)
     try:
         resp = _http_get(str(req.url), stream=True)
-        content_bytes = resp.content
+        content_bytes = _read_body(resp)
         reader = PdfReader(BytesIO(content_bytes))
         text_parts = [page.extract_text() or "" for page in reader.pages]
         text = "\n".join(text_parts).strip()
@@ -106,7 +118,7 @@ def tool_process_pdf_link(payload: UrlRequest | Dict[str, Any]) -> Dict[str, Any
         if not text:
             return PdfResponse(status="error", content="", metadata=meta, error_detail="EMPTY_CONTENT").model_dump()
         return PdfResponse(status="success", content=text, metadata=meta, error_detail=None).model_dump()
-    except requests.exceptions.Timeout:
+    except (requests.exceptions.Timeout, DeadlineExceeded):
         return PdfResponse(status="error", content="", metadata=PdfMetadata(page_count=0), error_detail="DOWNLOAD_FAILED").model_dump()
     except requests.HTTPError as exc:
         code = exc.response.status_code if exc.response else "UNKNOWN"
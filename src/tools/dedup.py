@@ -0,0 +1,144 @@
+from __future__ import annotations
+
+"""
+Near-duplicate detection for facts:
+- Normalized-text hash for exact restatements, 64-bit SimHash for near-duplicates.
+- SimHash is split into bands stored on each fact document so candidates are found with one array-contains-any query.
+
+Public API:
+- normalize_fact_text(text), text_hash(text), simhash64(text), similarity(a, b), band_keys(simhash).
+- fingerprint(text): fields stored on a fact document (text_hash, simhash, simhash_bands).
+- find_duplicate(domain_query, text, threshold, min_tokens, transaction=None): best existing match among one domain's facts, or None.
+- find_duplicates(domain_query, texts, threshold, min_tokens, transaction=None): the same for many texts with batched lookups, in texts order.
+
+Usage: Used by src/tools/memory.py before writing a fact (inside the insert transaction) and when flagging discovery candidates. The fingerprint index is the per-domain set of fact documents themselves; threshold and minimum token count come from `dedup` in config/config.yaml.
+"""
+
+import hashlib
+import re
+import unicodedata
+from typing import Any, Dict, Iterator, List, Optional
+
+from src.tools.firestore_query import stream_documents
+
+# Only what a merge needs is downloaded for candidates.
+MATCH_FIELDS = ["simhash", "source_url", "sources", "duplicate_count"]
+SIMHASH_BITS = 64
+# 8 bands of 8 bits: any pair within 7 differing bits shares at least one band (pigeonhole),
+# so dedup.similarity_threshold may not go below 57/64 (MIN_DEDUP_SIMILARITY in config_loader).
+BAND_COUNT = 8
+# Firestore accepts at most 30 values in one "in" / "array-contains-any" filter.
+MAX_FILTER_VALUES = 30
+_TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+
+def normalize_fact_text(text: str) -> str:
+    text = unicodedata.normalize("NFKC", text or "").lower()
+    return " ".join(_TOKEN_RE.findall(text))
+
+
+def text_hash(text: str) -> str:
+    return hashlib.sha1(normalize_fact_text(text).encode("utf-8")).hexdigest()
+
+
+def _features(tokens: List[str]) -> List[str]:
+    # Unigrams plus bigrams keep word order from dominating while still catching reorderings.
+    return tokens + [f"{a} {b}" for a, b in zip(tokens, tokens[1:])]
+
+
+def simhash64(text: str) -> int:
+    tokens = normalize_fact_text(text).split()
+    weights = [0] * SIMHASH_BITS
+    for feature in _features(tokens):
+        h = int.from_bytes(hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest(), "big")
+        for bit in range(SIMHASH_BITS):
+            weights[bit] += 1 if (h >> bit) & 1 else -1
+    value = 0
+    for bit, weight in enumerate(weights):
+        if weight > 0:
+            value |= 1 << bit
+    return value
+
+
+def similarity(a: int, b: int) -> float:
+    return 1.0 - bin(a ^ b).count("1") / SIMHASH_BITS
+
+
+def band_keys(simhash: int) -> List[str]:
+    width = SIMHASH_BITS // BAND_COUNT
+    mask = (1 << width) - 1
+    return [f"{i}:{(simhash >> (i * width)) & mask:0{width // 4}x}" for i in range(BAND_COUNT)]
+
+
+def fingerprint(text: str) -> Dict[str, Any]:
+    value = simhash64(text)
+    # Stored as hex: Firestore integers are signed 64-bit.
+    return {"text_hash": text_hash(text), "simhash": f"{value:016x}", "simhash_bands": band_keys(value)}
+
+
+def _chunks(values: List[str]) -> Iterator[List[str]]:
+    for i in range(0, len(values), MAX_FILTER_VALUES):
+        yield values[i : i + MAX_FILTER_VALUES]
+
+
+def find_duplicate(
+    domain_query: Any,
+    text: str,
+    threshold: float,
+    min_tokens: int,
+    transaction: Any = None,
+) -> Optional[Dict[str, Any]]:
+    """
+    Return {"memory_id", "similarity", "data"} for the closest existing fact in the domain, or None.
+    domain_query is already scoped to one user's domain (see fact_store.domain_facts).
+    Exact normalized matches win; SimHash matches are only considered for texts with >= min_tokens tokens
+    because short texts collide too easily.
+    """
+    return find_duplicates(domain_query, [text], threshold, min_tokens, transaction=transaction)[0]
+
+
+def find_duplicates(
+    domain_query: Any,
+    texts: List[str],
+    threshold: float,
+    min_tokens: int,
+    transaction: Any = None,
+) -> List[Optional[Dict[str, Any]]]:
+    """
+    find_duplicate for several texts of one domain: exact hashes go in one "in" query and all band keys in one
+    array-contains-any query (per 30 values), instead of two queries per text. Candidates are scored against
+    every text, so a text may also match a fact found through another text's bands.
+    """
+    fps = [fingerprint(text) for text in texts]
+    exact: Dict[str, Any] = {}
+    for chunk in _chunks(list(dict.fromkeys(fp["text_hash"] for fp in fps))):
+        query = domain_query.where("text_hash", "in", chunk)
+        for doc in stream_documents(query, fields=MATCH_FIELDS + ["text_hash"], transaction=transaction):
+            exact.setdefault((doc.to_dict() or {}).get("text_hash"), doc)
+
+    near = [i for i, (text, fp) in enumerate(zip(texts, fps)) if fp["text_hash"] not in exact and len(normalize_fact_text(text).split()) >= min_tokens]
+    near_ids = set(near)
+    candidates: Dict[str, Dict[str, Any]] = {}
+    for chunk in _chunks(list(dict.fromkeys(band for i in near for band in fps[i]["simhash_bands"]))):
+        query = domain_query.where("simhash_bands", "array_contains_any", chunk)
+        for doc in stream_documents(query, fields=MATCH_FIELDS, transaction=transaction):
+            data = doc.to_dict() or {}
+            if data.get("simhash"):
+                candidates[doc.id] = data
+
+    matches: List[Optional[Dict[str, Any]]] = []
+    for i, fp in enumerate(fps):
+        doc = exact.get(fp["text_hash"])
+        if doc is not None:
+            data = {k: v for k, v in (doc.to_dict() or {}).items() if k != "text_hash"}
+            matches.append({"memory_id": doc.id, "similarity": 1.0, "data": data})
+            continue
+        best: Optional[Dict[str, Any]] = None
+        if i in near_ids:
+            value = int(fp["simhash"], 16)
+            for memory_id, data in candidates.items():
+                score = similarity(value, int(data["simhash"], 16))
+                if score >= threshold and (best is None or score > best["similarity"]):
+                    best = {"memory_id": memory_id, "similarity": score, "data": data}
+        matches.append(best)
+    return matches
@@ -0,0 +1,139 @@
+from __future__ import annotations
+
+"""
+Document contexts for multi-domain discovery:
+- Discovery checks one document against every active domain. Instead of uploading its content_text in every prompt, it opens a context for the document once; the per-domain relevance and extraction calls reference it by context_id, and the context is deleted when discovery finishes.
+- With RUN_REAL_AI=1 a context is a Gemini cached-content resource (google.generativeai.caching) for the document processor's model, with `context_cache.ttl_seconds` as the expiry if a delete is missed; otherwise a local stand-in keeps the text in process, so the flow is the same in tests.
+- A context is only opened when it can pay off: more than one call against the document and at least `context_cache.min_content_chars` of text (Gemini rejects caches under its minimum token count). If creation fails, calls send the content inline as before.
+
+Public API:
+- GeminiContextBackend / LocalContextBackend: create(text, model_id, ttl_seconds) -> handle with .name; delete(handle).
+- DocumentContextCache(config=None, backend=None): document(text, expected_calls) context manager yielding a context_id or None; cached_content(context_id) -> provider handle or None (local stand-in and unknown ids give None); content(context_id) -> text or None; stats().
+- get_context_cache(): process-wide cache from `context_cache:` config (env CONTEXT_CACHE_ENABLED).
+
+Usage: src/agents/subagent_document_processor.py opens one context per fetched document for the domain loop; src/tools/ai_analysis.py builds the model from the cached content and leaves the document out of the prompt. Contexts live in this process only; the backend is chosen when a context is opened.
+"""
+
+import os
+import threading
+import uuid
+from contextlib import contextmanager
+from datetime import timedelta
+from typing import Any, Dict, Iterator, Optional
+
+from src.utils.config_loader import load_context_cache_config, load_model_config
+from src.utils.logger import get_logger
+from src.utils.scheduler import slot
+
+logger = get_logger("document_context")
+_cache: Optional["DocumentContextCache"] = None
+_cache_lock = threading.Lock()
+
+
+class LocalContextBackend:
+    """Stand-in with the provider's lifecycle; nothing leaves the process."""
+
+    class Handle:
+        def __init__(self, name: str) -> None:
+            self.name = name
+
+    def create(self, text: str, model_id: str, ttl_seconds: float) -> "LocalContextBackend.Handle":
+        return self.Handle(f"local/{uuid.uuid4().hex[:12]}")
+
+    def delete(self, handle: Any) -> None:
+        return None
+
+
+class GeminiContextBackend:
+    def create(self, text: str, model_id: str, ttl_seconds: float) -> Any:
+        from google.generativeai import caching
+
+        # Creating a cache is a Gemini call like any other; it waits for an llm slot.
+        with slot("llm"):
+            return caching.CachedContent.create(model=model_id, contents=[text], ttl=timedelta(seconds=ttl_seconds))
+
+    def delete(self, handle: Any) -> None:
+        handle.delete()
+
+
+class _Context:
+    def __init__(self, handle: Any, text: str, backend: Any) -> None:
+        self.handle = handle
+        self.text = text
+        self.backend = backend
+
+
+class DocumentContextCache:
+    def __init__(self, config: Optional[Dict[str, Any]] = None, backend: Any = None) -> None:
+        self.cfg = config or load_context_cache_config()
+        self._backend = backend
+        self._lock = threading.Lock()
+        self._contexts: Dict[str, _Context] = {}
+        self.counts: Dict[str, int] = {"created": 0, "deleted": 0, "failed": 0, "uses": 0}
+
+    def _pick_backend(self) -> Any:
+        if self._backend is not None:
+            return self._backend
+        return GeminiContextBackend() if os.getenv("RUN_REAL_AI") == "1" else LocalContextBackend()
+
+    @contextmanager
+    def document(self, text: str, expected_calls: int) -> Iterator[Optional[str]]:
+        if not self.cfg["enabled"] or expected_calls < 2 or len(text) < int(self.cfg["min_content_chars"]):
+            yield None
+            return
+        backend = self._pick_backend()
+        model_id = load_model_config("subagent_document_processor")["model_id"]
+        try:
+            handle = backend.create(text, model_id, float(self.cfg["ttl_seconds"]))
+        except Exception as exc:  # noqa: BLE001
+            with self._lock:
+                self.counts["failed"] += 1
+            logger.error("CONTEXT_CREATE_FAILED", content_chars=len(text), error=str(exc))
+            yield None
+            return
+        context_id = uuid.uuid4().hex
+        with self._lock:
+            self._contexts[context_id] = _Context(handle, text, backend)
+            self.counts["created"] += 1
+        logger.info("CONTEXT_CREATED", context=handle.name, content_chars=len(text), expected_calls=expected_calls)
+        try:
+            yield context_id
+        finally:
+            with self._lock:
+                context = self._contexts.pop(context_id)
+            try:
+                context.backend.delete(context.handle)
+                with self._lock:
+                    self.counts["deleted"] += 1
+            except Exception as exc:  # noqa: BLE001
+                # The provider expires it after ttl_seconds anyway.
+                logger.error("CONTEXT_DELETE_FAILED", context=context.handle.name, error=str(exc))
+
+    def _use(self, context_id: Optional[str]) -> Optional[_Context]:
+        with self._lock:
+            context = self._contexts.get(context_id or "")
+            if context is not None:
+                self.counts["uses"] += 1
+            return context
+
+    def cached_content(self, context_id: Optional[str]) -> Any:
+        context = self._use(context_id)
+        if context is None or isinstance(context.backend, LocalContextBackend):
+            return None
+        return context.handle
+
+    def content(self, context_id: Optional[str]) -> Optional[str]:
+        context = self._use(context_id)
+        return context.text if context is not None else None
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"active": len(self._contexts), **self.counts}
+
+
+def get_context_cache() -> DocumentContextCache:
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = DocumentContextCache()
+        return _cache
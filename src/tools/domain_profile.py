@@ -0,0 +1,89 @@
+from __future__ import annotations
+
+"""
+Precomputed domain profiles:
+- Built once when a domain is saved and stored on the domain document ("profile"), so discovery does not rebuild them from raw fields for every document.
+- A profile holds normalized keywords, a keyword matcher pattern (one alternation, longest keyword first, word-bounded), a local hashing embedding of name + description + keywords, and a compact prompt fragment used in relevance/extraction prompts.
+- Domains saved before profiles existed (or with a stale version/embedding width) get one built on read and memoised by content.
+
+Public API:
+- PROFILE_VERSION: bumped when the profile layout changes; older stored profiles are rebuilt on read.
+- build_domain_profile(name, description, keywords) -> profile dict.
+- profile_for(domain) -> stored profile of a fetched domain (DETAILED view) or a memoised rebuild.
+- match_strength(profile, text, text_vector) -> (distinct keyword hits, cosine similarity) for ordering domains.
+
+Usage: src/agents/subagent_domain_lifecycle.py stores the profile on save; src/agents/subagent_document_processor.py passes profile["prompt_fragment"] as domain_prompt to src/tools/ai_analysis.py and checks domains in order of match_strength, so a turn deadline cuts the least likely ones. The embedding width follows `search.embedding_dim`.
+"""
+
+import re
+from functools import lru_cache
+from typing import Any, Dict, List, Tuple
+
+import numpy as np
+
+from src.tools.dedup import normalize_fact_text
+from src.tools.fact_index import embed_text
+from src.utils.config_loader import load_search_config
+
+PROFILE_VERSION = 1
+PROMPT_DESCRIPTION_CHARS = 400
+EMBEDDING_DECIMALS = 4
+
+
+def _normalized_keywords(keywords: List[str]) -> List[str]:
+    return list(dict.fromkeys(k for k in (normalize_fact_text(kw) for kw in keywords or []) if k))
+
+
+def _matcher_pattern(keywords: List[str]) -> str:
+    # Longest first so "machine learning" wins over "machine" at the same position.
+    alternation = "|".join(re.escape(k).replace(r"\ ", r"\s+") for k in sorted(keywords, key=len, reverse=True))
+    return rf"\b(?:{alternation})\b" if alternation else ""
+
+
+def _prompt_fragment(name: str, description: str, keywords: List[str]) -> str:
+    description = " ".join((description or "").split())
+    if len(description) > PROMPT_DESCRIPTION_CHARS:
+        description = description[:PROMPT_DESCRIPTION_CHARS].rsplit(" ", 1)[0] + "…"
+    lines = [f"Domain: {name}"]
+    if description:
+        lines.append(f"Scope: {description}")
+    if keywords:
+        lines.append(f"Keywords: {', '.join(keywords)}")
+    return "\n".join(lines)
+
+
+def build_domain_profile(name: str, description: str, keywords: List[str]) -> Dict[str, Any]:
+    normalized = _normalized_keywords(keywords)
+    dim = int(load_search_config()["embedding_dim"])
+    vector = embed_text(" ".join([name or "", description or "", *normalized]), dim)
+    return {
+        "version": PROFILE_VERSION,
+        "keywords": normalized,
+        "matcher": _matcher_pattern(normalized),
+        "embedding": [round(float(v), EMBEDDING_DECIMALS) for v in vector],
+        "prompt_fragment": _prompt_fragment(name, description, normalized),
+    }
+
+
+@lru_cache(maxsize=1024)
+def _rebuilt(name: str, description: str, keywords: Tuple[str, ...]) -> Dict[str, Any]:
+    return build_domain_profile(name, description, list(keywords))
+
+
+def profile_for(domain: Dict[str, Any]) -> Dict[str, Any]:
+    profile = domain.get("profile")
+    dim = int(load_search_config()["embedding_dim"])
+    if profile and profile.get("version") == PROFILE_VERSION and len(profile.get("embedding") or []) == dim:
+        return profile
+    return _rebuilt(domain.get("name") or "", domain.get("domain_description") or "", tuple(domain.get("domain_keywords") or []))
+
+
+@lru_cache(maxsize=1024)
+def _compiled(pattern: str) -> re.Pattern:
+    return re.compile(pattern, re.IGNORECASE)
+
+
+def match_strength(profile: Dict[str, Any], text: str, text_vector: np.ndarray) -> Tuple[int, float]:
+    hits = len({" ".join(m.lower().split()) for m in _compiled(profile["matcher"]).findall(text)}) if profile["matcher"] else 0
+    similarity = float(np.asarray(profile["embedding"], dtype=np.float32) @ text_vector)
+    return hits, similarity
@@ -3,38 +3,57 @@ from __future__ import annotations
 """
 Domain tools:
 - Fetch/toggle domains from Firestore.
-- Generate/export snapshots (mocked).
+- Generate snapshots from the per-domain snapshot state (rolling or tree-reduce) and stream detailed exports to gzip objects; both mocked unless RUN_REAL_MEMORY=1.
+- Real snapshots/exports are cached against the domain's version counter (src/tools/result_cache.py); a repeat request costs one masked read.
 - Prettify domain description (delegates to AI).
 
 Public API:
-- tool_fetch_user_knowledge_domains(payload): list domains with filters.
+- tool_fetch_user_knowledge_domains(payload): list domains with filters; field mask per view_mode, optional paging/counts.
 - tool_toggle_domain_status(payload): flip active/inactive for a domain.
-- tool_generate_domain_snapshot(payload): mocked summary.
-- tool_export_detailed_domain_snapshot(payload): mocked export link.
+- tool_bulk_toggle_domain_status(payload): flip or set the status of several domains in one transaction (all-or-nothing ownership check).
+- tool_generate_domain_snapshot(payload): single read of the snapshot document; tree mode re-summarizes dirty branches first. In tree mode a stale cached copy is served (data.stale) while the refresh runs in the background.
+- tool_export_detailed_domain_snapshot(payload): paginated, resumable gzip export (Markdown/NDJSON/CSV); reused while the domain version is unchanged.
 - tool_prettify_domain_description(payload): delegates to AI prettify.
 
-Usage: Firestore-backed reads/writes; requires GCP creds/project/FIRESTORE_DATABASE. Prettify relies on ai_analysis (Gemini) or mock via RUN_REAL_AI flag. Snapshot/export remain mocked. See docs/tool_* JSON specs and README for flags (`RUN_REAL_DOMAINS` controls save in lifecycle agent, not here).
+Usage: Firestore-backed reads/writes (or embedded SQLite with `storage.backend: sqlite`, see src/storage/client.py); requires GCP creds/project/FIRESTORE_DATABASE for Firestore. Prettify relies on ai_analysis (Gemini) or mock via RUN_REAL_AI flag. Snapshots are maintained incrementally on fact save (see src/tools/snapshots.py); export streams to a gzip object (mocked unless RUN_REAL_MEMORY=1). See docs/tool_* JSON specs and README for flags (`RUN_REAL_DOMAINS` controls save in lifecycle agent, not here).
 """
 
+import os
 from typing import Any, Dict, List, Optional
 
 from google.cloud import firestore
 from google.cloud.firestore import Client
 from pydantic import BaseModel, Field, field_validator
 
-from src.utils.config_loader import ConfigLoader
+from src.storage.client import get_client, run_transaction
 from src.tools import ai_analysis
+from src.tools.firestore_query import (
+    count_documents,
+    fetch_page,
+    get_document,
+    get_documents,
+    stream_documents,
+    track_reads,
+)
+from src.tools.export import EXPORT_FORMATS, ExportError, run_domain_export
+from src.tools.export_store import get_export_store
+from src.tools.result_cache import export_cache, read_domain_version, snapshot_cache
+from src.tools.snapshots import read_snapshot_state, refresh_tree_snapshot
+from src.utils.config_loader import load_snapshot_config
+from src.utils.scheduler import scheduled, slot
 
 
 def _client() -> Client:
-    settings = ConfigLoader.instance().settings
-    return firestore.Client(database=settings.firestore_database or "(default)")
+    return get_client()
 
 
 class FetchDomainsRequest(BaseModel):
     user_id: str
     status_filter: str = Field(default="ALL")
     view_mode: str = Field(default="BRIEF")
+    page_size: Optional[int] = Field(default=None, ge=1, le=1000)
+    page_token: Optional[str] = None
+    include_counts: bool = False
 
     @field_validator("status_filter")
     @classmethod
@@ -59,11 +78,14 @@ class Domain(BaseModel):
     status: str
     domain_description: Optional[str] = None
     domain_keywords: Optional[List[str]] = None
+    profile: Optional[Dict[str, Any]] = None
 
 
 class FetchDomainsResponse(BaseModel):
     status: str
     data: List[Domain]
+    next_page_token: Optional[str] = None
+    total_count: Optional[int] = None
 
 
 class ToggleDomainRequest(BaseModel):
@@ -82,6 +104,37 @@ class ToggleDomainResponse(BaseModel):
     data: ToggleDomainData
 
 
+MAX_BULK_TOGGLE = 500  # Firestore limit on writes per transaction
+
+
+class BulkToggleRequest(BaseModel):
+    user_id: str
+    domain_ids: List[str] = Field(min_length=1, max_length=MAX_BULK_TOGGLE)
+    target_status: Optional[str] = None
+
+    @field_validator("domain_ids")
+    @classmethod
+    def unique_ids(cls, v: List[str]) -> List[str]:
+        return list(dict.fromkeys(v))
+
+    @field_validator("target_status")
+    @classmethod
+    def validate_target_status(cls, v: Optional[str]) -> Optional[str]:
+        if v is not None and v not in {"active", "inactive"}:
+            raise ValueError("target_status must be active or inactive (omit to flip each domain)")
+        return v
+
+
+class BulkToggleData(BaseModel):
+    results: List[ToggleDomainData]
+    changed_count: int
+
+
+class BulkToggleResponse(BaseModel):
+    status: str = "success"
+    data: BulkToggleData
+
+
 class GenerateSnapshotRequest(BaseModel):
     user_id: str
     domain_id: str
@@ -99,6 +152,8 @@ class SnapshotData(BaseModel):
     super_summary: str
     extended_summary: str
     meta_info: SnapshotMeta
+    version: Optional[int] = None
+    stale: bool = False
 
 
 class GenerateSnapshotResponse(BaseModel):
@@ -109,6 +164,15 @@ class GenerateSnapshotResponse(BaseModel):
 class ExportSnapshotRequest(BaseModel):
     user_id: str
     domain_id: str
+    file_format: str = Field(default="markdown")
+    export_id: Optional[str] = None
+
+    @field_validator("file_format")
+    @classmethod
+    def validate_file_format(cls, v: str) -> str:
+        if v not in EXPORT_FORMATS:
+            raise ValueError("file_format must be one of markdown, ndjson, csv")
+        return v
 
 
 class ExportSnapshotData(BaseModel):
@@ -116,6 +180,10 @@ class ExportSnapshotData(BaseModel):
     download_url: str
     file_size_bytes: int
     file_format: str = "markdown"
+    export_id: Optional[str] = None
+    fact_count: Optional[int] = None
+    version: Optional[int] = None
+    stale: bool = False
 
 
 class ExportSnapshotResponse(BaseModel):
@@ -125,6 +193,7 @@ class ExportSnapshotResponse(BaseModel):
 
 class PrettifyDomainRequest(BaseModel):
     raw_input_text: str
+    previous_draft: Dict[str, Any] | None = None
 
     @field_validator("raw_input_text")
     @classmethod
@@ -134,6 +203,13 @@ class PrettifyDomainRequest(BaseModel):
         return v
 
 
+# Field masks per view: BRIEF never downloads descriptions/keywords.
+DOMAIN_VIEW_FIELDS = {
+    "BRIEF": ["name", "status"],
+    "DETAILED": ["name", "status", "domain_description", "domain_keywords", "profile"],
+}
+
+
 def _ensure(model_cls, payload):
     return payload if isinstance(payload, model_cls) else model_cls(**payload)
 
@@ -146,62 +222,123 @@ def _doc_to_domain(doc) -> Domain:
         status=data.get("status", "inactive"),
         domain_description=data.get("domain_description"),
         domain_keywords=data.get("domain_keywords"),
+        profile=data.get("profile"),
     )
 
 
+@scheduled("storage")
 def tool_fetch_user_knowledge_domains(payload: FetchDomainsRequest | Dict[str, Any]) -> Dict[str, Any]:
     req = _ensure(FetchDomainsRequest, payload)
     client = _client()
+    fields = DOMAIN_VIEW_FIELDS[req.view_mode]
     try:
-        query = client.collection("domains").where("user_id", "==", req.user_id)
-        if req.status_filter != "ALL":
-            query = query.where("status", "==", req.status_filter.lower())
-        docs = list(query.stream())
+        with track_reads("tool_fetch_user_knowledge_domains"):
+            domains_ref = client.collection("domains")
+            query = domains_ref.where("user_id", "==", req.user_id)
+            if req.status_filter != "ALL":
+                query = query.where("status", "==", req.status_filter.lower())
+            next_token = None
+            if req.page_size:
+                cursor = get_document(domains_ref.document(req.page_token), fields=["user_id"]) if req.page_token else None
+                docs, next_cursor = fetch_page(query, fields=fields, page_size=req.page_size, start_after=cursor)
+                next_token = next_cursor.id if next_cursor is not None else None
+            else:
+                docs = list(stream_documents(query, fields=fields))
+            total = count_documents(query) if req.include_counts else None
         if not docs:
-            return FetchDomainsResponse(status="empty", data=[]).model_dump()
+            return FetchDomainsResponse(status="empty", data=[], total_count=total).model_dump()
         domains = [_doc_to_domain(doc) for doc in docs]
-        if req.view_mode == "BRIEF":
-            domains = [
-                Domain(domain_id=d.domain_id, name=d.name, status=d.status)  # type: ignore[arg-type]
-                for d in domains
-            ]
-        return FetchDomainsResponse(status="success", data=domains).model_dump()
+        return FetchDomainsResponse(
+            status="success", data=domains, next_page_token=next_token, total_count=total
+        ).model_dump()
     except Exception as exc:  # noqa: BLE001
         return {"status": "error", "error": f"FIRESTORE_UNAVAILABLE: {exc}"}
 
 
+class _ToggleRejected(Exception):
+    def __init__(self, code: str, domain_id: str) -> None:
+        super().__init__(code)
+        self.code = code
+        self.domain_id = domain_id
+
+
+def _toggle_domains(client: Client, user_id: str, domain_ids: List[str], target_status: Optional[str]) -> List[ToggleDomainData]:
+    """
+    Read all domains and write the changed ones inside one transaction, so concurrent toggles cannot
+    interleave between the read and the write. Raises _ToggleRejected (nothing written) on a missing or foreign domain.
+    """
+    refs = [client.collection("domains").document(domain_id) for domain_id in domain_ids]
+
+    def apply(transaction: Any) -> List[ToggleDomainData]:
+        results = []
+        for ref, snap in zip(refs, get_documents(client, refs, fields=["user_id", "status"], transaction=transaction)):
+            if not snap.exists:
+                raise _ToggleRejected("DOMAIN_NOT_FOUND", ref.id)
+            data = snap.to_dict() or {}
+            if data.get("user_id") != user_id:
+                raise _ToggleRejected("PERMISSION_DENIED", ref.id)
+            previous = data.get("status", "inactive")
+            new_status = target_status or ("inactive" if previous == "active" else "active")
+            if new_status != previous:
+                transaction.update(ref, {"status": new_status, "version": firestore.Increment(1)})
+            results.append(ToggleDomainData(domain_id=ref.id, previous_status=previous, new_status=new_status))
+        return results
+
+    return run_transaction(client, apply)
+
+
+@scheduled("storage")
 def tool_toggle_domain_status(payload: ToggleDomainRequest | Dict[str, Any]) -> Dict[str, Any]:
     req = _ensure(ToggleDomainRequest, payload)
-    client = _client()
-    doc_ref = client.collection("domains").document(req.domain_id)
     try:
-        snapshot = doc_ref.get()
-        if not snapshot.exists:
-            return {"status": "error", "error": "DOMAIN_NOT_FOUND"}
-        data = snapshot.to_dict() or {}
-        if data.get("user_id") != req.user_id:
-            return {"status": "error", "error": "PERMISSION_DENIED"}
-        previous = data.get("status", "inactive")
-        new_status = "inactive" if previous == "active" else "active"
-        doc_ref.update({"status": new_status})
-        return ToggleDomainResponse(
-            status="success",
-            data=ToggleDomainData(domain_id=req.domain_id, previous_status=previous, new_status=new_status),
-        ).model_dump()
+        with track_reads("tool_toggle_domain_status"):
+            (result,) = _toggle_domains(_client(), req.user_id, [req.domain_id], None)
+        return ToggleDomainResponse(status="success", data=result).model_dump()
+    except _ToggleRejected as exc:
+        return {"status": "error", "error": exc.code}
+    except Exception as exc:  # noqa: BLE001
+        return {"status": "error", "error": f"FIRESTORE_UNAVAILABLE: {exc}"}
+
+
+@scheduled("storage")
+def tool_bulk_toggle_domain_status(payload: BulkToggleRequest | Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Set (target_status) or flip (no target) the status of every listed domain in one transaction.
+    Domains already at the target are reported but not written. Any missing or foreign domain rejects the whole request.
+    """
+    req = _ensure(BulkToggleRequest, payload)
+    try:
+        with track_reads("tool_bulk_toggle_domain_status"):
+            results = _toggle_domains(_client(), req.user_id, req.domain_ids, req.target_status)
+    except _ToggleRejected as exc:
+        return {"status": "error", "error": exc.code, "domain_id": exc.domain_id}
     except Exception as exc:  # noqa: BLE001
         return {"status": "error", "error": f"FIRESTORE_UNAVAILABLE: {exc}"}
+    changed = sum(1 for r in results if r.previous_status != r.new_status)
+    return BulkToggleResponse(status="success", data=BulkToggleData(results=results, changed_count=changed)).model_dump()
 
 
+@scheduled(None, priority="snapshot")
 def tool_generate_domain_snapshot(payload: GenerateSnapshotRequest | Dict[str, Any]) -> Dict[str, Any]:
     """
-    Snapshot still mocked; Firestore lookup for domain name.
+    Real path (RUN_REAL_MEMORY=1) returns the rolling snapshot state, cached per domain version.
+    Mock path keeps the canned summary; Firestore lookup for domain name only.
     """
     req = _ensure(GenerateSnapshotRequest, payload)
     client = _client()
+    if os.getenv("RUN_REAL_MEMORY") == "1":
+        return _cached_result(
+            client, req, "tool_generate_domain_snapshot", snapshot_cache, (req.user_id, req.domain_id),
+            lambda: _read_rolling_snapshot(client, req),
+            # Rolling snapshots are rebuilt by the save itself; only tree re-summarization is worth deferring.
+            serve_stale=load_snapshot_config()["mode"] == "tree",
+        )
+
     doc_ref = client.collection("domains").document(req.domain_id)
     domain_name = "Domain"
     try:
-        snap = doc_ref.get()
+        with track_reads("tool_generate_domain_snapshot"), slot("storage"):
+            snap = get_document(doc_ref, fields=["name"])
         if snap.exists:
             domain_name = snap.to_dict().get("name", domain_name)
     except Exception:
@@ -216,17 +353,122 @@ def tool_generate_domain_snapshot(payload: GenerateSnapshotRequest | Dict[str, A
     return GenerateSnapshotResponse(status="success", data=data).model_dump()
 
 
+class _Uncacheable(Exception):
+    def __init__(self, result: Dict[str, Any]) -> None:
+        super().__init__(result.get("error"))
+        self.result = result
+
+
+def _cached_result(
+    client: Client, req: Any, label: str, cache: Any, key: tuple, compute: Any, serve_stale: bool = True
+) -> Dict[str, Any]:
+    """
+    Serve a tool result from `cache` when the domain version is unchanged. The version read doubles as the
+    ownership check; domains without a document (legacy data) skip the cache. Error results are never cached.
+    """
+    try:
+        with track_reads(label), slot("storage"):
+            exists, owner, version = read_domain_version(client, req.domain_id)
+    except Exception as exc:  # noqa: BLE001
+        return {"status": "error", "error": f"FIRESTORE_UNAVAILABLE: {exc}"}
+    if not exists:
+        return compute()
+    if owner != req.user_id:
+        return {"status": "error", "error": "PERMISSION_DENIED"}
+
+    def versioned() -> Dict[str, Any]:
+        result = compute()
+        if result.get("status") not in ("success", "empty"):
+            raise _Uncacheable(result)
+        return {**result, "data": {**result["data"], "version": version}}
+
+    try:
+        result, state = cache.get(key, version, versioned, serve_stale=serve_stale)
+    except _Uncacheable as exc:
+        return exc.result
+    return {**result, "data": {**result["data"], "stale": state == "stale"}}
+
+
+def _read_rolling_snapshot(client: Client, req: GenerateSnapshotRequest) -> Dict[str, Any]:
+    try:
+        with track_reads("tool_generate_domain_snapshot"), slot("storage"):
+            state = read_snapshot_state(client, req.domain_id)
+    except Exception as exc:  # noqa: BLE001
+        return {"status": "error", "error": f"FIRESTORE_UNAVAILABLE: {exc}"}
+    if state is None:
+        data = SnapshotData(
+            domain_id=req.domain_id,
+            domain_name="Domain",
+            super_summary="No facts saved for this domain yet.",
+            extended_summary="",
+            meta_info=SnapshotMeta(fact_count=0, total_char_length=0, source_count=0),
+        )
+        return GenerateSnapshotResponse(status="empty", data=data).model_dump()
+    if state.get("user_id") != req.user_id:
+        return {"status": "error", "error": "PERMISSION_DENIED"}
+    if state.get("tree_dirty"):
+        # No slot held here: the refresh takes storage slots per read/write and llm slots per summary.
+        try:
+            with track_reads("refresh_tree_snapshot"):
+                state = refresh_tree_snapshot(client, req.domain_id, state)
+        except Exception as exc:  # noqa: BLE001
+            return {"status": "error", "error": f"SNAPSHOT_REFRESH_FAILED: {exc}"}
+    data = SnapshotData(
+        domain_id=req.domain_id,
+        domain_name=state.get("domain_name", "Domain"),
+        super_summary=state.get("super_summary", ""),
+        extended_summary=state.get("extended_summary", ""),
+        meta_info=SnapshotMeta(
+            fact_count=state.get("fact_count", 0),
+            total_char_length=state.get("total_char_length", 0),
+            source_count=state.get("source_count", 0),
+        ),
+    )
+    return GenerateSnapshotResponse(status="success", data=data).model_dump()
+
+
+@scheduled(None, priority="snapshot")
 def tool_export_detailed_domain_snapshot(payload: ExportSnapshotRequest | Dict[str, Any]) -> Dict[str, Any]:
     """
-    Still mocked; would require storage + memory bank in later phases.
+    Real path (RUN_REAL_MEMORY=1) streams the domain's facts page by page into a gzip object on the
+    configured export store; pass export_id to resume an interrupted export. New exports are reused per
+    (domain version, format). Mock path returns a canned link.
     """
     req = _ensure(ExportSnapshotRequest, payload)
-    data = ExportSnapshotData(
-        domain_id=req.domain_id,
-        download_url="https://mock-bucket.s3.mock/exports/domain_report.md",
-        file_size_bytes=2048,
-        file_format="markdown",
+    if os.getenv("RUN_REAL_MEMORY") != "1":
+        data = ExportSnapshotData(
+            domain_id=req.domain_id,
+            download_url="https://mock-bucket.s3.mock/exports/domain_report.md",
+            file_size_bytes=2048,
+            file_format="markdown",
+        )
+        return ExportSnapshotResponse(status="success", data=data).model_dump()
+
+    client = _client()
+    if req.export_id:
+        return _run_export(client, req)
+    return _cached_result(
+        client, req, "tool_export_detailed_domain_snapshot", export_cache, (req.user_id, req.domain_id, req.file_format),
+        lambda: _run_export(client, req),
     )
+
+
+def _run_export(client: Client, req: ExportSnapshotRequest) -> Dict[str, Any]:
+    try:
+        with track_reads("tool_export_detailed_domain_snapshot"):
+            result = run_domain_export(
+                client,
+                get_export_store(),
+                req.user_id,
+                req.domain_id,
+                file_format=req.file_format,
+                export_id=req.export_id,
+            )
+    except ExportError as exc:
+        return {"status": "error", "error": exc.code, "export_id": exc.export_id}
+    except Exception as exc:  # noqa: BLE001
+        return {"status": "error", "error": f"EXPORT_FAILED: {exc}"}
+    data = ExportSnapshotData(domain_id=req.domain_id, **result)
     return ExportSnapshotResponse(status="success", data=data).model_dump()
 
 
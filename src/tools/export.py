@@ -0,0 +1,223 @@
+from __future__ import annotations
+
+"""
+Streaming domain export:
+- Pages through a domain's facts with Firestore cursors and streams Markdown, NDJSON or CSV into gzip parts on an ExportStore.
+- Memory stays bounded by one page; progress is checkpointed per part so an interrupted export resumes from its export_id.
+
+Public API:
+- run_domain_export(client, store, user_id, domain_id, file_format="markdown", export_id=None): returns export result dict.
+- EXPORT_FORMATS: supported file formats.
+
+Usage: Called by tool_export_detailed_domain_snapshot on the real path (RUN_REAL_MEMORY=1). Job state lives in EXPORT_COLLECTION_NAME (default domain_exports); facts are read via fact_store.domain_facts ordered by created_at (the flat layout needs the domain_id/user_id/created_at composite index; the sharded layout does not). Page and part sizes come from `export` in config/config.yaml. Each Firestore read/write takes its own storage slot, so a long export does not pin one.
+"""
+
+import csv
+import gzip
+import io
+import json
+import os
+import uuid
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterator, List, Optional
+
+from google.cloud import firestore
+from google.cloud.firestore import Client
+
+from src.tools.export_store import ExportStore
+from src.tools.fact_store import domain_facts
+from src.tools.firestore_query import fetch_page, get_document
+from src.utils.config_loader import load_export_config
+from src.utils.scheduler import slot
+
+EXPORT_FORMATS = {"markdown": "md", "ndjson": "ndjson", "csv": "csv"}
+CSV_COLUMNS = ["memory_id", "fact_text", "source_url", "created_at"]
+FACT_EXPORT_FIELDS = ["fact_text", "source_url", "sources", "created_at"]
+
+
+class ExportError(Exception):
+    def __init__(self, code: str, export_id: Optional[str] = None) -> None:
+        super().__init__(code)
+        self.code = code
+        self.export_id = export_id
+
+
+def _export_collection_name() -> str:
+    return os.getenv("EXPORT_COLLECTION_NAME", "domain_exports")
+
+
+def _fmt_ts(value: Any) -> str:
+    return value.isoformat() if hasattr(value, "isoformat") else str(value or "")
+
+
+def _fact_row(doc) -> Dict[str, str]:
+    data = doc.to_dict() or {}
+    return {
+        "memory_id": doc.id,
+        "fact_text": data.get("fact_text", ""),
+        # Deduplicated facts carry every source they were seen in.
+        "source_url": "; ".join(data.get("sources") or [data.get("source_url", "")]),
+        "created_at": _fmt_ts(data.get("created_at")),
+    }
+
+
+class _Formatter:
+    def __init__(self, file_format: str, out: io.TextIOWrapper) -> None:
+        self.file_format = file_format
+        self.out = out
+        self._csv = csv.DictWriter(out, fieldnames=CSV_COLUMNS) if file_format == "csv" else None
+
+    def header(self, domain_id: str, domain_name: str) -> None:
+        if self.file_format == "markdown":
+            exported_at = datetime.now(timezone.utc).isoformat()
+            self.out.write(f"# {domain_name}\n\n- Domain ID: {domain_id}\n- Exported at: {exported_at}\n\n## Facts\n\n")
+        elif self._csv:
+            self._csv.writeheader()
+
+    def row(self, row: Dict[str, str]) -> None:
+        if self.file_format == "markdown":
+            self.out.write(f"- {row['fact_text']}\n  - Source: {row['source_url']}\n  - Saved: {row['created_at']}\n")
+        elif self.file_format == "ndjson":
+            self.out.write(json.dumps(row, ensure_ascii=False) + "\n")
+        else:
+            self._csv.writerow(row)
+
+    def footer(self, total: int) -> None:
+        if self.file_format == "markdown":
+            self.out.write(f"\n---\nTotal facts: {total}\n")
+
+
+def _pages(client: Client, user_id: str, domain_id: str, cursor_id: Optional[str], page_size: int) -> Iterator[List[Any]]:
+    facts, base = domain_facts(client, user_id, domain_id)
+    with slot("storage"):
+        cursor = get_document(facts.document(cursor_id), fields=["created_at"]) if cursor_id else None
+    while True:
+        # One storage slot per page, released while the page is formatted and written out.
+        with slot("storage"):
+            page, cursor = fetch_page(base, fields=FACT_EXPORT_FIELDS, page_size=page_size, start_after=cursor, order_by="created_at")
+        yield page
+        if cursor is None:
+            return
+
+
+def _load_or_create_job(
+    jobs, user_id: str, domain_id: str, file_format: str, export_id: Optional[str]
+) -> tuple[Any, Dict[str, Any]]:
+    if export_id:
+        job_ref = jobs.document(export_id)
+        snap = get_document(job_ref)
+        if not snap.exists:
+            raise ExportError("EXPORT_NOT_FOUND")
+        job = snap.to_dict() or {}
+        if job.get("user_id") != user_id or job.get("domain_id") != domain_id:
+            raise ExportError("PERMISSION_DENIED")
+        return job_ref, job
+    export_id = uuid.uuid4().hex
+    job = {
+        "export_id": export_id,
+        "user_id": user_id,
+        "domain_id": domain_id,
+        "file_format": file_format,
+        "object_key": f"{user_id}/{domain_id}/{export_id}.{EXPORT_FORMATS[file_format]}.gz",
+        "status": "running",
+        "parts_committed": 0,
+        "cursor_id": None,
+        "rows_written": 0,
+        "created_at": firestore.SERVER_TIMESTAMP,
+    }
+    job_ref = jobs.document(export_id)
+    job_ref.set(job)
+    return job_ref, job
+
+
+def run_domain_export(
+    client: Client,
+    store: ExportStore,
+    user_id: str,
+    domain_id: str,
+    file_format: str = "markdown",
+    export_id: Optional[str] = None,
+) -> Dict[str, Any]:
+    """
+    Stream all facts of a domain into a gzip object and return
+    {export_id, download_url, file_size_bytes, file_format, fact_count}.
+    Raises ExportError for ownership/format problems; interrupted runs raise ExportError carrying
+    the export_id, which can be passed back to resume from the last committed part.
+    """
+    if file_format not in EXPORT_FORMATS:
+        raise ExportError("UNSUPPORTED_FORMAT")
+    cfg = load_export_config()
+    page_size = int(cfg["page_size"])
+    pages_per_part = int(cfg["pages_per_part"])
+
+    with slot("storage"):
+        job_ref, job = _load_or_create_job(client.collection(_export_collection_name()), user_id, domain_id, file_format, export_id)
+    file_format = job["file_format"]
+    key = job["object_key"]
+    if job.get("status") != "complete":
+        try:
+            with slot("storage"):
+                domain_snap = get_document(client.collection("domains").document(domain_id), fields=["name"])
+            domain_name = (domain_snap.to_dict() or {}).get("name", domain_id) if domain_snap.exists else domain_id
+            part_no = int(job.get("parts_committed", 0))
+            rows = int(job.get("rows_written", 0))
+            store.delete_parts_from(key, part_no)
+
+            pages = _pages(client, user_id, domain_id, job.get("cursor_id"), page_size)
+            finished = False
+            while not finished:
+                part = store.open_part(key, part_no)
+                gz = gzip.GzipFile(fileobj=part, mode="wb")
+                out = io.TextIOWrapper(gz, encoding="utf-8", newline="")
+                fmt = _Formatter(file_format, out)
+                if part_no == 0:
+                    fmt.header(domain_id, domain_name)
+                cursor_id = job.get("cursor_id")
+                for _ in range(pages_per_part):
+                    page = next(pages, [])
+                    for doc in page:
+                        fmt.row(_fact_row(doc))
+                    rows += len(page)
+                    if page:
+                        cursor_id = page[-1].id
+                    if len(page) < page_size:
+                        finished = True
+                        fmt.footer(rows)
+                        break
+                out.close()  # flushes text and closes the gzip member; part stays open
+                part.close()
+                part_no += 1
+                job.update({"parts_committed": part_no, "cursor_id": cursor_id, "rows_written": rows})
+                with slot("storage"):
+                    job_ref.update({"parts_committed": part_no, "cursor_id": cursor_id, "rows_written": rows})
+
+            store.finalize(key, part_no)
+            job.update(
+                {
+                    "status": "complete",
+                    "file_size_bytes": store.size(key),
+                    "download_url": store.url(key),
+                }
+            )
+            with slot("storage"):
+                job_ref.update(
+                    {
+                        "status": "complete",
+                        "file_size_bytes": job["file_size_bytes"],
+                        "download_url": job["download_url"],
+                        "completed_at": firestore.SERVER_TIMESTAMP,
+                    }
+                )
+        except ExportError:
+            raise
+        except Exception as exc:  # noqa: BLE001
+            with slot("storage"):
+                job_ref.update({"status": "interrupted", "error": str(exc)})
+            raise ExportError(f"EXPORT_INTERRUPTED: {exc}", export_id=job["export_id"]) from exc
+    return {
+        "export_id": job["export_id"],
+        "download_url": job["download_url"],
+        "file_size_bytes": job["file_size_bytes"],
+        "file_format": file_format,
+        "fact_count": job["rows_written"],
+    }
@@ -0,0 +1,166 @@
+from __future__ import annotations
+
+"""
+Export object stores:
+- Exports are written as numbered part objects and concatenated on finalize; gzip members concatenate into a valid gzip file.
+- LocalExportStore writes to a directory; GcsExportStore streams parts to a Cloud Storage bucket and composes them.
+
+Public API:
+- ExportStore: interface (open_part, finalize, size, url, delete_parts_from).
+- LocalExportStore(root_dir), GcsExportStore(bucket_name).
+- get_export_store(): store selected by EXPORT_STORE (local|gcs).
+
+Usage: EXPORT_STORE=local (default) writes under EXPORT_LOCAL_DIR (default ./exports). EXPORT_STORE=gcs requires EXPORT_BUCKET and the optional google-cloud-storage package. Parts are only visible once closed, so a crashed writer never leaves a half-written committed part.
+"""
+
+import os
+import shutil
+from pathlib import Path
+from typing import BinaryIO
+
+BASE_DIR = Path(__file__).resolve().parents[2]
+GCS_COMPOSE_LIMIT = 32
+
+
+def _part_name(key: str, part_no: int) -> str:
+    return f"{key}.part{part_no:05d}"
+
+
+class ExportStore:
+    def open_part(self, key: str, part_no: int) -> BinaryIO:
+        raise NotImplementedError
+
+    def finalize(self, key: str, part_count: int) -> None:
+        raise NotImplementedError
+
+    def delete_parts_from(self, key: str, part_no: int) -> None:
+        """Drop parts >= part_no left behind by an interrupted run."""
+        raise NotImplementedError
+
+    def size(self, key: str) -> int:
+        raise NotImplementedError
+
+    def url(self, key: str) -> str:
+        raise NotImplementedError
+
+
+class LocalExportStore(ExportStore):
+    def __init__(self, root_dir: str | Path) -> None:
+        self.root = Path(root_dir)
+
+    def _path(self, name: str) -> Path:
+        path = self.root / name
+        path.parent.mkdir(parents=True, exist_ok=True)
+        return path
+
+    def open_part(self, key: str, part_no: int) -> BinaryIO:
+        # Write to a temp name and rename on close so only complete parts are visible.
+        final = self._path(_part_name(key, part_no))
+        return _AtomicLocalFile(final)
+
+    def finalize(self, key: str, part_count: int) -> None:
+        with self._path(key).open("wb") as out:
+            for part_no in range(part_count):
+                part = self._path(_part_name(key, part_no))
+                with part.open("rb") as src:
+                    shutil.copyfileobj(src, out)
+        for part_no in range(part_count):
+            self._path(_part_name(key, part_no)).unlink(missing_ok=True)
+
+    def delete_parts_from(self, key: str, part_no: int) -> None:
+        directory = self._path(key).parent
+        prefix = Path(key).name + ".part"
+        for path in directory.glob(prefix + "*"):
+            suffix = path.name[len(prefix):].split(".")[0]
+            if suffix.isdigit() and int(suffix) >= part_no:
+                path.unlink(missing_ok=True)
+
+    def size(self, key: str) -> int:
+        return self._path(key).stat().st_size
+
+    def url(self, key: str) -> str:
+        return self._path(key).resolve().as_uri()
+
+
+class _AtomicLocalFile:
+    def __init__(self, final: Path) -> None:
+        self._final = final
+        self._tmp = final.with_name(final.name + ".tmp")
+        self._fh = self._tmp.open("wb")
+
+    def write(self, data: bytes) -> int:
+        return self._fh.write(data)
+
+    def flush(self) -> None:
+        self._fh.flush()
+
+    def close(self) -> None:
+        if self._fh.closed:
+            return
+        self._fh.close()
+        os.replace(self._tmp, self._final)
+
+    def __enter__(self) -> "_AtomicLocalFile":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        if exc_type is None:
+            self.close()
+        else:
+            self._fh.close()
+            self._tmp.unlink(missing_ok=True)
+
+
+class GcsExportStore(ExportStore):
+    def __init__(self, bucket_name: str) -> None:
+        try:
+            from google.cloud import storage  # type: ignore
+        except ImportError as exc:
+            raise RuntimeError("google-cloud-storage must be installed for EXPORT_STORE=gcs") from exc
+        self.bucket = storage.Client().bucket(bucket_name)
+
+    def open_part(self, key: str, part_no: int) -> BinaryIO:
+        # Resumable upload; the object is created only when the writer is closed.
+        return self.bucket.blob(_part_name(key, part_no)).open("wb", ignore_flush=True)
+
+    def finalize(self, key: str, part_count: int) -> None:
+        sources = [self.bucket.blob(_part_name(key, n)) for n in range(part_count)]
+        target = self.bucket.blob(key)
+        if not sources:
+            target.upload_from_string(b"")
+            return
+        # compose accepts at most 32 sources; fold them in chunks onto the target.
+        target.compose(sources[:GCS_COMPOSE_LIMIT])
+        for start in range(GCS_COMPOSE_LIMIT, len(sources), GCS_COMPOSE_LIMIT - 1):
+            target.compose([target, *sources[start : start + GCS_COMPOSE_LIMIT - 1]])
+        for blob in sources:
+            blob.delete()
+
+    def delete_parts_from(self, key: str, part_no: int) -> None:
+        for blob in self.bucket.list_blobs(prefix=f"{key}.part"):
+            suffix = blob.name.rsplit(".part", 1)[-1]
+            if suffix.isdigit() and int(suffix) >= part_no:
+                blob.delete()
+
+    def size(self, key: str) -> int:
+        blob = self.bucket.get_blob(key)
+        return int(blob.size or 0) if blob else 0
+
+    def url(self, key: str) -> str:
+        blob = self.bucket.blob(key)
+        try:
+            return blob.generate_signed_url(expiration=3600, version="v4")
+        except Exception:  # noqa: BLE001
+            return f"gs://{self.bucket.name}/{key}"
+
+
+def get_export_store() -> ExportStore:
+    kind = os.getenv("EXPORT_STORE", "local").lower()
+    if kind == "gcs":
+        bucket = os.getenv("EXPORT_BUCKET")
+        if not bucket:
+            raise EnvironmentError("EXPORT_BUCKET is required when EXPORT_STORE=gcs")
+        return GcsExportStore(bucket)
+    if kind != "local":
+        raise ValueError(f"Unsupported EXPORT_STORE: {kind}")
+    return LocalExportStore(os.getenv("EXPORT_LOCAL_DIR", str(BASE_DIR / "exports")))
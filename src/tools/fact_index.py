@@ -0,0 +1,405 @@
+from __future__ import annotations
+
+"""
+Local hybrid search index over saved facts:
+- BM25 inverted index (postings stored as (term, doc, tf) rows; a sorted base segment plus a small unsorted tail that is merged when it grows).
+- Brute-force NumPy cosine search over locally computed hashing embeddings (word + character trigram features).
+- Results from both are fused with reciprocal-rank fusion; one index per user, optionally filtered by domain.
+
+Public API:
+- embed_text(text, dim): L2-normalised hashing embedding.
+- FactIndex(directory, dim, k1, b): add(...), add_many(items), search(query, top_k, domain_id=None), len().
+- get_index(user_id): cached per-user index under `search.index_dir`.
+- index_fact(user_id, domain_id, memory_id, fact_text, source_url): incremental add used on fact save.
+- rebuild_user_index(client, user_id): rebuild from the fact store (both facts layouts), built aside and swapped in.
+- stored_fact_count(client, user_id) / sync_user_index(client, user_id): rebuild when the index's fact count differs from the store's.
+- search_facts(user_id, query, top_k=None, domain_id=None): ranked hits.
+
+Usage: Arrays (vectors, doc lengths, postings) are memory-mapped files that grow by doubling; doc metadata and the vocabulary are append-only files. meta.json is written last and atomically, so a crash mid-add loses at most that add. Several processes (e.g. `./adk api --workers N`) may share an index directory: writes take an exclusive fcntl lock on a lock file beside it, reads a shared one, and each process reloads when meta.json shows another writer's facts or a rebuild (build_id). The index lives on local disk of one process; it is a derived cache and can always be rebuilt from storage. Settings come from `search` in config/config.yaml.
+"""
+
+import fcntl
+import hashlib
+import json
+import math
+import os
+import re
+import shutil
+import threading
+import uuid
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence
+
+import numpy as np
+
+from src.tools.dedup import normalize_fact_text
+from src.tools.fact_store import domain_facts
+from src.tools.firestore_query import KEY_ONLY, count_documents, stream_documents
+from src.utils.config_loader import BASE_DIR, load_search_config
+
+META_FILE = "meta.json"
+INITIAL_DOC_CAPACITY = 1024
+INITIAL_POSTING_CAPACITY = 16384
+MIN_TAIL_BEFORE_MERGE = 4096
+_SAFE_ID_RE = re.compile(r"^[A-Za-z0-9_-]{1,64}$")
+_indexes: Dict[str, "FactIndex"] = {}
+_indexes_lock = threading.Lock()
+
+
+def _tokens(text: str) -> List[str]:
+    return normalize_fact_text(text).split()
+
+
+def _lock_path(directory: Path) -> Path:
+    # Beside the directory, not in it, so a rebuild can swap the directory while holding the lock.
+    return directory.with_name(f".{directory.name}.lock")
+
+
+def _hash64(feature: str) -> int:
+    return int.from_bytes(hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest(), "big")
+
+
+def embed_text(text: str, dim: int) -> np.ndarray:
+    """Signed feature hashing of words and character trigrams; trigrams give partial credit to inflections."""
+    vec = np.zeros(dim, dtype=np.float32)
+    for token in _tokens(text):
+        features = [(token, 1.0)]
+        padded = f"#{token}#"
+        features.extend((padded[i : i + 3], 0.5) for i in range(len(padded) - 2))
+        for feature, weight in features:
+            h = _hash64(feature)
+            vec[h % dim] += weight if (h >> 63) & 1 else -weight
+    norm = float(np.linalg.norm(vec))
+    return vec / norm if norm else vec
+
+
+class _MappedArray:
+    """Memory-mapped array that grows by doubling its file."""
+
+    def __init__(self, path: Path, dtype: Any, width: int, capacity: int) -> None:
+        self.path = path
+        self.dtype = np.dtype(dtype)
+        self.width = width
+        self.row_bytes = self.dtype.itemsize * width
+        path.touch(exist_ok=True)
+        self._open(max(capacity, path.stat().st_size // self.row_bytes))
+
+    def _open(self, capacity: int) -> None:
+        with self.path.open("r+b") as f:
+            if f.seek(0, os.SEEK_END) < capacity * self.row_bytes:
+                f.truncate(capacity * self.row_bytes)
+        self.capacity = capacity
+        shape = (capacity, self.width) if self.width > 1 else (capacity,)
+        self.data = np.memmap(self.path, dtype=self.dtype, mode="r+", shape=shape)
+
+    def ensure(self, rows: int) -> None:
+        if rows <= self.capacity:
+            return
+        self.data.flush()
+        capacity = self.capacity
+        while capacity < rows:
+            capacity *= 2
+        del self.data
+        self._open(capacity)
+
+    def flush(self) -> None:
+        self.data.flush()
+
+
+class FactIndex:
+    def __init__(self, directory: Path, dim: int = 256, k1: float = 1.2, b: float = 0.75) -> None:
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.k1 = k1
+        self.b = b
+        self._default_dim = dim
+        self._lock = threading.RLock()
+        with self._file_lock(exclusive=True):
+            self._load()
+
+    def _load(self) -> None:
+        meta = self._read_meta()
+        self.build_id = meta.get("build_id") or uuid.uuid4().hex
+        self.dim = int(meta.get("dim", self._default_dim))
+        self.doc_count = int(meta.get("doc_count", 0))
+        self.posting_count = int(meta.get("posting_count", 0))
+        self.total_length = int(meta.get("total_length", 0))
+        # Drop anything appended after the last committed meta.json (crash mid-add); callers hold the file lock, so no writer is mid-add.
+        self._truncate("docs.jsonl", int(meta.get("docs_bytes", 0)))
+        self._truncate("vocab.txt", int(meta.get("vocab_bytes", 0)))
+        self.vectors = _MappedArray(self.directory / "vectors.f32", np.float32, self.dim, INITIAL_DOC_CAPACITY)
+        self.doc_lengths = _MappedArray(self.directory / "doclen.u32", np.uint32, 1, INITIAL_DOC_CAPACITY)
+        self.postings = _MappedArray(self.directory / "postings.u32", np.uint32, 3, INITIAL_POSTING_CAPACITY)
+        self.docs: List[Dict[str, str]] = [json.loads(line) for line in self._lines("docs.jsonl")]
+        self.vocab: Dict[str, int] = {term: i for i, term in enumerate(self._lines("vocab.txt"))}
+        self.memory_ids = {doc["memory_id"] for doc in self.docs}
+        self._domain_codes: Dict[str, int] = {}
+        self.doc_domains = np.array([self._domain_code(d["domain_id"]) for d in self.docs], dtype=np.int32)
+        self._base_count = 0
+        self._merge_postings()
+
+    @contextmanager
+    def _file_lock(self, exclusive: bool) -> Iterator[None]:
+        """Cross-process lock (API workers share the index directory): exclusive for writes, shared for reads."""
+        with _lock_path(self.directory).open("a") as handle:
+            fcntl.flock(handle, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+            try:
+                yield
+            finally:
+                fcntl.flock(handle, fcntl.LOCK_UN)
+
+    def _refresh(self) -> None:
+        # Another process added facts or rebuilt the index since we loaded it; our arrays and offsets are stale.
+        meta = self._read_meta()
+        if meta.get("build_id") != self.build_id or int(meta.get("doc_count", 0)) != self.doc_count:
+            if meta or self.doc_count:
+                self._load()
+
+    # -- persistence -------------------------------------------------------
+    def _read_meta(self) -> Dict[str, Any]:
+        path = self.directory / META_FILE
+        return json.loads(path.read_text(encoding="utf-8")) if path.exists() else {}
+
+    def _truncate(self, name: str, size: int) -> None:
+        path = self.directory / name
+        path.touch(exist_ok=True)
+        if path.stat().st_size > size:
+            with path.open("r+b") as f:
+                f.truncate(size)
+
+    def _lines(self, name: str) -> List[str]:
+        return (self.directory / name).read_text(encoding="utf-8").splitlines()
+
+    def _commit(self) -> None:
+        for array in (self.vectors, self.doc_lengths, self.postings):
+            array.flush()
+        meta = {
+            "build_id": self.build_id,
+            "dim": self.dim,
+            "doc_count": self.doc_count,
+            "posting_count": self.posting_count,
+            "total_length": self.total_length,
+            "docs_bytes": (self.directory / "docs.jsonl").stat().st_size,
+            "vocab_bytes": (self.directory / "vocab.txt").stat().st_size,
+        }
+        tmp = self.directory / (META_FILE + ".tmp")
+        tmp.write_text(json.dumps(meta), encoding="utf-8")
+        os.replace(tmp, self.directory / META_FILE)
+
+    # -- writes ------------------------------------------------------------
+    def _domain_code(self, domain_id: str) -> int:
+        return self._domain_codes.setdefault(domain_id, len(self._domain_codes))
+
+    def __len__(self) -> int:
+        with self._lock, self._file_lock(exclusive=False):
+            self._refresh()
+            return self.doc_count
+
+    def add(self, memory_id: str, domain_id: str, fact_text: str, source_url: str = "") -> bool:
+        return self.add_many([{"memory_id": memory_id, "domain_id": domain_id, "fact_text": fact_text, "source_url": source_url}]) == 1
+
+    def add_many(self, items: Iterable[Dict[str, str]]) -> int:
+        """Append facts not yet indexed (by memory_id) and commit once; returns the number added."""
+        with self._lock, self._file_lock(exclusive=True):
+            self._refresh()
+            added = 0
+            new_terms: List[str] = []
+            doc_lines: List[str] = []
+            new_codes: List[int] = []
+            for item in items:
+                if item["memory_id"] in self.memory_ids:
+                    continue
+                tokens = _tokens(item["fact_text"])
+                counts: Dict[int, int] = {}
+                for token in tokens:
+                    if token not in self.vocab:
+                        self.vocab[token] = len(self.vocab)
+                        new_terms.append(token)
+                    counts[self.vocab[token]] = counts.get(self.vocab[token], 0) + 1
+                doc_no = self.doc_count
+                self.vectors.ensure(doc_no + 1)
+                self.doc_lengths.ensure(doc_no + 1)
+                self.postings.ensure(self.posting_count + len(counts))
+                self.vectors.data[doc_no] = embed_text(item["fact_text"], self.dim)
+                self.doc_lengths.data[doc_no] = len(tokens)
+                rows = np.array([(term, doc_no, tf) for term, tf in counts.items()], dtype=np.uint32).reshape(-1, 3)
+                self.postings.data[self.posting_count : self.posting_count + len(rows)] = rows
+                doc = {k: item.get(k, "") for k in ("memory_id", "domain_id", "fact_text", "source_url")}
+                self.docs.append(doc)
+                doc_lines.append(json.dumps(doc, ensure_ascii=False) + "\n")
+                self.memory_ids.add(doc["memory_id"])
+                new_codes.append(self._domain_code(doc["domain_id"]))
+                self.doc_count += 1
+                self.posting_count += len(rows)
+                self.total_length += len(tokens)
+                added += 1
+            if not added:
+                return 0
+            self.doc_domains = np.concatenate([self.doc_domains, np.array(new_codes, dtype=np.int32)])
+            with (self.directory / "docs.jsonl").open("a", encoding="utf-8") as f:
+                f.writelines(doc_lines)
+            with (self.directory / "vocab.txt").open("a", encoding="utf-8") as f:
+                f.writelines(term + "\n" for term in new_terms)
+            self._commit()
+            if self.posting_count - self._base_count > max(MIN_TAIL_BEFORE_MERGE, self._base_count // 4):
+                self._merge_postings()
+            return added
+
+    def _merge_postings(self) -> None:
+        """Sort all postings by term into the base segment (CSR offsets per term id)."""
+        rows = np.asarray(self.postings.data[: self.posting_count])
+        order = np.argsort(rows[:, 0], kind="stable") if len(rows) else np.zeros(0, dtype=np.int64)
+        self._base_terms = rows[order, 0] if len(rows) else np.zeros(0, dtype=np.uint32)
+        self._base_docs = rows[order, 1].astype(np.int64) if len(rows) else np.zeros(0, dtype=np.int64)
+        self._base_tf = rows[order, 2].astype(np.float32) if len(rows) else np.zeros(0, dtype=np.float32)
+        self._base_count = self.posting_count
+
+    # -- reads -------------------------------------------------------------
+    def _term_postings(self, term_id: int) -> tuple[np.ndarray, np.ndarray]:
+        lo, hi = np.searchsorted(self._base_terms, [term_id, term_id + 1])
+        docs, tfs = self._base_docs[lo:hi], self._base_tf[lo:hi]
+        if self.posting_count > self._base_count:
+            tail = np.asarray(self.postings.data[self._base_count : self.posting_count])
+            hit = tail[:, 0] == term_id
+            if hit.any():
+                docs = np.concatenate([docs, tail[hit, 1].astype(np.int64)])
+                tfs = np.concatenate([tfs, tail[hit, 2].astype(np.float32)])
+        return docs, tfs
+
+    def _bm25(self, query_terms: Sequence[str]) -> np.ndarray:
+        scores = np.zeros(self.doc_count, dtype=np.float32)
+        lengths = np.asarray(self.doc_lengths.data[: self.doc_count], dtype=np.float32)
+        avg_length = self.total_length / self.doc_count
+        for term in set(query_terms):
+            term_id = self.vocab.get(term)
+            if term_id is None:
+                continue
+            docs, tfs = self._term_postings(term_id)
+            df = len(docs)
+            idf = math.log(1.0 + (self.doc_count - df + 0.5) / (df + 0.5))
+            norm = tfs + self.k1 * (1.0 - self.b + self.b * lengths[docs] / avg_length)
+            np.add.at(scores, docs, idf * tfs * (self.k1 + 1.0) / norm)
+        return scores
+
+    def search(
+        self,
+        query: str,
+        top_k: int = 5,
+        domain_id: Optional[str] = None,
+        candidate_k: int = 50,
+        rrf_k: int = 60,
+        min_similarity: float = 0.2,
+    ) -> List[Dict[str, Any]]:
+        with self._lock, self._file_lock(exclusive=False):
+            self._refresh()
+            if not self.doc_count:
+                return []
+            allowed = np.ones(self.doc_count, dtype=bool)
+            if domain_id is not None:
+                code = self._domain_codes.get(domain_id)
+                if code is None:
+                    return []
+                allowed = self.doc_domains[: self.doc_count] == code
+            bm25 = self._bm25(_tokens(query))
+            bm25[~allowed] = 0.0
+            vectors = np.asarray(self.vectors.data[: self.doc_count])
+            cosine = vectors @ embed_text(query, self.dim)
+            cosine[~allowed] = -np.inf
+
+        fused: Dict[int, float] = {}
+        lexical = [int(i) for i in _top(bm25, candidate_k) if bm25[i] > 0]
+        semantic = [int(i) for i in _top(cosine, candidate_k) if cosine[i] >= min_similarity]
+        for ranking in (lexical, semantic):
+            for rank, doc_no in enumerate(ranking):
+                fused[doc_no] = fused.get(doc_no, 0.0) + 1.0 / (rrf_k + rank + 1)
+        best = sorted(fused.items(), key=lambda kv: kv[1], reverse=True)[:top_k]
+        return [
+            {
+                **self.docs[doc_no],
+                "score": round(score, 6),
+                "bm25": round(float(bm25[doc_no]), 4),
+                "similarity": round(float(cosine[doc_no]), 4),
+            }
+            for doc_no, score in best
+        ]
+
+
+def _top(scores: np.ndarray, k: int) -> np.ndarray:
+    if len(scores) <= k:
+        return np.argsort(-scores, kind="stable")
+    part = np.argpartition(-scores, k)[:k]
+    return part[np.argsort(-scores[part], kind="stable")]
+
+
+def _index_dir(user_id: str) -> Path:
+    root = Path(load_search_config()["index_dir"])
+    root = root if root.is_absolute() else BASE_DIR / root
+    name = user_id if _SAFE_ID_RE.match(user_id) else hashlib.sha1(user_id.encode("utf-8")).hexdigest()
+    return root / name
+
+
+def get_index(user_id: str) -> FactIndex:
+    directory = _index_dir(user_id)
+    key = str(directory)
+    with _indexes_lock:
+        if key not in _indexes:
+            cfg = load_search_config()
+            _indexes[key] = FactIndex(directory, int(cfg["embedding_dim"]), float(cfg["bm25_k1"]), float(cfg["bm25_b"]))
+        return _indexes[key]
+
+
+def index_fact(user_id: str, domain_id: str, memory_id: str, fact_text: str, source_url: str = "") -> bool:
+    return get_index(user_id).add(memory_id, domain_id, fact_text, source_url)
+
+
+def rebuild_user_index(client: Any, user_id: str) -> int:
+    """Recreate a user's index from storage; returns the number of facts indexed."""
+    directory = _index_dir(user_id)
+    cfg = load_search_config()
+    # Build aside and swap under the lock, so searches in other processes never see a half-built index.
+    staging = directory.with_name(f"{directory.name}.rebuild-{uuid.uuid4().hex[:8]}")
+    index = FactIndex(staging, int(cfg["embedding_dim"]), float(cfg["bm25_k1"]), float(cfg["bm25_b"]))
+    domains = client.collection("domains").where("user_id", "==", user_id)
+    total = 0
+    for domain in stream_documents(domains, fields=KEY_ONLY):
+        _, facts = domain_facts(client, user_id, domain.id)
+        items = (
+            {"memory_id": doc.id, "domain_id": domain.id, **{k: (doc.to_dict() or {}).get(k, "") for k in ("fact_text", "source_url")}}
+            for doc in stream_documents(facts, fields=["fact_text", "source_url"], page_size=500)
+        )
+        total += index.add_many(items)
+    with _indexes_lock:
+        _indexes.pop(str(directory), None)
+        directory.parent.mkdir(parents=True, exist_ok=True)
+        with _lock_path(directory).open("a") as handle:
+            fcntl.flock(handle, fcntl.LOCK_EX)
+            shutil.rmtree(directory, ignore_errors=True)
+            os.replace(staging, directory)
+        _lock_path(staging).unlink(missing_ok=True)
+    return total
+
+
+def stored_fact_count(client: Any, user_id: str) -> int:
+    """Facts the store holds for a user (aggregation counts, no documents downloaded)."""
+    domains = client.collection("domains").where("user_id", "==", user_id)
+    return sum(count_documents(domain_facts(client, user_id, domain.id)[1]) for domain in stream_documents(domains, fields=KEY_ONLY))
+
+
+def sync_user_index(client: Any, user_id: str) -> Optional[int]:
+    """Rebuild the index when it disagrees with the store (facts saved before indexing, by another node, or lost); returns facts indexed, or None when in sync."""
+    if len(get_index(user_id)) == stored_fact_count(client, user_id):
+        return None
+    return rebuild_user_index(client, user_id)
+
+
+def search_facts(user_id: str, query: str, top_k: Optional[int] = None, domain_id: Optional[str] = None) -> List[Dict[str, Any]]:
+    cfg = load_search_config()
+    return get_index(user_id).search(
+        query,
+        top_k=int(top_k or cfg["top_k"]),
+        domain_id=domain_id,
+        candidate_k=int(cfg["candidate_k"]),
+        rrf_k=int(cfg["rrf_k"]),
+        min_similarity=float(cfg["min_similarity"]),
+    )
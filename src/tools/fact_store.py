@@ -0,0 +1,45 @@
+from __future__ import annotations
+
+"""
+Fact storage layout:
+- flat (default): every fact in one MEMORY_COLLECTION_NAME collection, scoped by user_id/domain_id filters.
+- sharded: facts live in `users/{uid}/domains/{did}/facts`, so per-domain scans read one small subcollection and need no composite index on user_id/domain_id.
+
+Public API:
+- facts_layout(): active layout from FACTS_LAYOUT (flat|sharded).
+- memory_collection_name(): flat collection name (MEMORY_COLLECTION_NAME, default memory_facts).
+- domain_facts(client, user_id, domain_id, layout=None): (collection, query) for one domain; use the collection for document refs and the query for reads.
+- sharded_facts_collection(client, user_id, domain_id): the per-domain subcollection.
+
+Usage: Used by memory, snapshots, dedup and export. Fact documents keep user_id/domain_id fields in both layouts so they stay self-describing and collection-group queryable. New ids come from Firestore auto-ids (random, evenly spread across the key range); never derive ids from timestamps, which concentrates writes on one tablet. Existing flat data is copied with src/tools/facts_migration.py.
+"""
+
+import os
+from typing import Any, Optional, Tuple
+
+from google.cloud.firestore import Client
+
+FACT_LAYOUTS = {"flat", "sharded"}
+
+
+def facts_layout() -> str:
+    layout = os.getenv("FACTS_LAYOUT", "flat").lower()
+    if layout not in FACT_LAYOUTS:
+        raise ValueError(f"Unsupported FACTS_LAYOUT: {layout}")
+    return layout
+
+
+def memory_collection_name() -> str:
+    return os.getenv("MEMORY_COLLECTION_NAME", "memory_facts")
+
+
+def sharded_facts_collection(client: Client, user_id: str, domain_id: str) -> Any:
+    return client.collection("users").document(user_id).collection("domains").document(domain_id).collection("facts")
+
+
+def domain_facts(client: Client, user_id: str, domain_id: str, layout: Optional[str] = None) -> Tuple[Any, Any]:
+    if (layout or facts_layout()) == "sharded":
+        collection = sharded_facts_collection(client, user_id, domain_id)
+        return collection, collection
+    collection = client.collection(memory_collection_name())
+    return collection, collection.where("domain_id", "==", domain_id).where("user_id", "==", user_id)
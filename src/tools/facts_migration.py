@@ -0,0 +1,115 @@
+from __future__ import annotations
+
+"""
+Facts layout backfill:
+- Copies facts from the flat MEMORY_COLLECTION_NAME collection into `users/{uid}/domains/{did}/facts`.
+- Reads pages in document-id order and commits write batches in parallel; document ids are preserved, so re-runs are idempotent.
+- Facts written before dedup fingerprints existed are fingerprinted during the copy.
+
+Public API:
+- backfill_sharded_facts(client, page_size=500, max_workers=8, start_after_id=None): copy all facts; returns counters and the last committed id.
+- main(): CLI entry point.
+
+Usage: `python -m src.tools.facts_migration [--page-size N] [--workers N] [--start-after ID]`. Run before switching FACTS_LAYOUT=sharded; FACTS_BACKFILL_PAGE logs last_id only once that page and every earlier one are committed, so after a crash pass the last logged id as --start-after to resume. The flat collection is left untouched. Batch commits take storage slots in the scheduler's bulk class (src/utils/scheduler.py). Facts saved while the backfill runs should be covered by a second run after the switch.
+"""
+
+import argparse
+import contextvars
+import sys
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+
+from google.cloud.firestore import Client
+
+from src.storage.client import get_client
+from src.tools.dedup import fingerprint
+from src.tools.fact_store import memory_collection_name, sharded_facts_collection
+from src.tools.firestore_query import fetch_page, get_document, track_reads
+from src.utils.logger import get_logger
+from src.utils.scheduler import scheduling, slot
+
+MAX_BATCH_WRITES = 500  # Firestore limit per batched write
+logger = get_logger("facts_migration")
+
+
+def _client() -> Client:
+    return get_client()
+
+
+def _commit_batch(client: Client, docs: List[Any]) -> int:
+    with slot("storage"):
+        return _write_batch(client, docs)
+
+
+def _write_batch(client: Client, docs: List[Any]) -> int:
+    batch = client.batch()
+    for doc in docs:
+        data = dict(doc.to_dict() or {})
+        if "text_hash" not in data and data.get("fact_text"):
+            # Facts saved before dedup existed get their fingerprint on the way over.
+            data.update(fingerprint(data["fact_text"]))
+        batch.set(sharded_facts_collection(client, data["user_id"], data["domain_id"]).document(doc.id), data)
+    batch.commit()
+    return len(docs)
+
+
+def backfill_sharded_facts(
+    client: Client,
+    page_size: int = MAX_BATCH_WRITES,
+    max_workers: int = 8,
+    start_after_id: Optional[str] = None,
+) -> Dict[str, Any]:
+    """
+    Copy every flat fact into its per-domain subcollection. Facts without user_id/domain_id are skipped.
+    At most max_workers batches are in flight; reading the next page overlaps with committing the previous ones.
+    """
+    page_size = min(page_size, MAX_BATCH_WRITES)
+    source = client.collection(memory_collection_name())
+    copied = skipped = pages = committed = 0
+    last_id = start_after_id
+    # (commit future or None for a page with nothing to copy, the page's last id), in read order.
+    pending: List[Tuple[Optional[Future], str]] = []
+
+    def settle(limit: int) -> None:
+        # A page becomes the resume point only once its commit and every earlier page's have resolved.
+        nonlocal copied, committed, last_id
+        while pending and (len(pending) > limit or pending[0][0] is None or pending[0][0].done()):
+            future, page_last_id = pending.pop(0)
+            if future is not None:
+                copied += future.result()
+            committed += 1
+            last_id = page_last_id
+            logger.info("FACTS_BACKFILL_PAGE", page=committed, last_id=last_id, copied=copied, skipped=skipped)
+
+    with track_reads("facts_backfill"), ThreadPoolExecutor(max_workers=max_workers) as pool:
+        cursor = get_document(source.document(start_after_id), fields=["user_id"]) if start_after_id else None
+        while True:
+            docs, cursor = fetch_page(source, page_size=page_size, start_after=cursor)
+            movable = [d for d in docs if (d.to_dict() or {}).get("user_id") and (d.to_dict() or {}).get("domain_id")]
+            skipped += len(docs) - len(movable)
+            if docs:
+                pages += 1
+                future = pool.submit(contextvars.copy_context().run, _commit_batch, client, movable) if movable else None
+                pending.append((future, docs[-1].id))
+            settle(max_workers - 1)
+            if cursor is None:
+                break
+        settle(0)
+    logger.info("FACTS_BACKFILL_DONE", pages=pages, copied=copied, skipped=skipped, last_id=last_id)
+    return {"copied": copied, "skipped": skipped, "pages": pages, "last_id": last_id}
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Copy flat memory facts into per-user/per-domain subcollections.")
+    parser.add_argument("--page-size", type=int, default=MAX_BATCH_WRITES)
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--start-after", default=None, help="resume after this fact id")
+    args = parser.parse_args(argv)
+    with scheduling("bulk"):
+        result = backfill_sharded_facts(_client(), args.page_size, args.workers, args.start_after)
+    print(result)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
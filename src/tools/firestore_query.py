@@ -0,0 +1,170 @@
+from __future__ import annotations
+
+"""
+Projection-aware Firestore query layer:
+- Field masks (`select` / `field_paths`) so callers only download the fields their view needs.
+- Aggregation `count()` for meta numbers instead of streaming documents.
+- Cursor pagination ordered by document id, and per-call read accounting (documents and estimated bytes).
+
+Public API:
+- get_document(doc_ref, fields=None): single read with optional field mask.
+- get_documents(client, refs, fields=None, transaction=None): one batched read (get_all), returned in refs order.
+- fetch_page(query, fields=None, page_size=100, start_after=None): one page plus next cursor.
+- stream_documents(query, fields=None, page_size=None, transaction=None): iterate all matches, page by page when page_size is set; an unpaged stream can read inside a transaction.
+- count_documents(query): aggregation count.
+- track_reads(label): context manager that totals reads made inside it and logs FIRESTORE_READS.
+- estimate_doc_bytes(doc_id, data): Firestore storage-size estimate used for accounting.
+
+Usage: All tools that read Firestore go through these helpers; under a turn deadline each call's timeout is the remaining budget capped by deadlines.storage_timeout_seconds (src/utils/deadline.py), and paged streams stop between pages once it is spent. Byte figures follow Firestore's documented storage-size rules and are estimates of payload size, not billing numbers. Pass `fields=KEY_ONLY` to queries that only need document ids (an empty projection would return every field).
+"""
+
+import contextvars
+from datetime import datetime
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from google.cloud.firestore_v1.field_path import FieldPath
+from pydantic import BaseModel
+
+from src.utils.deadline import check, timeout_kwargs
+from src.utils.logger import get_logger
+
+DOC_OVERHEAD_BYTES = 32
+KEY_ONLY = [FieldPath.document_id()]
+logger = get_logger("firestore_query")
+
+
+class ReadStats(BaseModel):
+    label: str
+    calls: int = 0
+    documents: int = 0
+    bytes_read: int = 0
+
+
+_current_stats: contextvars.ContextVar[Optional[ReadStats]] = contextvars.ContextVar("firestore_read_stats", default=None)
+
+
+class track_reads:
+    """Accumulate reads made inside the block; a nested tracker also adds its totals to the enclosing one."""
+
+    def __init__(self, label: str) -> None:
+        self.stats = ReadStats(label=label)
+        self._token: Optional[contextvars.Token] = None
+
+    def __enter__(self) -> ReadStats:
+        self._token = _current_stats.set(self.stats)
+        return self.stats
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        _current_stats.reset(self._token)
+        parent = _current_stats.get()
+        if parent is not None:
+            parent.calls += self.stats.calls
+            parent.documents += self.stats.documents
+            parent.bytes_read += self.stats.bytes_read
+        logger.info(
+            "FIRESTORE_READS",
+            label=self.stats.label,
+            calls=self.stats.calls,
+            documents=self.stats.documents,
+            bytes_read=self.stats.bytes_read,
+        )
+
+
+def _value_bytes(value: Any) -> int:
+    if value is None or isinstance(value, bool):
+        return 1
+    if isinstance(value, (int, float, datetime)):
+        return 8
+    if isinstance(value, str):
+        return len(value.encode("utf-8")) + 1
+    if isinstance(value, bytes):
+        return len(value)
+    if isinstance(value, dict):
+        return sum(len(str(k).encode("utf-8")) + 1 + _value_bytes(v) for k, v in value.items())
+    if isinstance(value, (list, tuple)):
+        return sum(_value_bytes(v) for v in value)
+    return 8  # timestamps, references, sentinels
+
+
+def estimate_doc_bytes(doc_id: str, data: Optional[Dict[str, Any]]) -> int:
+    return len(doc_id.encode("utf-8")) + 1 + DOC_OVERHEAD_BYTES + _value_bytes(data or {})
+
+
+def _record(docs: Sequence[Any]) -> None:
+    stats = _current_stats.get()
+    if stats is None:
+        return
+    stats.calls += 1
+    for doc in docs:
+        if getattr(doc, "exists", True):
+            stats.documents += 1
+            stats.bytes_read += estimate_doc_bytes(doc.id, doc.to_dict())
+
+
+def _project(query: Any, fields: Optional[Sequence[str]]) -> Any:
+    return query.select(list(fields)) if fields is not None else query
+
+
+def get_document(doc_ref: Any, fields: Optional[Sequence[str]] = None) -> Any:
+    timeout = timeout_kwargs("storage")
+    snap = doc_ref.get(field_paths=list(fields), **timeout) if fields is not None else doc_ref.get(**timeout)
+    _record([snap])
+    return snap
+
+
+def get_documents(client: Any, refs: Sequence[Any], fields: Optional[Sequence[str]] = None, transaction: Any = None) -> List[Any]:
+    kwargs: Dict[str, Any] = {"transaction": transaction} if transaction is not None else {}
+    kwargs.update(timeout_kwargs("storage"))
+    if fields is not None:
+        kwargs["field_paths"] = list(fields)
+    by_id = {snap.reference.path: snap for snap in client.get_all(list(refs), **kwargs)}
+    snaps = [by_id[ref.path] for ref in refs]
+    _record(snaps)
+    return snaps
+
+
+def fetch_page(
+    query: Any,
+    fields: Optional[Sequence[str]] = None,
+    page_size: int = 100,
+    start_after: Any = None,
+    order_by: Optional[str] = None,
+) -> Tuple[List[Any], Any]:
+    """
+    Return (docs, next_cursor). Pages are ordered by `order_by` (document id by default); next_cursor is
+    the last snapshot of a full page (pass it back as start_after) or None when the result set is exhausted.
+    A start_after snapshot must include the order_by field when a field mask is used.
+    """
+    paged = _project(query, fields).order_by(order_by or FieldPath.document_id())
+    if start_after is not None:
+        paged = paged.start_after(start_after)
+    docs = list(paged.limit(page_size).stream(**timeout_kwargs("storage")))
+    _record(docs)
+    return docs, (docs[-1] if len(docs) == page_size else None)
+
+
+def stream_documents(
+    query: Any, fields: Optional[Sequence[str]] = None, page_size: Optional[int] = None, transaction: Any = None
+) -> Iterator[Any]:
+    if page_size is None:
+        kwargs: Dict[str, Any] = {"transaction": transaction} if transaction is not None else {}
+        docs = list(_project(query, fields).stream(**kwargs, **timeout_kwargs("storage")))
+        _record(docs)
+        yield from docs
+        return
+    cursor = None
+    while True:
+        docs, cursor = fetch_page(query, fields=fields, page_size=page_size, start_after=cursor)
+        yield from docs
+        if cursor is None:
+            return
+        check("storage page")
+
+
+def count_documents(query: Any) -> int:
+    result = query.count(alias="count").get(**timeout_kwargs("storage"))
+    stats = _current_stats.get()
+    if stats is not None:
+        # Aggregations are billed as one read per batch of up to 1000 index entries; no payload.
+        stats.calls += 1
+    return int(result[0][0].value)
@@ -3,27 +3,42 @@ from __future__ import annotations
 """
 Memory tool:
 - Mock mode (default) returns fake memory IDs.
-- Real mode (RUN_REAL_MEMORY=1) saves facts into Firestore collection.
+- Real mode (RUN_REAL_MEMORY=1) saves facts into Firestore (flat collection or per-domain subcollection, see src/tools/fact_store.py) and folds each fact into the domain's rolling snapshot.
+- Near-duplicates (normalized hash / SimHash, see src/tools/dedup.py) are merged as an extra source on the existing fact; the lookup and the insert of a new fact run in one transaction.
+- Saved facts are added to the user's local hybrid search index (src/tools/fact_index.py).
+- Every real save (new or merged) bumps the domain's version counter, invalidating cached snapshots/exports (src/tools/result_cache.py).
 
 Public API:
-- tool_save_fact_to_memory(payload): save fact metadata; returns status/data/error.
+- tool_save_fact_to_memory(payload): save fact metadata; returns status/data/error (data.merged_into_existing on dedup).
+- tool_check_duplicate_facts(payload): flag candidate facts that duplicate stored facts or each other.
+- tool_search_facts(payload): "what do I know about X" — BM25 + vector hybrid search over the user's saved facts.
 
-Usage: Mock unless RUN_REAL_MEMORY=1. Real path requires GCP creds/project/FIRESTORE_DATABASE; writes to MEMORY_COLLECTION_NAME (default memory_facts). See docs/tool_save_fact_to_memory.json. Not the Vertex AI Memory Bank; uses Firestore as durable store here.
+Usage: Mock unless RUN_REAL_MEMORY=1. Real path requires GCP creds/project/FIRESTORE_DATABASE; writes to MEMORY_COLLECTION_NAME (default memory_facts) or, with FACTS_LAYOUT=sharded, to users/{uid}/domains/{did}/facts. See docs/tool_save_fact_to_memory.json. Not the Vertex AI Memory Bank; uses Firestore as durable store here.
 """
 
 import os
 import time
 import uuid
-from typing import Any, Dict
+from typing import Any, Dict, List, Optional, Tuple
 
 from google.cloud import firestore
 from google.cloud.firestore import Client
 from pydantic import BaseModel, Field
 
-from src.utils.config_loader import ConfigLoader
+from src.storage.client import get_client, run_transaction
+from src.tools.dedup import find_duplicate, find_duplicates, fingerprint, normalize_fact_text, similarity, simhash64, text_hash
+from src.tools.fact_index import index_fact, search_facts, sync_user_index
+from src.tools.fact_store import domain_facts
+from src.tools.result_cache import bump_domain_version
+from src.tools.snapshots import apply_fact_to_snapshot, apply_source_to_snapshot, group_key_for
+from src.utils.config_loader import load_dedup_config
+from src.utils.deadline import timeout_kwargs
+from src.utils.logger import get_logger
+from src.utils.scheduler import scheduled, scheduling
 
 
 LATENCY_SECONDS = 0.1
+logger = get_logger("memory")
 
 
 class SaveFactRequest(BaseModel):
@@ -35,6 +50,8 @@ class SaveFactRequest(BaseModel):
 
 class SaveFactData(BaseModel):
     memory_id: str
+    merged_into_existing: bool = False
+    similarity: Optional[float] = None
 
 
 class SaveFactResponse(BaseModel):
@@ -43,38 +60,249 @@ class SaveFactResponse(BaseModel):
     error: str | None = None
 
 
+class SearchFactsRequest(BaseModel):
+    user_id: str
+    query: str
+    domain_id: Optional[str] = None
+    top_k: Optional[int] = Field(default=None, ge=1, le=50)
+
+
+class FactHit(BaseModel):
+    memory_id: str
+    domain_id: str
+    fact_text: str
+    source_url: str = ""
+    score: float
+
+
+class SearchFactsData(BaseModel):
+    query: str
+    hits: List[FactHit]
+
+
+class SearchFactsResponse(BaseModel):
+    status: str = Field(default="success")
+    data: SearchFactsData
+    error: str | None = None
+
+
+class CandidateFact(BaseModel):
+    fact_id: str
+    domain_id: str
+    content: str
+
+
+class CheckDuplicatesRequest(BaseModel):
+    user_id: str
+    facts: List[CandidateFact]
+
+
+class DuplicateFlag(BaseModel):
+    fact_id: str
+    duplicate_of: Optional[str] = None
+    duplicate_kind: Optional[str] = None  # "stored" (existing memory_id) or "candidate" (earlier fact_id)
+    similarity: Optional[float] = None
+
+
+class CheckDuplicatesResponse(BaseModel):
+    status: str = Field(default="success")
+    data: List[DuplicateFlag]
+    error: str | None = None
+
+
 def _ensure(model_cls, payload):
     return payload if isinstance(payload, model_cls) else model_cls(**payload)
 
 
 def _firestore_client() -> Client:
-    settings = ConfigLoader.instance().settings
-    return firestore.Client(database=settings.firestore_database or "(default)")
+    return get_client()
 
 
 def tool_save_fact_to_memory(payload: SaveFactRequest | Dict[str, Any]) -> Dict[str, Any]:
+    """
+    The writes run in storage slots; the snapshot merge between them takes its own llm/storage slots,
+    so a save never holds a storage slot while it waits for Gemini.
+    """
     req = _ensure(SaveFactRequest, payload)
+    response, client, group_key = _write_fact(req)
+    if client is None:
+        return response
+    memory_id = response["data"]["memory_id"]
+    # The fact is durable at this point; a failed snapshot merge must not fail the save.
+    try:
+        with scheduling(user_id=req.user_id):
+            apply_fact_to_snapshot(client, req.user_id, req.domain_id, req.fact_text, req.source_url, group_key=group_key)
+    except Exception as exc:  # noqa: BLE001
+        logger.error("SNAPSHOT_UPDATE_FAILED", domain_id=req.domain_id, memory_id=memory_id, error=str(exc))
+    _finish_save(req, client, memory_id)
+    return response
+
 
+@scheduled("storage")
+def _write_fact(req: SaveFactRequest) -> Tuple[Dict[str, Any], Optional[Client], Optional[str]]:
+    """Returns (response, client, group_key); client is None when the save is already complete (mock, merge, error)."""
     # Mock path unless explicitly told to hit real persistence.
     if os.getenv("RUN_REAL_MEMORY") != "1":
         time.sleep(LATENCY_SECONDS)
         data = SaveFactData(memory_id=f"mem_{uuid.uuid4().hex[:8]}")
-        return SaveFactResponse(status="success", data=data, error=None).model_dump()
+        return SaveFactResponse(status="success", data=data, error=None).model_dump(), None, None
 
     # "Real" path: persist to Firestore memory_facts collection (serves as durable store).
+    dedup_cfg = load_dedup_config()
+    group_key = group_key_for(req.source_url)
+    record = {
+        "fact_text": req.fact_text,
+        "source_url": req.source_url,
+        "sources": [req.source_url],
+        "user_id": req.user_id,
+        "domain_id": req.domain_id,
+        "group_key": group_key,
+        **fingerprint(req.fact_text),
+        "created_at": firestore.SERVER_TIMESTAMP,
+    }
     try:
         client = _firestore_client()
-        collection = os.getenv("MEMORY_COLLECTION_NAME", "memory_facts")
-        doc_ref = client.collection(collection).document()
-        doc_ref.set(
-            {
-                "fact_text": req.fact_text,
-                "source_url": req.source_url,
-                "user_id": req.user_id,
-                "domain_id": req.domain_id,
-                "created_at": firestore.SERVER_TIMESTAMP,
-            }
-        )
-        return SaveFactResponse(status="success", data=SaveFactData(memory_id=doc_ref.id), error=None).model_dump()
+        collection, domain_query = domain_facts(client, req.user_id, req.domain_id)
+        doc_ref = collection.document()
+
+        def insert(transaction: Any) -> Optional[Dict[str, Any]]:
+            # Lookup and insert commit together: two saves of one fact cannot both miss and both insert.
+            match = None
+            if dedup_cfg["enabled"]:
+                match = find_duplicate(
+                    domain_query,
+                    req.fact_text,
+                    float(dedup_cfg["similarity_threshold"]),
+                    int(dedup_cfg["min_tokens"]),
+                    transaction=transaction,
+                )
+            if match is None:
+                transaction.set(doc_ref, record)
+            return match
+
+        match = run_transaction(client, insert)
+        if match is not None:
+            return _merge_into_existing(client, collection, match, req), None, None
+    except Exception as exc:  # noqa: BLE001
+        return {"status": "error", "error": f"MEMORY_WRITE_ERROR: {exc}"}, None, None
+    return SaveFactResponse(status="success", data=SaveFactData(memory_id=doc_ref.id), error=None).model_dump(), client, group_key
+
+
+@scheduled("storage")
+def _finish_save(req: SaveFactRequest, client: Client, memory_id: str) -> None:
+    _bump_version(client, req.domain_id, memory_id)
+    # The search index is a derived local cache; it can be rebuilt from storage.
+    try:
+        index_fact(req.user_id, req.domain_id, memory_id, req.fact_text, req.source_url)
+    except Exception as exc:  # noqa: BLE001
+        logger.error("FACT_INDEX_UPDATE_FAILED", domain_id=req.domain_id, memory_id=memory_id, error=str(exc))
+
+
+def _bump_version(client: Client, domain_id: str, memory_id: str) -> None:
+    # Runs after the snapshot merge so a refresh triggered by the new version sees the new fact.
+    try:
+        bump_domain_version(client, domain_id)
+    except Exception as exc:  # noqa: BLE001
+        logger.error("DOMAIN_VERSION_BUMP_FAILED", domain_id=domain_id, memory_id=memory_id, error=str(exc))
+
+
+def _merge_into_existing(client: Client, collection, match: Dict[str, Any], req: SaveFactRequest) -> Dict[str, Any]:
+    """Record the new source on the matched fact instead of storing a restatement."""
+    # Sentinels, not the candidate read: two saves merging into the same fact both land.
+    # Facts saved before "sources" existed seed it with their own source_url.
+    data = match["data"]
+    added = [req.source_url] if data.get("sources") else [data.get("source_url", ""), req.source_url]
+    collection.document(match["memory_id"]).update(
+        {"sources": firestore.ArrayUnion(added), "duplicate_count": firestore.Increment(1)},
+        **timeout_kwargs("storage"),
+    )
+    logger.info(
+        "FACT_DEDUP_MERGED",
+        memory_id=match["memory_id"],
+        domain_id=req.domain_id,
+        similarity=match["similarity"],
+    )
+    # The fact is already counted; only a source new to the domain moves the snapshot counters.
+    try:
+        apply_source_to_snapshot(client, req.domain_id, req.source_url)
+    except Exception as exc:  # noqa: BLE001
+        logger.error("SNAPSHOT_UPDATE_FAILED", domain_id=req.domain_id, memory_id=match["memory_id"], error=str(exc))
+    _bump_version(client, req.domain_id, match["memory_id"])
+    merged = SaveFactData(memory_id=match["memory_id"], merged_into_existing=True, similarity=match["similarity"])
+    return SaveFactResponse(status="success", data=merged, error=None).model_dump()
+
+
+@scheduled("storage")
+def tool_check_duplicate_facts(payload: CheckDuplicatesRequest | Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Flag candidates that restate an earlier candidate in the same batch, or (RUN_REAL_MEMORY=1)
+    a fact already stored in the domain. Flags are advisory; nothing is written.
+    """
+    req = _ensure(CheckDuplicatesRequest, payload)
+    cfg = load_dedup_config()
+    threshold = float(cfg["similarity_threshold"])
+    min_tokens = int(cfg["min_tokens"])
+    flags: List[DuplicateFlag] = []
+    seen: List[tuple[CandidateFact, str, int]] = []
+    client = None
+    if cfg["enabled"] and os.getenv("RUN_REAL_MEMORY") == "1":
+        try:
+            client = _firestore_client()
+        except Exception as exc:  # noqa: BLE001
+            return {"status": "error", "data": [], "error": f"MEMORY_READ_ERROR: {exc}"}
+
+    stored_lookups: Dict[str, List[int]] = {}
+    for fact in req.facts:
+        flag = DuplicateFlag(fact_id=fact.fact_id)
+        if cfg["enabled"]:
+            fact_hash, fact_sim = text_hash(fact.content), simhash64(fact.content)
+            long_enough = len(normalize_fact_text(fact.content).split()) >= min_tokens
+            for prev, prev_hash, prev_sim in seen:
+                if prev.domain_id != fact.domain_id:
+                    continue
+                score = 1.0 if prev_hash == fact_hash else similarity(prev_sim, fact_sim)
+                if prev_hash == fact_hash or (long_enough and score >= threshold):
+                    flag = DuplicateFlag(fact_id=fact.fact_id, duplicate_of=prev.fact_id, duplicate_kind="candidate", similarity=score)
+                    break
+            if flag.duplicate_of is None and client is not None:
+                stored_lookups.setdefault(fact.domain_id, []).append(len(flags))
+            seen.append((fact, fact_hash, fact_sim))
+        flags.append(flag)
+
+    # One batched hash/band lookup per domain instead of two queries per candidate.
+    for domain_id, positions in stored_lookups.items():
+        try:
+            _, domain_query = domain_facts(client, req.user_id, domain_id)
+            matches = find_duplicates(domain_query, [req.facts[i].content for i in positions], threshold, min_tokens)
+        except Exception as exc:  # noqa: BLE001
+            return {"status": "error", "data": [], "error": f"MEMORY_READ_ERROR: {exc}"}
+        for i, match in zip(positions, matches):
+            if match is not None:
+                flags[i] = DuplicateFlag(
+                    fact_id=flags[i].fact_id, duplicate_of=match["memory_id"], duplicate_kind="stored", similarity=match["similarity"]
+                )
+    return CheckDuplicatesResponse(status="success", data=flags, error=None).model_dump()
+
+
+@scheduled("storage")
+def tool_search_facts(payload: SearchFactsRequest | Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Rank the user's saved facts for a free-text query (optionally within one domain).
+    Real path (RUN_REAL_MEMORY=1) reads the local index, rebuilding it from storage whenever its fact count differs from the store's.
+    """
+    req = _ensure(SearchFactsRequest, payload)
+    if os.getenv("RUN_REAL_MEMORY") != "1":
+        time.sleep(LATENCY_SECONDS)
+        hit = FactHit(memory_id="mem_mock", domain_id=req.domain_id or "dom_ai", fact_text=f"Mock fact about {req.query}.", score=1.0)
+        return SearchFactsResponse(status="success", data=SearchFactsData(query=req.query, hits=[hit]), error=None).model_dump()
+
+    try:
+        # Facts saved before indexing existed, on another node, or missed by a failed index write make the counts differ.
+        rebuilt = sync_user_index(_firestore_client(), req.user_id)
+        if rebuilt is not None:
+            logger.info("FACT_INDEX_REBUILT", user_id=req.user_id, facts=rebuilt)
+        hits = search_facts(req.user_id, req.query, top_k=req.top_k, domain_id=req.domain_id)
     except Exception as exc:  # noqa: BLE001
-        return {"status": "error", "error": f"MEMORY_WRITE_ERROR: {exc}"}
+        return {"status": "error", "error": f"SEARCH_ERROR: {exc}"}
+    data = SearchFactsData(query=req.query, hits=[FactHit(**hit) for hit in hits])
+    return SearchFactsResponse(status="success" if hits else "empty", data=data, error=None).model_dump()
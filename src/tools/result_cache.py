@@ -0,0 +1,140 @@
+from __future__ import annotations
+
+"""
+Versioned result cache for per-domain derived results (snapshots, exports):
+- Each domain document carries a `version` counter bumped by every fact save and domain edit.
+- Results are cached in-process against the version they were computed at; a request whose version matches is served after a single version read.
+- On a version mismatch the last good result is served (marked stale) while one background refresh per key recomputes it.
+
+Public API:
+- bump_domain_version(client, domain_id): atomic increment; False for domains without a document (nothing is cached for them).
+- read_domain_version(client, domain_id): (exists, user_id, version) from one masked read.
+- VersionedCache(name, max_entries, max_age_seconds): get(key, version, compute, serve_stale=True) -> (value, state) with state hit|stale|miss; join() waits for refreshes.
+- snapshot_cache, export_cache: shared instances used by src/tools/domains.py.
+
+Usage: Cache entries are per process and LRU-bounded; correctness only relies on the stored version, so several processes can each keep their own copy. compute() must return a value worth caching or raise; exceptions from background refreshes are logged (CACHE_REFRESH_FAILED) and the stale value is kept. A background refresh runs in its own context at the snapshot priority for the requesting user, with no slot held and no turn deadline.
+"""
+
+import contextvars
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+
+from google.api_core.exceptions import NotFound
+from google.cloud import firestore
+
+from src.tools.firestore_query import get_document
+from src.utils.logger import get_logger
+from src.utils.scheduler import current_scope, scheduling
+
+REFRESH_WORKERS = 2
+REFRESH_PRIORITY = "snapshot"
+logger = get_logger("result_cache")
+_executor: Optional[ThreadPoolExecutor] = None
+_executor_lock = threading.Lock()
+
+
+def _refresh_executor() -> ThreadPoolExecutor:
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=REFRESH_WORKERS, thread_name_prefix="cache-refresh")
+        return _executor
+
+
+def bump_domain_version(client: Any, domain_id: str) -> bool:
+    try:
+        client.collection("domains").document(domain_id).update({"version": firestore.Increment(1)})
+    except NotFound:
+        return False
+    return True
+
+
+def read_domain_version(client: Any, domain_id: str) -> Tuple[bool, Optional[str], int]:
+    snap = get_document(client.collection("domains").document(domain_id), fields=["user_id", "version"])
+    if not snap.exists:
+        return False, None, 0
+    data = snap.to_dict() or {}
+    return True, data.get("user_id"), int(data.get("version", 0) or 0)
+
+
+class VersionedCache:
+    def __init__(self, name: str, max_entries: int = 256, max_age_seconds: Optional[float] = None) -> None:
+        """max_age_seconds bounds how long any entry may be served (e.g. results holding signed URLs)."""
+        self.name = name
+        self.max_entries = max_entries
+        self.max_age_seconds = max_age_seconds
+        self._entries: "OrderedDict[Hashable, Tuple[int, Any, float]]" = OrderedDict()
+        self._refreshing: Dict[Hashable, Future] = {}
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable, version: int, compute: Callable[[], Any], serve_stale: bool = True) -> Tuple[Any, str]:
+        """serve_stale=False recomputes inline on a version change (for results that are cheap to rebuild)."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and self.max_age_seconds is not None and time.monotonic() - entry[2] > self.max_age_seconds:
+                del self._entries[key]
+                entry = None
+            if entry is not None:
+                self._entries.move_to_end(key)
+        if entry is not None and entry[0] == version:
+            return entry[1], "hit"
+        if entry is not None and serve_stale:
+            self._refresh_in_background(key, version, compute)
+            return entry[1], "stale"
+        value = compute()
+        self._store(key, version, value)
+        return value, "miss"
+
+    def _store(self, key: Hashable, version: int, value: Any) -> None:
+        with self._lock:
+            current = self._entries.get(key)
+            # A slower refresh for an older version must not overwrite a newer one.
+            if current is not None and current[0] > version:
+                return
+            self._entries[key] = (version, value, time.monotonic())
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def _refresh_in_background(self, key: Hashable, version: int, compute: Callable[[], Any]) -> None:
+        with self._lock:
+            if key in self._refreshing:
+                return
+            # A fresh context, not a copy: the caller's may hold slots that would let the refresh skip the
+            # scheduler after the caller has released them, and the turn deadline that would cut the refresh off
+            # (CACHE_REFRESH_FAILED) once the turn that served the stale value ends. Only the user is carried over.
+            _, user_id = current_scope()
+            ctx = contextvars.Context()
+            self._refreshing[key] = _refresh_executor().submit(ctx.run, self._refresh, key, version, compute, user_id)
+
+    def _refresh(self, key: Hashable, version: int, compute: Callable[[], Any], user_id: str = "") -> None:
+        try:
+            # compute() takes its own storage and llm slots; holding one here would pin it across Gemini calls.
+            with scheduling(REFRESH_PRIORITY, user_id=user_id):
+                value = compute()
+            self._store(key, version, value)
+            logger.info("CACHE_REFRESHED", cache=self.name, key=str(key), version=version)
+        except Exception as exc:  # noqa: BLE001
+            logger.error("CACHE_REFRESH_FAILED", cache=self.name, key=str(key), version=version, error=str(exc))
+        finally:
+            with self._lock:
+                self._refreshing.pop(key, None)
+
+    def join(self) -> None:
+        """Wait for in-flight background refreshes (tests, graceful shutdown)."""
+        with self._lock:
+            pending = list(self._refreshing.values())
+        for future in pending:
+            future.result()
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+snapshot_cache = VersionedCache("domain_snapshot")
+# Cloud export links are signed for an hour (src/tools/export_store.py); drop entries well before that.
+export_cache = VersionedCache("domain_export", max_entries=64, max_age_seconds=45 * 60)
@@ -0,0 +1,295 @@
+from __future__ import annotations
+
+"""
+Domain snapshot state:
+- Keeps one Firestore document per domain with the current super/extended summary and SnapshotMeta counters.
+- rolling mode: each saved fact is folded in with a small LLM merge step, so reading a snapshot is a single document read.
+- tree mode: facts are grouped (by source or day), group and branch summaries are cached in subcollections and
+  only dirty groups/branches are re-summarized on read, so cost grows with changed facts, not total facts.
+  Each save bumps dirty_seq on its group, branch and snapshot; a refresh clears a dirty flag only if dirty_seq is
+  unchanged since it read the node, so saves made during a refresh are not lost.
+
+Public API:
+- group_key_for(source_url): grouping key stored on each fact document.
+- apply_fact_to_snapshot(client, user_id, domain_id, fact_text, source_url, group_key=None): update state for one saved fact.
+- read_snapshot_state(client, domain_id): return the stored state dict or None when no fact was saved yet.
+- apply_source_to_snapshot(client, domain_id, source_url): count a new source brought by a merged duplicate.
+- refresh_tree_snapshot(client, domain_id, state): recompute dirty groups/branches and the root summary.
+
+Usage: Called by tool_save_fact_to_memory on the real path (RUN_REAL_MEMORY=1) and read by tool_generate_domain_snapshot. Writes to SNAPSHOT_COLLECTION_NAME (default domain_snapshots) with `groups`/`branches`/`sources` subcollections. Mode and fan-out limits come from `snapshots` in config/config.yaml. Summaries use ai_analysis (mock unless RUN_REAL_AI=1). Counters are updated transactionally; concurrent saves to one domain are last-writer-wins for the rolling summary text.
+"""
+
+import hashlib
+import os
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Tuple
+
+from google.cloud import firestore
+from google.cloud.firestore import Client
+
+from src.storage.client import run_transaction
+from src.tools import ai_analysis
+from src.tools.fact_store import domain_facts
+from src.tools.firestore_query import get_document, get_documents, stream_documents
+from src.utils.config_loader import load_snapshot_config
+from src.utils.scheduler import slot, worker_context
+
+DEFAULT_SNAPSHOT_COLLECTION = "domain_snapshots"
+SNAPSHOT_READ_FIELDS = [
+    "user_id",
+    "domain_name",
+    "super_summary",
+    "extended_summary",
+    "fact_count",
+    "total_char_length",
+    "source_count",
+    "tree_dirty",
+    "dirty_seq",
+]
+# Read inside the save transaction; source_hashes only exists on snapshots written before the sources subcollection.
+SNAPSHOT_COUNTER_FIELDS = ["fact_count", "total_char_length", "source_count", "source_hashes", "dirty_seq"]
+
+
+def snapshot_collection_name() -> str:
+    return os.getenv("SNAPSHOT_COLLECTION_NAME", DEFAULT_SNAPSHOT_COLLECTION)
+
+
+def _short_hash(value: str) -> str:
+    return hashlib.sha1(value.strip().encode("utf-8")).hexdigest()[:12]
+
+
+def group_key_for(source_url: str) -> str:
+    if load_snapshot_config()["group_by"] == "day":
+        return "day_" + datetime.now(timezone.utc).strftime("%Y-%m-%d")
+    return "src_" + _short_hash(source_url)
+
+
+def _branch_for(group_key: str, branch_count: int) -> str:
+    return f"b{int(_short_hash(group_key), 16) % branch_count:03d}"
+
+
+def read_snapshot_state(client: Client, domain_id: str) -> Optional[Dict[str, Any]]:
+    snap = get_document(client.collection(snapshot_collection_name()).document(domain_id), fields=SNAPSHOT_READ_FIELDS)
+    if not snap.exists:
+        return None
+    return snap.to_dict() or None
+
+
+def _domain_name(client: Client, domain_id: str) -> str:
+    snap = get_document(client.collection("domains").document(domain_id), fields=["name"])
+    if snap.exists:
+        return (snap.to_dict() or {}).get("name", "Domain")
+    return "Domain"
+
+
+def apply_fact_to_snapshot(
+    client: Client,
+    user_id: str,
+    domain_id: str,
+    fact_text: str,
+    source_url: str,
+    group_key: Optional[str] = None,
+) -> Dict[str, Any]:
+    """
+    Fold one saved fact into the domain's snapshot state and return the new state.
+    Counters and the source set are read and written in one transaction, so concurrent saves never lose a count;
+    the rolling summary merge runs before it (no LLM call inside a retried transaction).
+    Raises RuntimeError when the rolling merge step fails; counters are not advanced in that case.
+    """
+    cfg = load_snapshot_config()
+    doc_ref = client.collection(snapshot_collection_name()).document(domain_id)
+    # Storage work takes its own slots (pass-through when the caller holds one), never across the LLM merge.
+    with slot("storage"):
+        snap = get_document(doc_ref, fields=["domain_name", "super_summary", "extended_summary"])
+        state: Dict[str, Any] = (snap.to_dict() or {}) if snap.exists else {}
+        domain_name = state.get("domain_name") or _domain_name(client, domain_id)
+
+    updates: Dict[str, Any] = {"user_id": user_id, "domain_id": domain_id, "domain_name": domain_name}
+    dirty_refs = []
+    if cfg["mode"] == "tree":
+        # Defer summarization to read time; only mark the affected branch dirty.
+        group_key = group_key or group_key_for(source_url)
+        branch = _branch_for(group_key, int(cfg["branch_count"]))
+        dirty_refs = [
+            (
+                doc_ref.collection("groups").document(group_key),
+                {"group_key": group_key, "branch": branch, "dirty": True, "dirty_seq": firestore.Increment(1)},
+            ),
+            (doc_ref.collection("branches").document(branch), {"branch": branch, "dirty": True, "dirty_seq": firestore.Increment(1)}),
+        ]
+        updates["tree_dirty"] = True
+    else:
+        merged = ai_analysis.tool_merge_snapshot_summary(
+            {
+                "domain_name": domain_name,
+                "previous_super_summary": state.get("super_summary", ""),
+                "previous_extended_summary": state.get("extended_summary", ""),
+                "new_fact_text": fact_text,
+            }
+        )
+        if merged.get("status") != "success":
+            raise RuntimeError(merged.get("error_detail") or "SNAPSHOT_MERGE_FAILED")
+        updates.update(super_summary=merged["super_summary"], extended_summary=merged["extended_summary"])
+
+    # One document per distinct source keeps the snapshot document bounded however many sources a domain has.
+    source_key = _short_hash(source_url)
+    source_ref = doc_ref.collection("sources").document(source_key)
+
+    def apply(transaction: Any) -> Dict[str, Any]:
+        current_snap, source_snap = get_documents(client, [doc_ref, source_ref], fields=SNAPSHOT_COUNTER_FIELDS, transaction=transaction)
+        current = (current_snap.to_dict() or {}) if current_snap.exists else {}
+        # Snapshots written before the sources subcollection keep their (no longer growing) hash list.
+        new_source = not source_snap.exists and source_key not in (current.get("source_hashes") or [])
+        counters = {
+            **({"dirty_seq": int(current.get("dirty_seq", 0)) + 1} if dirty_refs else {}),
+            "fact_count": int(current.get("fact_count", 0)) + 1,
+            "total_char_length": int(current.get("total_char_length", 0)) + len(fact_text),
+            "source_count": int(current.get("source_count", 0)) + int(new_source),
+        }
+        if new_source:
+            transaction.set(source_ref, {"source_key": source_key})
+        for ref, data in dirty_refs:
+            transaction.set(ref, data, merge=True)
+        transaction.set(doc_ref, {**updates, **counters, "updated_at": firestore.SERVER_TIMESTAMP}, merge=True)
+        return {**current, **updates, **counters}
+
+    with slot("storage"):
+        new_state = run_transaction(client, apply)
+    new_state.pop("source_hashes", None)
+    return new_state
+
+
+def apply_source_to_snapshot(client: Client, domain_id: str, source_url: str) -> bool:
+    """
+    Count the source of a fact merged into an existing one (the fact itself is already counted).
+    Returns whether the source was new to the domain. A merge can commit before the first save of the fact has
+    folded it into the snapshot, so a missing snapshot document is created here rather than losing the source.
+    """
+    doc_ref = client.collection(snapshot_collection_name()).document(domain_id)
+    source_key = _short_hash(source_url)
+    source_ref = doc_ref.collection("sources").document(source_key)
+
+    def apply(transaction: Any) -> bool:
+        current_snap, source_snap = get_documents(client, [doc_ref, source_ref], fields=SNAPSHOT_COUNTER_FIELDS, transaction=transaction)
+        current = (current_snap.to_dict() or {}) if current_snap.exists else {}
+        if source_snap.exists or source_key in (current.get("source_hashes") or []):
+            return False
+        transaction.set(source_ref, {"source_key": source_key})
+        counters = {"domain_id": domain_id, "source_count": int(current.get("source_count", 0)) + 1}
+        transaction.set(doc_ref, {**counters, "updated_at": firestore.SERVER_TIMESTAMP}, merge=True)
+        return True
+
+    with slot("storage"):
+        return run_transaction(client, apply)
+
+
+def _summarize(domain_name: str, texts: List[str], level: str, max_texts: int) -> Dict[str, str]:
+    """Summarize texts, splitting into bounded prompts and reducing the partial results when needed."""
+    if len(texts) > max_texts:
+        partials = [
+            _summarize(domain_name, texts[i : i + max_texts], level, max_texts)["extended_summary"]
+            for i in range(0, len(texts), max_texts)
+        ]
+        return _summarize(domain_name, partials, "summaries", max_texts)
+    resp = ai_analysis.tool_summarize_texts({"domain_name": domain_name, "texts": texts, "level": level})
+    if resp.get("status") != "success":
+        raise RuntimeError(resp.get("error_detail") or "SNAPSHOT_SUMMARIZE_FAILED")
+    return {"super_summary": resp["super_summary"], "extended_summary": resp["extended_summary"]}
+
+
+def _reduce(domain_name: str, members: Dict[str, str], max_texts: int, cached: List[Dict[str, Any]]) -> Tuple[Dict[str, str], List[Dict[str, Any]]]:
+    """
+    Summarize member summaries (key -> text). Over max_texts they are split into buckets by key hash; a bucket
+    whose members did not change reuses its cached partial, so only changed buckets and the final reduce call the LLM.
+    Returns (summary, partials to cache).
+    """
+    if len(members) <= max_texts:
+        return _summarize(domain_name, list(members.values()), "summaries", max_texts), []
+    bucket_count = -(-len(members) // max_texts)
+    buckets: List[List[str]] = [[] for _ in range(bucket_count)]
+    for key in sorted(members):
+        buckets[int(_short_hash(key), 16) % bucket_count].append(members[key])
+    reuse = {p["digest"]: p["summary"] for p in cached if p.get("digest") and p.get("summary")}
+    partials = []
+    for texts in buckets:
+        if not texts:
+            continue
+        digest = _short_hash("\n".join(texts))
+        summary = reuse.get(digest) or _summarize(domain_name, texts, "summaries", max_texts)["extended_summary"]
+        partials.append({"digest": digest, "summary": summary})
+    return _summarize(domain_name, [p["summary"] for p in partials], "summaries", max_texts), partials
+
+
+def _write_refreshed(client: Client, ref: Any, data: Dict[str, Any], seen_seq: int, dirty_field: str = "dirty") -> bool:
+    """
+    Store a recomputed summary; clear the dirty flag only when no save bumped dirty_seq since it was read,
+    so a fact saved during the refresh is picked up by the next one. Returns whether the flag was cleared.
+    """
+
+    def apply(transaction: Any) -> bool:
+        (snap,) = get_documents(client, [ref], fields=["dirty_seq"], transaction=transaction)
+        clean = int((snap.to_dict() or {}).get("dirty_seq", 0)) == seen_seq
+        transaction.set(ref, {**data, **({dirty_field: False} if clean else {})}, merge=True)
+        return clean
+
+    with slot("storage"):
+        return run_transaction(client, apply)
+
+
+def refresh_tree_snapshot(client: Client, domain_id: str, state: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Recompute dirty groups (map), then dirty branches (reduce), then the root summary.
+    Clean groups/branches are served from their cached summaries; a branch re-reduces its groups' cached summaries.
+    """
+    if not state.get("tree_dirty"):
+        return state
+    cfg = load_snapshot_config()
+    max_texts = int(cfg["max_texts_per_prompt"])
+    domain_name = state.get("domain_name", "Domain")
+    user_id = state.get("user_id", "")
+    doc_ref = client.collection(snapshot_collection_name()).document(domain_id)
+    groups = doc_ref.collection("groups")
+    branches = doc_ref.collection("branches")
+
+    def refresh_group(group_key: str, seen_seq: int) -> None:
+        _, domain_query = domain_facts(client, user_id, domain_id)
+        with slot("storage"):
+            facts = stream_documents(domain_query.where("group_key", "==", group_key), fields=["fact_text"])
+            texts = [(f.to_dict() or {}).get("fact_text", "") for f in facts]
+        summary = _summarize(domain_name, [t for t in texts if t], "facts", max_texts)
+        _write_refreshed(client, groups.document(group_key), {**summary, "fact_count": len(texts)}, seen_seq)
+
+    def refresh_branch(branch: str, seen_seq: int) -> None:
+        with slot("storage"):
+            members = {g.id: (g.to_dict() or {}).get("extended_summary", "") for g in stream_documents(groups.where("branch", "==", branch), fields=["extended_summary"])}
+            cached = (get_document(branches.document(branch), fields=["partials"]).to_dict() or {}).get("partials") or []
+        texts = {key: text for key, text in members.items() if text}
+        summary, partials = _reduce(domain_name, texts, max_texts, cached) if texts else ({"super_summary": "", "extended_summary": ""}, [])
+        _write_refreshed(client, branches.document(branch), {**summary, "partials": partials, "group_count": len(members)}, seen_seq)
+
+    def dirty(collection: Any) -> List[Tuple[str, int]]:
+        with slot("storage"):
+            return [(d.id, int((d.to_dict() or {}).get("dirty_seq", 0))) for d in stream_documents(collection.where("dirty", "==", True), fields=["dirty_seq"])]
+
+    dirty_groups = dirty(groups)
+    dirty_branches = dirty(branches)
+    with ThreadPoolExecutor(max_workers=int(cfg["max_parallel"])) as pool:
+        # Each task runs in a copy of the caller's context so read accounting follows it, minus any held slots:
+        # every worker takes its own storage slot, so the per-class caps bound the fan-out.
+        for fn, keys in ((refresh_group, dirty_groups), (refresh_branch, dirty_branches)):
+            futures = [pool.submit(worker_context().run, fn, key, seq) for key, seq in keys]
+            for future in futures:
+                future.result()
+
+    with slot("storage"):
+        branch_texts = [
+            (b.to_dict() or {}).get("extended_summary", "") for b in stream_documents(branches, fields=["extended_summary"])
+        ]
+    branch_texts = [t for t in branch_texts if t]
+    root = _summarize(domain_name, branch_texts, "summaries", max_texts) if branch_texts else {}
+    # Only the summaries are written: counters belong to the save transactions.
+    clean = _write_refreshed(
+        client, doc_ref, {**root, "updated_at": firestore.SERVER_TIMESTAMP}, int(state.get("dirty_seq", 0)), dirty_field="tree_dirty"
+    )
+    return {**state, **root, "tree_dirty": not clean}
@@ -0,0 +1,216 @@
+from __future__ import annotations
+
+"""
+Admission control and load shedding for agent turns and document work:
+- In-flight documents (discovery runs) are capped per user and globally; a run is admitted or rejected at once, never queued.
+- LLM tokens are metered over a sliding minute per user and globally; bulk work may only use `admission.bulk_token_share` of the global budget, so chat keeps headroom.
+- Idle users' token windows are dropped lazily: when that user is next admitted, or by a sweep that runs at most once per window, so recording tokens stays O(1) under the global lock.
+- Queued background jobs are capped per user and globally; the queue checks the caps in the same transaction as the insert, so they hold host-wide.
+- A rejection is a clear OVERLOADED answer with a retry hint instead of added latency; rejections and admissions are counted by reason for metrics.
+
+Public API:
+- Overloaded(rejection): exception for callers that must fail (job handlers), carrying the rejection.
+- Rejection: reason, message, retry_after_seconds.
+- AdmissionController(config=None): admit_turn(user_id) -> Rejection|None; admit_document(user_id) -> (Ticket|None, Rejection|None); admit_job(user_id, enqueue) -> (job_id|None, Rejection|None), where enqueue(max_pending=..., max_pending_per_user=...) -> job_id may raise QueueFull; record_tokens(user_id, tokens); stats().
+- Ticket: context manager/release() returning the slot.
+- get_admission_controller(): process-wide controller from `admission:` config.
+- overloaded_response(rejection, message_field="message_to_user", **fields): the OVERLOADED response dict agents return.
+
+Usage: run_agent_root checks admit_turn, the document processor admit_document (discovery) and admit_job (queue mode, also the bulk URL API); src/tools/ai_analysis.py records tokens per call (Gemini usage metadata, else a chars/4 estimate) against the scheduler's current user. In-flight and token limits are per process; job limits are host-wide.
+"""
+
+import threading
+import time
+from collections import deque
+from typing import Any, Callable, Deque, Dict, Optional, Tuple
+
+from pydantic import BaseModel
+
+from src.utils.config_loader import load_admission_config
+from src.utils.logger import get_logger
+from src.utils.scheduler import current_scope
+
+TOKEN_WINDOW_SECONDS = 60.0
+logger = get_logger("admission")
+_controller: Optional["AdmissionController"] = None
+_controller_lock = threading.Lock()
+
+
+class Rejection(BaseModel):
+    reason: str
+    message: str
+    retry_after_seconds: float
+
+
+class Overloaded(Exception):
+    def __init__(self, rejection: Rejection) -> None:
+        super().__init__(f"OVERLOADED: {rejection.reason}")
+        self.rejection = rejection
+
+
+class _TokenWindow:
+    def __init__(self) -> None:
+        self.entries: Deque[Tuple[float, int]] = deque()
+        self.total = 0
+
+    def add(self, now: float, tokens: int) -> None:
+        self.entries.append((now, tokens))
+        self.total += tokens
+
+    def used(self, now: float) -> int:
+        while self.entries and self.entries[0][0] <= now - TOKEN_WINDOW_SECONDS:
+            self.total -= self.entries.popleft()[1]
+        return self.total
+
+    def frees_in(self, now: float) -> float:
+        return max(1.0, self.entries[0][0] + TOKEN_WINDOW_SECONDS - now) if self.entries else 1.0
+
+
+class Ticket:
+    def __init__(self, counts: Dict[str, int], lock: threading.Lock, user_id: str) -> None:
+        self._counts = counts
+        self._lock = lock
+        self._user_id = user_id
+        self._released = False
+
+    def release(self) -> None:
+        with self._lock:
+            if self._released or self._user_id not in self._counts:
+                return
+            self._released = True
+            self._counts[self._user_id] -= 1
+            if self._counts[self._user_id] <= 0:
+                del self._counts[self._user_id]
+
+    def __enter__(self) -> "Ticket":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.release()
+
+
+class AdmissionController:
+    def __init__(self, config: Optional[Dict[str, Any]] = None) -> None:
+        self.cfg = config or load_admission_config()
+        self._lock = threading.Lock()
+        self._inflight: Dict[str, int] = {}
+        self._tokens: Dict[str, _TokenWindow] = {}
+        self._global_tokens = _TokenWindow()
+        self._next_sweep = 0.0
+        self.admitted: Dict[str, int] = {"turn": 0, "document": 0, "job": 0}
+        self.rejections: Dict[str, int] = {}
+
+    def _reject(self, reason: str, message: str, retry_after: float, user_id: Optional[str]) -> Rejection:
+        self.rejections[reason] = self.rejections.get(reason, 0) + 1
+        logger.info("ADMISSION_REJECTED", reason=reason, user_id=user_id, retry_after_seconds=round(retry_after, 1))
+        return Rejection(reason=reason, message=message, retry_after_seconds=round(retry_after, 1))
+
+    def _token_rejection(self, user_id: Optional[str], now: float) -> Optional[Rejection]:
+        priority, _ = current_scope()
+        budget = float(self.cfg["llm_tokens_per_minute"])
+        if priority == "bulk":
+            budget *= float(self.cfg["bulk_token_share"])
+        if self._global_tokens.used(now) >= budget:
+            return self._reject("global_tokens", "The assistant is at capacity right now.", self._global_tokens.frees_in(now), user_id)
+        window = self._tokens.get(user_id or "")
+        if window is None:
+            return None
+        used = window.used(now)
+        if used == 0:
+            del self._tokens[user_id]
+        elif used >= float(self.cfg["llm_tokens_per_minute_per_user"]):
+            return self._reject("user_tokens", "You have reached your per-minute processing limit.", window.frees_in(now), user_id)
+        return None
+
+    def admit_turn(self, user_id: Optional[str]) -> Optional[Rejection]:
+        if not self.cfg["enabled"]:
+            return None
+        with self._lock:
+            rejection = self._token_rejection(user_id, time.time())
+            if rejection is None:
+                self.admitted["turn"] += 1
+            return rejection
+
+    def _ticket(self, counts: Dict[str, int], user_id: str) -> Ticket:
+        counts[user_id] = counts.get(user_id, 0) + 1
+        return Ticket(counts, self._lock, user_id)
+
+    def admit_document(self, user_id: str) -> Tuple[Optional[Ticket], Optional[Rejection]]:
+        if not self.cfg["enabled"]:
+            return Ticket({}, self._lock, user_id), None
+        with self._lock:
+            rejection = self._token_rejection(user_id, time.time())
+            if rejection is not None:
+                return None, rejection
+            retry = float(self.cfg["retry_after_seconds"])
+            if sum(self._inflight.values()) >= int(self.cfg["max_inflight_documents"]):
+                return None, self._reject("global_documents", "Too many documents are being processed right now.", retry, user_id)
+            if self._inflight.get(user_id, 0) >= int(self.cfg["max_inflight_documents_per_user"]):
+                return None, self._reject("user_documents", "You already have documents processing; wait for them to finish.", retry, user_id)
+            self.admitted["document"] += 1
+            return self._ticket(self._inflight, user_id), None
+
+    def admit_job(self, user_id: str, enqueue: Callable[..., str]) -> Tuple[Optional[str], Optional[Rejection]]:
+        if not self.cfg["enabled"]:
+            return enqueue(), None
+        from src.jobs.queue import QueueFull
+
+        with self._lock:
+            rejection = self._token_rejection(user_id, time.time())
+            if rejection is not None:
+                return None, rejection
+        try:
+            # The queue counts and inserts in one transaction, so a burst of submissions cannot pass the caps together.
+            job_id = enqueue(max_pending=int(self.cfg["max_queued_jobs"]), max_pending_per_user=int(self.cfg["max_queued_jobs_per_user"]))
+        except QueueFull as exc:
+            retry = float(self.cfg["retry_after_seconds"])
+            with self._lock:
+                if exc.scope == "global":
+                    return None, self._reject("global_jobs", "The background queue is full right now.", retry, user_id)
+                return None, self._reject("user_jobs", "You already have many documents queued; wait for them to finish.", retry, user_id)
+        with self._lock:
+            self.admitted["job"] += 1
+        return job_id, None
+
+    def record_tokens(self, user_id: Optional[str], tokens: int) -> None:
+        now = time.time()
+        with self._lock:
+            self._global_tokens.add(now, tokens)
+            if user_id:
+                self._tokens.setdefault(user_id, _TokenWindow()).add(now, tokens)
+            if now >= self._next_sweep:
+                # Once per window, drop users who went idle without being admitted again, so the map stays bounded.
+                self._next_sweep = now + TOKEN_WINDOW_SECONDS
+                for uid in [uid for uid, w in self._tokens.items() if w.used(now) == 0]:
+                    del self._tokens[uid]
+
+    def stats(self) -> Dict[str, Any]:
+        now = time.time()
+        with self._lock:
+            return {
+                "inflight_documents": sum(self._inflight.values()),
+                "inflight_users": len(self._inflight),
+                "tokens_last_minute": self._global_tokens.used(now),
+                "admitted": dict(self.admitted),
+                "rejections": dict(self.rejections),
+            }
+
+
+def get_admission_controller() -> AdmissionController:
+    global _controller
+    with _controller_lock:
+        if _controller is None:
+            _controller = AdmissionController()
+        return _controller
+
+
+def overloaded_response(rejection: Rejection, message_field: str = "message_to_user", **fields: Any) -> Dict[str, Any]:
+    seconds = max(1, round(rejection.retry_after_seconds))
+    return {
+        "reasoning": f"Admission rejected: {rejection.reason}.",
+        "status": "OVERLOADED",
+        "error_detail": rejection.reason,
+        "retry_after_seconds": rejection.retry_after_seconds,
+        message_field: f"{rejection.message} Please try again in about {seconds} seconds.",
+        **fields,
+    }
@@ -8,6 +8,20 @@ Public API:
 - load_prompts(): returns dict of agent prompts.
 - load_model_config(component_id): returns merged default/override model config.
 - load_relevance_threshold(component_id): returns numeric threshold.
+- load_snapshot_config(): returns snapshot generation settings (mode, grouping, fan-out limits).
+- load_export_config(): returns export paging settings (page_size, pages_per_part).
+- load_dedup_config(): returns near-duplicate suppression settings (enabled, similarity_threshold, min_tokens).
+- load_search_config(): returns local fact search index settings (index_dir, embedding_dim, BM25 and fusion parameters).
+- load_storage_config(): returns storage backend settings (backend, sqlite_path); STORAGE_BACKEND/STORAGE_SQLITE_PATH env vars override.
+- load_jobs_config(): returns background job queue settings (mode queue|inline, sqlite_path, workers, lease/retry/poll timing); JOBS_MODE/JOBS_WORKERS/JOBS_SQLITE_PATH env vars override.
+- load_api_config(): returns HTTP API settings (max_concurrency, url_concurrency, max_urls_per_request, job wait/poll timing); API_MAX_CONCURRENCY env var overrides.
+- load_scheduler_config(): returns per-resource (llm, storage) concurrency caps, total and per priority class (interactive, snapshot, bulk).
+- load_admission_config(): returns admission-control limits (in-flight documents, LLM tokens per minute, queued jobs; per user and global) and the retry hint.
+- load_deadline_config(): returns the per-turn time budget (turn_seconds, max_turn_seconds) and the per-call timeout caps (http, llm, storage); TURN_DEADLINE_SECONDS env var overrides turn_seconds.
+- load_discovery_config(): returns multi-URL discovery limits (max_urls_per_message, max_concurrency, batch_document_chars).
+- load_context_cache_config(): returns document context caching settings (enabled, min_content_chars, ttl_seconds); CONTEXT_CACHE_ENABLED env var overrides enabled.
+- load_prefetch_config(): returns speculative document prefetch settings (enabled, max_workers, ttl_seconds, max_sessions); PREFETCH_ENABLED env var overrides enabled.
+- load_session_config(): returns ADK session backend settings (backend, sqlite_path, cache caps, idle TTL, compaction thresholds, candidate-fact TTL, cross-worker session lease TTL and poll interval); SESSION_BACKEND/SESSION_SQLITE_PATH env vars override.
 
 Usage: requires .env with GOOGLE_APPLICATION_CREDENTIALS/GOOGLE_CLOUD_PROJECT (and optional FIRESTORE_DATABASE, GOOGLE_API_KEY). Reads config/prompts.yaml and config/config.yaml. See docs/project_overview.md for architecture context. Experimental flags may change structure without notice.
 """
@@ -24,6 +38,87 @@ from pydantic_settings import BaseSettings, SettingsConfigDict
 
 BASE_DIR = Path(__file__).resolve().parents[2]
 DEFAULT_RELEVANCE_THRESHOLD = 0.7
+DEFAULT_SNAPSHOT_CONFIG: Dict[str, Any] = {
+    "mode": "rolling",
+    "group_by": "source",
+    "branch_count": 16,
+    "max_parallel": 8,
+    "max_texts_per_prompt": 100,
+}
+DEFAULT_EXPORT_CONFIG: Dict[str, Any] = {"page_size": 500, "pages_per_part": 20}
+DEFAULT_DEDUP_CONFIG: Dict[str, Any] = {"enabled": True, "similarity_threshold": 0.9, "min_tokens": 5}
+# Lowest threshold the SimHash bands in src/tools/dedup.py can find: 8 bands of 8 bits only
+# guarantee a shared band within 7 differing bits, i.e. 1 - 7/64.
+MIN_DEDUP_SIMILARITY = 1 - 7 / 64
+DEFAULT_SEARCH_CONFIG: Dict[str, Any] = {
+    "index_dir": "data/fact_index",
+    "embedding_dim": 256,
+    "bm25_k1": 1.2,
+    "bm25_b": 0.75,
+    "top_k": 5,
+    "candidate_k": 50,
+    "rrf_k": 60,
+    "min_similarity": 0.2,
+}
+DEFAULT_STORAGE_CONFIG: Dict[str, Any] = {"backend": "firestore", "sqlite_path": "data/kb_store.sqlite3"}
+DEFAULT_SESSION_CONFIG: Dict[str, Any] = {
+    "backend": "sqlite",
+    "sqlite_path": "data/sessions.sqlite3",
+    "max_cached_sessions": 1024,
+    "max_cached_bytes": 64 * 1024 * 1024,
+    "idle_ttl_seconds": 86400,
+    "sweep_interval_seconds": 300,
+    "compact_max_events": 200,
+    "compact_max_bytes": 256 * 1024,
+    "compact_keep_recent": 20,
+    "candidate_ttl_seconds": 3600,
+    "lease_seconds": 300,
+    "lease_poll_seconds": 0.05,
+}
+DEFAULT_JOBS_CONFIG: Dict[str, Any] = {
+    "mode": "queue",
+    "sqlite_path": "data/jobs.sqlite3",
+    "workers": 2,
+    "autostart_workers": True,
+    "lease_seconds": 120,
+    "max_attempts": 3,
+    "retry_backoff_seconds": 5,
+    "poll_interval_seconds": 0.5,
+    "result_ttl_seconds": 86400,
+}
+DEFAULT_SCHEDULER_CONFIG: Dict[str, Any] = {
+    "enabled": True,
+    "llm": {"max_concurrency": 16, "interactive": 16, "snapshot": 8, "bulk": 4},
+    "storage": {"max_concurrency": 64, "interactive": 64, "snapshot": 32, "bulk": 16},
+}
+DEFAULT_ADMISSION_CONFIG: Dict[str, Any] = {
+    "enabled": True,
+    "max_inflight_documents": 32,
+    "max_inflight_documents_per_user": 4,
+    "llm_tokens_per_minute": 1_000_000,
+    "llm_tokens_per_minute_per_user": 100_000,
+    "bulk_token_share": 0.7,
+    "max_queued_jobs": 1000,
+    "max_queued_jobs_per_user": 20,
+    "retry_after_seconds": 5,
+}
+DEFAULT_DEADLINE_CONFIG: Dict[str, Any] = {
+    "turn_seconds": 30,
+    "max_turn_seconds": 120,
+    "http_timeout_seconds": 10,
+    "llm_timeout_seconds": 60,
+    "storage_timeout_seconds": 10,
+}
+DEFAULT_DISCOVERY_CONFIG: Dict[str, Any] = {"max_urls_per_message": 10, "max_concurrency": 4, "batch_document_chars": 8000}
+DEFAULT_CONTEXT_CACHE_CONFIG: Dict[str, Any] = {"enabled": True, "min_content_chars": 16000, "ttl_seconds": 600}
+DEFAULT_PREFETCH_CONFIG: Dict[str, Any] = {"enabled": True, "max_workers": 8, "ttl_seconds": 60, "max_sessions": 1024}
+DEFAULT_API_CONFIG: Dict[str, Any] = {
+    "max_concurrency": 64,
+    "url_concurrency": 8,
+    "max_urls_per_request": 100,
+    "wait_timeout_seconds": 120,
+    "poll_interval_seconds": 0.5,
+}
 
 
 class EnvSettings(BaseSettings):
@@ -92,6 +187,138 @@ class ConfigLoader:
         except (TypeError, ValueError) as exc:
             raise ValueError(f"Invalid relevance threshold for '{component_id}': {value}") from exc
 
+    def get_snapshot_config(self) -> Dict[str, Any]:
+        merged = {**DEFAULT_SNAPSHOT_CONFIG, **(self.config.get("snapshots", {}) or {})}
+        if merged["mode"] not in {"rolling", "tree"}:
+            raise ValueError(f"Invalid snapshots.mode: {merged['mode']}")
+        if merged["group_by"] not in {"source", "day"}:
+            raise ValueError(f"Invalid snapshots.group_by: {merged['group_by']}")
+        return merged
+
+    def get_export_config(self) -> Dict[str, Any]:
+        merged = {**DEFAULT_EXPORT_CONFIG, **(self.config.get("export", {}) or {})}
+        if int(merged["page_size"]) < 1 or int(merged["pages_per_part"]) < 1:
+            raise ValueError("export.page_size and export.pages_per_part must be positive")
+        return merged
+
+    def get_dedup_config(self) -> Dict[str, Any]:
+        merged = {**DEFAULT_DEDUP_CONFIG, **(self.config.get("dedup", {}) or {})}
+        if not MIN_DEDUP_SIMILARITY <= float(merged["similarity_threshold"]) <= 1.0:
+            raise ValueError(f"dedup.similarity_threshold must be in [{MIN_DEDUP_SIMILARITY}, 1]; lower values miss matches the bands never compare")
+        return merged
+
+    def get_search_config(self) -> Dict[str, Any]:
+        merged = {**DEFAULT_SEARCH_CONFIG, **(self.config.get("search", {}) or {})}
+        if int(merged["embedding_dim"]) < 8 or int(merged["top_k"]) < 1:
+            raise ValueError("search.embedding_dim must be >= 8 and search.top_k >= 1")
+        return merged
+
+    def get_storage_config(self) -> Dict[str, Any]:
+        merged = {**DEFAULT_STORAGE_CONFIG, **(self.config.get("storage", {}) or {})}
+        merged["backend"] = os.getenv("STORAGE_BACKEND") or merged["backend"]
+        merged["sqlite_path"] = os.getenv("STORAGE_SQLITE_PATH") or merged["sqlite_path"]
+        if merged["backend"] not in {"firestore", "sqlite"}:
+            raise ValueError(f"Invalid storage.backend: {merged['backend']}")
+        path = Path(merged["sqlite_path"])
+        merged["sqlite_path"] = str(path if path.is_absolute() else BASE_DIR / path)
+        return merged
+
+    def get_session_config(self) -> Dict[str, Any]:
+        merged = {**DEFAULT_SESSION_CONFIG, **(self.config.get("session", {}) or {})}
+        merged["backend"] = os.getenv("SESSION_BACKEND") or merged["backend"]
+        merged["sqlite_path"] = os.getenv("SESSION_SQLITE_PATH") or merged["sqlite_path"]
+        if merged["backend"] not in {"memory", "sqlite"}:
+            raise ValueError(f"Invalid session.backend: {merged['backend']}")
+        if int(merged["max_cached_sessions"]) < 1:
+            raise ValueError("session.max_cached_sessions must be positive")
+        if float(merged["idle_ttl_seconds"]) < 0 or int(merged["max_cached_bytes"]) < 0:
+            raise ValueError("session.idle_ttl_seconds and session.max_cached_bytes must be >= 0 (0 disables)")
+        if int(merged["compact_keep_recent"]) < 1 or min(int(merged["compact_max_events"]), int(merged["compact_max_bytes"])) < 0:
+            raise ValueError("session.compact_keep_recent must be positive and compaction thresholds >= 0 (0 disables)")
+        if float(merged["candidate_ttl_seconds"]) <= 0:
+            raise ValueError("session.candidate_ttl_seconds must be positive")
+        if float(merged["lease_seconds"]) <= 0 or float(merged["lease_poll_seconds"]) <= 0:
+            raise ValueError("session.lease_seconds and session.lease_poll_seconds must be positive")
+        path = Path(merged["sqlite_path"])
+        merged["sqlite_path"] = str(path if path.is_absolute() else BASE_DIR / path)
+        return merged
+
+
+    def get_jobs_config(self) -> Dict[str, Any]:
+        merged = {**DEFAULT_JOBS_CONFIG, **(self.config.get("jobs", {}) or {})}
+        merged["mode"] = os.getenv("JOBS_MODE") or merged["mode"]
+        merged["workers"] = int(os.getenv("JOBS_WORKERS") or merged["workers"])
+        merged["sqlite_path"] = os.getenv("JOBS_SQLITE_PATH") or merged["sqlite_path"]
+        if merged["mode"] not in {"queue", "inline"}:
+            raise ValueError(f"Invalid jobs.mode: {merged['mode']}")
+        if merged["workers"] < 1 or int(merged["max_attempts"]) < 1:
+            raise ValueError("jobs.workers and jobs.max_attempts must be positive")
+        if float(merged["lease_seconds"]) <= 0 or float(merged["poll_interval_seconds"]) <= 0:
+            raise ValueError("jobs.lease_seconds and jobs.poll_interval_seconds must be positive")
+        path = Path(merged["sqlite_path"])
+        merged["sqlite_path"] = str(path if path.is_absolute() else BASE_DIR / path)
+        return merged
+
+    def get_scheduler_config(self) -> Dict[str, Any]:
+        overrides = self.config.get("scheduler", {}) or {}
+        merged: Dict[str, Any] = {"enabled": bool(overrides.get("enabled", DEFAULT_SCHEDULER_CONFIG["enabled"]))}
+        for resource in ("llm", "storage"):
+            limits = {**DEFAULT_SCHEDULER_CONFIG[resource], **(overrides.get(resource, {}) or {})}
+            if any(int(v) < 1 for v in limits.values()):
+                raise ValueError(f"scheduler.{resource} limits must be positive")
+            merged[resource] = {k: int(v) for k, v in limits.items()}
+        return merged
+
+    def get_admission_config(self) -> Dict[str, Any]:
+        merged = {**DEFAULT_ADMISSION_CONFIG, **(self.config.get("admission", {}) or {})}
+        merged["enabled"] = os.getenv("ADMISSION_ENABLED", str(merged["enabled"])).lower() not in {"0", "false", "no"}
+        limits = [k for k in DEFAULT_ADMISSION_CONFIG if k.startswith(("max_", "llm_"))]
+        if any(float(merged[k]) < 1 for k in limits):
+            raise ValueError(f"admission limits must be positive: {', '.join(limits)}")
+        if not 0 < float(merged["bulk_token_share"]) <= 1:
+            raise ValueError("admission.bulk_token_share must be in (0, 1]")
+        return merged
+
+    def get_deadline_config(self) -> Dict[str, Any]:
+        merged = {**DEFAULT_DEADLINE_CONFIG, **(self.config.get("deadlines", {}) or {})}
+        merged["turn_seconds"] = os.getenv("TURN_DEADLINE_SECONDS") or merged["turn_seconds"]
+        merged = {k: float(v) for k, v in merged.items()}
+        if any(v <= 0 for v in merged.values()):
+            raise ValueError("deadlines values must be positive")
+        if merged["turn_seconds"] > merged["max_turn_seconds"]:
+            raise ValueError("deadlines.turn_seconds must not exceed deadlines.max_turn_seconds")
+        return merged
+
+    def get_discovery_config(self) -> Dict[str, Any]:
+        merged = {**DEFAULT_DISCOVERY_CONFIG, **(self.config.get("discovery", {}) or {})}
+        merged = {k: int(v) for k, v in merged.items()}
+        if any(v < 1 for v in merged.values()):
+            raise ValueError("discovery.max_urls_per_message, discovery.max_concurrency and discovery.batch_document_chars must be positive")
+        return merged
+
+    def get_prefetch_config(self) -> Dict[str, Any]:
+        merged = {**DEFAULT_PREFETCH_CONFIG, **(self.config.get("prefetch", {}) or {})}
+        merged["enabled"] = os.getenv("PREFETCH_ENABLED", str(merged["enabled"])).lower() not in {"0", "false", "no"}
+        if int(merged["max_workers"]) < 1 or int(merged["max_sessions"]) < 1 or float(merged["ttl_seconds"]) <= 0:
+            raise ValueError("prefetch.max_workers, prefetch.max_sessions and prefetch.ttl_seconds must be positive")
+        return merged
+
+    def get_context_cache_config(self) -> Dict[str, Any]:
+        merged = {**DEFAULT_CONTEXT_CACHE_CONFIG, **(self.config.get("context_cache", {}) or {})}
+        merged["enabled"] = os.getenv("CONTEXT_CACHE_ENABLED", str(merged["enabled"])).lower() not in {"0", "false", "no"}
+        if int(merged["min_content_chars"]) < 0 or float(merged["ttl_seconds"]) <= 0:
+            raise ValueError("context_cache.min_content_chars must be >= 0 and context_cache.ttl_seconds positive")
+        return merged
+
+    def get_api_config(self) -> Dict[str, Any]:
+        merged = {**DEFAULT_API_CONFIG, **(self.config.get("api", {}) or {})}
+        merged["max_concurrency"] = int(os.getenv("API_MAX_CONCURRENCY") or merged["max_concurrency"])
+        if merged["max_concurrency"] < 1 or int(merged["url_concurrency"]) < 1 or int(merged["max_urls_per_request"]) < 1:
+            raise ValueError("api.max_concurrency, api.url_concurrency and api.max_urls_per_request must be positive")
+        if float(merged["poll_interval_seconds"]) <= 0:
+            raise ValueError("api.poll_interval_seconds must be positive")
+        return merged
+
 
 def load_prompts() -> Dict[str, str]:
     return ConfigLoader.instance().prompts
@@ -103,3 +330,59 @@ def load_model_config(component_id: str) -> Dict[str, Any]:
 
 def load_relevance_threshold(component_id: str) -> float:
     return ConfigLoader.instance().get_relevance_threshold(component_id)
+
+
+def load_snapshot_config() -> Dict[str, Any]:
+    return ConfigLoader.instance().get_snapshot_config()
+
+
+def load_export_config() -> Dict[str, Any]:
+    return ConfigLoader.instance().get_export_config()
+
+
+def load_dedup_config() -> Dict[str, Any]:
+    return ConfigLoader.instance().get_dedup_config()
+
+
+def load_storage_config() -> Dict[str, Any]:
+    return ConfigLoader.instance().get_storage_config()
+
+
+def load_session_config() -> Dict[str, Any]:
+    return ConfigLoader.instance().get_session_config()
+
+
+def load_search_config() -> Dict[str, Any]:
+    return ConfigLoader.instance().get_search_config()
+
+
+def load_jobs_config() -> Dict[str, Any]:
+    return ConfigLoader.instance().get_jobs_config()
+
+
+def load_api_config() -> Dict[str, Any]:
+    return ConfigLoader.instance().get_api_config()
+
+
+def load_scheduler_config() -> Dict[str, Any]:
+    return ConfigLoader.instance().get_scheduler_config()
+
+
+def load_admission_config() -> Dict[str, Any]:
+    return ConfigLoader.instance().get_admission_config()
+
+
+def load_deadline_config() -> Dict[str, Any]:
+    return ConfigLoader.instance().get_deadline_config()
+
+
+def load_prefetch_config() -> Dict[str, Any]:
+    return ConfigLoader.instance().get_prefetch_config()
+
+
+def load_discovery_config() -> Dict[str, Any]:
+    return ConfigLoader.instance().get_discovery_config()
+
+
+def load_context_cache_config() -> Dict[str, Any]:
+    return ConfigLoader.instance().get_context_cache_config()
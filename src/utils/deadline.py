@@ -0,0 +1,84 @@
+from __future__ import annotations
+
+"""
+Per-turn deadlines propagated through the agent → tool call chain:
+- A turn opens deadline(seconds); the absolute deadline lives in a contextvar, so every tool, scheduler slot and worker thread started with contextvars.copy_context() sees it without extra arguments.
+- Nested deadlines only tighten the enclosing one, never extend it.
+- Blocking calls take their timeout from the remaining budget (capped by `deadlines.<kind>_timeout_seconds`) instead of a fixed value, so sequential calls cannot add up past the turn budget.
+- Cancellation is cooperative: check() between steps raises DeadlineExceeded once the budget is spent, and callers turn that into a partial or timeout answer.
+
+Public API:
+- DeadlineExceeded(stage): TimeoutError raised when the budget is spent; stage names where.
+- deadline(seconds): context manager bounding the calls made inside it; None leaves the current deadline unchanged.
+- remaining() -> seconds left, or None when no deadline is set.
+- check(stage): raise DeadlineExceeded when the budget is spent.
+- timeout_for(kind) -> per-call timeout for "http", "llm" or "storage": the config cap, or less when the turn has less left.
+- timeout_kwargs(kind, key="timeout") -> {key: timeout_for(kind)} under a deadline, else {} so client library defaults apply.
+- timeout_response(stage, message_field="message_to_user", **fields): the TIMEOUT response dict agents return.
+
+Usage: kb_adk/agent.py opens the turn deadline from RunConfig custom_metadata["turn_deadline_seconds"], measured from the invocation's user event; server/adk_web.py from the request's deadline_seconds (default deadlines.turn_seconds). src/tools/content.py, src/tools/ai_analysis.py and src/tools/firestore_query.py derive their timeouts here; the scheduler stops waiting for a slot at the deadline. Background jobs and background cache refreshes (src/tools/result_cache.py) run without a deadline.
+"""
+
+import contextvars
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, Optional
+
+from src.utils.config_loader import load_deadline_config
+
+_deadline: contextvars.ContextVar[Optional[float]] = contextvars.ContextVar("turn_deadline", default=None)
+
+
+class DeadlineExceeded(TimeoutError):
+    def __init__(self, stage: str) -> None:
+        super().__init__(f"Deadline exceeded during {stage}")
+        self.stage = stage
+
+
+@contextmanager
+def deadline(seconds: Optional[float]) -> Iterator[None]:
+    if seconds is None:
+        yield
+        return
+    target = time.monotonic() + float(seconds)
+    current = _deadline.get()
+    token = _deadline.set(target if current is None else min(current, target))
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+def remaining() -> Optional[float]:
+    target = _deadline.get()
+    return None if target is None else target - time.monotonic()
+
+
+def check(stage: str) -> None:
+    left = remaining()
+    if left is not None and left <= 0:
+        raise DeadlineExceeded(stage)
+
+
+def timeout_for(kind: str) -> float:
+    cap = float(load_deadline_config()[f"{kind}_timeout_seconds"])
+    left = remaining()
+    if left is None:
+        return cap
+    if left <= 0:
+        raise DeadlineExceeded(kind)
+    return min(cap, left)
+
+
+def timeout_kwargs(kind: str, key: str = "timeout") -> Dict[str, float]:
+    return {key: timeout_for(kind)} if _deadline.get() is not None else {}
+
+
+def timeout_response(stage: str, message_field: str = "message_to_user", **fields: Any) -> Dict[str, Any]:
+    return {
+        "reasoning": f"Turn deadline exceeded during {stage}.",
+        "status": "TIMEOUT",
+        "error_detail": "deadline_exceeded",
+        message_field: "That took longer than this turn allows; please try again or send a smaller request.",
+        **fields,
+    }
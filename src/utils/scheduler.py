@@ -0,0 +1,195 @@
+from __future__ import annotations
+
+"""
+Central scheduler for outbound LLM and storage calls:
+- Every call takes a slot on its resource ("llm", "storage"); each resource has a total concurrency cap and a cap per priority class.
+- Classes are served strictly by priority (interactive > snapshot > bulk) whenever a slot frees; within a class, users are served round-robin so one user's backlog cannot starve another's.
+- The class and user come from the caller's context (contextvars), so tools need no extra arguments; worker threads started with worker_context() inherit them.
+- Slots are reentrant per context: a call nested inside one already holding the resource (a storage tool calling another) passes straight through.
+- Under a turn deadline (src/utils/deadline.py) a caller stops waiting for a slot when the budget runs out and gets DeadlineExceeded instead of a late slot.
+
+Public API:
+- PRIORITIES: ("interactive", "snapshot", "bulk"), highest first.
+- scheduling(priority=None, user_id=None, demote_only=False): context manager setting the class/user for calls made inside it; demote_only never raises the current class.
+- current_scope() -> (priority, user_id) of the calling context.
+- worker_context() -> copy of the calling context (class, user, deadline) with no slots held; fan-out workers run in it so each takes its own slots instead of passing through on the caller's.
+- slot(resource, user_id=None): context manager holding one slot of the resource for the current class.
+- scheduled(resource, priority=None): decorator running a tool_*(payload) function inside slot(resource), keyed by payload user_id when present; priority demotes (never raises) the caller's class for the call. resource=None only sets the class/user, for tools whose storage and LLM calls take their own slots.
+- get_scheduler(): process-wide Scheduler built from `scheduler:` config; Scheduler.stats() -> per resource running/waiting/granted/timed_out/wait_ms by class.
+
+Usage: src/tools/ai_analysis.py wraps each Gemini call in slot("llm"); the persistence tools are decorated with scheduled("storage"). Job workers, bulk API requests and the facts backfill run under scheduling("bulk"), snapshot/export tools run at "snapshot" and take a storage slot per read/write, so a summary refresh never holds one across Gemini calls; everything else is interactive. Limits are per process: worker processes only ever run bulk work, so their bulk caps times jobs.workers bound a backfill's share of quota.
+"""
+
+import contextvars
+import functools
+import threading
+import time
+from collections import OrderedDict, deque
+from contextlib import contextmanager, nullcontext
+from typing import Any, Callable, Deque, Dict, Iterator, Optional, Tuple
+
+from src.utils.config_loader import load_scheduler_config
+from src.utils.deadline import DeadlineExceeded, check, remaining
+
+PRIORITIES = ("interactive", "snapshot", "bulk")
+RESOURCES = ("llm", "storage")
+
+_priority: contextvars.ContextVar[str] = contextvars.ContextVar("scheduler_priority", default="interactive")
+_user: contextvars.ContextVar[str] = contextvars.ContextVar("scheduler_user", default="")
+_held: contextvars.ContextVar[frozenset] = contextvars.ContextVar("scheduler_held", default=frozenset())
+_scheduler: Optional["Scheduler"] = None
+_scheduler_lock = threading.Lock()
+
+
+class _Waiter:
+    __slots__ = ("granted", "enqueued")
+
+    def __init__(self) -> None:
+        self.granted = threading.Event()
+        self.enqueued = time.monotonic()
+
+
+class ResourceScheduler:
+    def __init__(self, name: str, max_concurrency: int, class_limits: Dict[str, int]) -> None:
+        self.name = name
+        self.max_concurrency = int(max_concurrency)
+        self.class_limits = {p: int(class_limits.get(p, max_concurrency)) for p in PRIORITIES}
+        self._lock = threading.Lock()
+        self._running = {p: 0 for p in PRIORITIES}
+        # Per class: user -> FIFO of waiters; the OrderedDict order is the round-robin order.
+        self._queues: Dict[str, "OrderedDict[str, Deque[_Waiter]]"] = {p: OrderedDict() for p in PRIORITIES}
+        self._granted = {p: 0 for p in PRIORITIES}
+        self._timed_out = {p: 0 for p in PRIORITIES}
+        self._wait_ms = {p: 0.0 for p in PRIORITIES}
+
+    def _dispatch(self) -> None:
+        while sum(self._running.values()) < self.max_concurrency:
+            for priority in PRIORITIES:
+                users = self._queues[priority]
+                if users and self._running[priority] < self.class_limits[priority]:
+                    user, waiters = users.popitem(last=False)
+                    waiter = waiters.popleft()
+                    if waiters:
+                        users[user] = waiters
+                    self._running[priority] += 1
+                    self._granted[priority] += 1
+                    self._wait_ms[priority] += (time.monotonic() - waiter.enqueued) * 1000
+                    waiter.granted.set()
+                    break
+            else:
+                return
+
+    def acquire(self, priority: str, user_id: str, timeout: Optional[float] = None) -> bool:
+        """Wait for a slot; False when timeout passes first (the waiter is withdrawn)."""
+        waiter = _Waiter()
+        with self._lock:
+            self._queues[priority].setdefault(user_id, deque()).append(waiter)
+            self._dispatch()
+        if waiter.granted.wait(timeout):
+            return True
+        with self._lock:
+            if waiter.granted.is_set():
+                return True
+            waiters = self._queues[priority][user_id]
+            waiters.remove(waiter)
+            if not waiters:
+                del self._queues[priority][user_id]
+            self._timed_out[priority] += 1
+            return False
+
+    def release(self, priority: str) -> None:
+        with self._lock:
+            self._running[priority] -= 1
+            self._dispatch()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "max_concurrency": self.max_concurrency,
+                "running": dict(self._running),
+                "waiting": {p: sum(len(w) for w in self._queues[p].values()) for p in PRIORITIES},
+                "granted": dict(self._granted),
+                "timed_out": dict(self._timed_out),
+                "wait_ms": {p: round(v, 1) for p, v in self._wait_ms.items()},
+            }
+
+
+class Scheduler:
+    def __init__(self, config: Optional[Dict[str, Any]] = None) -> None:
+        cfg = config or load_scheduler_config()
+        self.enabled = bool(cfg.get("enabled", True))
+        self.resources = {
+            name: ResourceScheduler(name, cfg[name]["max_concurrency"], {p: cfg[name][p] for p in PRIORITIES}) for name in RESOURCES
+        }
+
+    def stats(self) -> Dict[str, Any]:
+        return {name: resource.stats() for name, resource in self.resources.items()}
+
+
+def get_scheduler() -> Scheduler:
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is None:
+            _scheduler = Scheduler()
+        return _scheduler
+
+
+@contextmanager
+def scheduling(priority: Optional[str] = None, user_id: Optional[str] = None, demote_only: bool = False) -> Iterator[None]:
+    if priority is not None and priority not in PRIORITIES:
+        raise ValueError(f"Unknown priority class: {priority}")
+    if priority is not None and demote_only and PRIORITIES.index(priority) < PRIORITIES.index(_priority.get()):
+        priority = None
+    priority_token = _priority.set(priority) if priority is not None else None
+    user_token = _user.set(user_id) if user_id else None
+    try:
+        yield
+    finally:
+        if user_token is not None:
+            _user.reset(user_token)
+        if priority_token is not None:
+            _priority.reset(priority_token)
+
+
+def current_scope() -> Tuple[str, str]:
+    return _priority.get(), _user.get()
+
+
+def worker_context() -> contextvars.Context:
+    """Copy of the caller's context with no slots held, for pool threads that must take their own."""
+    ctx = contextvars.copy_context()
+    ctx.run(_held.set, frozenset())
+    return ctx
+
+
+@contextmanager
+def slot(resource: str, user_id: Optional[str] = None) -> Iterator[None]:
+    held = _held.get()
+    scheduler = get_scheduler()
+    if resource in held or not scheduler.enabled:
+        yield
+        return
+    check(f"{resource} slot")
+    priority = _priority.get()
+    target = scheduler.resources[resource]
+    if not target.acquire(priority, user_id or _user.get(), remaining()):
+        raise DeadlineExceeded(f"{resource} slot")
+    token = _held.set(held | {resource})
+    try:
+        yield
+    finally:
+        _held.reset(token)
+        target.release(priority)
+
+
+def scheduled(resource: Optional[str], priority: Optional[str] = None) -> Callable:
+    def decorator(func: Callable) -> Callable:
+        @functools.wraps(func)
+        def wrapper(payload: Any, *args: Any, **kwargs: Any) -> Any:
+            user_id = payload.get("user_id") if isinstance(payload, dict) else getattr(payload, "user_id", None)
+            with scheduling(priority, user_id=user_id, demote_only=True), slot(resource) if resource else nullcontext():
+                return func(payload, *args, **kwargs)
+
+        return wrapper
+
+    return decorator
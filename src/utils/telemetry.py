@@ -49,7 +49,10 @@ def trace_span(span_name: Optional[str] = None, component: Optional[str] = None)
             gcp_trace_id = (session_fragment + base_trace)[:32].ljust(32, "0")
             trace_id = f"{session_id}-{base_trace}" if session_id else base_trace
             masked_args = [mask_pii(str(arg)) for arg in args]
-            masked_kwargs: Dict[str, Any] = {k: mask_pii(str(v)) if isinstance(v, str) else v for k, v in kwargs.items()}
+            masked_kwargs: Dict[str, Any] = {
+                k: mask_pii(v) if isinstance(v, str) else (getattr(v, "__qualname__", repr(v)) if callable(v) else v)
+                for k, v in kwargs.items()
+            }
             span_label = span_name or func.__name__
 
             span_context = None
@@ -0,0 +1,18 @@
+import sys
+from pathlib import Path
+
+import pytest
+
+ROOT_DIR = Path(__file__).resolve().parents[1]
+sys.path.append(str(ROOT_DIR))
+
+
+@pytest.fixture(autouse=True)
+def _isolated_fact_index(monkeypatch, tmp_path):
+    """Tests that save facts with RUN_REAL_MEMORY=1 index into tmp_path, not the repo's data/fact_index."""
+    from src.tools import fact_index
+    from src.utils.config_loader import ConfigLoader
+
+    config = ConfigLoader.instance().config
+    monkeypatch.setitem(config, "search", {**(config.get("search") or {}), "index_dir": str(tmp_path / "fact_index")})
+    monkeypatch.setattr(fact_index, "_indexes", {})
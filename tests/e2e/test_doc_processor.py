@@ -13,6 +13,9 @@ os.environ.setdefault("RUN_REAL_AI", "0")
 
 def test_document_processor_discovery_flow(monkeypatch):
     from src.agents import subagent_document_processor
+    from src.session import candidate_store
+
+    monkeypatch.setattr(candidate_store, "_store", candidate_store.InMemoryCandidateStore())
 
     def fake_fetch_domains(payload):
         return {
@@ -53,16 +56,58 @@ def test_document_processor_discovery_flow(monkeypatch):
 
     session_id = "sess_e2e_doc_discovery"
     state = {"user_id": "user_1", "url": "http://example.com/article"}
+    progress = []
     result = subagent_document_processor.run_subagent_document_processor(
         {"session_id": session_id, "raw_text": "Here is a link http://example.com/article"},
         session_id=session_id,
         session_state=state,
+        on_progress=progress.append,
     )
     assert result["status"] == "review_required"
     facts = result["candidate_facts"]
     assert len(facts) >= 2
+    assert [u["stage"] for u in progress] == ["content_fetched", "domain_scored", "facts_ready"]
+    assert progress[0]["title"] == "t" and progress[1]["relevant"] is True
+    assert [f["fact_id"] for f in progress[2]["facts"]] == [f["fact_id"] for f in facts]
     assert all(f["source_url"].startswith("http") for f in facts)
 
+    # Save mode needs only the ids: candidates are kept server-side for the session.
+    saved_calls = []
+    def save_fact(payload):
+        saved_calls.append(payload)
+        if payload["fact_text"] == "c1":
+            return {"status": "error", "error": "MEMORY_WRITE_ERROR: unavailable"}
+        return {"status": "success", "data": {"memory_id": "mem_1"}}
+
+    monkeypatch.setattr(subagent_document_processor, "tool_save_fact_to_memory", save_fact)
+    save = subagent_document_processor.run_subagent_document_processor(
+        {"session_id": session_id, "selected_fact_ids": [facts[1]["fact_id"], "unknown"]},
+        session_id=session_id,
+        session_state={"user_id": "user_1"},
+    )
+    assert save["status"] == "success" and save["saved_count"] == 1 and "failed_fact_ids" not in save
+    assert saved_calls == [{"fact_text": "c2", "source_url": "http://example.com/article", "user_id": "user_1", "domain_id": "dom_ai"}]
+    # A failed save is reported by id and its candidate stays available for a retry.
+    failed = subagent_document_processor.run_subagent_document_processor(
+        {"session_id": session_id, "selected_fact_ids": [facts[0]["fact_id"]]},
+        session_id=session_id,
+        session_state={"user_id": "user_1"},
+    )
+    assert (failed["status"], failed["error_detail"], failed["saved_count"]) == ("error", "save_failed", 0)
+    assert failed["failed_fact_ids"] == [facts[0]["fact_id"]]
+    retry = subagent_document_processor.run_subagent_document_processor(
+        {"session_id": session_id, "selected_fact_ids": [facts[0]["fact_id"]]},
+        session_id=session_id,
+        session_state={"user_id": "user_1"},
+    )
+    assert retry["failed_fact_ids"] == [facts[0]["fact_id"]]
+    again = subagent_document_processor.run_subagent_document_processor(
+        {"session_id": session_id, "selected_fact_ids": [facts[1]["fact_id"]]},
+        session_id=session_id,
+        session_state={"user_id": "user_1"},
+    )
+    assert again["error_detail"] == "candidates_expired"
+
 
 def test_document_processor_save_flow(monkeypatch):
     from src.agents import subagent_document_processor
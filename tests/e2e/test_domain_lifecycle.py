@@ -45,3 +45,35 @@ def test_domain_lifecycle_draft_and_confirm():
     assert second_turn["status"] == "SUCCESS"
     assert second_turn["domain_draft"]["domain_id"] == draft["domain_id"]
     assert "saved" in second_turn["message_to_user"].lower()
+
+
+def test_confirm_saves_the_cached_draft_and_update_refines_it(monkeypatch):
+    from src.agents import subagent_domain_lifecycle as lifecycle
+    from src.tools import ai_analysis
+
+    calls = []
+
+    def counting_prettify(payload):
+        calls.append(payload)
+        return ai_analysis.tool_prettify_domain_description(payload)
+
+    monkeypatch.setattr(lifecycle, "tool_prettify_domain_description", counting_prettify)
+    state = {"user_id": "user_1"}
+
+    def turn(operation_type, text, confirm=False):
+        result = lifecycle.run_subagent_domain_lifecycle(
+            {"operation_type": operation_type, "user_input": text, "confirmation_status": confirm}, session_id="s", session_state=state
+        )
+        state.update(result.get("state_delta", {}))
+        return result
+
+    draft = turn("CREATE", "Track AI research")["domain_draft"]
+    assert turn("CREATE", "track  AI research")["domain_draft"] == draft and len(calls) == 1
+    # An edit sends only the instructions plus the previous draft, and keeps the domain id.
+    refined = turn("UPDATE", "also cover robotics")["domain_draft"]
+    assert calls[-1]["previous_draft"] == {k: draft[k] for k in ("name", "description", "keywords")}
+    assert refined["domain_id"] == draft["domain_id"] and refined["description"].endswith("also cover robotics")
+
+    saved = turn("UPDATE", "confirm", confirm=True)
+    assert saved["status"] == "SUCCESS" and saved["domain_draft"] == refined and len(calls) == 2
+    assert "domain_draft" not in state or state["domain_draft"] is None
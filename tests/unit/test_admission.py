@@ -0,0 +1,123 @@
+import os
+import sys
+from pathlib import Path
+
+ROOT_DIR = Path(__file__).resolve().parents[2]
+sys.path.append(str(ROOT_DIR))
+os.environ["ENABLE_GCP_LOGGING"] = "0"
+os.environ.setdefault("RUN_REAL_AI", "0")
+
+LIMITS = {
+    "enabled": True,
+    "max_inflight_documents": 3,
+    "max_inflight_documents_per_user": 2,
+    "llm_tokens_per_minute": 1000,
+    "llm_tokens_per_minute_per_user": 400,
+    "bulk_token_share": 0.5,
+    "max_queued_jobs": 100,
+    "max_queued_jobs_per_user": 3,
+    "retry_after_seconds": 5,
+}
+
+
+def test_document_and_token_limits_shed_per_user_and_keep_chat_headroom():
+    from src.utils.admission import AdmissionController
+    from src.utils.scheduler import scheduling
+
+    ctl = AdmissionController(LIMITS)
+    t1, _ = ctl.admit_document("heavy")
+    t2, _ = ctl.admit_document("heavy")
+    ticket, rejection = ctl.admit_document("heavy")
+    assert ticket is None and rejection.reason == "user_documents" and rejection.retry_after_seconds == 5
+    light, _ = ctl.admit_document("light")
+    assert ctl.admit_document("other")[1].reason == "global_documents"
+    with t1:
+        pass
+    assert ctl.admit_document("other")[0] is not None and ctl.stats()["inflight_documents"] == 3
+    for t in (t2, light):
+        t.release()
+
+    ctl.record_tokens("heavy", 450)
+    assert ctl.admit_turn("heavy").reason == "user_tokens"
+    assert ctl.admit_turn("light") is None
+    # Bulk work stops at bulk_token_share of the global budget; chat keeps the remainder.
+    ctl.record_tokens("light", 100)
+    with scheduling("bulk"):
+        assert ctl.admit_turn("light").reason == "global_tokens"
+    assert ctl.admit_turn("light") is None
+    stats = ctl.stats()
+    assert stats["tokens_last_minute"] == 550
+    assert stats["rejections"] == {"user_documents": 1, "global_documents": 1, "user_tokens": 1, "global_tokens": 1}
+
+
+def test_idle_token_windows_are_pruned_lazily(monkeypatch):
+    from src.utils import admission
+
+    now = [1000.0]
+    monkeypatch.setattr(admission.time, "time", lambda: now[0])
+    ctl = admission.AdmissionController(LIMITS)
+
+    def record_at(t, uid):
+        now[0] = t
+        ctl.record_tokens(uid, 10)
+        return sorted(ctl._tokens)
+
+    assert record_at(1000, "a") == ["a"]
+    assert record_at(1050, "b") == ["a", "b"]
+    assert record_at(1061, "c") == ["b", "c"]  # a sweep, at most once per window: "a" went idle
+    # "b" is idle now, but recording does not scan other users again inside the sweep interval...
+    assert record_at(1111, "d") == ["b", "c", "d"]
+    # ...its window goes when that user is admitted again...
+    assert ctl.admit_turn("b") is None and sorted(ctl._tokens) == ["c", "d"]
+    # ...or at the next sweep, one window later.
+    assert record_at(1122, "e") == ["d", "e"]
+
+
+def test_heavy_user_link_dump_is_shed_without_blocking_others(tmp_path, monkeypatch):
+    from fastapi.testclient import TestClient
+
+    from server import adk_web
+    from src.agents import agent_root
+    from src.jobs import ingest, queue as jobs_queue
+    from src.jobs.worker import JobWorker
+    from src.session import session_manager
+    from src.session.memory_session_service import BoundedInMemorySessionService
+    from src.utils import admission
+
+    monkeypatch.setattr(session_manager, "_session_service", BoundedInMemorySessionService())
+    monkeypatch.setattr(jobs_queue, "_queue", jobs_queue.JobQueue(str(tmp_path / "jobs.sqlite3"), retry_backoff_seconds=0))
+    monkeypatch.setattr(admission, "_controller", admission.AdmissionController(LIMITS))
+    cfg = {**jobs_queue.load_jobs_config(), "mode": "queue", "autostart_workers": False}
+    monkeypatch.setattr(adk_web, "load_jobs_config", lambda: cfg)
+    monkeypatch.setattr(ingest, "load_jobs_config", lambda: cfg)
+    monkeypatch.setattr(agent_root, "tool_fetch_user_knowledge_domains", lambda p: {"status": "success", "data": []})
+    client = TestClient(adk_web.app)
+
+    sessions = {}
+    for name in ("Heavy", "Light"):
+        monkeypatch.setattr(agent_root, "tool_auth_user", lambda p: {"status": "success", "data": {"user_id": p["username"].lower()}})
+        sessions[name] = client.post("/v1/turns", json={"message": f"my name is {name}"}).json()["session_id"]
+
+    dump = [f"http://example.com/{i}" for i in range(8)]
+    results = client.post("/v1/documents", json={"session_id": sessions["Heavy"], "urls": dump}).json()["results"]
+    assert sorted(r["type"] for r in results) == ["queued"] * 3 + ["rejected"] * 5
+    assert {r["reason"] for r in results if r["type"] == "rejected"} == {"user_jobs"}
+    light = client.post("/v1/documents", json={"session_id": sessions["Light"], "urls": ["http://example.com/x"]}).json()["results"]
+    assert [r["type"] for r in light] == ["queued"]
+
+    # Once the heavy user's token budget is spent, their turns are shed with 429 while others still get answers.
+    admission.get_admission_controller().record_tokens("heavy", 500)
+    shed = client.post("/v1/turns", json={"session_id": sessions["Heavy"], "message": "snapshot"})
+    assert shed.status_code == 429 and int(shed.headers["Retry-After"]) >= 1
+    assert shed.json()["status"] == "OVERLOADED" and "try again" in shed.json()["message"]
+    assert client.post("/v1/turns", json={"session_id": sessions["Light"], "message": "hello"}).status_code == 200
+
+    # A worker whose discovery is shed defers the job by the retry hint without using up an attempt.
+    assert JobWorker(poll_interval=0.01, handlers={ingest.DOCUMENT_DISCOVERY: ingest.run_document_discovery}).run_once() is True
+    deferred = [jobs_queue.get_job_queue().get(r["job_id"]) for r in results + light if r["type"] == "queued"]
+    shed_job = next(job for job in deferred if job.error)
+    assert shed_job.status == "queued" and shed_job.attempts == 0 and "OVERLOADED" in shed_job.error
+    stats = client.get("/v1/stats").json()
+    # The heavy user's 500 tokens also hit the bulk share of the global budget, so the worker is shed first.
+    assert stats["admission"]["rejections"] == {"user_jobs": 5, "user_tokens": 1, "global_tokens": 1}
+    assert stats["jobs"]["queued"] == 4 and stats["jobs"]["running"] == 0
@@ -0,0 +1,152 @@
+import asyncio
+import json
+import os
+import sys
+from pathlib import Path
+
+ROOT_DIR = Path(__file__).resolve().parents[2]
+sys.path.append(str(ROOT_DIR))
+os.environ["ENABLE_GCP_LOGGING"] = "0"
+os.environ.setdefault("RUN_REAL_AI", "0")
+
+
+def _client(tmp_path, monkeypatch, mode):
+    from fastapi.testclient import TestClient
+
+    from kb_adk import agent as kb_agent
+    from server import adk_web
+    from src.agents import agent_root, subagent_document_processor as processor
+    from src.jobs import ingest, queue as jobs_queue
+    from src.session import candidate_store, session_manager
+    from src.session.memory_session_service import BoundedInMemorySessionService
+
+    monkeypatch.setattr(session_manager, "_session_service", BoundedInMemorySessionService())
+    monkeypatch.setattr(candidate_store, "_store", candidate_store.InMemoryCandidateStore())
+    monkeypatch.setattr(jobs_queue, "_queue", jobs_queue.JobQueue(str(tmp_path / "jobs.sqlite3")))
+    cfg = {**jobs_queue.load_jobs_config(), "mode": mode, "autostart_workers": False}
+    for module in (adk_web, kb_agent, ingest, processor):
+        monkeypatch.setattr(module, "load_jobs_config", lambda: cfg)
+    monkeypatch.setattr(agent_root, "tool_extract_user_name", lambda p: {"detected": True, "name": "Ada", "confidence": 1.0})
+    monkeypatch.setattr(agent_root, "tool_auth_user", lambda p: {"status": "success", "data": {"user_id": "u1"}})
+    domains = {"status": "success", "data": [{"domain_id": "dom_ai", "name": "AI", "status": "active"}]}
+    monkeypatch.setattr(agent_root, "tool_fetch_user_knowledge_domains", lambda p: domains)
+    monkeypatch.setattr(processor, "tool_fetch_user_knowledge_domains", lambda p: domains)
+    monkeypatch.setattr(processor, "tool_process_ordinary_page", lambda p: {"status": "success", "content": f"AI text {p['url']}", "page_title": "t"})
+    monkeypatch.setattr(processor, "tool_define_topic_relevance", lambda p: {"status": "success", "relevance_score": 0.9, "reasoning": "r"})
+    monkeypatch.setattr(processor, "tool_extract_facts_from_text", lambda p: {"status": "success", "facts": [{"content": p["content_text"]}]})
+    monkeypatch.setattr(processor, "tool_check_duplicate_facts", lambda p: {"status": "success", "data": []})
+    return TestClient(adk_web.app), processor
+
+
+def test_turns_bulk_documents_stream_and_save_by_id(tmp_path, monkeypatch):
+    client, processor = _client(tmp_path, monkeypatch, "inline")
+    assert client.post("/v1/documents", json={"session_id": "nobody", "urls": ["http://a"]}).status_code == 403
+
+    hello = client.post("/v1/turns", json={"message": "my name is Ada"}).json()
+    assert hello["status"] == "SUCCESS" and "Welcome, Ada" in hello["message"]
+    session_id = hello["session_id"]
+
+    urls = ["http://example.com/a", "http://example.com/b", "http://example.com/a"]
+    with client.stream("POST", "/v1/documents", json={"session_id": session_id, "urls": urls}, headers={"Accept": "application/x-ndjson"}) as resp:
+        assert resp.headers["content-type"].startswith("application/x-ndjson")
+        items = [json.loads(line) for line in resp.iter_lines() if line]
+    assert sorted(item["url"] for item in items) == ["http://example.com/a", "http://example.com/b"]
+    facts = [f for item in items for f in item["response"]["candidate_facts"]]
+    assert len(facts) == 2
+
+    # Both URLs' candidates stay saveable by id in the one session.
+    saved = []
+    monkeypatch.setattr(processor, "tool_save_fact_to_memory", lambda p: saved.append(p["fact_text"]) or {"status": "success"})
+    result = client.post("/v1/facts", json={"session_id": session_id, "selected_fact_ids": [f["fact_id"] for f in facts]}).json()
+    assert result["saved_count"] == 2 and sorted(saved) == sorted(f["content"] for f in facts)
+
+    sse = client.post("/v1/turns", json={"session_id": session_id, "message": "read http://example.com/c"}, headers={"Accept": "text/event-stream"})
+    events = [block.split("\n") for block in sse.text.strip().split("\n\n")]
+    assert [e[0] for e in events] == ["event: progress"] * 3 + ["event: result"]
+    assert json.loads(events[-1][1][len("data: "):])["agent"] == "subagent_document_processor"
+
+
+def test_queue_mode_returns_job_ids_and_job_status(tmp_path, monkeypatch):
+    from src.jobs.worker import JobWorker
+
+    client, _ = _client(tmp_path, monkeypatch, "queue")
+    session_id = client.post("/v1/turns", json={"message": "Ada"}).json()["session_id"]
+    body = client.post("/v1/documents", json={"session_id": session_id, "urls": ["http://example.com/a"]}).json()
+    [queued] = body["results"]
+    assert queued["type"] == "queued"
+    assert client.get(f"/v1/jobs/{queued['job_id']}", params={"session_id": session_id}).json()["status"] == "queued"
+
+    assert JobWorker(poll_interval=0.01).run_once() is True
+    job = client.get(f"/v1/jobs/{queued['job_id']}", params={"session_id": session_id}).json()
+    assert job["status"] == "done" and len(job["candidate_facts"]) == 1
+    assert client.get("/v1/jobs/job_missing", params={"session_id": session_id}).status_code == 404
+
+
+def test_streaming_turn_follows_the_queued_job_until_it_finishes(tmp_path, monkeypatch):
+    import threading
+
+    from kb_adk import agent as kb_agent
+    from src.jobs.worker import JobWorker
+    from src.session import session_manager
+
+    client, _ = _client(tmp_path, monkeypatch, "queue")
+    api_cfg = {**kb_agent.load_api_config(), "poll_interval_seconds": 0.02}
+    monkeypatch.setattr(kb_agent, "load_api_config", lambda: api_cfg)
+    session_id = client.post("/v1/turns", json={"message": "Ada"}).json()["session_id"]
+
+    stop = threading.Event()
+    worker = threading.Thread(target=JobWorker(poll_interval=0.01).run_forever, args=(stop,))
+    worker.start()
+    try:
+        sse = client.post("/v1/turns", json={"session_id": session_id, "message": "read http://example.com/q"}, headers={"Accept": "text/event-stream"})
+    finally:
+        stop.set()
+        worker.join()
+    items = [json.loads(block.split("\n")[1][len("data: "):]) for block in sse.text.strip().split("\n\n")]
+    progress, result = items[:-1], items[-1]
+    assert progress and {p["stage"] for p in progress} == {"job_status"} and progress[-1]["status"] == "done"
+    assert result["agent"] == "subagent_document_processor" and result["response"]["job_status"] == "done"
+    assert len(result["response"]["candidate_facts"]) == 1
+    # Answered within the turn, so kb_root does not announce the job again.
+    assert session_manager.get_state(session_id).get("pending_job_id") is None
+
+
+def test_turns_record_session_events_and_wait_for_another_workers_lease(tmp_path, monkeypatch):
+    from src.session import session_manager
+    from src.session.sqlite_session_service import SqliteSessionService
+
+    client, _ = _client(tmp_path, monkeypatch, "queue")
+    path = str(tmp_path / "sessions.sqlite3")
+    monkeypatch.setattr(session_manager, "_session_service", SqliteSessionService(path))
+    session_id = client.post("/v1/turns", json={"message": "my name is Ada"}).json()["session_id"]
+
+    session = session_manager.get_session_service().get_session_sync(app_name=session_manager.APP_NAME, user_id="anonymous", session_id=session_id)
+    assert [e.author for e in session.events] == ["user", "kb_root"]
+    assert session.events[-1].custom_metadata["response"]["status"] == "SUCCESS"
+
+    # Another worker is mid-turn on this session: the turn waits for its lease rather than running alongside it.
+    other = SqliteSessionService(path)
+    assert other.acquire_lease(session_manager.APP_NAME, "anonymous", session_id, "other-worker", 60)
+    blocked = client.post("/v1/turns", json={"session_id": session_id, "message": "hello", "deadline_seconds": 0.3}).json()
+    assert blocked["status"] == "TIMEOUT" and "session_lease" in blocked["response"]["reasoning"]
+
+    other.release_lease(session_manager.APP_NAME, "anonymous", session_id, "other-worker")
+    assert client.post("/v1/turns", json={"session_id": session_id, "message": "hello"}).json()["status"] != "TIMEOUT"
+    assert other.acquire_lease(session_manager.APP_NAME, "anonymous", session_id, "other-worker", 60)  # released after the turn
+
+
+def test_coalescer_shares_one_execution():
+    from server.adk_web import Coalescer
+
+    coalescer, calls = Coalescer(), []
+
+    async def work():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return len(calls)
+
+    async def main():
+        return await asyncio.gather(*(coalescer.run("k", work) for _ in range(5)))
+
+    assert asyncio.run(main()) == [1] * 5
+    assert calls == [1] and coalescer.coalesced == 4 and len(coalescer) == 0
@@ -27,3 +27,18 @@ def test_prompts_and_model_config_loads():
 
     threshold = load_relevance_threshold("subagent_document_processor")
     assert pytest.approx(threshold) == 0.7
+
+
+def test_dedup_threshold_below_band_guarantee_is_rejected():
+    from src.utils.config_loader import ConfigLoader
+
+    loader = ConfigLoader.instance()
+    original = loader.config.get("dedup")
+    try:
+        loader.config["dedup"] = {"similarity_threshold": 57 / 64}
+        assert loader.get_dedup_config()["similarity_threshold"] == 57 / 64
+        loader.config["dedup"] = {"similarity_threshold": 0.85}
+        with pytest.raises(ValueError, match="dedup.similarity_threshold"):
+            loader.get_dedup_config()
+    finally:
+        loader.config["dedup"] = original
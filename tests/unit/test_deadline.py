@@ -0,0 +1,126 @@
+import os
+import sys
+import threading
+import time
+from pathlib import Path
+
+import pytest
+
+ROOT_DIR = Path(__file__).resolve().parents[2]
+sys.path.append(str(ROOT_DIR))
+os.environ["ENABLE_GCP_LOGGING"] = "0"
+os.environ.setdefault("RUN_REAL_AI", "0")
+
+
+def test_call_timeouts_follow_the_remaining_budget_and_slot_waits_stop_at_the_deadline(monkeypatch):
+    from src.tools import content
+    from src.utils import deadline, scheduler
+
+    assert deadline.remaining() is None and deadline.timeout_kwargs("storage") == {} and deadline.timeout_for("http") == 10
+    seen = []
+
+    class FakeResp:
+        text = "<html><title>t</title><body>body</body></html>"
+
+        def raise_for_status(self):
+            return None
+
+    def fake_get(url, headers=None, timeout=None, stream=False):
+        seen.append(timeout)
+        return FakeResp()
+
+    monkeypatch.setattr(content.requests, "get", fake_get)
+    with deadline.deadline(3):
+        # A nested deadline only tightens the enclosing one.
+        with deadline.deadline(60):
+            assert deadline.remaining() <= 3
+        assert content.tool_process_ordinary_page({"url": "https://example.com"})["status"] == "success"
+        assert 2 < seen[-1] <= 3 and 2 < deadline.timeout_kwargs("llm")["timeout"] <= 3
+    with deadline.deadline(0):
+        assert content.tool_process_ordinary_page({"url": "https://example.com"})["error_detail"] == "TIMEOUT"
+        with pytest.raises(deadline.DeadlineExceeded):
+            deadline.check("step")
+    assert len(seen) == 1
+
+    limits = {"max_concurrency": 1, "interactive": 1, "snapshot": 1, "bulk": 1}
+    monkeypatch.setattr(scheduler, "_scheduler", scheduler.Scheduler({"enabled": True, "llm": dict(limits), "storage": dict(limits)}))
+    llm = scheduler.get_scheduler().resources["llm"]
+    held, release = threading.Event(), threading.Event()
+
+    def hold():
+        with scheduler.slot("llm"):
+            held.set()
+            release.wait()
+
+    holder = threading.Thread(target=hold)
+    holder.start()
+    held.wait()
+    started = time.monotonic()
+    with deadline.deadline(0.05), pytest.raises(deadline.DeadlineExceeded):
+        with scheduler.slot("llm"):
+            pass
+    assert time.monotonic() - started < 1
+    stats = llm.stats()
+    assert stats["waiting"]["interactive"] == 0 and stats["timed_out"]["interactive"] == 1
+    release.set()
+    holder.join()
+    with scheduler.slot("llm"):
+        assert llm.stats()["running"]["interactive"] == 1
+
+
+def test_background_cache_refresh_outlives_the_turn_deadline():
+    from src.tools.result_cache import VersionedCache
+    from src.utils.deadline import check, deadline, remaining
+
+    cache = VersionedCache("test")
+    cache.get("k", 1, lambda: "old")
+    seen = []
+
+    def compute():
+        time.sleep(0.1)
+        seen.append(remaining())
+        check("refresh")
+        return "fresh"
+
+    with deadline(0.05):
+        assert cache.get("k", 2, compute) == ("old", "stale")
+    cache.join()
+    # The turn's 50 ms budget does not follow the refresh, so it finishes and is stored.
+    assert seen == [None]
+    assert cache.get("k", 2, lambda: pytest.fail("recomputed")) == ("fresh", "hit")
+
+
+def test_document_processor_returns_partial_candidates_when_the_turn_runs_out(monkeypatch):
+    from src.agents import subagent_document_processor as processor
+    from src.session import candidate_store
+    from src.utils.deadline import deadline
+
+    monkeypatch.setattr(candidate_store, "_store", candidate_store.InMemoryCandidateStore())
+    domains = [{"domain_id": f"dom_{n}", "name": n, "domain_description": "", "domain_keywords": []} for n in ("A", "B", "C")]
+    scored = []
+
+    def slow_relevance(payload):
+        scored.append(payload["domain_name"])
+        if payload["domain_name"] == "B":
+            time.sleep(0.3)
+        return {"status": "success", "relevance_score": 0.95, "reasoning": "r"}
+
+    monkeypatch.setattr(processor, "tool_process_ordinary_page", lambda p: {"status": "success", "content": "text", "page_title": "t"})
+    monkeypatch.setattr(processor, "tool_fetch_user_knowledge_domains", lambda p: {"status": "success", "data": domains})
+    monkeypatch.setattr(processor, "tool_define_topic_relevance", slow_relevance)
+    monkeypatch.setattr(processor, "tool_extract_facts_from_text", lambda p: {"status": "success", "facts": [{"content": f"{p['domain_name']} fact"}]})
+    monkeypatch.setattr(processor, "tool_check_duplicate_facts", lambda p: pytest.fail("dedup runs after the deadline"))
+
+    state = {"user_id": "u1", "url": "http://example.com/a"}
+    with deadline(0.15):
+        result = processor.run_subagent_document_processor({"raw_text": "http://example.com/a"}, session_id="s1", session_state=state)
+    assert result["status"] == "review_required" and result["partial"] is True
+    assert result["domains_skipped"] == ["B", "C"] and scored == ["A", "B"]
+    assert [f["content"] for f in result["candidate_facts"]] == ["A fact"]
+    assert candidate_store.get_candidate_store().get("s1", "u1", [result["candidate_facts"][0]["fact_id"]])
+    assert result["state_delta"]["url"] is None
+
+    with deadline(0):
+        timed_out = processor.run_subagent_document_processor({"raw_text": "http://example.com/a"}, session_id="s1", session_state=state)
+    assert timed_out["status"] == "TIMEOUT" and timed_out["error_detail"] == "deadline_exceeded"
+    assert timed_out["state_delta"] == {"url": None}
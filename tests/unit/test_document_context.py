@@ -0,0 +1,109 @@
+import os
+import sys
+from pathlib import Path
+
+ROOT_DIR = Path(__file__).resolve().parents[2]
+sys.path.append(str(ROOT_DIR))
+os.environ["ENABLE_GCP_LOGGING"] = "0"
+os.environ.setdefault("RUN_REAL_AI", "0")
+
+CONFIG = {"enabled": True, "min_content_chars": 1000, "ttl_seconds": 60}
+
+
+def test_discovery_opens_one_context_per_long_document_and_deletes_it(monkeypatch):
+    from src.agents import subagent_document_processor as processor
+    from src.session import candidate_store
+    from src.tools import document_context
+
+    class FailingBackend(document_context.LocalContextBackend):
+        def create(self, text, model_id, ttl_seconds):
+            raise RuntimeError("cache quota")
+
+    monkeypatch.setattr(candidate_store, "_store", candidate_store.InMemoryCandidateStore())
+    cache = document_context.DocumentContextCache(CONFIG, backend=document_context.LocalContextBackend())
+    monkeypatch.setattr(document_context, "_cache", cache)
+    document = "Orbital launch cadence keeps rising. " * 100
+    domains = [{"domain_id": f"dom_{n}", "name": n, "domain_description": "", "domain_keywords": []} for n in ("A", "B", "C")]
+    seen = []
+
+    def call(payload):
+        # The tool reads the document through the context while it is open.
+        seen.append(payload["context_id"] and cache.content(payload["context_id"]) == payload["content_text"])
+        return {"status": "success", "relevance_score": 0.95, "reasoning": "r", "facts": [{"content": payload["domain_name"]}]}
+
+    monkeypatch.setattr(processor, "tool_process_ordinary_page", lambda p: {"status": "success", "content": document, "page_title": "t"})
+    monkeypatch.setattr(processor, "tool_fetch_user_knowledge_domains", lambda p: {"status": "success", "data": domains})
+    monkeypatch.setattr(processor, "tool_define_topic_relevance", call)
+    monkeypatch.setattr(processor, "tool_extract_facts_from_text", call)
+    monkeypatch.setattr(processor, "tool_check_duplicate_facts", lambda p: {"status": "success", "data": []})
+
+    run = lambda: processor.run_subagent_document_processor({"raw_text": "http://example.com/a"}, session_id="s1", session_state={"user_id": "u1"})
+    assert len(run()["candidate_facts"]) == 3
+    assert seen == [True] * 6
+    assert cache.stats() == {"active": 0, "created": 1, "deleted": 1, "failed": 0, "uses": 6}
+
+    # Short documents and failed creations send the content inline instead.
+    document = "short"
+    run()
+    monkeypatch.setattr(cache, "_backend", FailingBackend())
+    document = "Orbital launch cadence keeps rising. " * 100
+    assert len(run()["candidate_facts"]) == 3
+    assert seen[6:] == [None] * 12
+    assert cache.stats() == {"active": 0, "created": 1, "deleted": 1, "failed": 1, "uses": 6}
+
+
+def test_real_calls_reference_the_cached_document_instead_of_resending_it(monkeypatch):
+    from google.generativeai import caching
+
+    from src.tools import ai_analysis, document_context
+
+    created, deleted, prompts, models = [], [], [], []
+
+    class FakeCache:
+        name = "cachedContents/abc"
+
+        def delete(self):
+            deleted.append(self.name)
+
+    class FakeModel:
+        def generate_content(self, prompt, **kwargs):
+            prompts.append(prompt)
+            return type("Resp", (), {"text": '{"facts": [{"fact_id": "f", "content": "c", "justification": "j"}]}', "candidates": []})()
+
+    monkeypatch.setenv("RUN_REAL_AI", "1")
+    monkeypatch.setattr(caching.CachedContent, "create", lambda **kw: created.append(kw) or FakeCache())
+    monkeypatch.setattr(ai_analysis, "_configure_model", lambda component, cached_content=None: models.append(cached_content) or FakeModel())
+    cache = document_context.DocumentContextCache(CONFIG)
+    monkeypatch.setattr(document_context, "_cache", cache)
+
+    document = "A long report body. " * 100
+    request = {"content_text": document, "domain_name": "D", "domain_description": "", "domain_keywords": [], "relevance_justification": "r"}
+    with cache.document(document, expected_calls=3) as context_id:
+        assert ai_analysis.tool_extract_facts_from_text({**request, "context_id": context_id})["status"] == "success"
+    assert created[0]["contents"] == [document] and created[0]["ttl"].total_seconds() == 60
+    assert isinstance(models[0], FakeCache) and document not in prompts[0]
+    assert deleted == ["cachedContents/abc"]
+    # After the context is closed the same id falls back to sending the content.
+    ai_analysis.tool_extract_facts_from_text({**request, "context_id": context_id})
+    assert models[1] is None and document in prompts[1]
+
+
+def test_pinned_sdk_has_the_caching_api_the_real_backend_uses(monkeypatch):
+    import google.generativeai as genai
+    from google.generativeai import caching
+
+    from src.tools import ai_analysis, document_context
+
+    # The pin must be a release with google.generativeai.caching and from_cached_content (0.7+).
+    pin = next(line for line in (ROOT_DIR / "requirements.txt").read_text().splitlines() if line.startswith("google-generativeai=="))
+    assert tuple(int(p) for p in pin.split("==")[1].split(".")[:2]) >= (0, 7)
+
+    handle = type("Cache", (), {"name": "cachedContents/xyz"})()
+    built = []
+    monkeypatch.setattr(caching.CachedContent, "create", classmethod(lambda cls, **kw: handle))
+    monkeypatch.setattr(genai.GenerativeModel, "from_cached_content", classmethod(lambda cls, cached_content, generation_config: built.append(cached_content) or "model"))
+    monkeypatch.setattr(ai_analysis.ConfigLoader.instance().settings, "google_api_key", "key")
+    # The real backend, not a fallback: an import or attribute error here would fail the test.
+    assert document_context.GeminiContextBackend().create("text", "models/gemini", 60) is handle
+    assert ai_analysis._configure_model("subagent_document_processor", cached_content=handle) == "model"
+    assert built == [handle]
@@ -0,0 +1,61 @@
+import os
+import sys
+from pathlib import Path
+
+import pytest
+
+ROOT_DIR = Path(__file__).resolve().parents[2]
+sys.path.append(str(ROOT_DIR))
+os.environ["ENABLE_GCP_LOGGING"] = "0"
+os.environ.setdefault("RUN_REAL_AI", "0")
+
+
+def test_profile_normalizes_keywords_and_is_reused_when_stored():
+    import numpy as np
+
+    from src.tools.domain_profile import build_domain_profile, match_strength, profile_for
+    from src.tools.fact_index import embed_text
+
+    profile = build_domain_profile("AI", "  Machine learning\nresearch. " * 40, ["Machine Learning", "machine learning", "ML", ""])
+    assert profile["keywords"] == ["machine learning", "ml"]
+    assert len(profile["prompt_fragment"]) < 500 and profile["prompt_fragment"].endswith("Keywords: machine learning, ml")
+    text = "New MACHINE   learning results; ml everywhere, but not html."
+    hits, similarity = match_strength(profile, text, embed_text(text, len(profile["embedding"])))
+    assert hits == 2 and similarity > 0
+    assert np.isclose(np.linalg.norm(profile["embedding"]), 1.0, atol=1e-3)
+
+    stored = {"domain_id": "d1", "name": "AI", "profile": profile}
+    assert profile_for(stored) is profile
+    # Domains saved before profiles existed get one built once, then memoised.
+    legacy = {"domain_id": "d2", "name": "Bio", "domain_description": "Genomics", "domain_keywords": ["CRISPR"]}
+    assert profile_for(legacy) is profile_for(dict(legacy)) and profile_for(legacy)["keywords"] == ["crispr"]
+    assert profile_for({**stored, "profile": {**profile, "version": 0}}) is not profile
+
+
+def test_discovery_uses_stored_prompt_fragments_and_checks_likely_domains_first(monkeypatch):
+    from src.agents import subagent_document_processor as processor
+    from src.session import candidate_store
+    from src.tools import domain_profile
+    from src.tools.domain_profile import build_domain_profile
+
+    monkeypatch.setattr(candidate_store, "_store", candidate_store.InMemoryCandidateStore())
+    domains = [
+        {"domain_id": f"dom_{n}", "name": n, "domain_description": d, "domain_keywords": k, "profile": build_domain_profile(n, d, k)}
+        for n, d, k in (("Cooking", "Recipes", ["pasta"]), ("Space", "Rockets and orbits", ["launch", "orbit"]))
+    ]
+    prompts = []
+
+    def relevance(payload):
+        prompts.append(payload["domain_prompt"])
+        return {"status": "success", "relevance_score": 0.95, "reasoning": "r"}
+
+    monkeypatch.setattr(processor, "tool_process_ordinary_page", lambda p: {"status": "success", "content": "The launch reached orbit.", "page_title": "t"})
+    monkeypatch.setattr(processor, "tool_fetch_user_knowledge_domains", lambda p: {"status": "success", "data": domains})
+    monkeypatch.setattr(processor, "tool_define_topic_relevance", relevance)
+    monkeypatch.setattr(processor, "tool_extract_facts_from_text", lambda p: {"status": "success", "facts": [{"content": p["domain_prompt"].splitlines()[0]}]})
+    monkeypatch.setattr(processor, "tool_check_duplicate_facts", lambda p: {"status": "success", "data": []})
+    monkeypatch.setattr(domain_profile, "_rebuilt", lambda *a: pytest.fail("stored profile rebuilt"))
+
+    result = processor.run_subagent_document_processor({"raw_text": "http://example.com/a"}, session_id="s1", session_state={"user_id": "u1"})
+    assert prompts == [domains[1]["profile"]["prompt_fragment"], domains[0]["profile"]["prompt_fragment"]]
+    assert [f["content"] for f in result["candidate_facts"]] == ["Domain: Space", "Domain: Cooking"]
@@ -0,0 +1,120 @@
+import sys
+import threading
+from pathlib import Path
+
+
+ROOT_DIR = Path(__file__).resolve().parents[2]
+sys.path.append(str(ROOT_DIR))
+
+
+def test_job_queue_leases_retries_and_reclaims_abandoned_jobs(tmp_path, monkeypatch):
+    from src.jobs import queue as jobs_queue
+
+    q = jobs_queue.JobQueue(str(tmp_path / "jobs.sqlite3"), lease_seconds=30, max_attempts=3, retry_backoff_seconds=0)
+    job_id = q.enqueue("document_discovery", {"url": "http://x"}, session_id="s1")
+    job = q.claim("w1")
+    assert job.job_id == job_id and job.attempts == 1 and job.payload == {"url": "http://x"}
+    assert q.claim("w2") is None  # leased
+
+    assert q.fail(job_id, "w1", "boom") == "queued"  # retried
+    assert q.claim("w2").attempts == 2
+
+    # w2 dies without heartbeating: once its lease lapses the job is claimable again.
+    real_time = jobs_queue.time.time
+    monkeypatch.setattr(jobs_queue.time, "time", lambda: real_time() + 31)
+    assert q.claim("w3").attempts == 3
+    assert q.complete(job_id, "w2", {"late": True}) is False and q.heartbeat(job_id, "w2") is False
+    assert q.complete(job_id, "w3", {"candidate_facts": []}) is True
+    assert q.get(job_id).status == "done" and q.get(job_id).result == {"candidate_facts": []}
+
+    # A job whose final attempt's worker vanished is failed instead of looping forever.
+    poison = q.enqueue("document_discovery", {}, max_attempts=1)
+    q.claim("w4")
+    monkeypatch.setattr(jobs_queue.time, "time", lambda: real_time() + 100)
+    assert q.claim("w5") is None
+    assert q.get(poison).status == "failed" and "lease expired" in q.get(poison).error
+    assert q.stats() == {"queued": 0, "running": 0, "done": 1, "failed": 1}
+
+
+def test_enqueue_caps_hold_for_racing_producers_in_separate_connections(tmp_path):
+    from concurrent.futures import ThreadPoolExecutor
+
+    from src.jobs.queue import JobQueue, QueueFull
+
+    path = str(tmp_path / "jobs.sqlite3")
+
+    def submit(i):
+        # A queue per call: separate connections, like producers in different processes.
+        try:
+            return JobQueue(path).enqueue("k", {"user_id": "heavy" if i % 4 else "light"}, max_pending=10, max_pending_per_user=4)
+        except QueueFull as exc:
+            return exc.scope
+
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        outcomes = list(pool.map(submit, range(40)))
+    q = JobQueue(path)
+    assert (q.pending_count("heavy"), q.pending_count("light"), q.pending_count()) == (4, 4, 8)
+    assert outcomes.count("user") == 32
+
+    job = q.claim("w1")
+    assert q.defer(job.job_id, "w1", 60, "OVERLOADED: user_tokens") is True
+    assert q.get(job.job_id).attempts == 0 and q.get(job.job_id).status == "queued"
+    assert q.defer(job.job_id, "w1", 60, "again") is False  # no longer leased
+
+
+def test_autostart_elects_one_worker_pool_per_host(tmp_path, monkeypatch):
+    from src.jobs import queue as jobs_queue, worker
+
+    path = str(tmp_path / "jobs.sqlite3")
+    monkeypatch.setattr(jobs_queue, "_queue", jobs_queue.JobQueue(path, lease_seconds=30))
+    monkeypatch.setattr(worker, "_pool", None)
+    monkeypatch.setattr(worker, "_next_pool_check", 0.0)
+    started, stop = [], threading.Event()
+    alive = type("Process", (), {"is_alive": lambda self: not stop.is_set()})()
+    monkeypatch.setattr(worker, "start_worker_pool", lambda: started.append(1) or ([alive], stop))
+
+    # Another API worker on the host already runs the pool: enqueuing here starts nothing.
+    other = jobs_queue.JobQueue(path, lease_seconds=30)
+    assert other.claim_pool("api-worker-2")
+    assert worker.ensure_worker_pool() is False and started == []
+
+    # Once that process is gone (lease released or expired), the next enqueue takes the pool over.
+    other.release_pool("api-worker-2")
+    monkeypatch.setattr(worker, "_next_pool_check", 0.0)
+    assert worker.ensure_worker_pool() is True and worker.ensure_worker_pool() is True and started == [1]
+    assert other.claim_pool("api-worker-2") is False
+    stop.set()
+
+
+def test_queued_discovery_runs_on_worker_and_surfaces_on_next_turn(tmp_path, monkeypatch):
+    from src.agents import agent_root, subagent_document_processor as processor
+    from src.jobs import ingest, queue as jobs_queue
+    from src.jobs.worker import JobWorker
+    from src.session import candidate_store
+
+    monkeypatch.setattr(jobs_queue, "_queue", jobs_queue.JobQueue(str(tmp_path / "jobs.sqlite3")))
+    monkeypatch.setattr(candidate_store, "_store", candidate_store.InMemoryCandidateStore())
+    cfg = {**jobs_queue.load_jobs_config(), "mode": "queue", "autostart_workers": False}
+    monkeypatch.setattr(ingest, "load_jobs_config", lambda: cfg)
+    monkeypatch.setattr(processor, "load_jobs_config", lambda: cfg)
+    monkeypatch.setattr(processor, "tool_process_ordinary_page", lambda p: {"status": "success", "content": "AI text", "page_title": "t"})
+    monkeypatch.setattr(processor, "tool_fetch_user_knowledge_domains", lambda p: {"status": "success", "data": [{"domain_id": "dom_ai", "name": "AI"}]})
+    monkeypatch.setattr(processor, "tool_define_topic_relevance", lambda p: {"status": "success", "relevance_score": 0.9, "reasoning": "r"})
+    monkeypatch.setattr(processor, "tool_extract_facts_from_text", lambda p: {"status": "success", "facts": [{"content": "c1"}]})
+    monkeypatch.setattr(processor, "tool_check_duplicate_facts", lambda p: {"status": "success", "data": []})
+
+    state = {"user_id": "u1", "intent": "DOC_PROCESS", "url": "http://example.com/a"}
+    queued = processor.dispatch_subagent_document_processor({"raw_text": "http://example.com/a"}, session_id="s1", session_state=state)
+    assert queued["status"] == "queued"
+    assert queued["state_delta"] == {"url": None, "pending_job_id": queued["job_id"]}
+    state.update(queued["state_delta"])
+
+    pending = agent_root.run_agent_root("status?", session_state=state, session_id="s1")
+    assert pending["job_status"] == "queued" and "Still processing" in pending["response_message"]
+
+    assert JobWorker(poll_interval=0.01).run_once() is True
+    done = agent_root.run_agent_root("show results", session_state=state, session_id="s1")
+    assert done["job_status"] == "done" and done["state_delta"] == {"pending_job_id": None}
+    assert [f["content"] for f in done["candidate_facts"]] == ["c1"]
+    # Candidates were stored server-side by the worker, so save mode needs only ids.
+    assert candidate_store.get_candidate_store().get("s1", "u1", [done["candidate_facts"][0]["fact_id"]])
@@ -0,0 +1,117 @@
+import os
+import sys
+import threading
+import time
+from pathlib import Path
+
+import pytest
+
+ROOT_DIR = Path(__file__).resolve().parents[2]
+sys.path.append(str(ROOT_DIR))
+os.environ["ENABLE_GCP_LOGGING"] = "0"
+os.environ.setdefault("RUN_REAL_AI", "0")
+
+
+def test_extract_urls_strips_punctuation_and_duplicates():
+    from src.agents.subagent_document_processor import extract_urls
+
+    text = "see (http://a.com/x), http://b.com/y. and again http://a.com/x!"
+    assert extract_urls(text) == ["http://a.com/x", "http://b.com/y"]
+    assert extract_urls(text, first="http://b.com/y") == ["http://b.com/y", "http://a.com/x"]
+    assert extract_urls("no links") == []
+
+
+def test_every_url_is_fetched_concurrently_and_reported_per_source(monkeypatch):
+    from src.agents import subagent_document_processor as processor
+    from src.session import candidate_store
+
+    monkeypatch.setattr(candidate_store, "_store", candidate_store.InMemoryCandidateStore())
+    monkeypatch.setattr(processor, "load_prefetch_config", lambda: {"enabled": False})
+    monkeypatch.setattr(processor, "load_discovery_config", lambda: {"max_urls_per_message": 3, "max_concurrency": 4, "batch_document_chars": 8000})
+    fetched, batches, progress = [], [], []
+
+    def page(payload):
+        fetched.append((payload["url"], threading.current_thread().name))
+        time.sleep(0.1)
+        if payload["url"].endswith("/broken"):
+            return {"status": "error", "error_detail": "HTTP 404"}
+        return {"status": "success", "content": f"text of {payload['url']}", "page_title": payload["url"][-1]}
+
+    def score(payload):
+        batches.append((payload["domain_name"], [d["document_id"] for d in payload["documents"]]))
+        return {
+            "status": "success",
+            "scores": [{"document_id": d["document_id"], "relevance_score": 0.9 if d["content_text"].endswith("/a") else 0.1, "reasoning": "r"} for d in payload["documents"]],
+        }
+
+    domains = [{"domain_id": f"dom_{n}", "name": n, "domain_description": "", "domain_keywords": []} for n in ("AI", "Bio")]
+    monkeypatch.setattr(processor, "tool_process_ordinary_page", page)
+    monkeypatch.setattr(processor, "tool_fetch_user_knowledge_domains", lambda p: {"status": "success", "data": domains})
+    monkeypatch.setattr(processor, "tool_score_documents_relevance", score)
+    monkeypatch.setattr(processor, "tool_define_topic_relevance", lambda p: pytest.fail("scored one document at a time"))
+    monkeypatch.setattr(processor, "tool_extract_facts_from_text", lambda p: {"status": "success", "facts": [{"content": f"{p['domain_name']} fact"}]})
+    monkeypatch.setattr(processor, "tool_check_duplicate_facts", lambda p: {"status": "success", "data": []})
+
+    text = "compare http://x.com/a, http://x.com/b and http://x.com/broken (also http://x.com/a) plus http://x.com/extra"
+    started = time.monotonic()
+    result = processor.run_subagent_document_processor({"raw_text": text}, session_id="s1", session_state={"user_id": "u1"}, on_progress=progress.append)
+    # Three pages fetched side by side, not one after another; the duplicate is fetched once and the fourth URL is over the cap.
+    assert time.monotonic() - started < 0.25
+    assert sorted(url for url, _ in fetched) == ["http://x.com/a", "http://x.com/b", "http://x.com/broken"]
+    assert len({name for _, name in fetched}) == 3
+    # One relevance call per domain covers both fetched documents.
+    assert batches == [("AI", ["0", "1"]), ("Bio", ["0", "1"])]
+
+    assert result["status"] == "review_required" and len(result["candidate_facts"]) == 2
+    sources = {s["url"]: s for s in result["sources"]}
+    assert [s["url"] for s in result["sources"]] == ["http://x.com/a", "http://x.com/b", "http://x.com/broken", "http://x.com/extra"]
+    assert [f["content"] for f in sources["http://x.com/a"]["candidate_facts"]] == ["AI fact", "Bio fact"]
+    assert sources["http://x.com/b"]["status"] == "no_relevance"
+    assert (sources["http://x.com/broken"]["status"], sources["http://x.com/broken"]["error_detail"]) == ("error", "content_unavailable")
+    assert (sources["http://x.com/extra"]["status"], sources["http://x.com/extra"]["error_detail"]) == ("skipped", "url_limit")
+    assert "http://x.com/broken" in result["reasoning"] and "2 of 4 URLs" in result["reasoning"]
+    assert {u["url"] for u in progress if u["stage"] == "facts_ready"} == {"http://x.com/a"}
+
+
+def test_batch_relevance_truncates_skips_contexts_and_rescores_missing_ids(monkeypatch):
+    from src.agents import subagent_document_processor as processor
+
+    monkeypatch.setattr(processor, "load_discovery_config", lambda: {"max_urls_per_message": 10, "max_concurrency": 2, "batch_document_chars": 5})
+    batches, singles = [], []
+    running, peak = [0], [0]
+    lock = threading.Lock()
+
+    def score(payload):
+        batches.append([(d["document_id"], d["content_text"]) for d in payload["documents"]])
+        # The model drops document "1" from its answer.
+        return {"status": "success", "scores": [{"document_id": "0", "relevance_score": 0.8, "reasoning": "r"}]}
+
+    def single(payload):
+        with lock:
+            running[0] += 1
+            peak[0] = max(peak[0], running[0])
+        time.sleep(0.05)
+        with lock:
+            running[0] -= 1
+        singles.append((payload["content_text"], payload["context_id"]))
+        return {"status": "success", "relevance_score": 0.4, "reasoning": "alone"}
+
+    monkeypatch.setattr(processor, "tool_score_documents_relevance", score)
+    monkeypatch.setattr(processor, "tool_define_topic_relevance", single)
+    documents = [("http://a", "aaaaaaaaaa"), ("http://b", "bbbbbbbbbb"), ("http://c", "long text"), ("http://d", "dddddddddd")]
+    results = processor._score_documents({"domain_name": "AI"}, documents, {"http://c": "ctx-c"})
+
+    # Only the documents without a context are batched, each cut to batch_document_chars.
+    assert batches == [[("0", "aaaaa"), ("1", "bbbbb"), ("3", "ddddd")]]
+    # The context document and the ids the batch left out are scored alone, with full text, two at a time.
+    assert sorted(singles) == [("bbbbbbbbbb", None), ("dddddddddd", None), ("long text", "ctx-c")]
+    assert peak[0] == 2
+    assert [r["relevance_score"] for r in results] == [0.8, 0.4, 0.4, 0.4]
+
+
+def test_candidate_fact_ids_carry_a_full_uuid():
+    from src.agents.subagent_document_processor import _generate_fact_id
+
+    ids = {_generate_fact_id("dom_ai", 0) for _ in range(1000)}
+    assert len(ids) == 1000
+    assert all(len(fact_id.rsplit("_", 1)[1]) == 32 for fact_id in ids)
@@ -0,0 +1,88 @@
+import os
+import sys
+import threading
+import time
+from pathlib import Path
+
+ROOT_DIR = Path(__file__).resolve().parents[2]
+sys.path.append(str(ROOT_DIR))
+os.environ["ENABLE_GCP_LOGGING"] = "0"
+os.environ.setdefault("RUN_REAL_AI", "0")
+
+CONFIG = {"enabled": True, "max_workers": 4, "ttl_seconds": 60, "max_sessions": 8}
+
+
+def _patch_tools(monkeypatch, processor, delay):
+    calls = {"page": [], "domains": []}
+
+    def page(payload):
+        calls["page"].append((time.monotonic(), threading.current_thread().name))
+        time.sleep(delay)
+        return {"status": "success", "content": "AI content", "page_title": "t"}
+
+    def domains(payload):
+        calls["domains"].append((time.monotonic(), threading.current_thread().name))
+        time.sleep(delay)
+        return {"status": "success", "data": [{"domain_id": "dom_ai", "name": "AI", "domain_description": "", "domain_keywords": []}]}
+
+    monkeypatch.setattr(processor, "tool_process_ordinary_page", page)
+    monkeypatch.setattr(processor, "tool_fetch_user_knowledge_domains", domains)
+    monkeypatch.setattr(processor, "tool_define_topic_relevance", lambda p: {"status": "success", "relevance_score": 0.95, "reasoning": "r"})
+    monkeypatch.setattr(processor, "tool_extract_facts_from_text", lambda p: {"status": "success", "facts": [{"content": "fact"}]})
+    monkeypatch.setattr(processor, "tool_check_duplicate_facts", lambda p: {"status": "success", "data": []})
+    return calls
+
+
+def test_root_prefetch_overlaps_fetches_and_the_processor_picks_them_up(monkeypatch):
+    from src.agents import agent_root, subagent_document_processor as processor
+    from src.session import candidate_store, prefetch
+
+    monkeypatch.setattr(candidate_store, "_store", candidate_store.InMemoryCandidateStore())
+    monkeypatch.setattr(prefetch, "_prefetcher", prefetch.Prefetcher(CONFIG))
+    monkeypatch.setattr(processor, "load_jobs_config", lambda: {"mode": "inline"})
+    calls = _patch_tools(monkeypatch, processor, delay=0.2)
+
+    url = "http://example.com/article"
+    root = agent_root.run_agent_root(f"read {url}", session_state={"user_id": "u1"}, session_id="s1")
+    assert root["status"] == "DELEGATE"
+    # Both reads are already in flight, side by side, before the hand-off completes.
+    assert len(calls["page"]) == 1 and len(calls["domains"]) == 1
+    assert abs(calls["page"][0][0] - calls["domains"][0][0]) < 0.1
+    assert all(name.startswith("prefetch") for _, name in calls["page"] + calls["domains"])
+
+    started = time.monotonic()
+    result = processor.run_subagent_document_processor({"raw_text": url}, session_id="s1", session_state={"user_id": "u1", **root["state_delta"]})
+    assert result["status"] == "review_required" and [f["content"] for f in result["candidate_facts"]] == ["fact"]
+    assert time.monotonic() - started < 0.35
+    assert len(calls["page"]) == 1 and len(calls["domains"]) == 1
+    assert prefetch.get_prefetcher().stats() == {"pending": 0, "started": 1, "hits": 1, "misses": 0, "expired": 0}
+
+
+def test_unmatched_or_disabled_prefetch_falls_back_to_fetching_in_the_processor(monkeypatch):
+    from src.agents import subagent_document_processor as processor
+    from src.session import candidate_store, prefetch
+
+    monkeypatch.setattr(candidate_store, "_store", candidate_store.InMemoryCandidateStore())
+    monkeypatch.setattr(prefetch, "_prefetcher", prefetch.Prefetcher(CONFIG))
+    monkeypatch.setattr(processor, "load_jobs_config", lambda: {"mode": "queue"})
+    calls = _patch_tools(monkeypatch, processor, delay=0.1)
+
+    # Queue-mode discovery runs in a worker process, so the root does not prefetch for it.
+    assert processor.prefetch_discovery("s1", "u1", ["http://example.com/a"]) is False
+    monkeypatch.setattr(processor, "load_jobs_config", lambda: {"mode": "inline"})
+    assert processor.prefetch_discovery("s1", "u1", ["http://example.com/a"]) is True
+    # Another user's turn on the same session id misses; the owner's turn takes the handle and adds the URL it lacks.
+    assert prefetch.get_prefetcher().take("s1", "u2") is None
+    result = processor.run_subagent_document_processor({"raw_text": "http://example.com/b"}, session_id="s1", session_state={"user_id": "u1"})
+    assert result["status"] == "review_required" and result["candidate_facts"][0]["source_url"] == "http://example.com/b"
+    assert len(calls["page"]) == 2 and len(calls["domains"]) == 1
+    # Without a handle the processor still overlaps its own reads.
+    processor.run_subagent_document_processor({"raw_text": "http://example.com/c"}, session_id="s3", session_state={"user_id": "u1"})
+    assert len(calls["page"]) == 3 and abs(calls["page"][2][0] - calls["domains"][1][0]) < 0.05
+    assert prefetch.get_prefetcher().stats() == {"pending": 0, "started": 1, "hits": 1, "misses": 2, "expired": 0}
+
+    monkeypatch.setattr(processor, "load_prefetch_config", lambda: {**CONFIG, "enabled": False})
+    assert processor.prefetch_discovery("s2", "u1", ["http://example.com/c"]) is False
+    processor.run_subagent_document_processor({"raw_text": "http://example.com/c"}, session_id="s2", session_state={"user_id": "u1"})
+    page_at, page_thread = calls["page"][-1]
+    assert page_thread == threading.current_thread().name and calls["domains"][-1][0] >= page_at + 0.1
@@ -0,0 +1,193 @@
+import os
+import sys
+import threading
+import time
+from pathlib import Path
+
+ROOT_DIR = Path(__file__).resolve().parents[2]
+sys.path.append(str(ROOT_DIR))
+os.environ["ENABLE_GCP_LOGGING"] = "0"
+
+
+def _config(total, interactive, snapshot, bulk):
+    limits = {"max_concurrency": total, "interactive": interactive, "snapshot": snapshot, "bulk": bulk}
+    return {"enabled": True, "llm": dict(limits), "storage": dict(limits)}
+
+
+def _wait_until(predicate):
+    deadline = time.monotonic() + 2
+    while not predicate():
+        assert time.monotonic() < deadline
+        time.sleep(0.001)
+
+
+def test_priority_order_and_per_user_round_robin(monkeypatch):
+    from src.utils import scheduler
+
+    monkeypatch.setattr(scheduler, "_scheduler", scheduler.Scheduler(_config(1, 1, 1, 1)))
+    llm = scheduler.get_scheduler().resources["llm"]
+    order, threads = [], []
+    blocker = threading.Event()
+
+    def call(priority, user, label, hold=None):
+        with scheduler.scheduling(priority, user_id=user), scheduler.slot("llm"):
+            order.append(label)
+            if hold:
+                hold.wait()
+
+    first = threading.Thread(target=call, args=("bulk", "a", "a0", blocker))
+    first.start()
+    _wait_until(lambda: order == ["a0"])
+    # A backfill from user a queues first; user b's bulk call and a chat turn arrive later.
+    for priority, user, label in [("bulk", "a", "a1"), ("bulk", "a", "a2"), ("bulk", "b", "b1"), ("snapshot", "c", "s1"), ("interactive", "d", "i1")]:
+        threads.append(threading.Thread(target=call, args=(priority, user, label)))
+        threads[-1].start()
+        _wait_until(lambda n=len(threads): sum(llm.stats()["waiting"].values()) == n)
+    blocker.set()
+    for t in [first, *threads]:
+        t.join()
+    assert order == ["a0", "i1", "s1", "a1", "b1", "a2"]
+    stats = llm.stats()
+    assert stats["granted"] == {"interactive": 1, "snapshot": 1, "bulk": 4} and sum(stats["running"].values()) == 0
+
+
+def test_class_caps_keep_capacity_for_interactive_and_slots_are_reentrant(monkeypatch):
+    from src.utils import scheduler
+
+    monkeypatch.setattr(scheduler, "_scheduler", scheduler.Scheduler(_config(3, 3, 1, 1)))
+    llm = scheduler.get_scheduler().resources["llm"]
+    release = threading.Event()
+
+    def bulk():
+        with scheduler.scheduling("bulk"), scheduler.slot("llm"):
+            release.wait()
+
+    bulk_threads = [threading.Thread(target=bulk) for _ in range(3)]
+    for t in bulk_threads:
+        t.start()
+    _wait_until(lambda: llm.stats()["waiting"]["bulk"] == 2)
+    assert llm.stats()["running"]["bulk"] == 1
+
+    @scheduler.scheduled("llm", priority="snapshot")
+    def tool(payload):
+        # Nested slots in the same context pass through instead of taking a second slot.
+        with scheduler.slot("llm"):
+            return llm.stats()["running"]
+
+    # Interactive callers are demoted to snapshot for the decorated tool; it still runs beside the bulk backlog.
+    assert tool({"user_id": "u1"}) == {"interactive": 0, "snapshot": 1, "bulk": 1}
+    with scheduler.scheduling("bulk"), scheduler.scheduling("interactive", demote_only=True):
+        assert scheduler._priority.get() == "bulk"
+    release.set()
+    for t in bulk_threads:
+        t.join()
+    assert llm.stats()["granted"]["bulk"] == 3
+
+
+def test_background_refresh_and_snapshot_merge_take_their_own_slots(monkeypatch, tmp_path):
+    from src.storage.sqlite_store import SqliteClient
+    from src.tools import ai_analysis, memory
+    from src.tools.result_cache import VersionedCache
+    from src.utils import scheduler
+
+    monkeypatch.setattr(scheduler, "_scheduler", scheduler.Scheduler(_config(1, 1, 1, 1)))
+    storage = scheduler.get_scheduler().resources["storage"]
+    cache = VersionedCache("test")
+    seen = {}
+
+    def compute():
+        with scheduler.slot("storage"):
+            seen.update(scope=scheduler.current_scope(), caller_done=caller_done, running=storage.stats()["running"])
+        return "fresh"
+
+    with scheduler.scheduling(user_id="u1"), scheduler.slot("storage"):
+        cache.get("k", 1, lambda: "old")
+        assert cache.get("k", 2, compute) == ("old", "stale")
+        caller_done = True
+    cache.join()
+    # The refresh waited for a storage slot of its own instead of riding on the caller's (limit 1).
+    assert seen == {"scope": ("snapshot", "u1"), "caller_done": True, "running": {"interactive": 0, "snapshot": 1, "bulk": 0}}
+
+    client = SqliteClient(tmp_path / "kb.sqlite3")
+    monkeypatch.setattr(memory, "_firestore_client", lambda: client)
+    monkeypatch.setenv("RUN_REAL_MEMORY", "1")
+    monkeypatch.delenv("RUN_REAL_AI", raising=False)
+    merges = []
+    real_merge = ai_analysis.tool_merge_snapshot_summary
+
+    def merge(payload):
+        merges.append(sum(storage.stats()["running"].values()))
+        return real_merge(payload)
+
+    monkeypatch.setattr(ai_analysis, "tool_merge_snapshot_summary", merge)
+    saved = memory.tool_save_fact_to_memory({"fact_text": "A fact.", "source_url": "https://a.example", "user_id": "u1", "domain_id": "d1"})
+    # The rolling merge waits for Gemini without holding a storage slot.
+    assert saved["status"] == "success" and merges == [0]
+    assert client.collection("domain_snapshots").document("d1").get().to_dict()["fact_count"] == 1
+
+
+def test_snapshot_tool_holds_no_storage_slot_across_summary_calls(monkeypatch, tmp_path):
+    from src.storage.sqlite_store import SqliteClient
+    from src.tools import ai_analysis, domains, memory
+    from src.utils import scheduler
+    from src.utils.config_loader import ConfigLoader
+
+    monkeypatch.setattr(scheduler, "_scheduler", scheduler.Scheduler(_config(4, 4, 4, 4)))
+    monkeypatch.setitem(ConfigLoader.instance().config, "snapshots", {"mode": "tree", "group_by": "source", "branch_count": 2})
+    storage = scheduler.get_scheduler().resources["storage"]
+    client = SqliteClient(tmp_path / "kb.sqlite3")
+    monkeypatch.setattr(memory, "_firestore_client", lambda: client)
+    monkeypatch.setattr(domains, "_client", lambda: client)
+    monkeypatch.setenv("RUN_REAL_MEMORY", "1")
+    monkeypatch.delenv("RUN_REAL_AI", raising=False)
+    for n in range(3):
+        memory.tool_save_fact_to_memory({"fact_text": f"Fact number {n} about launches.", "source_url": f"https://{n}.example", "user_id": "u1", "domain_id": "d1"})
+
+    held = []
+    real_summarize = ai_analysis.tool_summarize_texts
+
+    def summarize(payload):
+        held.append("storage" in scheduler._held.get())
+        return real_summarize(payload)
+
+    monkeypatch.setattr(ai_analysis, "tool_summarize_texts", summarize)
+    before = storage.stats()["granted"]["snapshot"]
+    result = domains.tool_generate_domain_snapshot({"user_id": "u1", "domain_id": "d1"})
+    # No summary call ran holding a storage slot; the reads and writes around them took snapshot slots.
+    assert result["status"] == "success" and result["data"]["meta_info"]["fact_count"] == 3
+    assert held and not any(held)
+    assert storage.stats()["granted"]["snapshot"] > before
+
+
+def test_tree_refresh_workers_take_their_own_storage_slots(monkeypatch, tmp_path):
+    from src.storage.sqlite_store import SqliteClient
+    from src.tools import memory, snapshots
+    from src.utils import scheduler
+    from src.utils.config_loader import ConfigLoader
+
+    monkeypatch.setitem(ConfigLoader.instance().config, "snapshots", {"mode": "tree", "group_by": "source", "branch_count": 4, "max_parallel": 4})
+    client = SqliteClient(tmp_path / "kb.sqlite3")
+    monkeypatch.setattr(memory, "_firestore_client", lambda: client)
+    monkeypatch.setenv("RUN_REAL_MEMORY", "1")
+    monkeypatch.delenv("RUN_REAL_AI", raising=False)
+    for n in range(4):
+        memory.tool_save_fact_to_memory({"fact_text": f"Fact {n} on reusable boosters.", "source_url": f"https://{n}.example", "user_id": "u1", "domain_id": "d1"})
+
+    monkeypatch.setattr(scheduler, "_scheduler", scheduler.Scheduler(_config(8, 8, 2, 8)))
+    storage = scheduler.get_scheduler().resources["storage"]
+    peak = [0]
+    real_stream = snapshots.stream_documents
+
+    def stream(*args, **kwargs):
+        peak[0] = max(peak[0], storage.stats()["running"]["snapshot"])
+        return real_stream(*args, **kwargs)
+
+    monkeypatch.setattr(snapshots, "stream_documents", stream)
+    state = snapshots.read_snapshot_state(client, "d1")
+    # Even a caller already holding a storage slot does not lend it to the pool: the workers queue for their own,
+    # so the snapshot class never runs more than its cap of 2.
+    with scheduler.scheduling("snapshot", user_id="u1"), scheduler.slot("storage"):
+        refreshed = snapshots.refresh_tree_snapshot(client, "d1", state)
+    assert refreshed["tree_dirty"] is False
+    stats = storage.stats()
+    assert stats["granted"]["snapshot"] > 1 + 2 * 4 and peak[0] <= 2
@@ -0,0 +1,256 @@
+import asyncio
+import sys
+import time
+from pathlib import Path
+
+import pytest
+
+
+ROOT_DIR = Path(__file__).resolve().parents[2]
+sys.path.append(str(ROOT_DIR))
+
+
+@pytest.fixture
+def session_manager(monkeypatch, tmp_path):
+    monkeypatch.setenv("SESSION_BACKEND", "sqlite")
+    monkeypatch.setenv("SESSION_SQLITE_PATH", str(tmp_path / "sessions.sqlite3"))
+    from src.session import session_manager
+
+    monkeypatch.setattr(session_manager, "_session_service", None)
+    return session_manager
+
+
+def test_session_helpers_persist_deltas_across_service_instances(session_manager, tmp_path):
+    from src.session.sqlite_session_service import SqliteSessionService
+
+    session_id, _ = session_manager.ensure_session()
+    session_manager.update_state(session_id, {"user_id": "u1", "intent": "CREATE", "skip": None})
+    session_manager.update_state(session_id, {"domain_id": "dom_ai"}, clear_keys=["intent"])
+    assert session_manager.get_state(session_id) == {"user_id": "u1", "domain_id": "dom_ai"}
+    assert session_manager.ensure_session(session_id)[0] == session_id
+
+    service = session_manager.get_session_service()
+    session_manager.get_state(session_id)
+    assert service.cache_info()["hits"] >= 2 and service.cache_info()["misses"] == 0
+
+    # A second worker (or a restart) sees the same state; its write makes the first worker reload once.
+    other = SqliteSessionService(str(tmp_path / "sessions.sqlite3"))
+    other.update_state_sync(session_manager.APP_NAME, "anonymous", session_id, {"step": 2})
+    assert session_manager.get_state(session_id)["step"] == 2
+    assert service.cache_info()["reloads"] == 1
+
+
+def test_append_event_writes_delta_and_rejects_stale_sessions(tmp_path):
+    from google.adk.events import Event, EventActions
+
+    from src.session.sqlite_session_service import SqliteSessionService
+
+    path = str(tmp_path / "events.sqlite3")
+    service = SqliteSessionService(path, max_cached_sessions=1)
+
+    async def scenario():
+        session = await service.create_session(app_name="kb", user_id="anon", state={"n": 0, "temp:scratch": 1})
+        event = Event(invocation_id="i1", author="kb_root", actions=EventActions(state_delta={"n": 1, "temp:x": 9}))
+        await service.append_event(session, event)
+        assert session.state["n"] == 1 and session.state["temp:x"] == 9
+
+        reloaded = await SqliteSessionService(path).get_session(app_name="kb", user_id="anon", session_id=session.id)
+        assert reloaded.state == {"n": 1}
+        assert [e.actions.state_delta for e in reloaded.events] == [{"n": 1}]
+
+        stale = await service.get_session(app_name="kb", user_id="anon", session_id=session.id)
+        await service.append_event(session, Event(invocation_id="i2", author="kb_root", actions=EventActions(state_delta={"n": 2})))
+        with pytest.raises(ValueError):
+            await service.append_event(stale, Event(invocation_id="i3", author="kb_root", actions=EventActions(state_delta={"n": 3})))
+        assert stale.state["n"] == 1
+
+        listed = await service.list_sessions(app_name="kb", user_id="anon")
+        assert [s.id for s in listed.sessions] == [session.id]
+        await service.delete_session(app_name="kb", user_id="anon", session_id=session.id)
+        assert await service.get_session(app_name="kb", user_id="anon", session_id=session.id) is None
+
+    asyncio.run(scenario())
+
+
+def test_ensure_session_uses_the_session_a_racing_worker_created(session_manager, tmp_path):
+    from src.session.sqlite_session_service import SqliteSessionService
+
+    service = session_manager.get_session_service()
+    other = SqliteSessionService(str(tmp_path / "sessions.sqlite3"))
+    real_get = service.get_session_sync
+    calls = []
+
+    def get_after_race(**kwargs):
+        if not calls:
+            # The other worker inserts right after our miss.
+            other.create_session_sync(app_name=kwargs["app_name"], user_id=kwargs["user_id"], session_id=kwargs["session_id"], state={"by": "other"})
+        calls.append(kwargs["session_id"])
+        return None if len(calls) == 1 else real_get(**kwargs)
+
+    service.get_session_sync = get_after_race
+    session_id, session = session_manager.ensure_session("s-race")
+    assert session_id == "s-race" and session.state == {"by": "other"}
+
+
+def test_session_lease_excludes_other_workers_until_released_or_expired(tmp_path):
+    from src.session.sqlite_session_service import SqliteSessionService
+
+    path = str(tmp_path / "sessions.sqlite3")
+    first, second = SqliteSessionService(path), SqliteSessionService(path)
+    key = ("kb", "anon", "s1")
+    assert first.acquire_lease(*key, "w1", 60)
+    assert not second.acquire_lease(*key, "w2", 60)
+    assert first.acquire_lease(*key, "w1", 60)  # the holder may extend its own lease
+    second.release_lease(*key, "w2")  # releasing someone else's lease is a no-op
+    assert not second.acquire_lease(*key, "w2", 60)
+
+    first.release_lease(*key, "w1")
+    assert second.acquire_lease(*key, "w2", 0.01)
+    time.sleep(0.02)
+    assert first.acquire_lease(*key, "w1", 60)  # an expired lease (dead worker) is taken over
+
+
+def test_app_and_user_state_are_shared_and_io_runs_off_the_event_loop(tmp_path):
+    import threading
+
+    from google.adk.events import Event, EventActions
+    from google.adk.sessions import InMemorySessionService
+
+    from src.session.sqlite_session_service import SqliteSessionService
+
+    path = str(tmp_path / "shared.sqlite3")
+    sqlite = SqliteSessionService(path)
+    write_threads = []
+    real_write = sqlite._write_delta
+    sqlite._write_delta = lambda *a, **kw: write_threads.append(threading.get_ident()) or real_write(*a, **kw)
+
+    async def scenario(service):
+        first = await service.create_session(app_name="kb", user_id="u1", state={"app:mode": "a", "own": 1})
+        second = await service.create_session(app_name="kb", user_id="u1")
+        other_user = await service.create_session(app_name="kb", user_id="u2")
+        delta = {"app:mode": "b", "user:lang": "en", "own": 2}
+        await service.append_event(first, Event(invocation_id="i1", author="kb_root", actions=EventActions(state_delta=delta)))
+        get = lambda s: service.get_session(app_name="kb", user_id=s.user_id, session_id=s.id)
+        return (await get(first)).state, (await get(second)).state, (await get(other_user)).state
+
+    expected = ({"app:mode": "b", "user:lang": "en", "own": 2}, {"app:mode": "b", "user:lang": "en"}, {"app:mode": "b"})
+    # Same contract as ADK's in-memory service: app: keys reach every session, user: keys every session of that user.
+    assert asyncio.run(scenario(InMemorySessionService())) == expected
+    loop_thread = threading.get_ident()
+    assert asyncio.run(scenario(sqlite)) == expected
+    assert write_threads and loop_thread not in write_threads
+    # Shared keys survive in their own rows, not copied per session.
+    fresh = SqliteSessionService(path)
+    (listed, *_) = asyncio.run(fresh.list_sessions(app_name="kb", user_id="u2")).sessions
+    assert fresh.get_session_sync(app_name="kb", user_id="u2", session_id=listed.id).state == {"app:mode": "b"}
+    with fresh._conn() as conn:
+        assert conn.execute("SELECT COUNT(*) FROM session_state WHERE key LIKE 'app:%' OR key LIKE 'user:%'").fetchone() == (0,)
+
+
+def test_session_budget_expires_idle_sessions_and_enforces_caps():
+    from src.session.eviction import SessionBudget
+
+    now = [0.0]
+    budget = SessionBudget(idle_ttl_seconds=10, max_sessions=3, max_bytes=100, clock=lambda: now[0])
+    assert budget.touch("a", 10) == [] and budget.touch("b", 10) == [] and budget.touch("c", 10) == []
+    now[0] = 5
+    budget.touch("a")  # refreshes a's deadline; b and c keep theirs
+    assert budget.touch("d", 10) == ["b"]  # count cap drops the least recently used
+    assert budget.resize("d", 85) == ["c"]  # byte cap: 10 + 85 fits once c is gone
+    now[0] = 12
+    assert budget.expire() == []  # a was touched at 5, d created at 5
+    now[0] = 16
+    assert sorted(budget.expire()) == ["a", "d"]
+    assert budget.stats() == {
+        "evicted_ttl": 2, "evicted_sessions_cap": 1, "evicted_bytes_cap": 1, "evicted_bytes": 115, "sessions": 0, "bytes": 0,
+    }
+
+
+def test_session_caches_stay_within_budget(tmp_path):
+    from google.adk.events import Event, EventActions
+
+    from src.session.memory_session_service import BoundedInMemorySessionService
+    from src.session.sqlite_session_service import SqliteSessionService
+
+    sqlite = SqliteSessionService(str(tmp_path / "cap.sqlite3"), max_cached_sessions=2, idle_ttl_seconds=3600, max_cached_bytes=0)
+    ids = [sqlite.create_session_sync(app_name="kb", user_id="anon", state={"i": i}).id for i in range(3)]
+    info = sqlite.cache_info()
+    assert info["sessions"] == 2 and info["evicted_sessions_cap"] == 1
+    # Cache eviction only drops the cached copy; the stored session reloads.
+    assert sqlite.get_session_sync(app_name="kb", user_id="anon", session_id=ids[0]).state == {"i": 0}
+    assert sqlite.session_size("kb", "anon", ids[0]) > 0
+
+    with sqlite._conn() as conn:
+        conn.execute("UPDATE sessions SET update_time = update_time - 7200 WHERE session_id = ?", [ids[1]])
+    assert sqlite.sweep_expired() == 1
+    assert sqlite.get_session_sync(app_name="kb", user_id="anon", session_id=ids[1]) is None
+    assert sqlite.cache_info()["expired_deleted"] == 1
+
+    memory = BoundedInMemorySessionService(idle_ttl_seconds=3600, max_sessions=10, max_bytes=2000)
+
+    async def scenario():
+        first = await memory.create_session(app_name="kb", user_id="anon", state={"n": 0})
+        second = await memory.create_session(app_name="kb", user_id="anon")
+        await memory.append_event(first, Event(invocation_id="i1", author="kb_root", actions=EventActions(state_delta={"blob": "x" * 400})))
+        assert memory.session_size("kb", "anon", first.id) > 400
+        # Growing `second` past the byte cap evicts `first` outright: the memory backend has no store behind it.
+        memory.update_state_sync("kb", "anon", second.id, {"blob": "y" * 1200})
+        assert await memory.get_session(app_name="kb", user_id="anon", session_id=first.id) is None
+        assert memory.budget_info()["evicted_bytes_cap"] == 1
+
+    asyncio.run(scenario())
+
+
+def test_long_histories_compact_to_marker_and_recent_tail(tmp_path):
+    from google.adk.events import Event, EventActions
+
+    from src.session.compaction import CompactionPolicy, is_compaction_marker
+    from src.session.memory_session_service import BoundedInMemorySessionService
+    from src.session.sqlite_session_service import SqliteSessionService
+
+    path = str(tmp_path / "compact.sqlite3")
+    sqlite = SqliteSessionService(path)
+    sqlite._compaction = CompactionPolicy(max_events=6, max_bytes=0, keep_recent=3)
+    memory = BoundedInMemorySessionService()
+    memory._compaction = CompactionPolicy(max_events=6, max_bytes=0, keep_recent=3)
+
+    async def turns(service):
+        session = await service.create_session(app_name="kb", user_id="anon")
+        for n in range(1, 13):
+            event = Event(invocation_id=f"i{n}", author="kb_root", actions=EventActions(state_delta={"n": n, f"k{n % 2}": n}))
+            await service.append_event(session, event)  # the same session object keeps appending across compactions
+        return await service.get_session(app_name="kb", user_id="anon", session_id=session.id)
+
+    for service in (sqlite, memory):
+        session = asyncio.run(turns(service))
+        assert session.state == {"n": 12, "k0": 12, "k1": 11}
+        assert is_compaction_marker(session.events[0]) and session.events[0].custom_metadata["compacted_events"] == 7
+        assert [e.invocation_id for e in session.events[1:]] == ["i8", "i9", "i10", "i11", "i12"]
+
+    (stored,) = asyncio.run(sqlite.list_sessions(app_name="kb", user_id="anon")).sessions
+    reloaded = SqliteSessionService(path).get_session_sync(app_name="kb", user_id="anon", session_id=stored.id)
+    assert len(reloaded.events) == 6 and reloaded.state["n"] == 12
+    assert sqlite.cache_info()["compactions"] == 2 and sqlite.cache_info()["events_compacted"] == 8
+
+
+def test_candidate_store_scopes_by_session_and_user_and_expires(tmp_path, monkeypatch):
+    from src.session import candidate_store
+
+    facts = [
+        {"fact_id": f"f{i}", "domain_id": "dom_ai", "content": f"c{i}", "source_url": "http://x", "similarity": 0.1} for i in range(3)
+    ]
+    for store in (candidate_store.SqliteCandidateStore(str(tmp_path / "c.sqlite3"), ttl_seconds=60), candidate_store.InMemoryCandidateStore(ttl_seconds=60)):
+        assert store.put("s1", "u1", facts) == 3
+        assert [f["fact_id"] for f in store.get("s1", "u1", ["f2", "f0", "nope"])] == ["f2", "f0"]
+        assert store.get("s1", "u2", ["f0"]) == [] and store.get("s2", "u1", ["f0"]) == []
+        # A later discovery in the same session adds to the saveable candidates.
+        assert store.put("s1", "u1", [{**facts[0], "fact_id": "g0"}]) == 1
+        assert [f["fact_id"] for f in store.get("s1", "u1", ["f0", "g0"])] == ["f0", "g0"]
+        assert store.get("s1", "u1", ["f1"]) == [{"fact_id": "f1", "domain_id": "dom_ai", "content": "c1", "source_url": "http://x"}]
+        store.discard("s1", ["f1"])
+        assert store.get("s1", "u1", ["f1"]) == []
+
+    sqlite_store = candidate_store.SqliteCandidateStore(str(tmp_path / "c.sqlite3"), ttl_seconds=60)
+    real_time = candidate_store.time.time
+    monkeypatch.setattr(candidate_store.time, "time", lambda: real_time() + 120)
+    assert sqlite_store.get("s1", "u1", ["f0"]) == []
@@ -0,0 +1,172 @@
+import sys
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+import pytest
+
+
+ROOT_DIR = Path(__file__).resolve().parents[2]
+sys.path.append(str(ROOT_DIR))
+
+
+@pytest.fixture
+def sqlite_backend(monkeypatch, tmp_path):
+    monkeypatch.setenv("STORAGE_BACKEND", "sqlite")
+    monkeypatch.setenv("STORAGE_SQLITE_PATH", str(tmp_path / "kb.sqlite3"))
+    from src.storage.client import get_client
+
+    return get_client()
+
+
+def test_sqlite_client_queries_match_firestore_semantics(tmp_path):
+    from google.api_core.exceptions import NotFound
+    from google.cloud import firestore
+
+    from src.storage.sqlite_store import SqliteClient
+    from src.tools.firestore_query import count_documents, fetch_page, get_document
+
+    client = SqliteClient(tmp_path / "store.sqlite3")
+    facts = client.collection("memory_facts")
+    base = datetime(2026, 1, 1, tzinfo=timezone.utc)
+    for i in range(5):
+        facts.document(f"f{i}").set(
+            {"domain_id": "d1" if i < 4 else "d2", "n": i, "tags": [f"t{i % 2}"], "created_at": base + timedelta(minutes=5 - i)}
+        )
+    facts.document("f0").set({"extra": {"a": 1}}, merge=True)
+    facts.document("f0").update({"n": firestore.Increment(10), "extra.b": 2, "touched_at": firestore.SERVER_TIMESTAMP})
+
+    f0 = get_document(facts.document("f0"), fields=["n", "extra"]).to_dict()
+    assert f0 == {"n": 10, "extra": {"a": 1, "b": 2}}
+    assert isinstance(facts.document("f0").get().to_dict()["touched_at"], datetime)
+    assert not facts.document("missing").get().exists
+    with pytest.raises(NotFound):
+        facts.document("missing").update({"n": 1})
+
+    scoped = facts.where("domain_id", "==", "d1")
+    assert count_documents(scoped) == 4
+    assert [d.id for d in scoped.where("tags", "array_contains_any", ["t1"]).stream()] == ["f1", "f3"]
+    page, cursor = fetch_page(scoped, fields=["created_at"], page_size=3, order_by="created_at")
+    assert [d.id for d in page] == ["f3", "f2", "f1"]
+    rest, cursor = fetch_page(scoped, fields=["created_at"], page_size=3, start_after=page[-1], order_by="created_at")
+    assert [d.id for d in rest] == ["f0"] and cursor is None
+
+    batch = client.batch()
+    batch.set(facts.document("f9"), {"domain_id": "d1"})
+    batch.update(facts.document("nope"), {"n": 1})
+    with pytest.raises(NotFound):
+        batch.commit()
+    assert not facts.document("f9").get().exists
+
+
+def test_sqlite_transactions_serialize_concurrent_read_modify_write(tmp_path):
+    from concurrent.futures import ThreadPoolExecutor
+
+    from src.storage.client import run_transaction
+    from src.storage.sqlite_store import SqliteClient
+
+    client = SqliteClient(tmp_path / "txn.sqlite3")
+    ref = client.collection("domains").document("d1")
+    ref.set({"n": 0})
+
+    def bump(_):
+        def apply(transaction):
+            (snap,) = client.get_all([ref], field_paths=["n"], transaction=transaction)
+            transaction.update(ref, {"n": snap.to_dict()["n"] + 1})
+
+        run_transaction(client, apply)
+
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        list(pool.map(bump, range(200)))
+    assert ref.get().to_dict()["n"] == 200
+
+    def fail(transaction):
+        transaction.update(ref, {"n": -1})
+        raise RuntimeError("abort")
+
+    with pytest.raises(RuntimeError):
+        run_transaction(client, fail)
+    assert ref.get().to_dict()["n"] == 200
+
+
+def test_concurrent_snapshot_saves_keep_every_count(monkeypatch, tmp_path):
+    from concurrent.futures import ThreadPoolExecutor
+
+    from src.storage.sqlite_store import SqliteClient
+    from src.tools import snapshots
+
+    monkeypatch.delenv("RUN_REAL_AI", raising=False)
+    client = SqliteClient(tmp_path / "snap.sqlite3")
+    client.collection("domains").document("d1").set({"name": "Edge"})
+    urls = [f"https://src{i % 5}.example" for i in range(40)]
+
+    def save(i):
+        snapshots.apply_fact_to_snapshot(client, "u1", "d1", f"fact {i:02d}", urls[i])
+
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        list(pool.map(save, range(len(urls))))
+    state = client.collection("domain_snapshots").document("d1").get().to_dict()
+    assert (state["fact_count"], state["total_char_length"], state["source_count"]) == (40, 40 * len("fact 00"), 5)
+    assert "source_hashes" not in state
+    assert len(list(client.collection("domain_snapshots").document("d1").collection("sources").stream())) == 5
+
+
+def test_concurrent_saves_of_one_fact_store_it_once(monkeypatch, tmp_path):
+    from concurrent.futures import ThreadPoolExecutor
+
+    from src.storage.sqlite_store import SqliteClient
+    from src.tools import memory
+
+    monkeypatch.setenv("RUN_REAL_MEMORY", "1")
+    monkeypatch.delenv("RUN_REAL_AI", raising=False)
+    client = SqliteClient(tmp_path / "kb.sqlite3")
+    monkeypatch.setattr(memory, "_firestore_client", lambda: client)
+    text = "Reusable boosters cut the marginal cost of orbital launches sharply."
+
+    def save(i):
+        return memory.tool_save_fact_to_memory({"user_id": "u1", "domain_id": "d1", "fact_text": text, "source_url": f"https://src{i}.example"})
+
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        results = list(pool.map(save, range(8)))
+    facts = list(client.collection("memory_facts").stream())
+    # Lookup and insert share a transaction: one stored fact, every other save merged into it.
+    assert len(facts) == 1 and sum(not r["data"]["merged_into_existing"] for r in results) == 1
+    stored = facts[0].to_dict()
+    assert sorted(stored["sources"]) == sorted(f"https://src{i}.example" for i in range(8)) and stored["duplicate_count"] == 7
+    state = client.collection("domain_snapshots").document("d1").get().to_dict()
+    # Merged restatements add their sources, not facts.
+    assert (state["fact_count"], state["source_count"]) == (1, 8)
+
+
+def test_tools_run_on_sqlite_backend(monkeypatch, tmp_path, sqlite_backend):
+    from src.agents import subagent_domain_lifecycle
+    from src.tools import auth, domains, memory
+
+    monkeypatch.setenv("RUN_REAL_MEMORY", "1")
+    monkeypatch.setenv("EXPORT_LOCAL_DIR", str(tmp_path / "exports"))
+    monkeypatch.delenv("RUN_REAL_AI", raising=False)
+
+    user = auth.tool_auth_user({"username": "Edge"})
+    assert user["data"]["is_new_user"] is True
+    assert auth.tool_auth_user({"username": "Edge"})["data"] == {**user["data"], "is_new_user": False}
+    user_id = user["data"]["user_id"]
+
+    subagent_domain_lifecycle._persist_domain(
+        "dom_edge", user_id, {"name": "Edge AI", "description": "On-device models", "keywords": ["edge"]}
+    )
+    listed = domains.tool_fetch_user_knowledge_domains({"user_id": user_id, "view_mode": "DETAILED", "include_counts": True})
+    assert listed["total_count"] == 1 and listed["data"][0]["domain_keywords"] == ["edge"]
+    assert listed["data"][0]["profile"]["prompt_fragment"] == "Domain: Edge AI\nScope: On-device models\nKeywords: edge"
+    toggled = domains.tool_toggle_domain_status({"user_id": user_id, "domain_id": "dom_edge"})
+    assert toggled["data"]["new_status"] == "inactive"
+    bulk = domains.tool_bulk_toggle_domain_status({"user_id": user_id, "domain_ids": ["dom_edge"], "target_status": "active"})
+    assert bulk["data"]["changed_count"] == 1
+
+    text = "Quantized small language models now run comfortably on recent phone chips."
+    first = memory.tool_save_fact_to_memory({"user_id": user_id, "domain_id": "dom_edge", "fact_text": text, "source_url": "https://a.example"})
+    again = memory.tool_save_fact_to_memory({"user_id": user_id, "domain_id": "dom_edge", "fact_text": text, "source_url": "https://b.example"})
+    assert again["data"]["memory_id"] == first["data"]["memory_id"] and again["data"]["merged_into_existing"]
+
+    snapshot = domains.tool_generate_domain_snapshot({"user_id": user_id, "domain_id": "dom_edge"})
+    assert snapshot["data"]["meta_info"]["fact_count"] == 1
+    export = domains.tool_export_detailed_domain_snapshot({"user_id": user_id, "domain_id": "dom_edge", "file_format": "ndjson"})
+    assert export["data"]["fact_count"] == 1
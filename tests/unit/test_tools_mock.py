@@ -1,28 +1,124 @@
 import sys
+import time
 from pathlib import Path
 
 import pytest
+from google.api_core.exceptions import NotFound
+from google.cloud import firestore
+
+
+@pytest.fixture(autouse=True)
+def _fresh_result_caches():
+    from src.tools.result_cache import export_cache, snapshot_cache
+
+    snapshot_cache.clear()
+    export_cache.clear()
+
+
+class FakeSnapshot:
+    def __init__(self, doc_id, data, exists=True, reference=None):
+        self.id = doc_id
+        self._data = data
+        self.exists = exists
+        self.reference = reference
+
+    def to_dict(self):
+        return self._data
+
+
+def _project(doc, fields):
+    if fields is None:
+        return doc
+    data = {k: v for k, v in doc.to_dict().items() if k in fields}
+    return FakeSnapshot(doc.id, data, doc.exists, reference=doc)
+
+
+def _apply(current, key, value):
+    if isinstance(value, firestore.Increment):
+        return current.get(key, 0) + value.value
+    if isinstance(value, firestore.ArrayUnion):
+        items = list(current.get(key) or [])
+        return items + [v for v in value.values if v not in items]
+    return value
+
+
+def _resolve(current, updates):
+    return {k: _apply(current, k, v) for k, v in updates.items()}
+
+
+class FakeCount:
+    def __init__(self, value):
+        self.value = value
+
+    def get(self):
+        return [[self]]
 
 
 class FakeDocRef:
     def __init__(self, doc_id: str, data=None):
         self.id = doc_id
+        self.path = doc_id
+        self.reference = self
         self._data = data or {}
         self.exists = bool(data)
+        self._subcollections = {}
 
-    def set(self, data):
-        self._data = data
+    def set(self, data, merge=False):
+        self._data = {**self._data, **_resolve(self._data, data)} if merge else _resolve({}, data)
         self.exists = True
 
     def update(self, updates):
-        self._data.update(updates)
+        if not self.exists:
+            raise NotFound(f"no document {self.id}")
+        self._data.update(_resolve(self._data, updates))
 
-    def get(self):
-        return self
+    def get(self, field_paths=None):
+        return _project(self, field_paths)
 
     def to_dict(self):
         return self._data
 
+    def collection(self, name: str):
+        return self._subcollections.setdefault(name, FakeCollection({}))
+
+
+class FakeQuery:
+    def __init__(self, docs, fields=None):
+        self._docs = list(docs)
+        self._fields = fields
+
+    def _derive(self, docs):
+        return FakeQuery(docs, self._fields)
+
+    def where(self, field, op, value):
+        if op == "array_contains_any":
+            return self._derive(d for d in self._docs if d.exists and set(d.to_dict().get(field) or []) & set(value))
+        if op == "in":
+            return self._derive(d for d in self._docs if d.exists and d.to_dict().get(field) in value)
+        assert op == "==", "fake supports ==, in and array_contains_any filters only"
+        return self._derive(d for d in self._docs if d.exists and d.to_dict().get(field) == value)
+
+    def select(self, fields):
+        return FakeQuery(self._docs, [f for f in fields if f != "__name__"])
+
+    def limit(self, n):
+        return self._derive(self._docs[:n])
+
+    def order_by(self, field):
+        if field == "__name__":
+            return self._derive(sorted(self._docs, key=lambda d: d.id))
+        return self._derive(sorted(self._docs, key=lambda d: d.to_dict().get(field)))
+
+    def start_after(self, snapshot):
+        ids = [d.id for d in self._docs]
+        return self._derive(self._docs[ids.index(snapshot.id) + 1 :])
+
+    def count(self, alias=None):
+        return FakeCount(len([d for d in self._docs if d.exists]))
+
+    def stream(self, transaction=None):
+        return iter([_project(d, self._fields) for d in self._docs if d.exists])
+
 
 class FakeCollection:
     def __init__(self, initial=None):
@@ -35,14 +131,38 @@ class FakeCollection:
             self.docs[doc_id] = FakeDocRef(doc_id, {})
         return self.docs[doc_id]
 
-    def where(self, *_, **__):
-        return self
+    def where(self, field, op, value):
+        return FakeQuery(self.docs.values()).where(field, op, value)
+
+    def limit(self, n):
+        return FakeQuery(self.docs.values()).limit(n)
+
+    def select(self, fields):
+        return FakeQuery(self.docs.values()).select(fields)
+
+    def order_by(self, field):
+        return FakeQuery(self.docs.values()).order_by(field)
+
+    def count(self, alias=None):
+        return FakeQuery(self.docs.values()).count(alias)
+
+    def stream(self, transaction=None):
+        return FakeQuery(self.docs.values()).stream()
 
-    def limit(self, *_):
-        return self
 
-    def stream(self):
-        return iter(self.docs.values())
+class FakeBatch:
+    def __init__(self):
+        self._writes = []
+
+    def set(self, doc_ref, data, merge=False):
+        self._writes.append((doc_ref, data, merge))
+
+    def update(self, doc_ref, data):
+        self._writes.append((doc_ref, data, None))
+
+    def commit(self):
+        for doc_ref, data, merge in self._writes:
+            doc_ref.update(data) if merge is None else doc_ref.set(data, merge=merge)
 
 
 class FakeClient:
@@ -60,10 +180,25 @@ class FakeClient:
                     }
                 }
             ),
+            "memory_facts": FakeCollection({}),
+            "domain_snapshots": FakeCollection({}),
         }
 
     def collection(self, name: str):
-        return self.collections[name]
+        return self.collections.setdefault(name, FakeCollection({}))
+
+    def batch(self):
+        return FakeBatch()
+
+    def get_all(self, refs, field_paths=None, transaction=None):
+        # Firestore does not promise input order; callers must match snapshots by reference.
+        return iter([_project(ref, field_paths) for ref in reversed(refs)])
+
+    def run_transaction(self, fn):
+        transaction = FakeBatch()
+        result = fn(transaction)
+        transaction.commit()
+        return result
 
 
 ROOT_DIR = Path(__file__).resolve().parents[2]
@@ -96,6 +231,36 @@ def test_fetch_domains_detailed_view(monkeypatch):
     assert isinstance(first.get("domain_keywords"), list)
 
 
+def test_fetch_domains_brief_projection_pages_and_counts(monkeypatch):
+    from src.tools import domains, firestore_query
+
+    fake_client = FakeClient()
+    for i in range(3):
+        fake_client.collection("domains").document(f"dom_x{i}").set(
+            {"user_id": "user_1", "name": f"X{i}", "status": "inactive", "domain_description": "d" * 500}
+        )
+    monkeypatch.setattr(domains, "_client", lambda: fake_client, raising=False)
+
+    first = domains.tool_fetch_user_knowledge_domains({"user_id": "user_1", "page_size": 2, "include_counts": True})
+    assert first["status"] == "success"
+    assert first["total_count"] == 4
+    assert len(first["data"]) == 2 and first["next_page_token"]
+    assert all(d["domain_description"] is None for d in first["data"])
+
+    second = domains.tool_fetch_user_knowledge_domains(
+        {"user_id": "user_1", "page_size": 2, "page_token": first["next_page_token"]}
+    )
+    ids = [d["domain_id"] for d in first["data"] + second["data"]]
+    assert sorted(ids) == sorted(set(ids)) and len(ids) == 4
+
+    with firestore_query.track_reads("brief") as brief:
+        domains.tool_fetch_user_knowledge_domains({"user_id": "user_1", "view_mode": "BRIEF"})
+    with firestore_query.track_reads("detailed") as detailed:
+        domains.tool_fetch_user_knowledge_domains({"user_id": "user_1", "view_mode": "DETAILED"})
+    assert brief.documents == detailed.documents == 4
+    assert brief.bytes_read < detailed.bytes_read
+
+
 def test_toggle_domain_status(monkeypatch):
     from src.tools import domains
 
@@ -107,6 +272,45 @@ def test_toggle_domain_status(monkeypatch):
     assert result["data"]["previous_status"] != result["data"]["new_status"]
 
 
+def test_bulk_toggle_is_all_or_nothing_and_sets_target(monkeypatch):
+    from src.agents.agent_root import _select_domains, _toggle_target
+    from src.tools import domains
+
+    fake_client = FakeClient()
+    fake_client.collection("domains").document("dom_bio").set({"user_id": "user_1", "name": "Biology", "status": "inactive"})
+    fake_client.collection("domains").document("dom_other").set({"user_id": "user_2", "name": "Other", "status": "active"})
+    monkeypatch.setattr(domains, "_client", lambda: fake_client, raising=False)
+
+    denied = domains.tool_bulk_toggle_domain_status({"user_id": "user_1", "domain_ids": ["dom_ai", "dom_other"], "target_status": "inactive"})
+    assert denied == {"status": "error", "error": "PERMISSION_DENIED", "domain_id": "dom_other"}
+    assert fake_client.collection("domains").document("dom_ai").to_dict()["status"] == "active"
+
+    result = domains.tool_bulk_toggle_domain_status({"user_id": "user_1", "domain_ids": ["dom_ai", "dom_bio", "dom_ai"], "target_status": "active"})
+    assert result["status"] == "success"
+    assert [(r["domain_id"], r["previous_status"], r["new_status"]) for r in result["data"]["results"]] == [
+        ("dom_ai", "active", "active"),
+        ("dom_bio", "inactive", "active"),
+    ]
+    assert result["data"]["changed_count"] == 1
+    assert fake_client.collection("domains").document("dom_bio").to_dict()["version"] == 1
+    assert "version" not in fake_client.collection("domains").document("dom_ai").to_dict()
+
+    listed = [{"domain_id": "dom_ai", "name": "AI Research"}, {"domain_id": "dom_bio", "name": "Biology"}]
+    assert _toggle_target("please disable biology") == "inactive" and _toggle_target("turn on all") == "active"
+    assert [d["domain_id"] for d in _select_domains("please disable biology", listed)] == ["dom_bio"]
+    assert len(_select_domains("enable all my domains", listed)) == 2
+
+
+def test_select_domains_matches_whole_words_only():
+    from src.agents.agent_root import _select_domains
+
+    listed = [{"domain_id": "dom_ai", "name": "AI"}, {"domain_id": "ml", "name": "Machine Learning"}, {"domain_id": "dom_cpp", "name": "C++"}]
+    # "AI" inside "said"/"again" and "ml" inside "html" are not mentions.
+    assert _select_domains("he said to disable it again in the html page", listed) == []
+    assert [d["domain_id"] for d in _select_domains("disable AI, and ml.", listed)] == ["dom_ai", "ml"]
+    assert [d["domain_id"] for d in _select_domains("turn off machine  learning and c++", listed)] == ["ml", "dom_cpp"]
+
+
 def test_prettify_domain_description(monkeypatch):
     from src.tools import ai_analysis
     from src.tools.domains import tool_prettify_domain_description
@@ -153,6 +357,9 @@ def test_content_tools(monkeypatch):
         def raise_for_status(self):
             return None
 
+        def iter_content(self, chunk_size=1):
+            yield self.content
+
     class FakeRequests(types.SimpleNamespace):
         @staticmethod
         def get(url, headers=None, timeout=10, stream=False):
@@ -246,3 +453,352 @@ def test_save_fact_to_memory():
     )
     assert result["status"] == "success"
     assert result["data"]["memory_id"].startswith("mem_")
+
+
+def test_rolling_snapshot_updates_on_save(monkeypatch):
+    from src.tools import domains, memory
+
+    fake_client = FakeClient()
+    monkeypatch.setattr(memory, "_firestore_client", lambda: fake_client, raising=False)
+    monkeypatch.setattr(domains, "_client", lambda: fake_client, raising=False)
+    monkeypatch.setenv("RUN_REAL_MEMORY", "1")
+    monkeypatch.delenv("RUN_REAL_AI", raising=False)
+
+    empty = domains.tool_generate_domain_snapshot({"user_id": "user_1", "domain_id": "dom_ai"})
+    assert empty["status"] == "empty"
+    assert empty["data"]["meta_info"]["fact_count"] == 0
+
+    for text, url in [("Fact one.", "https://a.example"), ("Fact two.", "https://a.example"), ("Fact three.", "https://b.example")]:
+        saved = memory.tool_save_fact_to_memory(
+            {"fact_text": text, "source_url": url, "user_id": "user_1", "domain_id": "dom_ai"}
+        )
+        assert saved["status"] == "success"
+
+    snapshot = domains.tool_generate_domain_snapshot({"user_id": "user_1", "domain_id": "dom_ai"})
+    assert snapshot["status"] == "success"
+    meta = snapshot["data"]["meta_info"]
+    assert meta == {"fact_count": 3, "total_char_length": len("Fact one.Fact two.Fact three."), "source_count": 2}
+    assert snapshot["data"]["domain_name"] == "AI Research"
+    assert "Fact three." in snapshot["data"]["extended_summary"]
+
+    denied = domains.tool_generate_domain_snapshot({"user_id": "someone_else", "domain_id": "dom_ai"})
+    assert denied["status"] == "error"
+
+
+def test_tree_snapshot_recomputes_only_dirty_groups(monkeypatch):
+    from src.tools import ai_analysis, domains, memory
+    from src.tools.result_cache import snapshot_cache
+    from src.utils.config_loader import ConfigLoader
+
+    fake_client = FakeClient()
+    monkeypatch.setattr(memory, "_firestore_client", lambda: fake_client, raising=False)
+    monkeypatch.setattr(domains, "_client", lambda: fake_client, raising=False)
+    monkeypatch.setenv("RUN_REAL_MEMORY", "1")
+    monkeypatch.delenv("RUN_REAL_AI", raising=False)
+    loader = ConfigLoader.instance()
+    monkeypatch.setitem(loader.config, "snapshots", {"mode": "tree", "group_by": "source", "branch_count": 4})
+
+    calls = []
+    real_summarize = ai_analysis.tool_summarize_texts
+
+    def counting_summarize(payload):
+        calls.append(payload["level"])
+        return real_summarize(payload)
+
+    monkeypatch.setattr(ai_analysis, "tool_summarize_texts", counting_summarize)
+
+    for text, url in [("Alpha fact.", "https://a.example"), ("Beta fact.", "https://b.example")]:
+        memory.tool_save_fact_to_memory({"fact_text": text, "source_url": url, "user_id": "user_1", "domain_id": "dom_ai"})
+
+    first = domains.tool_generate_domain_snapshot({"user_id": "user_1", "domain_id": "dom_ai"})
+    assert first["status"] == "success"
+    assert first["data"]["meta_info"]["fact_count"] == 2
+    assert "Alpha fact." in first["data"]["extended_summary"]
+    assert calls.count("facts") == 2
+
+    calls.clear()
+    cached = domains.tool_generate_domain_snapshot({"user_id": "user_1", "domain_id": "dom_ai"})
+    assert cached["data"]["extended_summary"] == first["data"]["extended_summary"]
+    assert calls == []
+
+    memory.tool_save_fact_to_memory({"fact_text": "Gamma fact.", "source_url": "https://a.example", "user_id": "user_1", "domain_id": "dom_ai"})
+    # The last good snapshot is served while the dirty branch is re-summarized in the background.
+    stale = domains.tool_generate_domain_snapshot({"user_id": "user_1", "domain_id": "dom_ai"})
+    assert stale["data"]["stale"] is True
+    assert stale["data"]["extended_summary"] == first["data"]["extended_summary"]
+    snapshot_cache.join()
+    refreshed = domains.tool_generate_domain_snapshot({"user_id": "user_1", "domain_id": "dom_ai"})
+    assert calls.count("facts") == 1
+    assert refreshed["data"]["stale"] is False and refreshed["data"]["version"] > first["data"]["version"]
+    assert "Gamma fact." in refreshed["data"]["extended_summary"]
+
+
+def test_tree_refresh_keeps_concurrent_saves_and_reuses_unchanged_buckets(monkeypatch):
+    from src.tools import ai_analysis, memory, snapshots
+    from src.utils.config_loader import ConfigLoader
+
+    fake_client = FakeClient()
+    monkeypatch.setattr(memory, "_firestore_client", lambda: fake_client, raising=False)
+    monkeypatch.setenv("RUN_REAL_MEMORY", "1")
+    monkeypatch.delenv("RUN_REAL_AI", raising=False)
+    loader = ConfigLoader.instance()
+    cfg = {"mode": "tree", "group_by": "source", "branch_count": 1, "max_parallel": 1, "max_texts_per_prompt": 2}
+    monkeypatch.setitem(loader.config, "snapshots", cfg)
+
+    def save(text, url):
+        assert memory.tool_save_fact_to_memory({"fact_text": text, "source_url": url, "user_id": "user_1", "domain_id": "dom_ai"})["status"] == "success"
+
+    for i in range(6):
+        save(f"Fact {i}.", f"https://s{i}.example")
+    first = snapshots.refresh_tree_snapshot(fake_client, "dom_ai", snapshots.read_snapshot_state(fake_client, "dom_ai"))
+    assert first["tree_dirty"] is False
+
+    calls = []
+    real_summarize = ai_analysis.tool_summarize_texts
+
+    def summarize_with_racing_save(payload):
+        calls.append(payload["level"])
+        if payload["level"] == "facts" and calls.count("facts") == 1:
+            # A save lands after the group's facts were read but before the refresh clears its flag.
+            save("Late fact.", "https://s0.example")
+        return real_summarize(payload)
+
+    monkeypatch.setattr(ai_analysis, "tool_summarize_texts", summarize_with_racing_save)
+    save("Changed fact.", "https://s0.example")
+    second = snapshots.refresh_tree_snapshot(fake_client, "dom_ai", snapshots.read_snapshot_state(fake_client, "dom_ai"))
+    # Only the bucket holding the changed group is re-summarized; the other two partials come from the cache.
+    # Then the branch reduces three partials (two prompts and their merge) and the root reduces the branch.
+    assert calls == ["facts"] + ["summaries"] * 5
+    assert second["tree_dirty"] is True and "Late fact." not in second["extended_summary"]
+    groups = fake_client.collection("domain_snapshots").document("dom_ai").collection("groups")
+    assert [g.id for g in groups.where("dirty", "==", True).stream()] == [snapshots.group_key_for("https://s0.example")]
+
+    third = snapshots.refresh_tree_snapshot(fake_client, "dom_ai", snapshots.read_snapshot_state(fake_client, "dom_ai"))
+    assert third["tree_dirty"] is False and "Late fact." in third["extended_summary"]
+    assert third["fact_count"] == 8
+
+
+def test_streaming_export_resumes_after_interruption(monkeypatch, tmp_path):
+    import gzip
+    import json
+
+    from src.tools import domains
+    from src.tools.export_store import LocalExportStore
+    from src.tools.result_cache import bump_domain_version, export_cache
+    from src.utils.config_loader import ConfigLoader
+
+    fake_client = FakeClient()
+    facts = fake_client.collection("memory_facts")
+    for i in range(7):
+        facts.document(f"m{i}").set(
+            {"fact_text": f"fact {i}", "source_url": "https://a.example", "user_id": "user_1", "domain_id": "dom_ai", "created_at": i}
+        )
+    monkeypatch.setattr(domains, "_client", lambda: fake_client, raising=False)
+    monkeypatch.setenv("RUN_REAL_MEMORY", "1")
+    monkeypatch.setitem(ConfigLoader.instance().config, "export", {"page_size": 2, "pages_per_part": 1})
+
+    class FlakyStore(LocalExportStore):
+        fail_on_part = 2
+
+        def open_part(self, key, part_no):
+            if part_no == self.fail_on_part:
+                self.fail_on_part = None
+                raise IOError("disk went away")
+            return super().open_part(key, part_no)
+
+    store = FlakyStore(tmp_path)
+    monkeypatch.setattr(domains, "get_export_store", lambda: store)
+
+    first = domains.tool_export_detailed_domain_snapshot({"user_id": "user_1", "domain_id": "dom_ai", "file_format": "ndjson"})
+    assert first["status"] == "error"
+    assert first["export_id"]
+
+    resumed = domains.tool_export_detailed_domain_snapshot(
+        {"user_id": "user_1", "domain_id": "dom_ai", "file_format": "ndjson", "export_id": first["export_id"]}
+    )
+    assert resumed["status"] == "success"
+    data = resumed["data"]
+    assert data["fact_count"] == 7
+    path = tmp_path / "user_1" / "dom_ai" / f"{first['export_id']}.ndjson.gz"
+    assert data["file_size_bytes"] == path.stat().st_size
+    with gzip.open(path, "rt", encoding="utf-8") as fh:
+        rows = [json.loads(line) for line in fh]
+    assert [r["fact_text"] for r in rows] == [f"fact {i}" for i in range(7)]
+    assert not list(tmp_path.glob("**/*.part*"))
+
+    # New exports are reused until the domain version moves; then the old link is served while a new one is built.
+    request = {"user_id": "user_1", "domain_id": "dom_ai", "file_format": "ndjson"}
+    fresh = domains.tool_export_detailed_domain_snapshot(request)
+    again = domains.tool_export_detailed_domain_snapshot(request)
+    assert again["data"]["export_id"] == fresh["data"]["export_id"] and again["data"]["stale"] is False
+    facts.document("m7").set({"fact_text": "fact 7", "user_id": "user_1", "domain_id": "dom_ai", "created_at": 7})
+    bump_domain_version(fake_client, "dom_ai")
+    stale = domains.tool_export_detailed_domain_snapshot(request)
+    assert stale["data"]["export_id"] == fresh["data"]["export_id"] and stale["data"]["stale"] is True
+    export_cache.join()
+    rebuilt = domains.tool_export_detailed_domain_snapshot(request)
+    assert rebuilt["data"]["export_id"] != fresh["data"]["export_id"] and rebuilt["data"]["fact_count"] == 8
+
+
+def test_near_duplicate_fact_is_merged_as_extra_source(monkeypatch):
+    from src.tools import memory
+
+    fake_client = FakeClient()
+    monkeypatch.setattr(memory, "_firestore_client", lambda: fake_client, raising=False)
+    monkeypatch.setenv("RUN_REAL_MEMORY", "1")
+    monkeypatch.delenv("RUN_REAL_AI", raising=False)
+
+    base = {"user_id": "user_1", "domain_id": "dom_ai"}
+    first = memory.tool_save_fact_to_memory(
+        {**base, "fact_text": "OpenAI released a new model with a much longer context window today.", "source_url": "https://a.example"}
+    )
+    restated = memory.tool_save_fact_to_memory(
+        {**base, "fact_text": "OpenAI has released a new model with a much longer context window today.", "source_url": "https://b.example"}
+    )
+    distinct = memory.tool_save_fact_to_memory(
+        {**base, "fact_text": "Solar panel efficiency records were broken by a perovskite tandem cell.", "source_url": "https://c.example"}
+    )
+
+    assert restated["data"]["merged_into_existing"] is True
+    assert 0.9 <= restated["data"]["similarity"] < 1.0
+    assert restated["data"]["memory_id"] == first["data"]["memory_id"]
+    assert distinct["data"]["merged_into_existing"] is False
+    stored = fake_client.collection("memory_facts").document(first["data"]["memory_id"]).to_dict()
+    assert stored["sources"] == ["https://a.example", "https://b.example"] and stored["duplicate_count"] == 1
+    snapshot = fake_client.collection("domain_snapshots").document("dom_ai").to_dict()
+    assert snapshot["fact_count"] == 2
+
+    from src.tools import dedup
+
+    lookups = []
+    real_stream = dedup.stream_documents
+    monkeypatch.setattr(dedup, "stream_documents", lambda query, **kw: lookups.append(1) or real_stream(query, **kw))
+    flags = memory.tool_check_duplicate_facts(
+        {
+            "user_id": "user_1",
+            "facts": [
+                {"fact_id": "f1", "domain_id": "dom_ai", "content": "Solar panel efficiency records were broken by a perovskite tandem cell"},
+                {"fact_id": "f2", "domain_id": "dom_ai", "content": "A brand new fact about quantum error correction thresholds."},
+                {"fact_id": "f3", "domain_id": "dom_ai", "content": "A brand new fact about quantum error correction thresholds"},
+            ],
+        }
+    )
+    by_id = {f["fact_id"]: f for f in flags["data"]}
+    assert by_id["f1"]["duplicate_kind"] == "stored"
+    assert by_id["f1"]["duplicate_of"] == distinct["data"]["memory_id"]
+    assert by_id["f2"]["duplicate_of"] is None
+    assert by_id["f3"]["duplicate_of"] == "f2"
+    # f1 and f2 are looked up together: one hash query and one band query for the domain.
+    assert len(lookups) == 2
+
+
+def test_backfill_to_sharded_layout_and_domain_scoped_reads(monkeypatch):
+    from src.tools import fact_store, facts_migration, memory
+
+    fake_client = FakeClient()
+    flat = fake_client.collection("memory_facts")
+    for i in range(5):
+        domain_id = "dom_ai" if i % 2 == 0 else "dom_bio"
+        flat.document(f"fact_{i}").set(
+            {"user_id": "user_1", "domain_id": domain_id, "fact_text": f"Fact number {i}", "source_url": "https://seed.example"}
+        )
+    flat.document("orphan").set({"fact_text": "no owner"})
+
+    result = facts_migration.backfill_sharded_facts(fake_client, page_size=2, max_workers=2)
+    assert result == {"copied": 5, "skipped": 1, "pages": 3, "last_id": "orphan"}
+    ai_facts = fact_store.sharded_facts_collection(fake_client, "user_1", "dom_ai")
+    assert sorted(ai_facts.docs) == ["fact_0", "fact_2", "fact_4"]
+    assert facts_migration.backfill_sharded_facts(fake_client, page_size=2, max_workers=2)["copied"] == 5
+
+    # A failed commit must not be behind the logged resume point, even while later pages were already read.
+    logged = []
+    monkeypatch.setattr(facts_migration.logger, "info", lambda event, **kw: logged.append(kw.get("last_id")))
+
+    def flaky_commit(client, docs):
+        if docs[0].id == "fact_0":
+            time.sleep(0.1)
+            return len(docs)
+        raise RuntimeError("commit failed")
+
+    monkeypatch.setattr(facts_migration, "_commit_batch", flaky_commit)
+    with pytest.raises(RuntimeError):
+        facts_migration.backfill_sharded_facts(fake_client, page_size=2, max_workers=2)
+    assert logged == ["fact_1"]
+
+    monkeypatch.setenv("FACTS_LAYOUT", "sharded")
+    monkeypatch.setenv("RUN_REAL_MEMORY", "1")
+    monkeypatch.delenv("RUN_REAL_AI", raising=False)
+    monkeypatch.setattr(memory, "_firestore_client", lambda: fake_client, raising=False)
+    saved = memory.tool_save_fact_to_memory(
+        {"user_id": "user_1", "domain_id": "dom_ai", "fact_text": "Fact number 2", "source_url": "https://x.example"}
+    )
+    assert saved["data"] == {"memory_id": "fact_2", "merged_into_existing": True, "similarity": 1.0}
+    assert ai_facts.document("fact_2").to_dict()["sources"] == ["https://seed.example", "https://x.example"]
+    assert len(flat.docs) == 6
+
+
+def test_hybrid_fact_search_indexes_on_save_and_persists(monkeypatch, tmp_path):
+    from src.tools import fact_index, fact_store, memory
+    from src.utils.config_loader import ConfigLoader
+
+    fake_client = FakeClient()
+    fake_client.collection("domains").document("dom_bio").set({"user_id": "user_1", "name": "Biology", "status": "active"})
+    monkeypatch.setattr(memory, "_firestore_client", lambda: fake_client, raising=False)
+    monkeypatch.setitem(ConfigLoader.instance().config, "search", {"index_dir": str(tmp_path / "index")})
+    monkeypatch.setattr(fact_index, "_indexes", {})
+    monkeypatch.setenv("RUN_REAL_MEMORY", "1")
+    monkeypatch.delenv("RUN_REAL_AI", raising=False)
+
+    facts = [
+        ("dom_ai", "Transformers replaced recurrent networks for most language modeling tasks."),
+        ("dom_ai", "Mixture of experts layers route each token to a few expert networks."),
+        ("dom_bio", "CRISPR base editors change single DNA letters without double strand breaks."),
+        ("dom_bio", "Transformer models now predict protein structures from amino acid sequences."),
+    ]
+    ids = [
+        memory.tool_save_fact_to_memory({"user_id": "user_1", "domain_id": d, "fact_text": t, "source_url": "https://s.example"})["data"]["memory_id"]
+        for d, t in facts
+    ]
+
+    result = memory.tool_search_facts({"user_id": "user_1", "query": "language modelling"})
+    assert result["status"] == "success"
+    assert result["data"]["hits"][0]["memory_id"] == ids[0]
+    assert all(h["memory_id"] != ids[2] for h in result["data"]["hits"])
+    scoped = memory.tool_search_facts({"user_id": "user_1", "query": "transformer", "domain_id": "dom_bio"})
+    assert [h["memory_id"] for h in scoped["data"]["hits"]][0] == ids[3]
+    assert all(h["domain_id"] == "dom_bio" for h in scoped["data"]["hits"])
+
+    # Reopen from the memory-mapped files: same ranking without touching storage.
+    monkeypatch.setattr(fact_index, "_indexes", {})
+    reopened = fact_index.search_facts("user_1", "DNA editing")
+    assert reopened[0]["memory_id"] == ids[2]
+
+    # An index that is missing on disk is rebuilt from storage on first search.
+    monkeypatch.setattr(fact_index, "_indexes", {})
+    import shutil
+
+    shutil.rmtree(tmp_path / "index")
+    rebuilt = memory.tool_search_facts({"user_id": "user_1", "query": "expert routing"})
+    assert rebuilt["data"]["hits"][0]["memory_id"] == ids[1]
+
+    # A fact stored without going through this process's index (another node, a failed index write) is picked up too.
+    fake_client.collection(fact_store.memory_collection_name()).document("other_node").set(
+        {"user_id": "user_1", "domain_id": "dom_bio", "fact_text": "Gene drives spread edits through wild mosquito populations.", "source_url": ""}
+    )
+    synced = memory.tool_search_facts({"user_id": "user_1", "query": "mosquito gene drives"})
+    assert synced["data"]["hits"][0]["memory_id"] == "other_node"
+
+    # Two handles on one directory stand in for two API worker processes: neither overwrites the other's facts.
+    first = fact_index.FactIndex(tmp_path / "shared", dim=64)
+    second = fact_index.FactIndex(tmp_path / "shared", dim=64)
+    assert first.add("m1", "d", "Solid state batteries promise faster charging.")
+    assert second.add("m2", "d", "Sodium ion cells avoid lithium supply limits.")
+    assert first.add("m3", "d", "Grid storage increasingly uses iron air batteries.")
+    assert len(second) == 3 and {h["memory_id"] for h in second.search("batteries lithium", top_k=5)} == {"m1", "m2", "m3"}
+
+
+def test_knowledge_query_intent_routes_to_search():
+    from src.agents.agent_root import _classify_intent
+
+    assert _classify_intent("What do I know about quantum computing?") == "KNOWLEDGE_QUERY"
+    assert _classify_intent("give me a snapshot") == "SNAPSHOT"